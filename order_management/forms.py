@@ -1,6 +1,6 @@
 from django import forms
 from django.utils import timezone
-from .models import Project, FixedCost, VariableCost
+from .models import Project, FixedCost, VariableCost, BankStatementImport
 
 
 class ProjectForm(forms.ModelForm):
@@ -173,4 +173,24 @@ class VariableCostFilterForm(forms.Form):
         required=False,
         empty_label="全ての案件",
         widget=forms.Select(attrs={'class': 'form-select'})
-    )
\ No newline at end of file
+    )
+
+class BankStatementImportForm(forms.Form):
+    """入出金明細取込フォーム"""
+    statement_file = forms.FileField(
+        label='明細ファイル',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control form-control-sm', 'accept': '.txt,.dat,.csv'})
+    )
+    file_format = forms.ChoiceField(
+        label='形式',
+        choices=[('auto', '自動判別')] + BankStatementImport.FORMAT_CHOICES,
+        initial='auto',
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'})
+    )
+    window_days = forms.IntegerField(
+        label='入金予定日の許容日数',
+        initial=10,
+        min_value=0,
+        max_value=60,
+        widget=forms.NumberInput(attrs={'class': 'form-control form-control-sm'})
+    )
@@ -0,0 +1,30 @@
+import calendar
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from order_management.models import Invoice
+from order_management.utils.invoice_pdf import render_invoice_batch
+
+
+class Command(BaseCommand):
+    help = '指定月に発行した請求書のPDFをプロセスプールで一括生成'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, default=timezone.now().year)
+        parser.add_argument('--month', type=int, default=timezone.now().month)
+
+    def handle(self, *args, **options):
+        year, month = options['year'], options['month']
+        start_date = date(year, month, 1)
+        end_date = date(year, month, calendar.monthrange(year, month)[1])
+
+        invoices = Invoice.objects.filter(
+            issue_date__range=[start_date, end_date]
+        ).exclude(status='cancelled').prefetch_related('items')
+
+        rendered = render_invoice_batch(invoices)
+        self.stdout.write(self.style.SUCCESS(
+            f'{year}年{month}月: {invoices.count()}件中 {len(rendered)}件のPDFを生成しました'
+        ))
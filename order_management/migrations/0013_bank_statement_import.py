@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order_management', '0012_invoice_invoiceitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankStatementImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255, verbose_name='ファイル名')),
+                ('file_format', models.CharField(choices=[('zengin', '全銀協 入出金取引明細'), ('csv', 'CSV')], max_length=10, verbose_name='形式')),
+                ('line_count', models.IntegerField(default=0, verbose_name='入金明細件数')),
+                ('matched_count', models.IntegerField(default=0, verbose_name='消込件数')),
+                ('imported_by', models.CharField(blank=True, max_length=100, verbose_name='取込者')),
+                ('imported_at', models.DateTimeField(auto_now_add=True, verbose_name='取込日時')),
+            ],
+            options={
+                'verbose_name': '入出金明細取込',
+                'verbose_name_plural': '入出金明細取込一覧',
+                'ordering': ['-imported_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='contractor',
+            name='payer_name_kana',
+            field=models.CharField(blank=True, help_text='入金明細に表示される振込依頼人名。入金消込の照合に使用', max_length=100, verbose_name='振込依頼人名（カナ）'),
+        ),
+        migrations.CreateModel(
+            name='BankStatementLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_date', models.DateField(verbose_name='入金日')),
+                ('amount', models.DecimalField(decimal_places=0, max_digits=12, verbose_name='入金額')),
+                ('payer_name', models.CharField(blank=True, max_length=100, verbose_name='振込依頼人名')),
+                ('payer_name_normalized', models.CharField(blank=True, max_length=100, verbose_name='振込依頼人名（正規化）')),
+                ('reference_no', models.CharField(blank=True, max_length=20, verbose_name='照会番号')),
+                ('match_status', models.CharField(choices=[('unmatched', '未消込'), ('matched', '消込済み'), ('ambiguous', '候補複数')], default='unmatched', max_length=20, verbose_name='消込状況')),
+                ('matched_at', models.DateTimeField(blank=True, null=True, verbose_name='消込日時')),
+                ('matched_projects', models.ManyToManyField(blank=True, related_name='bank_receipts', to='order_management.project', verbose_name='消込案件')),
+                ('statement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='order_management.bankstatementimport', verbose_name='取込')),
+            ],
+            options={
+                'verbose_name': '入金明細',
+                'verbose_name_plural': '入金明細一覧',
+                'ordering': ['transaction_date', 'id'],
+                'indexes': [models.Index(fields=['amount', 'transaction_date'], name='order_manag_amount_27e8bb_idx'), models.Index(fields=['payer_name_normalized'], name='order_manag_payer_n_9d82fe_idx'), models.Index(fields=['match_status'], name='order_manag_match_s_30aeb7_idx')],
+            },
+        ),
+    ]
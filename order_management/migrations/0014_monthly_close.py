@@ -0,0 +1,134 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order_management', '0013_bank_statement_import'),
+        ('subcontract_management', '0009_contractor_closing_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyClose',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField(verbose_name='年')),
+                ('month', models.IntegerField(verbose_name='月')),
+                ('status', models.CharField(choices=[('closed', '締め済み'), ('reopened', '締め解除')], default='closed', max_length=10, verbose_name='状態')),
+                ('receipt_total', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='入金予定合計')),
+                ('receipt_received', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='入金済み')),
+                ('receipt_pending', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='入金待ち')),
+                ('payment_total', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='出金予定合計')),
+                ('payment_paid', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='支払済み')),
+                ('payment_pending', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='未払い')),
+                ('closed_by', models.CharField(blank=True, max_length=100, verbose_name='締め実行者')),
+                ('closed_at', models.DateTimeField(blank=True, null=True, verbose_name='締め日時')),
+                ('reopened_by', models.CharField(blank=True, max_length=100, verbose_name='締め解除者')),
+                ('reopened_at', models.DateTimeField(blank=True, null=True, verbose_name='締め解除日時')),
+            ],
+            options={
+                'verbose_name': '月次締め',
+                'verbose_name_plural': '月次締め一覧',
+                'ordering': ['-year', '-month'],
+                'unique_together': {('year', 'month')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日付')),
+                ('transaction_type', models.CharField(choices=[('receipt', '入金'), ('payment', '出金')], max_length=10, verbose_name='区分')),
+                ('site_name', models.CharField(max_length=200, verbose_name='現場名')),
+                ('description', models.CharField(max_length=255, verbose_name='摘要')),
+                ('client', models.CharField(blank=True, max_length=100, verbose_name='取引先')),
+                ('amount', models.DecimalField(decimal_places=0, max_digits=12, verbose_name='金額')),
+                ('status', models.CharField(max_length=20, verbose_name='状況')),
+                ('balance', models.DecimalField(decimal_places=0, max_digits=14, verbose_name='残高')),
+                ('position', models.IntegerField(default=0, verbose_name='表示順')),
+                ('project', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='order_management.project', verbose_name='案件')),
+                ('monthly_close', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_rows', to='order_management.monthlyclose', verbose_name='月次締め')),
+            ],
+            options={
+                'verbose_name': '通帳スナップショット',
+                'verbose_name_plural': '通帳スナップショット一覧',
+                'ordering': ['position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PaymentSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('site_name', models.CharField(max_length=200, verbose_name='現場名')),
+                ('worker_type', models.CharField(max_length=20, verbose_name='作業者タイプ')),
+                ('contract_amount', models.DecimalField(decimal_places=0, default=0, max_digits=10, verbose_name='契約金額')),
+                ('billed_amount', models.DecimalField(decimal_places=0, default=0, max_digits=10, verbose_name='請求金額')),
+                ('payment_date', models.DateField(blank=True, null=True, verbose_name='支払日')),
+                ('payment_status', models.CharField(max_length=20, verbose_name='出金状況')),
+                ('contractor_name', models.CharField(blank=True, max_length=100, verbose_name='発注先名')),
+                ('contractor_bank_name', models.CharField(blank=True, max_length=100, verbose_name='銀行名')),
+                ('contractor_account_number', models.CharField(blank=True, max_length=20, verbose_name='口座番号')),
+                ('contractor_account_holder', models.CharField(blank=True, max_length=100, verbose_name='口座名義')),
+                ('contractor_payment_cycle', models.CharField(blank=True, max_length=10, verbose_name='支払サイクル')),
+                ('contractor_payment_day', models.IntegerField(blank=True, null=True, verbose_name='支払日')),
+                ('contractor_closing_day', models.IntegerField(blank=True, null=True, verbose_name='締め日')),
+                ('internal_worker_name', models.CharField(blank=True, max_length=100, verbose_name='社内担当者名')),
+                ('contractor', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='subcontract_management.contractor', verbose_name='発注先')),
+                ('internal_worker', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='subcontract_management.internalworker', verbose_name='社内担当者')),
+                ('monthly_close', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='order_management.monthlyclose', verbose_name='月次締め')),
+                ('project', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='order_management.project', verbose_name='案件')),
+                ('subcontract', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='subcontract_management.subcontract', verbose_name='外注')),
+            ],
+            options={
+                'verbose_name': '出金スナップショット',
+                'verbose_name_plural': '出金スナップショット一覧',
+                'ordering': ['contractor_name', 'internal_worker_name', 'payment_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProfitLossSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revenue', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='売上高')),
+                ('cost_of_sales', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='売上原価')),
+                ('cost_labor', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='職人さん人工')),
+                ('cost_materials', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='資材')),
+                ('gross_profit', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='売上総利益')),
+                ('sales_expense', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='販管費')),
+                ('fixed_costs', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='固定費')),
+                ('operating_profit', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='営業利益')),
+                ('monthly_close', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profit_loss', to='order_management.monthlyclose', verbose_name='月次締め')),
+            ],
+            options={
+                'verbose_name': '損益スナップショット',
+                'verbose_name_plural': '損益スナップショット一覧',
+            },
+        ),
+        migrations.CreateModel(
+            name='ReceiptSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('management_no', models.CharField(max_length=20, verbose_name='管理No')),
+                ('site_name', models.CharField(max_length=200, verbose_name='現場名')),
+                ('contractor_name', models.CharField(max_length=100, verbose_name='請負業者名')),
+                ('order_status', models.CharField(blank=True, max_length=10, verbose_name='受注ヨミ')),
+                ('estimate_amount', models.DecimalField(decimal_places=0, default=0, max_digits=10, verbose_name='見積金額(税込)')),
+                ('billing_amount', models.DecimalField(decimal_places=0, default=0, max_digits=10, verbose_name='請求額実請求')),
+                ('payment_due_date', models.DateField(blank=True, null=True, verbose_name='入金予定日')),
+                ('payment_status', models.CharField(blank=True, max_length=20, verbose_name='入金状況')),
+                ('work_start_date', models.DateField(blank=True, null=True, verbose_name='工事開始日')),
+                ('work_end_date', models.DateField(blank=True, null=True, verbose_name='工事終了日')),
+                ('monthly_close', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipts', to='order_management.monthlyclose', verbose_name='月次締め')),
+                ('project', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='order_management.project', verbose_name='案件')),
+            ],
+            options={
+                'verbose_name': '入金スナップショット',
+                'verbose_name_plural': '入金スナップショット一覧',
+                'ordering': ['contractor_name', 'payment_due_date'],
+            },
+        ),
+    ]
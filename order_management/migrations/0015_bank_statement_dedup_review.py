@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:44
+
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_dedup_keys(apps, schema_editor):
+    """既存の入金明細に重複判定キーを設定（再取込で重複した明細はキーなしのまま残す）"""
+    BankStatementLine = apps.get_model('order_management', 'BankStatementLine')
+    seen = set()
+    ordinals = {}
+    for line in BankStatementLine.objects.order_by('statement_id', 'id').iterator():
+        fields = (
+            line.transaction_date.isoformat(), str(int(line.amount)),
+            line.reference_no, line.payer_name_normalized,
+        )
+        ordinal = ordinals.get((line.statement_id, fields), 0)
+        ordinals[(line.statement_id, fields)] = ordinal + 1
+        key = hashlib.sha256('|'.join((*fields, str(ordinal))).encode('utf-8')).hexdigest()
+        if key in seen:
+            continue
+        seen.add(key)
+        BankStatementLine.objects.filter(pk=line.pk).update(dedup_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order_management', '0014_monthly_close'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankstatementimport',
+            name='duplicate_count',
+            field=models.IntegerField(default=0, verbose_name='取込済みのため除外した件数'),
+        ),
+        migrations.AddField(
+            model_name='bankstatementline',
+            name='dedup_key',
+            field=models.CharField(editable=False, help_text='入金日・金額・照会番号・振込依頼人名（と同一明細内の出現順）から算出', max_length=64, null=True, unique=True, verbose_name='重複判定キー'),
+        ),
+        migrations.AddField(
+            model_name='bankstatementline',
+            name='suggested_project',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='suggested_receipts', to='order_management.project', verbose_name='消込候補（要確認）'),
+        ),
+        migrations.AlterField(
+            model_name='bankstatementline',
+            name='match_status',
+            field=models.CharField(choices=[('unmatched', '未消込'), ('matched', '消込済み'), ('needs_review', '要確認'), ('ambiguous', '候補複数')], default='unmatched', max_length=20, verbose_name='消込状況'),
+        ),
+        migrations.RunPython(backfill_dedup_keys, migrations.RunPython.noop),
+    ]
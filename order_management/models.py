@@ -680,6 +680,11 @@ class Contractor(models.Model):
     )
     account_number = models.CharField(max_length=20, blank=True, verbose_name='口座番号')
     account_holder = models.CharField(max_length=100, blank=True, verbose_name='口座名義')
+    payer_name_kana = models.CharField(
+        max_length=100, blank=True,
+        verbose_name='振込依頼人名（カナ）',
+        help_text='入金明細に表示される振込依頼人名。入金消込の照合に使用'
+    )
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
@@ -1092,3 +1097,404 @@ class InvoiceItem(models.Model):
         # 請求書の小計を更新
         self.invoice.subtotal = sum(item.amount for item in self.invoice.items.all())
         self.invoice.save()
+
+
+class BankStatementImport(models.Model):
+    """入出金明細取込"""
+    FORMAT_CHOICES = [
+        ('zengin', '全銀協 入出金取引明細'),
+        ('csv', 'CSV'),
+    ]
+
+    file_name = models.CharField(max_length=255, verbose_name='ファイル名')
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, verbose_name='形式')
+    line_count = models.IntegerField(default=0, verbose_name='入金明細件数')
+    duplicate_count = models.IntegerField(default=0, verbose_name='取込済みのため除外した件数')
+    matched_count = models.IntegerField(default=0, verbose_name='消込件数')
+    imported_by = models.CharField(max_length=100, blank=True, verbose_name='取込者')
+    imported_at = models.DateTimeField(auto_now_add=True, verbose_name='取込日時')
+
+    class Meta:
+        verbose_name = '入出金明細取込'
+        verbose_name_plural = '入出金明細取込一覧'
+        ordering = ['-imported_at']
+
+    def __str__(self):
+        return f"{self.file_name} ({self.imported_at:%Y/%m/%d %H:%M})"
+
+
+class BankStatementLine(models.Model):
+    """入金明細（消込対象）"""
+    MATCH_STATUS_CHOICES = [
+        ('unmatched', '未消込'),
+        ('matched', '消込済み'),
+        ('needs_review', '要確認'),
+        ('ambiguous', '候補複数'),
+    ]
+
+    statement = models.ForeignKey(
+        BankStatementImport,
+        on_delete=models.CASCADE,
+        related_name='lines',
+        verbose_name='取込'
+    )
+    transaction_date = models.DateField(verbose_name='入金日')
+    amount = models.DecimalField(max_digits=12, decimal_places=0, verbose_name='入金額')
+    payer_name = models.CharField(max_length=100, blank=True, verbose_name='振込依頼人名')
+    payer_name_normalized = models.CharField(max_length=100, blank=True, verbose_name='振込依頼人名（正規化）')
+    reference_no = models.CharField(max_length=20, blank=True, verbose_name='照会番号')
+    dedup_key = models.CharField(
+        max_length=64, unique=True, null=True, editable=False,
+        verbose_name='重複判定キー',
+        help_text='入金日・金額・照会番号・振込依頼人名（と同一明細内の出現順）から算出'
+    )
+    match_status = models.CharField(
+        max_length=20,
+        choices=MATCH_STATUS_CHOICES,
+        default='unmatched',
+        verbose_name='消込状況'
+    )
+    matched_projects = models.ManyToManyField(
+        Project,
+        blank=True,
+        related_name='bank_receipts',
+        verbose_name='消込案件'
+    )
+    suggested_project = models.ForeignKey(
+        Project,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='suggested_receipts',
+        verbose_name='消込候補（要確認）'
+    )
+    matched_at = models.DateTimeField(null=True, blank=True, verbose_name='消込日時')
+
+    class Meta:
+        verbose_name = '入金明細'
+        verbose_name_plural = '入金明細一覧'
+        ordering = ['transaction_date', 'id']
+        indexes = [
+            models.Index(fields=['amount', 'transaction_date']),
+            models.Index(fields=['payer_name_normalized']),
+            models.Index(fields=['match_status']),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_date} {self.payer_name} ¥{self.amount:,}"
+
+
+class MonthlyClose(models.Model):
+    """月次締め（締め済みの月は入金・出金・通帳・損益をスナップショットから表示）"""
+    STATUS_CHOICES = [
+        ('closed', '締め済み'),
+        ('reopened', '締め解除'),
+    ]
+
+    year = models.IntegerField(verbose_name='年')
+    month = models.IntegerField(verbose_name='月')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='closed', verbose_name='状態')
+
+    # 締め時点の集計値（経理ダッシュボード用）
+    receipt_total = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='入金予定合計')
+    receipt_received = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='入金済み')
+    receipt_pending = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='入金待ち')
+    payment_total = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='出金予定合計')
+    payment_paid = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='支払済み')
+    payment_pending = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='未払い')
+
+    closed_by = models.CharField(max_length=100, blank=True, verbose_name='締め実行者')
+    closed_at = models.DateTimeField(null=True, blank=True, verbose_name='締め日時')
+    reopened_by = models.CharField(max_length=100, blank=True, verbose_name='締め解除者')
+    reopened_at = models.DateTimeField(null=True, blank=True, verbose_name='締め解除日時')
+
+    class Meta:
+        verbose_name = '月次締め'
+        verbose_name_plural = '月次締め一覧'
+        ordering = ['-year', '-month']
+        unique_together = ['year', 'month']
+
+    def __str__(self):
+        return f"{self.year}年{self.month}月 ({self.get_status_display()})"
+
+    @property
+    def is_closed(self):
+        return self.status == 'closed'
+
+    def get_stats(self):
+        """経理ダッシュボードの統計情報を締め時点の値で返す"""
+        return {
+            'total_receipt': self.receipt_total,
+            'receipt_received': self.receipt_received,
+            'receipt_pending': self.receipt_pending,
+            'total_payment': self.payment_total,
+            'payment_paid': self.payment_paid,
+            'payment_pending': self.payment_pending,
+            'net_cashflow': self.receipt_received - self.payment_paid,
+            'projected_cashflow': self.receipt_total - self.payment_total,
+        }
+
+
+class ReceiptSnapshot(models.Model):
+    """締め時点の入金予定（入金管理ダッシュボード用）"""
+    monthly_close = models.ForeignKey(
+        MonthlyClose,
+        on_delete=models.CASCADE,
+        related_name='receipts',
+        verbose_name='月次締め'
+    )
+    # 元案件が削除されてもスナップショットは残す
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        verbose_name='案件'
+    )
+    management_no = models.CharField(max_length=20, verbose_name='管理No')
+    site_name = models.CharField(max_length=200, verbose_name='現場名')
+    contractor_name = models.CharField(max_length=100, verbose_name='請負業者名')
+    order_status = models.CharField(max_length=10, blank=True, verbose_name='受注ヨミ')
+    estimate_amount = models.DecimalField(max_digits=10, decimal_places=0, default=0, verbose_name='見積金額(税込)')
+    billing_amount = models.DecimalField(max_digits=10, decimal_places=0, default=0, verbose_name='請求額実請求')
+    payment_due_date = models.DateField(null=True, blank=True, verbose_name='入金予定日')
+    payment_status = models.CharField(max_length=20, blank=True, verbose_name='入金状況')
+    work_start_date = models.DateField(null=True, blank=True, verbose_name='工事開始日')
+    work_end_date = models.DateField(null=True, blank=True, verbose_name='工事終了日')
+
+    class Meta:
+        verbose_name = '入金スナップショット'
+        verbose_name_plural = '入金スナップショット一覧'
+        ordering = ['contractor_name', 'payment_due_date']
+
+    def __str__(self):
+        return f"{self.monthly_close} {self.site_name}"
+
+    def as_project(self):
+        """テンプレートでそのまま扱えるよう未保存の案件インスタンスに戻す"""
+        return Project(
+            id=self.project_id,
+            management_no=self.management_no,
+            site_name=self.site_name,
+            contractor_name=self.contractor_name,
+            order_status=self.order_status,
+            estimate_amount=self.estimate_amount,
+            billing_amount=self.billing_amount,
+            payment_due_date=self.payment_due_date,
+            payment_status=self.payment_status,
+            work_start_date=self.work_start_date,
+            work_end_date=self.work_end_date,
+        )
+
+
+class PaymentSnapshot(models.Model):
+    """締め時点の出金予定（出金管理ダッシュボード用）"""
+    monthly_close = models.ForeignKey(
+        MonthlyClose,
+        on_delete=models.CASCADE,
+        related_name='payments',
+        verbose_name='月次締め'
+    )
+    subcontract = models.ForeignKey(
+        'subcontract_management.Subcontract',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        verbose_name='外注'
+    )
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        verbose_name='案件'
+    )
+    site_name = models.CharField(max_length=200, verbose_name='現場名')
+    worker_type = models.CharField(max_length=20, verbose_name='作業者タイプ')
+    contract_amount = models.DecimalField(max_digits=10, decimal_places=0, default=0, verbose_name='契約金額')
+    billed_amount = models.DecimalField(max_digits=10, decimal_places=0, default=0, verbose_name='請求金額')
+    payment_date = models.DateField(null=True, blank=True, verbose_name='支払日')
+    payment_status = models.CharField(max_length=20, verbose_name='出金状況')
+
+    # 発注先（支払条件・口座は締め時点の値を保持）
+    contractor = models.ForeignKey(
+        'subcontract_management.Contractor',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+        verbose_name='発注先'
+    )
+    contractor_name = models.CharField(max_length=100, blank=True, verbose_name='発注先名')
+    contractor_bank_name = models.CharField(max_length=100, blank=True, verbose_name='銀行名')
+    contractor_account_number = models.CharField(max_length=20, blank=True, verbose_name='口座番号')
+    contractor_account_holder = models.CharField(max_length=100, blank=True, verbose_name='口座名義')
+    contractor_payment_cycle = models.CharField(max_length=10, blank=True, verbose_name='支払サイクル')
+    contractor_payment_day = models.IntegerField(null=True, blank=True, verbose_name='支払日')
+    contractor_closing_day = models.IntegerField(null=True, blank=True, verbose_name='締め日')
+
+    internal_worker = models.ForeignKey(
+        'subcontract_management.InternalWorker',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+        verbose_name='社内担当者'
+    )
+    internal_worker_name = models.CharField(max_length=100, blank=True, verbose_name='社内担当者名')
+
+    class Meta:
+        verbose_name = '出金スナップショット'
+        verbose_name_plural = '出金スナップショット一覧'
+        ordering = ['contractor_name', 'internal_worker_name', 'payment_date']
+
+    def __str__(self):
+        return f"{self.monthly_close} {self.site_name}"
+
+    def as_subcontract(self, project=None):
+        """
+        テンプレートでそのまま扱えるよう未保存の外注インスタンスに戻す
+
+        project には案件を渡す（現場名は締め時点の値で上書きする）。
+        案件が削除済みなどで渡されない場合は id と現場名だけを持つ案件になり、
+        それ以外の項目は空になる。
+        """
+        from subcontract_management.models import Subcontract, Contractor as SubcontractContractor, InternalWorker
+
+        subcontract = Subcontract(
+            id=self.subcontract_id,
+            site_name=self.site_name,
+            worker_type=self.worker_type,
+            contract_amount=self.contract_amount,
+            billed_amount=self.billed_amount,
+            payment_date=self.payment_date,
+            payment_status=self.payment_status,
+        )
+        if project is None:
+            project = Project(id=self.project_id)
+        project.site_name = self.site_name
+        subcontract.project = project
+        if self.contractor_id:
+            subcontract.contractor = SubcontractContractor(
+                id=self.contractor_id,
+                name=self.contractor_name,
+                bank_name=self.contractor_bank_name,
+                account_number=self.contractor_account_number,
+                account_holder=self.contractor_account_holder,
+                payment_cycle=self.contractor_payment_cycle,
+                payment_day=self.contractor_payment_day,
+                closing_day=self.contractor_closing_day,
+            )
+        if self.internal_worker_id:
+            subcontract.internal_worker = InternalWorker(
+                id=self.internal_worker_id,
+                name=self.internal_worker_name,
+            )
+        return subcontract
+
+
+class LedgerSnapshot(models.Model):
+    """締め時点の通帳明細（経理ダッシュボード用）"""
+    TYPE_CHOICES = [
+        ('receipt', '入金'),
+        ('payment', '出金'),
+    ]
+
+    monthly_close = models.ForeignKey(
+        MonthlyClose,
+        on_delete=models.CASCADE,
+        related_name='ledger_rows',
+        verbose_name='月次締め'
+    )
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        verbose_name='案件'
+    )
+    date = models.DateField(verbose_name='日付')
+    transaction_type = models.CharField(max_length=10, choices=TYPE_CHOICES, verbose_name='区分')
+    site_name = models.CharField(max_length=200, verbose_name='現場名')
+    description = models.CharField(max_length=255, verbose_name='摘要')
+    client = models.CharField(max_length=100, blank=True, verbose_name='取引先')
+    amount = models.DecimalField(max_digits=12, decimal_places=0, verbose_name='金額')
+    status = models.CharField(max_length=20, verbose_name='状況')
+    balance = models.DecimalField(max_digits=14, decimal_places=0, verbose_name='残高')
+    position = models.IntegerField(default=0, verbose_name='表示順')
+
+    class Meta:
+        verbose_name = '通帳スナップショット'
+        verbose_name_plural = '通帳スナップショット一覧'
+        ordering = ['position']
+
+    def __str__(self):
+        return f"{self.date} {self.description}"
+
+    def as_transaction(self):
+        """経理ダッシュボードの取引辞書形式に戻す"""
+        return {
+            'date': self.date,
+            'site_name': self.site_name,
+            'description': self.description,
+            'client': self.client,
+            'type': self.transaction_type,
+            'amount': self.amount,
+            'status': self.status,
+            'balance': self.balance,
+            'project': self.as_project(),
+        }
+
+    def as_project(self):
+        """入金明細を経理ダッシュボードの入金一覧用の未保存案件インスタンスに戻す"""
+        return Project(
+            id=self.project_id,
+            site_name=self.site_name,
+            contractor_name=self.client,
+            billing_amount=self.amount,
+            payment_due_date=self.date,
+        )
+
+    def as_subcontract(self):
+        """出金明細を経理ダッシュボードの出金一覧用の未保存外注インスタンスに戻す"""
+        from subcontract_management.models import Subcontract, Contractor as SubcontractContractor
+
+        subcontract = Subcontract(
+            site_name=self.site_name,
+            billed_amount=self.amount,
+            payment_date=self.date,
+            payment_status=self.status,
+        )
+        subcontract.project = self.as_project()
+        subcontract.contractor = SubcontractContractor(name=self.client)
+        return subcontract
+
+
+class ProfitLossSnapshot(models.Model):
+    """締め時点の月次損益"""
+    monthly_close = models.OneToOneField(
+        MonthlyClose,
+        on_delete=models.CASCADE,
+        related_name='profit_loss',
+        verbose_name='月次締め'
+    )
+    revenue = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='売上高')
+    cost_of_sales = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='売上原価')
+    cost_labor = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='職人さん人工')
+    cost_materials = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='資材')
+    gross_profit = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='売上総利益')
+    sales_expense = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='販管費')
+    fixed_costs = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='固定費')
+    operating_profit = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name='営業利益')
+
+    PL_FIELDS = [
+        'revenue', 'cost_of_sales', 'cost_labor', 'cost_materials',
+        'gross_profit', 'sales_expense', 'fixed_costs', 'operating_profit',
+    ]
+
+    class Meta:
+        verbose_name = '損益スナップショット'
+        verbose_name_plural = '損益スナップショット一覧'
+
+    def __str__(self):
+        return f"{self.monthly_close} 損益"
@@ -1,3 +1,463 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from concurrent.futures import Future
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from subcontract_management.models import Contractor, Subcontract
+
+from .models import BankStatementLine, Contractor as ClientContractor, Invoice, Project
+from .utils import invoice_pdf
+from .utils.cashflow import CashflowForecast, derive_payment_date
+from .utils.month_close import close_month
+from .utils.bank_statement import (
+    confirm_suggested_receipt, import_bank_statement, normalize_payer_name,
+    parse_csv_statement, parse_zengin_statement,
+)
+from .utils.bank_transfer import (
+    BankTransferFileGenerator, ZenginTransferBatch, ZENGIN_RECORD_LENGTH,
+    pad_code, pad_number, pad_sjis,
+)
+
+
+def create_project(**kwargs):
+    values = {
+        'site_name': 'テスト現場',
+        'site_address': '東京都新宿区西新宿1-1-1',
+        'contractor_name': '元請株式会社',
+        'contractor_address': '東京都千代田区丸の内1-1-1',
+        'project_manager': '担当者',
+        'work_type': 'cross',
+    }
+    values.update(kwargs)
+    return Project.objects.create(**values)
+
+
+def create_contractor(**kwargs):
+    values = {
+        'name': '山田内装',
+        'address': '東京都豊島区',
+        'bank_name': 'みずほ銀行',
+        'bank_code': '0001',
+        'branch_name': '池袋支店',
+        'branch_code': '123',
+        'account_number': '1234567',
+        'account_holder': 'ヤマダナイソウ',
+    }
+    values.update(kwargs)
+    return Contractor.objects.create(**values)
+
+
+def create_subcontract(project, contractor, amount, due=date(2026, 10, 25)):
+    return Subcontract.objects.create(
+        project=project,
+        contractor=contractor,
+        worker_type='external',
+        contract_amount=amount,
+        payment_due_date=due,
+    )
+
+
+class ZenginPaddingTests(TestCase):
+    def test_pad_sjis_counts_full_width_as_two_bytes(self):
+        self.assertEqual(pad_sjis('ヤマダ', 8), 'ヤマダ'.encode('cp932') + b'  ')
+        self.assertEqual(len(pad_sjis('山田内装工業株式会社', 15)), 15)
+        # 全角文字の途中では切らない
+        self.assertEqual(pad_sjis('山田内装', 7), '山田内'.encode('cp932') + b' ')
+
+    def test_pad_number_rejects_overflow(self):
+        self.assertEqual(pad_number(1500, 10), b'0000001500')
+        with self.assertRaises(ValueError):
+            pad_number(10 ** 10, 10)
+
+    def test_pad_code_rejects_overflow(self):
+        self.assertEqual(pad_code('12-34', 7), b'0001234')
+        with self.assertRaises(ValueError):
+            pad_code('12345678', 7)
+
+
+class ZenginFormatTests(TestCase):
+    transfer = {
+        'bank_code': '0005',
+        'bank_name': 'ﾐﾂﾋﾞｼ',
+        'branch_code': '012',
+        'branch_name': 'ｼﾝｼﾞｭｸ',
+        'account_type': '1',
+        'account_number': '7654321',
+        'account_holder': 'ﾔﾏﾀﾞ ﾀﾛｳ',
+        'amount': 123456,
+        'client_code': '42',
+    }
+
+    def test_record_layout(self):
+        content = BankTransferFileGenerator().generate_zengin_format(
+            [self.transfer, dict(self.transfer, amount=1000)], date(2026, 10, 25)
+        )
+        records = content.split(b'\r\n')
+        self.assertEqual(records.pop(), b'')
+        self.assertEqual([r[:1] for r in records], [b'1', b'2', b'2', b'8', b'9'])
+        for record in records:
+            self.assertEqual(len(record), ZENGIN_RECORD_LENGTH)
+
+        header, data = records[0], records[1]
+        self.assertEqual(header[1:3], b'21')
+        self.assertEqual(header[54:58], b'1025')
+
+        self.assertEqual(data[1:5], b'0005')
+        self.assertEqual(data[20:23], b'012')
+        self.assertEqual(data[42:43], b'1')
+        self.assertEqual(data[43:50], b'7654321')
+        self.assertEqual(data[80:90], b'0000123456')
+
+        trailer = records[3]
+        self.assertEqual(trailer[1:7], b'000002')
+        self.assertEqual(trailer[7:19], b'000000124456')
+
+    def test_rejects_invalid_amount(self):
+        with self.assertRaises(ValueError):
+            BankTransferFileGenerator().generate_zengin_format([dict(self.transfer, amount=0)])
+
+
+class ZenginTransferBatchTests(TestCase):
+    def setUp(self):
+        self.project = create_project()
+
+    def test_groups_pending_payments_per_account(self):
+        contractor = create_contractor()
+        create_subcontract(self.project, contractor, 100000)
+        create_subcontract(self.project, contractor, 50000)
+        create_subcontract(self.project, contractor, 70000, due=date(2026, 11, 30))
+
+        response = ZenginTransferBatch(date(2026, 10, 31)).streaming_response()
+        content = b''.join(response.streaming_content)
+        records = content.split(b'\r\n')[:-1]
+
+        self.assertEqual(response['X-Transfer-Count'], '1')
+        self.assertEqual(response['X-Transfer-Total'], '150000')
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[1][1:5], b'0001')
+        self.assertEqual(records[1][20:23], b'123')
+        self.assertEqual(records[1][80:90], b'0000150000')
+
+    def test_bank_code_falls_back_to_bank_name(self):
+        create_subcontract(self.project, create_contractor(bank_code=''), 1000)
+
+        transfers = ZenginTransferBatch(date(2026, 10, 31)).validated_transfers()
+
+        self.assertEqual(transfers[0]['bank_code'], '0001')
+
+    def test_rejects_unknown_bank_and_branch_before_responding(self):
+        create_subcontract(self.project, create_contractor(), 1000)
+        create_subcontract(
+            self.project,
+            create_contractor(name='佐藤塗装', bank_name='地方銀行', bank_code='', branch_code='',
+                              account_holder='サトウトソウ'),
+            2000,
+        )
+
+        with self.assertRaises(ValueError) as raised:
+            ZenginTransferBatch(date(2026, 10, 31)).streaming_response()
+
+        message = str(raised.exception)
+        self.assertIn('サトウトソウ', message)
+        self.assertIn('銀行コードが未登録です', message)
+        self.assertIn('支店コードが未登録です', message)
+        self.assertNotIn('ヤマダナイソウ', message)
+
+    def test_rejects_overlong_account_number(self):
+        create_subcontract(self.project, create_contractor(account_number='12345678'), 1000)
+
+        with self.assertRaises(ValueError) as raised:
+            ZenginTransferBatch(date(2026, 10, 31)).streaming_response()
+
+        self.assertIn('口座番号', str(raised.exception))
+
+    def test_rejects_empty_batch(self):
+        with self.assertRaises(ValueError):
+            ZenginTransferBatch(date(2026, 10, 31)).streaming_response()
+
+
+def zengin_statement_record(reference_no, reiwa_date, amount, payer_name, direction=b'1'):
+    record = (
+        b'2'
+        + reference_no.encode('ascii').ljust(8)
+        + reiwa_date.encode('ascii')
+        + b' ' * 6
+        + direction
+        + b' ' * 2
+        + str(amount).encode('ascii').zfill(12)
+        + b' ' * 45
+        + payer_name.encode('cp932').ljust(48)
+    )
+    return record.ljust(200)
+
+
+def statement_file(*rows, name='statement.csv'):
+    lines = ['取引日,入金額,振込依頼人名,照会番号'] + [','.join(row) for row in rows]
+    return SimpleUploadedFile(name, '\n'.join(lines).encode('cp932'))
+
+
+class StatementParsingTests(TestCase):
+    def test_normalize_payer_name(self):
+        self.assertEqual(normalize_payer_name('ｶ)ﾔﾏﾀﾞｺｳﾑﾃﾝ'), 'ヤマダコウムテン')
+        self.assertEqual(normalize_payer_name('やまだ　こうむてん（カ'), 'ヤマダコウムテン')
+        self.assertEqual(normalize_payer_name('キヨウワ ビルド'), 'キヨウワビルド')
+
+    def test_parse_zengin_statement_keeps_deposits_only(self):
+        content = b'\r\n'.join([
+            b'1'.ljust(200),
+            zengin_statement_record('00000001', '081020', 330000, 'ﾔﾏﾀﾞｺｳﾑﾃﾝ'),
+            zengin_statement_record('00000002', '081021', 5000, 'ﾃｽｳﾘﾖｳ', direction=b'2'),
+            b'8'.ljust(200),
+        ])
+
+        rows = list(parse_zengin_statement(content))
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['reference_no'], '00000001')
+        self.assertEqual(rows[0]['transaction_date'], date(2026, 10, 20))
+        self.assertEqual(rows[0]['amount'], 330000)
+        self.assertEqual(rows[0]['payer_name'], 'ﾔﾏﾀﾞｺｳﾑﾃﾝ')
+
+    def test_parse_zengin_statement_rejects_wrong_length(self):
+        with self.assertRaises(ValueError):
+            list(parse_zengin_statement(b'2' * 150))
+
+    def test_parse_csv_statement(self):
+        content = '日付,お預入れ金額,摘要\n2026/10/20,"330,000",ﾔﾏﾀﾞｺｳﾑﾃﾝ\n2026/10/21,,出金\n'.encode('cp932')
+
+        rows = list(parse_csv_statement(content))
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['transaction_date'], date(2026, 10, 20))
+        self.assertEqual(rows[0]['amount'], 330000)
+
+
+class ReceiptReconcileTests(TestCase):
+    def setUp(self):
+        ClientContractor.objects.create(name='山田工務店', payer_name_kana='ﾔﾏﾀﾞｺｳﾑﾃﾝ')
+        self.project = create_project(
+            contractor_name='山田工務店', estimate_amount=330000, payment_due_date=date(2026, 10, 20)
+        )
+        self.project.refresh_from_db()
+
+    def test_matches_by_amount_and_payer(self):
+        statement, result = import_bank_statement(
+            statement_file(('2026/10/20', '330000', 'ﾔﾏﾀﾞｺｳﾑﾃﾝ', 'A1'))
+        )
+
+        self.project.refresh_from_db()
+        self.assertEqual(result['matched'], 1)
+        self.assertEqual(self.project.payment_status, 'executed')
+        self.assertEqual(self.project.payment_executed_date, date(2026, 10, 20))
+        self.assertEqual(self.project.payment_amount, 330000)
+
+    def test_reimport_skips_imported_lines(self):
+        rows = (('2026/10/20', '330000', 'ﾔﾏﾀﾞｺｳﾑﾃﾝ', 'A1'), ('2026/10/22', '5000', 'ｻﾄｳ', ''))
+        import_bank_statement(statement_file(*rows))
+        other = create_project(
+            contractor_name='山田工務店', estimate_amount=330000, payment_due_date=date(2026, 10, 21)
+        )
+
+        with self.assertRaises(ValueError):
+            import_bank_statement(statement_file(*rows))
+
+        # 新しい明細だけが取り込まれ、同額の別案件は消込まれない
+        statement, result = import_bank_statement(
+            statement_file(*rows, ('2026/10/23', '1000', 'ｽｽﾞｷ', ''))
+        )
+        other.refresh_from_db()
+        self.assertEqual(statement.line_count, 1)
+        self.assertEqual(statement.duplicate_count, 2)
+        self.assertEqual(result['matched'], 0)
+        self.assertNotEqual(other.payment_status, 'executed')
+        self.assertEqual(BankStatementLine.objects.count(), 3)
+
+    def test_identical_lines_in_one_file_are_kept(self):
+        row = ('2026/10/22', '5000', 'ｻﾄｳ', '')
+
+        statement, _ = import_bank_statement(statement_file(row, row))
+
+        self.assertEqual(statement.line_count, 2)
+
+    def test_amount_only_match_needs_confirmation(self):
+        statement, result = import_bank_statement(
+            statement_file(('2026/10/20', '330000', 'ﾍﾞﾂｶｲｼﾔ', 'B1'))
+        )
+
+        self.project.refresh_from_db()
+        line = statement.lines.get()
+        self.assertEqual(result['matched'], 0)
+        self.assertEqual(result['needs_review'], 1)
+        self.assertEqual(line.match_status, 'needs_review')
+        self.assertEqual(line.suggested_project, self.project)
+        self.assertNotEqual(self.project.payment_status, 'executed')
+        self.assertIsNone(self.project.payment_executed_date)
+
+        confirm_suggested_receipt(line.pk)
+
+        self.project.refresh_from_db()
+        line.refresh_from_db()
+        self.assertEqual(self.project.payment_status, 'executed')
+        self.assertEqual(line.match_status, 'matched')
+        self.assertEqual(list(line.matched_projects.all()), [self.project])
+        with self.assertRaises(ValueError):
+            confirm_suggested_receipt(line.pk)
+
+
+class InvoicePDFBatchTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-202610-0001',
+            client_name='元請株式会社',
+            issue_date=date(2026, 10, 31),
+            due_date=date(2026, 11, 30),
+            billing_period_start=date(2026, 10, 1),
+            billing_period_end=date(2026, 10, 31),
+            subtotal=100000,
+            tax_amount=10000,
+            total_amount=110000,
+        )
+
+    def test_failed_render_is_reported_by_poll(self):
+        future = Future()
+        url = reverse('order_management:invoice_pdf_batch_api')
+        with override_settings(INVOICE_PDF_CACHE_DIR=self.cache_dir), \
+                mock.patch.object(invoice_pdf, '_submit', return_value=future), \
+                self.assertLogs('order_management.utils.invoice_pdf', 'ERROR'):
+            response = self.client.post(
+                url, json.dumps({'invoice_ids': [self.invoice.id]}), content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 202)
+            future.set_exception(RuntimeError('layout broken'))
+
+            poll = self.client.get(url, {'invoice_ids': str(self.invoice.id)}).json()
+
+        self.assertEqual(poll['failed_count'], 1)
+        self.assertFalse(poll['invoices'][0]['ready'])
+        self.assertIn('layout broken', poll['invoices'][0]['error'])
+
+    def test_rejects_invalid_parameters(self):
+        url = reverse('order_management:invoice_pdf_batch_api')
+        for data in (
+            {'year': 'abc', 'month': 10},
+            {'year': 2026, 'month': 13},
+            {'year': 2026, 'month': 'x'},
+            {'invoice_ids': 'abc'},
+            {'invoice_ids': [1, 'x']},
+            [1],
+        ):
+            with self.subTest(data=data), \
+                    mock.patch.object(invoice_pdf, '_submit') as submit:
+                response = self.client.post(url, json.dumps(data), content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+                submit.assert_not_called()
+
+
+class MonthCloseTests(TestCase):
+    stats = {
+        'total_receipt': 0, 'receipt_received': 0, 'receipt_pending': 0,
+        'total_payment': 0, 'payment_paid': 0, 'payment_pending': 0,
+    }
+
+    def close(self, year, month, subcontracts=()):
+        return close_month(year, month, receipts=[], subcontracts=subcontracts, transactions=[],
+                           stats=self.stats, profit_loss={})
+
+    def test_rejects_month_that_has_not_ended(self):
+        today = timezone.localdate()
+        with self.assertRaises(ValueError):
+            self.close(today.year, today.month)
+        with self.assertRaises(ValueError):
+            self.close(today.year + 1, 1)
+
+    def test_payment_snapshot_keeps_project_fields(self):
+        project = create_project(site_name='旧現場名', work_type='painting')
+        subcontract = create_subcontract(project, create_contractor(), 1000)
+        monthly_close = self.close(2025, 9, subcontracts=[subcontract])
+        Project.objects.filter(pk=project.pk).update(site_name='新現場名')
+
+        row = monthly_close.payments.get()
+        restored = row.as_subcontract(Project.objects.get(pk=project.pk))
+
+        self.assertEqual(restored.project.work_type, 'painting')
+        self.assertEqual(restored.project.site_name, '旧現場名')
+        self.assertEqual(restored.contractor.name, '山田内装')
+
+
+class PaymentDateTests(TestCase):
+    def test_month_end_closing_in_short_months(self):
+        # 31日締めは2月なら28日締め、翌月末払い
+        self.assertEqual(derive_payment_date(date(2026, 2, 28), 31, 31), date(2026, 3, 31))
+        self.assertEqual(derive_payment_date(date(2026, 3, 1), 31, 31), date(2026, 4, 30))
+        self.assertEqual(derive_payment_date(date(2028, 2, 29), 31, 30), date(2028, 3, 31))
+
+    def test_after_closing_day_moves_to_next_cycle(self):
+        self.assertEqual(derive_payment_date(date(2026, 3, 21), 25, 20), date(2026, 5, 25))
+        self.assertEqual(derive_payment_date(date(2026, 1, 31), 31, 30), date(2026, 3, 31))
+        self.assertEqual(derive_payment_date(date(2026, 3, 20), 25, 20), date(2026, 4, 25))
+
+    def test_defaults_and_cycles(self):
+        self.assertEqual(derive_payment_date(date(2026, 1, 15)), date(2026, 2, 28))
+        self.assertEqual(derive_payment_date(date(2026, 1, 15), 10, 20, 'quarterly'), date(2026, 4, 10))
+
+
+class CashflowForecastTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        project = create_project(
+            estimate_amount=100000, payment_due_date=date(2026, 11, 10), work_end_date=date(2026, 10, 20),
+        )
+        create_subcontract(project, create_contractor(), 30000, due=date(2026, 11, 15))
+        contractor = create_contractor(name='月末締め工務店', closing_day=31, payment_day=31)
+        create_subcontract(project, contractor, 20000, due=None)
+        self.forecast = CashflowForecast(date(2026, 11, 1), 1)
+
+    def test_places_receipts_and_derived_payment_dates(self):
+        result = self.forecast.compute(opening_balance=50000)
+
+        self.assertEqual(result['receipts'][9], 100000)
+        self.assertEqual(result['payments'][14], 30000)
+        # 支払予定日のない外注費は 10/20 完了 → 10月末締め翌月末払い
+        self.assertEqual(result['payments'][29], 20000)
+        self.assertEqual(result['summary']['closing_balance'], 100000)
+
+    def test_delay_shifts(self):
+        result = self.forecast.compute(receipt_delay_days=30, payment_delay_days=-20)
+
+        # 期間外にずれた入金は除外し、期間前にずれた支払は初日に寄せる
+        self.assertEqual(sum(result['receipts']), 0)
+        self.assertEqual(result['payments'][0], 30000)
+        self.assertEqual(result['payments'][9], 20000)
+        self.assertEqual(result['summary']['first_negative_date'], '2026-11-01')
+
+    def test_adjustments(self):
+        result = self.forecast.compute(adjustments=[
+            {'date': date(2026, 11, 5), 'amount': -40000},
+            {'date': date(2026, 12, 5), 'amount': 99999},
+        ])
+
+        self.assertEqual(result['payments'][4], 40000)
+        self.assertEqual(result['summary']['total_receipts'], 100000)
+
+    def test_api_rejects_malformed_adjustments(self):
+        url = reverse('order_management:cashflow_forecast_api')
+        for adjustments in ('abc', [1], {'date': '2026-11-05'}):
+            with self.subTest(adjustments=adjustments):
+                response = self.client.post(
+                    url, json.dumps({'adjustments': adjustments}), content_type='application/json'
+                )
+                self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(url, {'start_date': '2026-11-01', 'months': 1, 'adjustments': 'abc'})
+        self.assertEqual(response.status_code, 200)
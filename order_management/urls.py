@@ -6,9 +6,10 @@ from .views_landing import LandingView
 from .views_contractor import ContractorDashboardView, ContractorProjectsView, ContractorEditView
 from .views_ordering import OrderingDashboardView, ExternalContractorManagementView, SupplierManagementView
 from .views_contractor_create import ContractorCreateView
-from .views_payment import PaymentDashboardView
-from .views_receipt import ReceiptDashboardView
-from .views_accounting import AccountingDashboardView
+from .views_payment import PaymentDashboardView, zengin_transfer_file
+from .views_receipt import ReceiptDashboardView, bank_statement_import, bank_statement_review
+from .views_accounting import AccountingDashboardView, monthly_close_action
+from .views_cashflow import CashflowForecastView, cashflow_forecast_api
 from .views_cost import (
     FixedCostListView, FixedCostCreateView, FixedCostUpdateView, FixedCostDeleteView,
     VariableCostListView, VariableCostCreateView, VariableCostUpdateView, VariableCostDeleteView,
@@ -16,6 +17,7 @@ from .views_cost import (
 )
 from .views_ultimate import UltimateDashboardView
 from . import views_material
+from .views_invoice import invoice_pdf, invoice_pdf_batch_api
 
 app_name = 'order_management'
 
@@ -34,9 +36,15 @@ urlpatterns = [
     path('external-contractors/', ExternalContractorManagementView.as_view(), name='external_contractor_management'),
     path('suppliers/', SupplierManagementView.as_view(), name='supplier_management'),
     path('accounting/', AccountingDashboardView.as_view(), name='accounting_dashboard'),
+    path('accounting/monthly-close/', monthly_close_action, name='monthly_close_action'),
+    path('cashflow/', CashflowForecastView.as_view(), name='cashflow_forecast'),
+    path('api/cashflow/', cashflow_forecast_api, name='cashflow_forecast_api'),
     path('ultimate/', UltimateDashboardView.as_view(), name='ultimate_dashboard'),
     path('payment/', PaymentDashboardView.as_view(), name='payment_dashboard'),
+    path('payment/transfer-file/', zengin_transfer_file, name='zengin_transfer_file'),
     path('receipt/', ReceiptDashboardView.as_view(), name='receipt_dashboard'),
+    path('receipt/statement-import/', bank_statement_import, name='bank_statement_import'),
+    path('receipt/statement-lines/<int:line_id>/review/', bank_statement_review, name='bank_statement_review'),
     path('contractor/<int:contractor_id>/projects/', ContractorProjectsView.as_view(), name='contractor_projects'),
     path('contractors/<int:pk>/edit/', ContractorEditView.as_view(), name='contractor_edit'),
     path('contractors/new/', ContractorCreateView.as_view(), name='contractor_create'),
@@ -58,6 +66,8 @@ urlpatterns = [
     path('api/invoice/preview/<int:project_id>/', views.get_invoice_preview_api, name='get_invoice_preview_api'),
     path('api/invoice/preview/client/', views.get_client_invoice_preview_api, name='client_invoice_preview_api'),
     path('api/generate-invoices-by-client/', views.generate_invoices_by_client_api, name='generate_invoices_by_client_api'),
+    path('invoices/<int:invoice_id>/pdf/', invoice_pdf, name='invoice_pdf'),
+    path('api/invoice/pdf-batch/', invoice_pdf_batch_api, name='invoice_pdf_batch_api'),
 
     # コスト管理
     path('cost/', cost_dashboard, name='cost_dashboard'),
@@ -0,0 +1,469 @@
+"""
+入出金明細取込・入金消込ユーティリティ
+全銀協 入出金取引明細（200バイト固定長）/ CSV 対応
+"""
+import csv
+import hashlib
+import io
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import List, Dict, Any, Iterator, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+
+# 全銀協 入出金取引明細は1レコード200バイト固定長
+ZENGIN_STATEMENT_RECORD_LENGTH = 200
+
+# 令和元年 = 2019年
+REIWA_OFFSET = 2018
+
+# 入金予定日からの許容日数（前後）
+DEFAULT_DUE_DATE_WINDOW = 10
+
+# 振込依頼人名から除去する法人格の略号・表記
+LEGAL_ENTITY_PATTERN = re.compile(
+    r'カブシキガイシヤ|カブシキカイシヤ|ユウゲンガイシヤ|ゴウドウガイシヤ|'
+    r'\(カ\)|\(ユ\)|\(ド\)|カ\)|\(カ|ユ\)|\(ユ|ド\)|\(ド|'
+    r'株式会社|有限会社|合同会社|\(株\)|\(有\)|㈱|㈲'
+)
+
+# 小書き仮名 → 大書き仮名（銀行の名義カナは大書きで表記される）
+SMALL_KANA_TABLE = str.maketrans('ァィゥェォッャュョヮヵヶ', 'アイウエオツヤユヨワカケ')
+
+CSV_DATE_HEADERS = ('取引日', '日付', '入金日', '勘定日', 'date')
+CSV_AMOUNT_HEADERS = ('入金額', '入金金額', 'お預入れ金額', '預入金額', '金額', 'amount')
+CSV_PAYER_HEADERS = ('振込依頼人名', '依頼人名', '摘要', 'お取引内容', '内容', 'payer')
+CSV_REFERENCE_HEADERS = ('照会番号', '取引番号', 'reference')
+
+
+def normalize_payer_name(name: str) -> str:
+    """
+    振込依頼人名を照合用に正規化
+
+    半角カナ→全角カナ、ひらがな→カタカナ、小書き仮名→大書き、
+    法人格の略号と空白・記号を除去する。
+    """
+    if not name:
+        return ''
+    text = unicodedata.normalize('NFKC', name)
+    text = ''.join(
+        chr(ord(ch) + 0x60) if 'ぁ' <= ch <= 'ゖ' else ch
+        for ch in text
+    )
+    text = text.translate(SMALL_KANA_TABLE).upper()
+    text = LEGAL_ENTITY_PATTERN.sub('', text)
+    return re.sub(r'[\s　・.,、。()\-ー－]', '', text)
+
+
+def line_dedup_key(transaction_date: date, amount, reference_no: str, payer_name_normalized: str,
+                   ordinal: int = 0) -> str:
+    """
+    入金明細の重複判定キー
+
+    同じ明細ファイルを取り込み直しても同じキーになる。1つのファイルに同じ内容の入金が
+    複数ある場合（照会番号のないCSV等）は出現順 ordinal で区別する。
+    """
+    fields = (
+        transaction_date.isoformat(), str(int(amount)), reference_no or '',
+        payer_name_normalized or '', str(ordinal),
+    )
+    return hashlib.sha256('|'.join(fields).encode('utf-8')).hexdigest()
+
+
+def _parse_wareki_date(value: str) -> Optional[date]:
+    """和暦（令和）YYMMDD を日付に変換"""
+    try:
+        return date(REIWA_OFFSET + int(value[0:2]), int(value[2:4]), int(value[4:6]))
+    except ValueError:
+        return None
+
+
+def _parse_csv_date(value: str) -> Optional[date]:
+    value = unicodedata.normalize('NFKC', value or '').strip()
+    for fmt in ('%Y-%m-%d', '%Y/%m/%d', '%Y%m%d', '%Y年%m月%d日'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_amount(value: str) -> Optional[Decimal]:
+    value = unicodedata.normalize('NFKC', value or '')
+    value = value.replace(',', '').replace('¥', '').replace('円', '').strip()
+    if not value:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        return None
+
+
+def _decode(content: bytes) -> str:
+    for encoding in ('utf-8-sig', 'cp932'):
+        try:
+            return content.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("ファイルの文字コードを判別できません（UTF-8またはShift-JISに対応）。")
+
+
+def parse_zengin_statement(content: bytes) -> Iterator[Dict[str, Any]]:
+    """
+    全銀協 入出金取引明細から入金（入払区分=1）の明細を抽出
+
+    レコードはバイト位置で切り出すため、改行の有無どちらにも対応する。
+    """
+    data = content.replace(b'\r', b'').replace(b'\n', b'')
+    if len(data) % ZENGIN_STATEMENT_RECORD_LENGTH:
+        raise ValueError("全銀協フォーマットのレコード長（200バイト）と一致しません。")
+
+    for offset in range(0, len(data), ZENGIN_STATEMENT_RECORD_LENGTH):
+        record = data[offset:offset + ZENGIN_STATEMENT_RECORD_LENGTH]
+        # データレコード(2) かつ 入金(1) のみ対象
+        if record[0:1] != b'2' or record[21:22] != b'1':
+            continue
+        transaction_date = _parse_wareki_date(record[9:15].decode('ascii', errors='replace'))
+        amount = _parse_amount(record[24:36].decode('ascii', errors='replace'))
+        if transaction_date is None or not amount:
+            continue
+        yield {
+            'reference_no': record[1:9].decode('ascii', errors='replace').strip(),
+            'transaction_date': transaction_date,
+            'amount': amount,
+            'payer_name': record[81:129].decode('cp932', errors='replace').strip(),
+        }
+
+
+def _find_column(headers: List[str], candidates) -> Optional[int]:
+    normalized = [unicodedata.normalize('NFKC', h or '').strip().lower() for h in headers]
+    for candidate in candidates:
+        if candidate.lower() in normalized:
+            return normalized.index(candidate.lower())
+    return None
+
+
+def parse_csv_statement(content: bytes) -> Iterator[Dict[str, Any]]:
+    """ヘッダー付きCSV明細から入金の明細を抽出"""
+    reader = csv.reader(io.StringIO(_decode(content)))
+    headers = next(reader, None)
+    if not headers:
+        return
+
+    date_col = _find_column(headers, CSV_DATE_HEADERS)
+    amount_col = _find_column(headers, CSV_AMOUNT_HEADERS)
+    payer_col = _find_column(headers, CSV_PAYER_HEADERS)
+    reference_col = _find_column(headers, CSV_REFERENCE_HEADERS)
+    if date_col is None or amount_col is None or payer_col is None:
+        raise ValueError("CSVに取引日・入金額・振込依頼人名の列が見つかりません。")
+
+    for row in reader:
+        if len(row) <= max(date_col, amount_col, payer_col):
+            continue
+        transaction_date = _parse_csv_date(row[date_col])
+        amount = _parse_amount(row[amount_col])
+        # 出金行・不正行はスキップ
+        if transaction_date is None or not amount or amount <= 0:
+            continue
+        yield {
+            'reference_no': row[reference_col].strip() if reference_col is not None and len(row) > reference_col else '',
+            'transaction_date': transaction_date,
+            'amount': amount,
+            'payer_name': row[payer_col].strip(),
+        }
+
+
+class ReceiptReconciler:
+    """
+    入金明細と案件の入金予定をハッシュ結合で照合する消込処理
+
+    案件側は 金額 と まとめ振込の合計金額 をキーとする2つのハッシュ索引を
+    一度だけ構築し、明細1行あたり索引引きのみで候補を得る。
+
+    振込依頼人名が一致した場合だけ自動で消込む。金額と入金予定日だけが一致する候補は
+    別の入金を誤って消込まないよう要確認（needs_review）として候補を記録し、
+    confirm_suggested_receipt() で担当者が確定する。
+    """
+
+    def __init__(self, window_days: int = DEFAULT_DUE_DATE_WINDOW):
+        self.window = timedelta(days=window_days)
+
+    def load_candidates(self, lines) -> List[Dict[str, Any]]:
+        """明細の日付範囲に入金予定がある未入金案件を1クエリで取得"""
+        from ..models import Project, Contractor
+
+        dates = [line.transaction_date for line in lines]
+        if not dates:
+            return []
+
+        projects = list(
+            Project.objects.filter(
+                payment_due_date__range=[min(dates) - self.window, max(dates) + self.window],
+                estimate_amount__gt=0,
+            ).exclude(
+                payment_status='executed'
+            ).exclude(
+                contractor_name=''
+            ).values('id', 'contractor_name', 'billing_amount', 'estimate_amount', 'payment_due_date')
+        )
+
+        # 受注先名 → 振込依頼人カナ
+        kana_by_client = {
+            name: normalize_payer_name(kana)
+            for name, kana in Contractor.objects.filter(
+                name__in={p['contractor_name'] for p in projects}
+            ).exclude(payer_name_kana='').values_list('name', 'payer_name_kana')
+        }
+
+        for project in projects:
+            project['amount'] = project['billing_amount'] or project['estimate_amount']
+            project['payer_key'] = kana_by_client.get(
+                project['contractor_name'], normalize_payer_name(project['contractor_name'])
+            )
+        return projects
+
+    def build_indexes(self, projects):
+        """金額索引とまとめ振込（依頼人・入金予定日ごとの合計金額）索引を構築"""
+        by_amount = defaultdict(list)
+        groups = defaultdict(list)
+        for project in projects:
+            by_amount[project['amount']].append(project)
+            groups[(project['payer_key'], project['payment_due_date'])].append(project)
+
+        by_total = defaultdict(list)
+        for (payer_key, due_date), group in groups.items():
+            if len(group) > 1:
+                total = sum(p['amount'] for p in group)
+                by_total[total].append({
+                    'payer_key': payer_key,
+                    'payment_due_date': due_date,
+                    'ids': [p['id'] for p in group],
+                })
+        return by_amount, by_total
+
+    def _name_matches(self, payer_key: str, line_key: str) -> bool:
+        if not payer_key or not line_key:
+            return False
+        return payer_key == line_key or payer_key in line_key or line_key in payer_key
+
+    def _within_window(self, due_date, transaction_date) -> bool:
+        return abs(due_date - transaction_date) <= self.window
+
+    def match_line(self, line, by_amount, by_total, consumed):
+        """
+        1明細の照合
+
+        Returns:
+            (消込状況, 案件IDリスト)。要確認の場合は候補の案件ID
+        """
+        line_key = line.payer_name_normalized
+        candidates = [
+            p for p in by_amount.get(line.amount, ())
+            if p['id'] not in consumed and self._within_window(p['payment_due_date'], line.transaction_date)
+        ]
+        named = [p for p in candidates if self._name_matches(p['payer_key'], line_key)]
+
+        if len(named) == 1:
+            return 'matched', [named[0]['id']]
+        if len(named) > 1:
+            # 同名・同額が複数ある場合は入金予定日が最も近い案件を優先
+            named.sort(key=lambda p: abs(p['payment_due_date'] - line.transaction_date))
+            if named[0]['payment_due_date'] != named[1]['payment_due_date']:
+                return 'matched', [named[0]['id']]
+            return 'ambiguous', []
+
+        # 同一入金予定日の複数案件をまとめて振り込んだケース
+        for group in by_total.get(line.amount, ()):
+            if (self._name_matches(group['payer_key'], line_key)
+                    and self._within_window(group['payment_due_date'], line.transaction_date)
+                    and not consumed.intersection(group['ids'])):
+                return 'matched', group['ids']
+
+        if len(candidates) == 1:
+            # 金額・入金予定日だけが一致（依頼人名は不一致または照合不能）
+            return 'needs_review', [candidates[0]['id']]
+        return ('ambiguous' if candidates else 'unmatched'), []
+
+    def reconcile(self, lines) -> Dict[str, int]:
+        """明細リストを照合し、案件と明細の消込状況を一括更新"""
+        from ..models import Project, BankStatementLine
+
+        lines = list(lines)
+        by_amount, by_total = self.build_indexes(self.load_candidates(lines))
+
+        now = timezone.now()
+        consumed = set()
+        matched_projects = []
+        through_rows = []
+        result = {'matched': 0, 'needs_review': 0, 'ambiguous': 0, 'unmatched': 0}
+
+        for line in lines:
+            status, project_ids = self.match_line(line, by_amount, by_total, consumed)
+            line.match_status = status
+            line.suggested_project_id = project_ids[0] if status == 'needs_review' else None
+            result[status] += 1
+            if status != 'matched':
+                continue
+
+            line.matched_at = now
+            consumed.update(project_ids)
+            amount_each = line.amount if len(project_ids) == 1 else None
+            for project_id in project_ids:
+                matched_projects.append(Project(
+                    id=project_id,
+                    payment_status='executed',
+                    payment_executed_date=line.transaction_date,
+                    payment_amount=amount_each,
+                    updated_at=now,
+                ))
+                through_rows.append(BankStatementLine.matched_projects.through(
+                    bankstatementline_id=line.id, project_id=project_id
+                ))
+
+        with transaction.atomic():
+            BankStatementLine.objects.bulk_update(
+                lines, ['match_status', 'suggested_project', 'matched_at'], batch_size=500
+            )
+            if matched_projects:
+                # payment_amount はまとめ振込時は案件単位の金額が不明なため更新しない
+                single = [p for p in matched_projects if p.payment_amount is not None]
+                grouped = [p for p in matched_projects if p.payment_amount is None]
+                Project.objects.bulk_update(
+                    single, ['payment_status', 'payment_executed_date', 'payment_amount', 'updated_at'], batch_size=500
+                )
+                Project.objects.bulk_update(
+                    grouped, ['payment_status', 'payment_executed_date', 'updated_at'], batch_size=500
+                )
+                BankStatementLine.matched_projects.through.objects.bulk_create(
+                    through_rows, batch_size=500, ignore_conflicts=True
+                )
+        return result
+
+
+def confirm_suggested_receipt(line_id: int):
+    """
+    要確認の入金明細を候補の案件で消込む
+
+    Raises:
+        ValueError: 要確認の明細でない、または候補の案件がすでに入金済み
+    """
+    from ..models import Project, BankStatementLine
+
+    with transaction.atomic():
+        line = BankStatementLine.objects.select_for_update().filter(
+            pk=line_id, match_status='needs_review', suggested_project__isnull=False
+        ).first()
+        if line is None:
+            raise ValueError("確認待ちの入金明細が見つかりません。")
+        now = timezone.now()
+        updated = Project.objects.filter(pk=line.suggested_project_id).exclude(
+            payment_status='executed'
+        ).update(
+            payment_status='executed',
+            payment_executed_date=line.transaction_date,
+            payment_amount=line.amount,
+            updated_at=now,
+        )
+        if not updated:
+            raise ValueError("候補の案件はすでに入金済みです。")
+        line.matched_projects.add(line.suggested_project_id)
+        line.match_status = 'matched'
+        line.matched_at = now
+        line.suggested_project = None
+        line.save(update_fields=['match_status', 'matched_at', 'suggested_project'])
+    return line
+
+
+def reject_suggested_receipt(line_id: int):
+    """要確認の入金明細の候補を取り消して未消込に戻す"""
+    from ..models import BankStatementLine
+
+    updated = BankStatementLine.objects.filter(pk=line_id, match_status='needs_review').update(
+        match_status='unmatched', suggested_project=None
+    )
+    if not updated:
+        raise ValueError("確認待ちの入金明細が見つかりません。")
+
+
+def import_bank_statement(uploaded_file, file_format: str = 'auto', imported_by: str = '',
+                          window_days: int = DEFAULT_DUE_DATE_WINDOW):
+    """
+    入出金明細ファイルを取り込み、入金消込まで実行
+
+    Args:
+        uploaded_file: アップロードファイル
+        file_format: 'zengin' / 'csv' / 'auto'
+        imported_by: 取込者名
+        window_days: 入金予定日からの許容日数
+
+    Returns:
+        (BankStatementImport, 照合結果の辞書) のタプル
+    """
+    from ..models import BankStatementImport, BankStatementLine
+
+    content = uploaded_file.read()
+    file_name = getattr(uploaded_file, 'name', '') or 'statement'
+
+    if file_format == 'auto':
+        file_format = 'csv' if file_name.lower().endswith('.csv') else 'zengin'
+
+    if file_format == 'zengin':
+        rows = list(parse_zengin_statement(content))
+    elif file_format == 'csv':
+        rows = list(parse_csv_statement(content))
+    else:
+        raise ValueError("サポートされていないファイル形式です。")
+
+    if not rows:
+        raise ValueError("取り込める入金明細がありません。")
+
+    # 取込済みの明細は除外し、同じファイルを取り込み直しても二重に消込まない
+    ordinals = defaultdict(int)
+    new_lines = []
+    for row in rows:
+        payer_name = row['payer_name'][:100]
+        payer_name_normalized = normalize_payer_name(row['payer_name'])[:100]
+        reference_no = row['reference_no'][:20]
+        fields = (row['transaction_date'], row['amount'], reference_no, payer_name_normalized)
+        new_lines.append(BankStatementLine(
+            transaction_date=row['transaction_date'],
+            amount=row['amount'],
+            payer_name=payer_name,
+            payer_name_normalized=payer_name_normalized,
+            reference_no=reference_no,
+            dedup_key=line_dedup_key(*fields, ordinal=ordinals[fields]),
+        ))
+        ordinals[fields] += 1
+
+    existing = set(BankStatementLine.objects.filter(
+        dedup_key__in=[line.dedup_key for line in new_lines]
+    ).values_list('dedup_key', flat=True))
+    new_lines = [line for line in new_lines if line.dedup_key not in existing]
+    if not new_lines:
+        raise ValueError(f"{len(rows)}件の入金明細はすべて取込済みです。")
+
+    with transaction.atomic():
+        statement = BankStatementImport.objects.create(
+            file_name=file_name,
+            file_format=file_format,
+            imported_by=imported_by,
+        )
+        for line in new_lines:
+            line.statement = statement
+        # 同時に取り込まれた明細とはキーの一意制約で重複を防ぐ
+        BankStatementLine.objects.bulk_create(new_lines, batch_size=500, ignore_conflicts=True)
+        statement.line_count = statement.lines.count()
+        statement.duplicate_count = len(rows) - statement.line_count
+        statement.save(update_fields=['line_count', 'duplicate_count'])
+
+    lines = statement.lines.all()
+    result = ReceiptReconciler(window_days).reconcile(lines)
+
+    statement.matched_count = result['matched']
+    statement.save(update_fields=['matched_count'])
+    return statement, result
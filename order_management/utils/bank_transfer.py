@@ -6,8 +6,98 @@ import csv
 import io
 from datetime import datetime
 from decimal import Decimal
-from typing import List, Dict, Any
-from django.http import HttpResponse
+from typing import List, Dict, Any, Iterator, Iterable
+from django.db.models import Sum, Count, Min, Case, When, F, DecimalField
+from django.http import HttpResponse, StreamingHttpResponse
+
+
+# 全銀協フォーマットは1レコード120バイト固定長（Shift-JIS）
+ZENGIN_RECORD_LENGTH = 120
+ZENGIN_ENCODING = 'cp932'
+ZENGIN_LINE_SEPARATOR = b'\r\n'
+
+# 振込金額・合計金額の桁数上限
+MAX_TRANSFER_AMOUNT = 10 ** 10 - 1
+MAX_TOTAL_AMOUNT = 10 ** 12 - 1
+
+# 銀行コードのマッピング（実際の銀行コードを使用）
+BANK_CODE_MAPPING = {
+    'みずほ銀行': '0001',
+    '三菱UFJ銀行': '0005',
+    '三井住友銀行': '0009',
+    'りそな銀行': '0010',
+    '埼玉りそな銀行': '0017',
+    'ゆうちょ銀行': '9900',
+}
+
+# 口座種別のマッピング
+ACCOUNT_TYPE_MAPPING = {
+    'ordinary': ('1', '普通'),
+    'current': ('2', '当座'),
+    'savings': ('4', '貯蓄'),
+}
+
+
+def pad_sjis(value, width: int) -> bytes:
+    """
+    Shift-JISのバイト幅で左寄せ・スペース埋めする
+
+    全角文字は2バイトとして数え、幅を超える場合は文字の途中で
+    切れないよう文字単位で切り詰める。
+    """
+    encoded = b''
+    for char in str(value or ''):
+        char_bytes = char.encode(ZENGIN_ENCODING, errors='replace')
+        if len(encoded) + len(char_bytes) > width:
+            break
+        encoded += char_bytes
+    return encoded.ljust(width, b' ')
+
+
+def pad_number(value, width: int) -> bytes:
+    """数値項目を右寄せ・ゼロ埋めする（桁あふれはエラー）"""
+    digits = str(int(value or 0))
+    if len(digits) > width:
+        raise ValueError(f"数値項目が{width}桁を超えています: {digits}")
+    return digits.zfill(width).encode('ascii')
+
+
+def pad_code(value, width: int) -> bytes:
+    """コード項目（口座番号等）を数字のみ抽出して右寄せ・ゼロ埋めする（桁あふれはエラー）"""
+    digits = ''.join(ch for ch in str(value or '') if ch.isdigit())
+    if len(digits) > width:
+        raise ValueError(f"コード項目が{width}桁を超えています: {digits}")
+    return digits.zfill(width).encode('ascii')
+
+
+def resolve_bank_code(bank_code, bank_name) -> str:
+    """登録済みの銀行コード、なければ銀行名から引いた銀行コード（不明なら空文字）"""
+    return bank_code or BANK_CODE_MAPPING.get(bank_name, '')
+
+
+def transfer_errors(transfer: Dict[str, Any]) -> List[str]:
+    """
+    振込データを全銀協フォーマットに出力できない理由のリスト
+
+    銀行コード・支店コードを推測で埋めると別の口座に振り込まれるおそれがあるため、
+    不明なものは出力せずにエラーとする。
+    """
+    errors = []
+    codes = (
+        ('bank_code', 4, '銀行コード'),
+        ('branch_code', 3, '支店コード'),
+        ('account_number', 7, '口座番号'),
+    )
+    for key, width, label in codes:
+        value = str(transfer.get(key) or '')
+        if not value:
+            errors.append(f"{label}が未登録です")
+        elif not value.isdigit() or len(value) > width:
+            errors.append(f"{label}は{width}桁以内の数字で登録してください（{value}）")
+    amount = int(transfer.get('amount') or 0)
+    if amount <= 0 or amount > MAX_TRANSFER_AMOUNT:
+        errors.append(f"振込金額が不正です（¥{amount:,}）")
+    return errors
 
 
 class BankTransferFileGenerator:
@@ -18,90 +108,120 @@ class BankTransferFileGenerator:
             'name': '建築派遣管理株式会社',
             'code': '1234567',  # 会社コード
             'bank_code': '0001',  # みずほ銀行
+            'bank_name': 'ミズホ',
             'branch_code': '001',  # 本店
+            'branch_name': 'ホンテン',
+            'account_type': '1',
             'account_number': '1234567',
             'account_holder': 'ケンチクハケンカンリ(カ',
         }
 
-    def generate_zengin_format(self, transfers: List[Dict[str, Any]], transfer_date: datetime = None) -> str:
+    def iter_zengin_format(self, transfers: Iterable[Dict[str, Any]], transfer_date: datetime = None) -> Iterator[bytes]:
         """
-        全銀協フォーマットの振込ファイルを生成
+        全銀協フォーマットの振込ファイルをレコード単位で逐次生成
 
         Args:
-            transfers: 振込データのリスト
+            transfers: 振込データのイテラブル（ジェネレータ可）
             transfer_date: 振込実行日
 
-        Returns:
-            全銀協フォーマットの文字列
+        Yields:
+            改行付きの120バイト固定長レコード（Shift-JIS）
         """
         if transfer_date is None:
             transfer_date = datetime.now()
 
-        lines = []
-
         # ヘッダーレコード (1行目)
-        header = self._create_header_record(transfer_date, len(transfers))
-        lines.append(header)
+        yield self._finalize_record(self._create_header_record(transfer_date))
 
         # データレコード (各振込データ)
-        for i, transfer in enumerate(transfers, 1):
-            data_record = self._create_data_record(transfer, i)
-            lines.append(data_record)
+        record_count = 0
+        total_amount = 0
+        for transfer in transfers:
+            amount = int(transfer['amount'])
+            if amount <= 0 or amount > MAX_TRANSFER_AMOUNT:
+                raise ValueError(f"振込金額が不正です: {transfer.get('account_holder', '')} ¥{amount:,}")
+            record_count += 1
+            total_amount += amount
+            yield self._finalize_record(self._create_data_record(transfer, record_count))
+
+        if total_amount > MAX_TOTAL_AMOUNT:
+            raise ValueError("合計金額が全銀協フォーマットの上限を超えています。")
+
+        # トレーラーレコード・エンドレコード (最終行)
+        yield self._finalize_record(self._create_trailer_record(record_count, total_amount))
+        yield self._finalize_record(self._create_end_record())
+
+    def generate_zengin_format(self, transfers: List[Dict[str, Any]], transfer_date: datetime = None) -> bytes:
+        """
+        全銀協フォーマットの振込ファイルを生成
 
-        # トレーラーレコード (最終行)
-        total_amount = sum(transfer['amount'] for transfer in transfers)
-        trailer = self._create_trailer_record(len(transfers), total_amount)
-        lines.append(trailer)
+        Args:
+            transfers: 振込データのリスト
+            transfer_date: 振込実行日
+
+        Returns:
+            全銀協フォーマットのバイト列（Shift-JIS）
+        """
+        return b''.join(self.iter_zengin_format(transfers, transfer_date))
 
-        return '\n'.join(lines)
+    def _finalize_record(self, record: bytes) -> bytes:
+        """レコード長を検証して改行を付与"""
+        if len(record) != ZENGIN_RECORD_LENGTH:
+            raise ValueError(f"レコード長が不正です: {len(record)}バイト")
+        return record + ZENGIN_LINE_SEPARATOR
 
-    def _create_header_record(self, transfer_date: datetime, record_count: int) -> str:
+    def _create_header_record(self, transfer_date: datetime) -> bytes:
         """ヘッダーレコード生成"""
         return (
-            '1'  # レコード区分 (1:ヘッダー)
-            + '21'  # 種別コード (21:総合振込)
-            + '0'  # コード区分 (0:JIS)
-            + self.company_info['code'].ljust(10)  # 委託者コード
-            + self.company_info['name'][:40].ljust(40)  # 委託者名
-            + transfer_date.strftime('%m%d')  # 振込指定日 (MMDD)
-            + self.company_info['bank_code']  # 仕向銀行番号
-            + self.company_info['bank_code'][:15].ljust(15)  # 仕向銀行名
-            + self.company_info['branch_code']  # 仕向支店番号
-            + self.company_info['branch_code'][:15].ljust(15)  # 仕向支店名
-            + '1'  # 預金種目 (1:普通)
-            + self.company_info['account_number'].rjust(7, '0')  # 口座番号
-            + self.company_info['account_holder'][:30].ljust(30)  # 口座名義人
-            + ' ' * 17  # ダミー項目
+            b'1'  # レコード区分 (1:ヘッダー)
+            + b'21'  # 種別コード (21:総合振込)
+            + b'0'  # コード区分 (0:JIS)
+            + pad_code(self.company_info['code'], 10)  # 委託者コード
+            + pad_sjis(self.company_info['account_holder'], 40)  # 委託者名
+            + transfer_date.strftime('%m%d').encode('ascii')  # 振込指定日 (MMDD)
+            + pad_code(self.company_info['bank_code'], 4)  # 仕向銀行番号
+            + pad_sjis(self.company_info['bank_name'], 15)  # 仕向銀行名
+            + pad_code(self.company_info['branch_code'], 3)  # 仕向支店番号
+            + pad_sjis(self.company_info['branch_name'], 15)  # 仕向支店名
+            + self.company_info['account_type'].encode('ascii')  # 預金種目 (1:普通)
+            + pad_code(self.company_info['account_number'], 7)  # 口座番号
+            + b' ' * 17  # ダミー項目
         )
 
-    def _create_data_record(self, transfer: Dict[str, Any], sequence: int) -> str:
+    def _create_data_record(self, transfer: Dict[str, Any], sequence: int) -> bytes:
         """データレコード生成"""
         return (
-            '2'  # レコード区分 (2:データ)
-            + str(sequence).zfill(6)  # 連番
-            + transfer['bank_code'][:4].ljust(4)  # 被仕向銀行番号
-            + transfer['bank_name'][:15].ljust(15)  # 被仕向銀行名
-            + transfer['branch_code'][:3].ljust(3)  # 被仕向支店番号
-            + transfer['branch_name'][:15].ljust(15)  # 被仕向支店名
-            + '1'  # 預金種目 (1:普通, 2:当座, 4:貯蓄)
-            + transfer['account_number'].rjust(7, '0')  # 口座番号
-            + transfer['account_holder'][:30].ljust(30)  # 受取人名
-            + str(int(transfer['amount'])).zfill(10)  # 振込金額
-            + '0'  # 新規コード (0:新規)
-            + transfer['client_code'][:10].ljust(10)  # 顧客コード1
-            + transfer['transfer_purpose'][:20].ljust(20)  # 振込依頼人名
-            + ' ' * 7  # ダミー項目
+            b'2'  # レコード区分 (2:データ)
+            + pad_code(transfer['bank_code'], 4)  # 被仕向銀行番号
+            + pad_sjis(transfer['bank_name'], 15)  # 被仕向銀行名
+            + pad_code(transfer['branch_code'], 3)  # 被仕向支店番号
+            + pad_sjis(transfer['branch_name'], 15)  # 被仕向支店名
+            + b' ' * 4  # 手形交換所番号
+            + pad_code(transfer.get('account_type', '1'), 1)  # 預金種目 (1:普通, 2:当座, 4:貯蓄)
+            + pad_code(transfer['account_number'], 7)  # 口座番号
+            + pad_sjis(transfer['account_holder'], 30)  # 受取人名
+            + pad_number(transfer['amount'], 10)  # 振込金額
+            + b'0'  # 新規コード (0:その他)
+            + pad_sjis(transfer['client_code'], 10)  # 顧客コード1
+            + pad_number(sequence, 10)  # 顧客コード2（連番）
+            + b' '  # 振込指定区分
+            + b' '  # 識別表示
+            + b' ' * 7  # ダミー項目
         )
 
-    def _create_trailer_record(self, record_count: int, total_amount: Decimal) -> str:
+    def _create_trailer_record(self, record_count: int, total_amount: Decimal) -> bytes:
         """トレーラーレコード生成"""
         return (
-            '8'  # レコード区分 (8:トレーラー)
-            + str(record_count).zfill(6)  # 合計件数
-            + str(int(total_amount)).zfill(12)  # 合計金額
-            + ' ' * 101  # ダミー項目
+            b'8'  # レコード区分 (8:トレーラー)
+            + pad_number(record_count, 6)  # 合計件数
+            + pad_number(total_amount, 12)  # 合計金額
+            + b' ' * 101  # ダミー項目
         )
 
+    def _create_end_record(self) -> bytes:
+        """エンドレコード生成"""
+        return b'9' + b' ' * 119
+
     def generate_csv_format(self, transfers: List[Dict[str, Any]]) -> str:
         """
         CSV形式の振込ファイルを生成
@@ -138,7 +258,7 @@ class BankTransferFileGenerator:
 
         return output.getvalue()
 
-    def create_http_response(self, content: str, filename: str, content_type: str = 'text/plain') -> HttpResponse:
+    def create_http_response(self, content, filename: str, content_type: str = 'text/plain') -> HttpResponse:
         """
         ダウンロード用のHTTPレスポンスを作成
 
@@ -155,6 +275,156 @@ class BankTransferFileGenerator:
         return response
 
 
+class ZenginTransferBatch:
+    """
+    支払予定日ベースの総合振込バッチ
+
+    未払いの外注費（Subcontract）を振込先口座ごとにDB側で集計し、
+    全銀協フォーマットのレコードをストリーミングで出力する。
+    件数・合計金額は事前集計値とトレーラーの値を突き合わせて検証する。
+    """
+
+    # 振込先口座のグルーピングキー
+    ACCOUNT_FIELDS = (
+        'contractor__bank_code',
+        'contractor__bank_name',
+        'contractor__branch_code',
+        'contractor__branch_name',
+        'contractor__account_type',
+        'contractor__account_number',
+        'contractor__account_holder',
+    )
+
+    def __init__(self, pay_date, generator: BankTransferFileGenerator = None):
+        self.pay_date = pay_date
+        self.generator = generator or BankTransferFileGenerator()
+
+    def get_queryset(self):
+        """支払予定日までの未払い外注費（口座情報あり）"""
+        from subcontract_management.models import Subcontract
+
+        return Subcontract.objects.filter(
+            payment_status='pending',
+            worker_type='external',
+            contractor__isnull=False,
+            payment_due_date__lte=self.pay_date,
+        ).exclude(
+            contractor__bank_name=''
+        ).exclude(
+            contractor__account_number=''
+        ).exclude(
+            contractor__account_holder=''
+        )
+
+    def _amount_expression(self):
+        """支払金額（被請求額があれば優先、なければ依頼金額）"""
+        return Case(
+            When(billed_amount__gt=0, then=F('billed_amount')),
+            default=F('contract_amount'),
+            output_field=DecimalField(max_digits=12, decimal_places=0),
+        )
+
+    def get_account_totals(self):
+        """振込先口座ごとの支払合計（DB側でGROUP BY）"""
+        return self.get_queryset().values(
+            *self.ACCOUNT_FIELDS
+        ).annotate(
+            total_amount=Sum(self._amount_expression()),
+            sites_count=Count('id'),
+            client_code=Min('contractor_id'),  # 顧客コードとして代表業者IDを使用
+        ).filter(
+            total_amount__gt=0
+        ).order_by(*self.ACCOUNT_FIELDS)
+
+    def iter_transfers(self) -> Iterator[Dict[str, Any]]:
+        """口座別集計行を振込データ形式に変換して逐次返す"""
+        for row in self.get_account_totals().iterator(chunk_size=500):
+            account_type_code, account_type_display = ACCOUNT_TYPE_MAPPING.get(
+                row['contractor__account_type'] or 'ordinary', ('1', '普通')
+            )
+            yield {
+                'bank_code': resolve_bank_code(row['contractor__bank_code'], row['contractor__bank_name']),
+                'bank_name': row['contractor__bank_name'],
+                'branch_code': row['contractor__branch_code'],
+                'branch_name': row['contractor__branch_name'],
+                'account_type': account_type_code,
+                'account_type_display': account_type_display,
+                'account_number': row['contractor__account_number'],
+                'account_holder': row['contractor__account_holder'],
+                'amount': int(row['total_amount']),
+                'client_code': str(row['client_code']),
+                'transfer_purpose': f"工事代金 {row['sites_count']}件分",
+                'memo': f"振込日: {self.pay_date.strftime('%Y/%m/%d')}",
+            }
+
+    def validated_transfers(self) -> List[Dict[str, Any]]:
+        """
+        全件を検証した振込データのリスト
+
+        1件でも出力できない振込先があれば、振込先ごとの理由をまとめた ValueError を送出する。
+        データは口座ごとの集計行なので、件数は振込先口座の数にとどまる。
+        """
+        transfers = list(self.iter_transfers())
+        if not transfers:
+            raise ValueError("振込可能な業者データがありません。銀行口座情報を確認してください。")
+
+        problems = []
+        total_amount = 0
+        for transfer in transfers:
+            errors = transfer_errors(transfer)
+            if errors:
+                problems.append(f"{transfer['account_holder']}: {'、'.join(errors)}")
+            total_amount += transfer['amount']
+        if problems:
+            shown = problems[:5]
+            if len(problems) > len(shown):
+                shown.append(f"ほか{len(problems) - len(shown)}件")
+            raise ValueError("振込先の口座情報に不備があるため出力できません。" + ' / '.join(shown))
+        if total_amount > MAX_TOTAL_AMOUNT:
+            raise ValueError("合計金額が全銀協フォーマットの上限を超えています。")
+        return transfers
+
+    def iter_records(self, transfers: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+        """
+        レコードを逐次出力し、トレーラーの件数・金額をデータレコードと突き合わせる
+
+        不一致の場合は ValueError を送出する。
+        """
+        record_count = 0
+        total_amount = 0
+        for record in self.generator.iter_zengin_format(transfers, self.pay_date):
+            record_type = record[:1]
+            if record_type == b'2':
+                record_count += 1
+                total_amount += int(record[80:90])
+            elif record_type == b'8':
+                trailer_count = int(record[1:7])
+                trailer_amount = int(record[7:19])
+                if (trailer_count, trailer_amount) != (record_count, total_amount):
+                    raise ValueError("トレーラーの件数・金額がデータレコードと一致しません。")
+            yield record
+
+    def streaming_response(self) -> StreamingHttpResponse:
+        """
+        全銀協フォーマットのダウンロードレスポンス
+
+        応答を始めてから中断すると正常に見える途中までのファイルが保存されてしまうため、
+        全件の検証とレコードの組み立てを済ませてから応答を返す。
+        """
+        transfers = self.validated_transfers()
+        records = list(self.iter_records(transfers))
+
+        response = StreamingHttpResponse(
+            iter(records),
+            content_type=f'text/plain; charset={ZENGIN_ENCODING}',
+        )
+        filename = f"furikomi_zengin_{self.pay_date.strftime('%Y%m%d')}.txt"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['X-Transfer-Count'] = str(len(transfers))
+        response['X-Transfer-Total'] = str(sum(t['amount'] for t in transfers))
+        return response
+
+
 def convert_contractor_to_transfer_data(contractor_payment: Dict[str, Any]) -> Dict[str, Any]:
     """
     業者支払いデータを振込データ形式に変換
@@ -167,34 +437,14 @@ def convert_contractor_to_transfer_data(contractor_payment: Dict[str, Any]) -> D
     """
     contractor = contractor_payment.get('contractor')
 
-    # 銀行コードのマッピング（実際の銀行コードを使用）
-    bank_code_mapping = {
-        'みずほ銀行': '0001',
-        '三菱UFJ銀行': '0005',
-        '三井住友銀行': '0009',
-        'りそな銀行': '0010',
-        '埼玉りそな銀行': '0017',
-        'ゆうちょ銀行': '9900',
-    }
-
-    # 支店コードの生成（実際には銀行の支店コード一覧から取得）
-    branch_code = '001'  # デフォルト値
-
-    # 口座種別のマッピング
-    account_type_mapping = {
-        'ordinary': ('1', '普通'),
-        'current': ('2', '当座'),
-        'savings': ('4', '貯蓄'),
-    }
-
-    account_type_code, account_type_display = account_type_mapping.get(
+    account_type_code, account_type_display = ACCOUNT_TYPE_MAPPING.get(
         contractor.account_type if contractor else 'ordinary', ('1', '普通')
     )
 
     return {
-        'bank_code': bank_code_mapping.get(contractor.bank_name if contractor else '', '0000'),
+        'bank_code': resolve_bank_code(contractor.bank_code, contractor.bank_name) if contractor else '',
         'bank_name': contractor.bank_name if contractor else '',
-        'branch_code': branch_code,
+        'branch_code': contractor.branch_code if contractor else '',
         'branch_name': contractor.branch_name if contractor else '',
         'account_type': account_type_code,
         'account_type_display': account_type_display,
@@ -235,9 +485,17 @@ def generate_bulk_transfer_file(contractor_payments: List[Dict[str, Any]], file_
     current_date = datetime.now()
 
     if file_format == 'zengin':
+        problems = [
+            f"{t['account_holder']}: {'、'.join(errors)}"
+            for t in valid_transfers
+            for errors in [transfer_errors(t)]
+            if errors
+        ]
+        if problems:
+            raise ValueError("振込先の口座情報に不備があるため出力できません。" + ' / '.join(problems))
         content = generator.generate_zengin_format(valid_transfers)
         filename = f"furikomi_zengin_{current_date.strftime('%Y%m%d_%H%M%S')}.txt"
-        content_type = 'text/plain'
+        content_type = f'text/plain; charset={ZENGIN_ENCODING}'
     elif file_format == 'csv':
         content = generator.generate_csv_format(valid_transfers)
         filename = f"furikomi_list_{current_date.strftime('%Y%m%d_%H%M%S')}.csv"
@@ -245,4 +503,4 @@ def generate_bulk_transfer_file(contractor_payments: List[Dict[str, Any]], file_
     else:
         raise ValueError("サポートされていないファイル形式です。")
 
-    return content, filename, content_type
\ No newline at end of file
+    return content, filename, content_type
@@ -0,0 +1,269 @@
+"""
+資金繰り予測ユーティリティ
+入金予定（案件）と出金予定（外注費・固定費）を日次の配列に展開し、累積残高を算出する
+"""
+import calendar
+import hashlib
+from datetime import date, timedelta
+from itertools import accumulate
+from typing import Dict, Any, List, Optional
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from order_management.models import Project, FixedCost
+from subcontract_management.models import Subcontract, Contractor
+
+
+CACHE_PREFIX = 'cashflow_forecast'
+CACHE_TIMEOUT = 60 * 60
+
+# 支払サイクル → 締め月から支払月までの月数
+PAYMENT_CYCLE_MONTHS = {
+    'monthly': 1,
+    'bimonthly': 2,
+    'quarterly': 3,
+    'custom': 1,
+}
+
+# 締め日・支払日が未登録の業者は「月末締め翌月末払い」として扱う
+DEFAULT_CLOSING_DAY = 31
+DEFAULT_PAYMENT_DAY = 31
+
+
+def add_months(year: int, month: int, months: int):
+    """年月に月数を加算"""
+    index = year * 12 + (month - 1) + months
+    return index // 12, index % 12 + 1
+
+
+def clamp_day(year: int, month: int, day: int) -> date:
+    """月末を超える日付を月末日に丸める（31日払い → 2月は28/29日）"""
+    return date(year, month, min(max(day, 1), calendar.monthrange(year, month)[1]))
+
+
+def derive_payment_date(base_date: date, payment_day: Optional[int] = None,
+                        closing_day: Optional[int] = None,
+                        payment_cycle: Optional[str] = 'monthly') -> date:
+    """
+    締め日・支払日・支払サイクルから支払予定日を求める
+
+    例: 20日締め翌月25日払いで基準日が 3/21 の場合、締めは 4/20、支払は 5/25
+    """
+    closing = clamp_day(base_date.year, base_date.month, closing_day or DEFAULT_CLOSING_DAY)
+    year, month = base_date.year, base_date.month
+    if base_date > closing:
+        year, month = add_months(year, month, 1)
+
+    year, month = add_months(year, month, PAYMENT_CYCLE_MONTHS.get(payment_cycle or 'monthly', 1))
+    return clamp_day(year, month, payment_day or DEFAULT_PAYMENT_DAY)
+
+
+def forecast_fingerprint() -> str:
+    """予測の入力データが変わったかを判定するための指紋（件数と最終更新日時）"""
+    parts = []
+    for model in (Project, Subcontract, Contractor, FixedCost):
+        stats = model.objects.aggregate(count=Count('id'), latest=Max('updated_at'))
+        latest = stats['latest'].isoformat() if stats['latest'] else ''
+        parts.append(f"{stats['count']}:{latest}")
+    return '|'.join(parts)
+
+
+class CashflowForecast:
+    """
+    日次の資金繰り予測
+
+    入金・出金をそれぞれ日単位の配列に積み上げ、累積和で残高推移を求める。
+    配列はDjangoキャッシュに保存し、入力データが変わるまで再利用する。
+    期間開始前に期日を過ぎた未入金・未払いは初日に計上する。
+    """
+
+    def __init__(self, start_date: date = None, months: int = 3):
+        self.start_date = start_date or date.today()
+        self.months = max(1, min(int(months), 24))
+        end_year, end_month = add_months(self.start_date.year, self.start_date.month, self.months)
+        self.end_date = clamp_day(end_year, end_month, self.start_date.day) - timedelta(days=1)
+        self.days = (self.end_date - self.start_date).days + 1
+
+    def day_index(self, target: date) -> Optional[int]:
+        """日付を配列の添字に変換（期間前は0、期間後はNone）"""
+        if target is None:
+            return None
+        offset = (target - self.start_date).days
+        if offset >= self.days:
+            return None
+        return max(offset, 0)
+
+    def cache_key(self) -> str:
+        return f'{CACHE_PREFIX}:{self.start_date.isoformat()}:{self.days}:' + hashlib.md5(
+            forecast_fingerprint().encode()
+        ).hexdigest()
+
+    def load_receipts(self) -> List[Dict[str, Any]]:
+        """入金予定（未入金の案件）"""
+        rows = Project.objects.filter(
+            payment_due_date__isnull=False,
+            payment_due_date__lte=self.end_date,
+        ).exclude(
+            payment_status='executed'
+        ).exclude(
+            order_status='NG'
+        ).values('id', 'site_name', 'payment_due_date', 'billing_amount', 'estimate_amount')
+
+        receipts = []
+        for row in rows:
+            amount = int(row['billing_amount'] or row['estimate_amount'] or 0)
+            if amount:
+                receipts.append({
+                    'date': row['payment_due_date'],
+                    'amount': amount,
+                    'label': row['site_name'],
+                })
+        return receipts
+
+    def load_payments(self) -> List[Dict[str, Any]]:
+        """出金予定（未払いの外注費）"""
+        rows = Subcontract.objects.filter(
+            worker_type='external',
+            payment_status__in=['pending', 'processing'],
+        ).values(
+            'id', 'site_name', 'contract_amount', 'billed_amount', 'payment_due_date',
+            'project__work_end_date', 'contractor__name', 'contractor__payment_day',
+            'contractor__closing_day', 'contractor__payment_cycle',
+        )
+
+        payments = []
+        for row in rows:
+            amount = int(row['billed_amount'] or row['contract_amount'] or 0)
+            if not amount:
+                continue
+            pay_date = row['payment_due_date']
+            if pay_date is None:
+                pay_date = derive_payment_date(
+                    row['project__work_end_date'] or self.start_date,
+                    row['contractor__payment_day'],
+                    row['contractor__closing_day'],
+                    row['contractor__payment_cycle'],
+                )
+            if pay_date <= self.end_date:
+                payments.append({
+                    'date': pay_date,
+                    'amount': amount,
+                    'label': row['contractor__name'] or row['site_name'],
+                })
+        return payments
+
+    def load_fixed_costs(self) -> List[Dict[str, Any]]:
+        """固定費（開始日の日付に毎月計上）"""
+        rows = FixedCost.objects.filter(
+            is_active=True,
+            start_date__lte=self.end_date,
+        ).values('name', 'monthly_amount', 'start_date', 'end_date')
+
+        costs = []
+        for row in rows:
+            amount = int(row['monthly_amount'] or 0)
+            year, month = self.start_date.year, self.start_date.month
+            for _ in range(self.months + 1):
+                pay_date = clamp_day(year, month, row['start_date'].day)
+                year, month = add_months(year, month, 1)
+                if pay_date < self.start_date or pay_date > self.end_date:
+                    continue
+                if pay_date < row['start_date'] or (row['end_date'] and pay_date > row['end_date']):
+                    continue
+                costs.append({'date': pay_date, 'amount': amount, 'label': row['name']})
+        return costs
+
+    def build_arrays(self) -> Dict[str, List[int]]:
+        """入金・外注費・固定費を日次配列に展開"""
+        arrays = {
+            'receipts': [0] * self.days,
+            'payments': [0] * self.days,
+            'fixed_costs': [0] * self.days,
+        }
+        sources = (
+            ('receipts', self.load_receipts()),
+            ('payments', self.load_payments()),
+            ('fixed_costs', self.load_fixed_costs()),
+        )
+        for key, items in sources:
+            array = arrays[key]
+            for item in items:
+                index = self.day_index(item['date'])
+                if index is not None:
+                    array[index] += item['amount']
+        return arrays
+
+    def get_arrays(self) -> Dict[str, List[int]]:
+        """日次配列を取得（入力データが変わっていなければキャッシュから）"""
+        key = self.cache_key()
+        arrays = cache.get(key)
+        if arrays is None:
+            arrays = self.build_arrays()
+            cache.set(key, arrays, CACHE_TIMEOUT)
+        return arrays
+
+    def compute(self, opening_balance: int = 0, receipt_delay_days: int = 0,
+                payment_delay_days: int = 0, adjustments: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        残高推移を算出
+
+        what-if 条件（入金遅延・支払繰延・臨時の入出金）はキャッシュ済み配列をずらして適用するため、
+        DBへの再問い合わせは発生しない。
+        """
+        arrays = self.get_arrays()
+        receipts = shift(arrays['receipts'], receipt_delay_days)
+        payments = shift(arrays['payments'], payment_delay_days)
+        fixed_costs = arrays['fixed_costs']
+
+        for adjustment in adjustments or []:
+            index = self.day_index(adjustment['date'])
+            if index is None:
+                continue
+            amount = int(adjustment['amount'])
+            if amount >= 0:
+                receipts[index] += amount
+            else:
+                payments[index] -= amount
+
+        net = [r - p - f for r, p, f in zip(receipts, payments, fixed_costs)]
+        balances = list(accumulate(net, initial=opening_balance))[1:]
+        min_balance = min(balances) if balances else opening_balance
+        min_index = balances.index(min_balance) if balances else 0
+        first_negative = next((i for i, b in enumerate(balances) if b < 0), None)
+
+        return {
+            'start_date': self.start_date.isoformat(),
+            'end_date': self.end_date.isoformat(),
+            'dates': [(self.start_date + timedelta(days=i)).isoformat() for i in range(self.days)],
+            'receipts': receipts,
+            'payments': payments,
+            'fixed_costs': fixed_costs,
+            'balances': balances,
+            'summary': {
+                'opening_balance': opening_balance,
+                'closing_balance': balances[-1] if balances else opening_balance,
+                'total_receipts': sum(receipts),
+                'total_payments': sum(payments),
+                'total_fixed_costs': sum(fixed_costs),
+                'min_balance': min_balance,
+                'min_balance_date': (self.start_date + timedelta(days=min_index)).isoformat(),
+                'first_negative_date': (
+                    (self.start_date + timedelta(days=first_negative)).isoformat()
+                    if first_negative is not None else None
+                ),
+            },
+        }
+
+
+def shift(values: List[int], days: int) -> List[int]:
+    """配列を指定日数だけ後ろ（負なら前）にずらす。期間外に出た分は除外し、期間前は初日に寄せる"""
+    if not days:
+        return list(values)
+    size = len(values)
+    shifted = [0] * size
+    for index, value in enumerate(values):
+        target = max(index + days, 0)
+        if value and target < size:
+            shifted[target] += value
+    return shifted
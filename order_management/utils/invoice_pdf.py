@@ -0,0 +1,475 @@
+"""
+請求書PDF生成ユーティリティ
+外部ライブラリに依存しない純Python実装（日本語は非埋め込みのCIDフォントを使用）
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from decimal import Decimal
+from functools import lru_cache, partial
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, Any, List
+
+from django.conf import settings
+
+
+LAYOUT_DIR = Path(__file__).resolve().parent.parent / 'pdf_layouts'
+
+# 日本語CIDフォント（Adobe-Japan1、PDFビューア側の標準フォントで表示）
+CID_FONT_NAME = 'HeiseiKakuGo-W5'
+CID_FONT_ENCODING = 'UniJIS-UCS2-H'
+
+_executor = None
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=8)
+def load_layout(name: str = 'invoice') -> Dict[str, Any]:
+    """レイアウト定義を読み込む（プロセス内でキャッシュ）"""
+    with open(LAYOUT_DIR / f'{name}.json', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=1)
+def font_objects() -> List[bytes]:
+    """フォント関連のPDFオブジェクト本体（Type0 / CIDFont / FontDescriptor）"""
+    return [
+        (
+            f'<< /Type /Font /Subtype /Type0 /BaseFont /{CID_FONT_NAME} '
+            f'/Encoding /{CID_FONT_ENCODING} /DescendantFonts [{{cid}} 0 R] >>'
+        ).encode('ascii'),
+        (
+            f'<< /Type /Font /Subtype /CIDFontType0 /BaseFont /{CID_FONT_NAME} '
+            '/CIDSystemInfo << /Registry (Adobe) /Ordering (Japan1) /Supplement 2 >> '
+            '/FontDescriptor {descriptor} 0 R /DW 1000 /W [1 95 500 231 632 500] >>'
+        ).encode('ascii'),
+        (
+            f'<< /Type /FontDescriptor /FontName /{CID_FONT_NAME} /Flags 4 '
+            '/FontBBox [-92 -250 1010 922] /ItalicAngle 0 /Ascent 752 /Descent -271 '
+            '/CapHeight 737 /StemV 114 >>'
+        ).encode('ascii'),
+    ]
+
+
+def text_width(text: str, size: float) -> float:
+    """文字列の描画幅（半角=0.5em, 全角=1em）"""
+    units = 0
+    for ch in text:
+        code = ord(ch)
+        units += 500 if code < 0x7f or 0xff61 <= code <= 0xff9f else 1000
+    return units * size / 1000
+
+
+def _encode_text(text: str) -> str:
+    """UCS-2（BMP外は〓に置換）の16進文字列"""
+    safe = ''.join(ch if ord(ch) <= 0xffff else '〓' for ch in text)
+    return safe.encode('utf-16-be').hex().upper()
+
+
+class PDFPage:
+    """1ページ分の描画命令"""
+
+    def __init__(self, width: float, height: float):
+        self.width = width
+        self.height = height
+        self.ops = []
+
+    def text(self, x: float, y: float, text: str, size: float = 10, align: str = 'left'):
+        text = str(text)
+        if not text:
+            return
+        if align == 'right':
+            x -= text_width(text, size)
+        elif align == 'center':
+            x -= text_width(text, size) / 2
+        self.ops.append(f'BT /F1 {size:.2f} Tf {x:.2f} {y:.2f} Td <{_encode_text(text)}> Tj ET')
+
+    def line(self, x1: float, y1: float, x2: float, y2: float, width: float = 0.5):
+        self.ops.append(f'{width:.2f} w {x1:.2f} {y1:.2f} m {x2:.2f} {y2:.2f} l S')
+
+    def rect(self, x: float, y: float, w: float, h: float, width: float = 0.5, fill_gray: float = None):
+        if fill_gray is not None:
+            self.ops.append(f'q {fill_gray:.2f} g {x:.2f} {y:.2f} {w:.2f} {h:.2f} re f Q')
+        self.ops.append(f'{width:.2f} w {x:.2f} {y:.2f} {w:.2f} {h:.2f} re S')
+
+    def content(self) -> bytes:
+        return zlib.compress('\n'.join(self.ops).encode('ascii'))
+
+
+def build_pdf(pages: List[PDFPage], title: str = '') -> bytes:
+    """ページ群からPDFバイト列を組み立てる"""
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(b'')
+    pages_id = add(b'')
+    type0, cid_font, descriptor = font_objects()
+    font_id = add(b'')
+    cid_id = add(b'')
+    descriptor_id = add(descriptor)
+    objects[font_id - 1] = type0.replace(b'{cid}', str(cid_id).encode())
+    objects[cid_id - 1] = cid_font.replace(b'{descriptor}', str(descriptor_id).encode())
+
+    page_ids = []
+    for page in pages:
+        stream = page.content()
+        content_id = add(
+            f'<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n'.encode('ascii') + stream + b'\nendstream'
+        )
+        page_ids.append(add((
+            f'<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {page.width} {page.height}] '
+            f'/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>'
+        ).encode('ascii')))
+
+    kids = ' '.join(f'{pid} 0 R' for pid in page_ids)
+    objects[pages_id - 1] = f'<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>'.encode('ascii')
+    objects[catalog_id - 1] = f'<< /Type /Catalog /Pages {pages_id} 0 R >>'.encode('ascii')
+    info_id = add(f'<< /Title <FEFF{_encode_text(title)}> /Producer (construction-dispatch) >>'.encode('ascii'))
+
+    output = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f'{number} 0 obj\n'.encode('ascii') + body + b'\nendobj\n'
+
+    xref_offset = len(output)
+    output += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('ascii')
+    for offset in offsets:
+        output += f'{offset:010d} 00000 n \n'.encode('ascii')
+    output += (
+        f'trailer\n<< /Size {len(objects) + 1} /Root {catalog_id} 0 R /Info {info_id} 0 R >>\n'
+        f'startxref\n{xref_offset}\n%%EOF\n'
+    ).encode('ascii')
+    return bytes(output)
+
+
+def _format_amount(value) -> str:
+    if isinstance(value, str):
+        return value
+    return f'{Decimal(str(value or 0)):,.0f}'
+
+
+def _format_quantity(value) -> str:
+    if isinstance(value, str):
+        return value
+    return f'{Decimal(str(value or 0)):.2f}'.rstrip('0').rstrip('.')
+
+
+def normalize_payload(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    プレビューAPIの preview_data 形式を描画用に正規化
+
+    数値は表示用文字列に変換し、ハッシュ計算が安定するよう必要な項目のみ残す。
+    """
+    return {
+        'invoice_number': str(data.get('invoice_number', '')),
+        'issue_date': str(data.get('issue_date', '')),
+        'due_date': str(data.get('due_date', '')),
+        'billing_period': str(data.get('billing_period', '')),
+        'client_name': str(data.get('client_name', '')),
+        'client_address': str(data.get('client_address', '') or ''),
+        'items': [
+            {
+                'description': str(item.get('description', '')),
+                'quantity': _format_quantity(item.get('quantity', 1)),
+                'unit': str(item.get('unit', '式')),
+                'unit_price': _format_amount(item.get('unit_price', 0)),
+                'amount': _format_amount(item.get('amount', 0)),
+            }
+            for item in data.get('items', [])
+        ],
+        'subtotal': _format_amount(data.get('subtotal', 0)),
+        'tax_amount': _format_amount(data.get('tax_amount', 0)),
+        'total_amount': _format_amount(data.get('total_amount', 0)),
+        'notes': str(data.get('notes', '') or ''),
+    }
+
+
+def build_invoice_payload(invoice) -> Dict[str, Any]:
+    """Invoice（items は prefetch 済み推奨）から描画用データを作成"""
+    return normalize_payload({
+        'invoice_number': invoice.invoice_number,
+        'issue_date': invoice.issue_date.strftime('%Y年%m月%d日'),
+        'due_date': invoice.due_date.strftime('%Y年%m月%d日'),
+        'billing_period': (
+            f"{invoice.billing_period_start.strftime('%Y年%m月%d日')} ～ "
+            f"{invoice.billing_period_end.strftime('%Y年%m月%d日')}"
+        ),
+        'client_name': invoice.client_name,
+        'client_address': invoice.client_address,
+        'items': [
+            {
+                'description': item.description,
+                'quantity': item.quantity,
+                'unit': item.unit,
+                'unit_price': item.unit_price,
+                'amount': item.amount,
+            }
+            for item in invoice.items.all()
+        ],
+        'subtotal': invoice.subtotal,
+        'tax_amount': invoice.tax_amount,
+        'total_amount': invoice.total_amount,
+        'notes': invoice.notes,
+    })
+
+
+def payload_digest(payload: Dict[str, Any], layout_name: str = 'invoice') -> str:
+    """描画内容とレイアウト版数から決まるコンテンツハッシュ"""
+    layout = load_layout(layout_name)
+    source = json.dumps(
+        {'layout': layout_name, 'version': layout.get('version'), 'payload': payload},
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def render_invoice_pdf(payload: Dict[str, Any], layout_name: str = 'invoice') -> bytes:
+    """正規化済みの請求書データをPDFに描画"""
+    layout = load_layout(layout_name)
+    page_conf = layout['page']
+    table = layout['table']
+    columns = table['columns']
+    row_height = table['row_height']
+    left = columns[0]['x']
+    right = columns[-1]['x'] + columns[-1]['width']
+
+    items = payload['items']
+    chunks = [items[:table['rows_first_page']]]
+    rest = items[table['rows_first_page']:]
+    while rest:
+        chunks.append(rest[:table['rows_per_page']])
+        rest = rest[table['rows_per_page']:]
+
+    pages = []
+    for page_index, chunk in enumerate(chunks):
+        page = PDFPage(page_conf['width'], page_conf['height'])
+        pages.append(page)
+
+        if page_index == 0:
+            title = layout['title']
+            page.text(title['x'], title['y'], title['text'], title['size'], title['align'])
+
+            client = layout['client']
+            page.text(client['x'], client['y'], payload['client_name'] + client['suffix'], client['size'])
+            page.line(client['x'], client['y'] - 4, client['x'] + 300, client['y'] - 4, 0.8)
+            page.text(client['x'], client['y'] - 18, payload['client_address'], client['address_size'])
+
+            for field in layout['fields']:
+                page.text(field['x'], field['y'], f"{field['label']}：{payload[field['key']]}", field['size'])
+
+            issuer = layout['issuer']
+            block = layout['issuer_block']
+            page.text(block['x'], block['y'], issuer['name'], block['size'])
+            for i, line in enumerate(issuer['lines'], 1):
+                page.text(block['x'], block['y'] - i * (block['line_size'] + 4), line, block['line_size'])
+
+            box = layout['total_box']
+            page.rect(box['x'], box['y'], box['width'], box['height'], 1.0, fill_gray=0.93)
+            page.text(box['x'] + 8, box['y'] + 10, box['label'], 10)
+            page.text(box['x'] + box['width'] - 8, box['y'] + 8, f"¥{payload['total_amount']}", box['size'], 'right')
+            top = table['top']
+        else:
+            top = table['continued_top']
+            page.text(left, top + 24, f"{payload['invoice_number']}（続き）", 9)
+
+        # 明細ヘッダー
+        page.rect(left, top - row_height, right - left, row_height, 0.5, fill_gray=0.88)
+        for column in columns:
+            page.text(column['x'] + column['width'] / 2, top - row_height + 6, column['label'],
+                      table['header_size'], 'center')
+
+        # 明細行
+        y = top - row_height
+        for item in chunk:
+            y -= row_height
+            page.line(left, y, right, y, 0.3)
+            for column in columns:
+                value = item[column['key']]
+                if column['key'] in ('unit_price', 'amount'):
+                    value = f'¥{value}'
+                if column['align'] == 'right':
+                    x = column['x'] + column['width'] - 4
+                elif column['align'] == 'center':
+                    x = column['x'] + column['width'] / 2
+                else:
+                    x = column['x'] + 4
+                page.text(x, y + 6, value, table['size'], column['align'])
+
+        # 最終ページに合計欄
+        if page_index == len(chunks) - 1:
+            total_left = columns[-2]['x']
+            for total in layout['totals']:
+                y -= row_height
+                page.rect(total_left, y, right - total_left, row_height, 0.5)
+                page.text(total_left + 4, y + 6, total['label'], table['size'])
+                page.text(right - 4, y + 6, f"¥{payload[total['key']]}", table['size'], 'right')
+            if payload['notes']:
+                notes = layout['notes']
+                page.text(left, y - 24, f"{notes['label']}：{payload['notes']}", notes['size'])
+
+    footer = layout['footer']
+    for number, page in enumerate(pages, 1):
+        page.text(page_conf['width'] / 2, footer['y'],
+                  footer['text'].format(page=number, pages=len(pages)), footer['size'], 'center')
+
+    return build_pdf(pages, title=f"請求書 {payload['invoice_number']}")
+
+
+class InvoicePDFCache:
+    """コンテンツハッシュをキーにしたPDFのディスクキャッシュ"""
+
+    def __init__(self, root=None):
+        self.root = Path(root or getattr(settings, 'INVOICE_PDF_CACHE_DIR', Path(settings.MEDIA_ROOT) / 'invoices' / 'pdf'))
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / f'{digest}.pdf'
+
+    def exists(self, digest: str) -> bool:
+        return self.path_for(digest).exists()
+
+    def store(self, digest: str, content: bytes) -> Path:
+        return write_cache_file(str(self.root), digest, content)
+
+    def error_path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f'{digest}.error'
+
+    def error(self, digest: str):
+        """バックグラウンド生成に失敗していればその理由（なければ None）"""
+        try:
+            return self.error_path(digest).read_text(encoding='utf-8')
+        except FileNotFoundError:
+            return None
+
+    def record_error(self, digest: str, message: str):
+        """生成の失敗を記録（他のプロセスの状況確認からも見えるようファイルに残す）"""
+        path = self.error_path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(message, encoding='utf-8')
+
+    def clear_error(self, digest: str):
+        self.error_path(digest).unlink(missing_ok=True)
+
+    def get_or_render(self, payload: Dict[str, Any]):
+        """キャッシュ済みならそのパス、未生成なら描画して保存したパスを返す"""
+        digest = payload_digest(payload)
+        path = self.path_for(digest)
+        if not path.exists():
+            path = self.store(digest, render_invoice_pdf(payload))
+        return digest, path
+
+
+def write_cache_file(root: str, digest: str, content: bytes) -> Path:
+    """一時ファイル経由でアトミックに書き込む"""
+    path = Path(root) / digest[:2] / f'{digest}.pdf'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _render_to_cache(root: str, digest: str, payload: Dict[str, Any]) -> str:
+    """ワーカープロセス側の処理（DBアクセスなし）"""
+    path = Path(root) / digest[:2] / f'{digest}.pdf'
+    if not path.exists():
+        write_cache_file(root, digest, render_invoice_pdf(payload))
+    return digest
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """PDF描画用のプロセスプール（プロセス内で共有）"""
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, 'INVOICE_PDF_WORKERS', None) or min(4, os.cpu_count() or 1)
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+    return _executor
+
+
+def _submit(fn, *args):
+    """プロセスプールに投入（ワーカーの異常終了で壊れたプールは作り直して1回だけ再投入）"""
+    global _executor
+    executor = get_executor()
+    try:
+        return executor.submit(fn, *args)
+    except BrokenProcessPool:
+        logger.warning('請求書PDFのプロセスプールが停止していたため作り直します')
+        if _executor is executor:
+            _executor = None
+        return get_executor().submit(fn, *args)
+
+
+def _record_render_result(cache: InvoicePDFCache, invoice_number: str, digest: str, future):
+    """バックグラウンド生成の完了時に、失敗していればログとエラーを記録する"""
+    try:
+        future.result()
+    except Exception as exc:
+        logger.error('請求書PDFの生成に失敗しました: %s', invoice_number, exc_info=exc)
+        cache.record_error(digest, f'{type(exc).__name__}: {exc}')
+
+
+def submit_invoice_batch(invoices, cache: InvoicePDFCache = None) -> List[Dict[str, Any]]:
+    """
+    請求書群のPDF生成をプロセスプールに投入（完了を待たない）
+
+    生成に失敗した請求書は InvoicePDFCache.error() で理由を取得できる（再投入で消える）。
+
+    Returns:
+        請求書ごとの {invoice_id, invoice_number, digest, ready, error} のリスト
+    """
+    cache = cache or InvoicePDFCache()
+    results = []
+    for invoice in invoices:
+        payload = build_invoice_payload(invoice)
+        digest = payload_digest(payload)
+        ready = cache.exists(digest)
+        error = None
+        if not ready:
+            cache.clear_error(digest)
+            try:
+                future = _submit(_render_to_cache, str(cache.root), digest, payload)
+            except Exception as exc:
+                logger.error('請求書PDFの生成を投入できませんでした: %s', invoice.invoice_number, exc_info=exc)
+                error = f'{type(exc).__name__}: {exc}'
+                cache.record_error(digest, error)
+            else:
+                future.add_done_callback(
+                    partial(_record_render_result, cache, invoice.invoice_number, digest)
+                )
+        results.append({
+            'invoice_id': invoice.id,
+            'invoice_number': invoice.invoice_number,
+            'digest': digest,
+            'ready': ready,
+            'error': error,
+        })
+    return results
+
+
+def render_invoice_batch(invoices, cache: InvoicePDFCache = None) -> List[str]:
+    """請求書群のPDFをプロセスプールで生成し、完了まで待つ（管理コマンド用）"""
+    cache = cache or InvoicePDFCache()
+    jobs = []
+    for invoice in invoices:
+        payload = build_invoice_payload(invoice)
+        digest = payload_digest(payload)
+        if not cache.exists(digest):
+            jobs.append((digest, payload))
+
+    if not jobs:
+        return []
+    root = str(cache.root)
+    return list(get_executor().map(
+        _render_to_cache, [root] * len(jobs), [d for d, _ in jobs], [p for _, p in jobs], chunksize=8
+    ))
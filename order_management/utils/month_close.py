@@ -0,0 +1,168 @@
+"""
+月次締めユーティリティ
+締めた月の入金・出金・通帳明細・損益をスナップショットテーブルに固定し、
+以降の表示はスナップショットから行う（元データを後から編集しても過去月は変わらない）
+"""
+import calendar
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from order_management.models import (
+    MonthlyClose, ReceiptSnapshot, PaymentSnapshot, LedgerSnapshot, ProfitLossSnapshot,
+)
+
+
+def fiscal_year_of(year: int, month: int) -> int:
+    """会計年度（4月-3月）を返す"""
+    return year if month >= 4 else year - 1
+
+
+def get_monthly_close(year: int, month: int) -> Optional[MonthlyClose]:
+    """締め済みの月次締めを取得（未締め・締め解除済みは None）"""
+    return MonthlyClose.objects.filter(year=year, month=month, status='closed').first()
+
+
+def get_closed_profit_loss(fiscal_year: int) -> Dict[Tuple[int, int], ProfitLossSnapshot]:
+    """会計年度内の締め済み月の損益スナップショットを (年, 月) をキーに返す"""
+    snapshots = ProfitLossSnapshot.objects.filter(
+        Q(monthly_close__year=fiscal_year, monthly_close__month__gte=4) |
+        Q(monthly_close__year=fiscal_year + 1, monthly_close__month__lte=3),
+        monthly_close__status='closed',
+    )
+    return {
+        (s.monthly_close.year, s.monthly_close.month): s
+        for s in snapshots.select_related('monthly_close')
+    }
+
+
+def _receipt_snapshot(monthly_close, project) -> ReceiptSnapshot:
+    return ReceiptSnapshot(
+        monthly_close=monthly_close,
+        project_id=project.id,
+        management_no=project.management_no,
+        site_name=project.site_name,
+        contractor_name=project.contractor_name or '',
+        order_status=project.order_status or '',
+        estimate_amount=project.estimate_amount or 0,
+        billing_amount=project.billing_amount or 0,
+        payment_due_date=project.payment_due_date,
+        payment_status=project.payment_status or '',
+        work_start_date=project.work_start_date,
+        work_end_date=project.work_end_date,
+    )
+
+
+def _payment_snapshot(monthly_close, subcontract) -> PaymentSnapshot:
+    contractor = subcontract.contractor
+    internal_worker = subcontract.internal_worker
+    return PaymentSnapshot(
+        monthly_close=monthly_close,
+        subcontract_id=subcontract.id,
+        project_id=subcontract.project_id,
+        site_name=subcontract.site_name,
+        worker_type=subcontract.worker_type,
+        contract_amount=subcontract.contract_amount or 0,
+        billed_amount=subcontract.billed_amount or 0,
+        payment_date=subcontract.payment_date,
+        payment_status=subcontract.payment_status,
+        contractor_id=contractor.id if contractor else None,
+        contractor_name=contractor.name if contractor else '',
+        contractor_bank_name=contractor.bank_name if contractor else '',
+        contractor_account_number=contractor.account_number if contractor else '',
+        contractor_account_holder=contractor.account_holder if contractor else '',
+        contractor_payment_cycle=(contractor.payment_cycle or '') if contractor else '',
+        contractor_payment_day=contractor.payment_day if contractor else None,
+        contractor_closing_day=contractor.closing_day if contractor else None,
+        internal_worker_id=internal_worker.id if internal_worker else None,
+        internal_worker_name=internal_worker.name if internal_worker else '',
+    )
+
+
+def _ledger_snapshot(monthly_close, position, row) -> LedgerSnapshot:
+    return LedgerSnapshot(
+        monthly_close=monthly_close,
+        project_id=row['project'].id,
+        date=row['date'],
+        transaction_type=row['type'],
+        site_name=row.get('site_name') or row['project'].site_name,
+        description=row['description'],
+        client=row['client'] or '',
+        amount=row['amount'],
+        status=row['status'],
+        balance=row['balance'],
+        position=position,
+    )
+
+
+def _clear_snapshots(monthly_close):
+    monthly_close.receipts.all().delete()
+    monthly_close.payments.all().delete()
+    monthly_close.ledger_rows.all().delete()
+    ProfitLossSnapshot.objects.filter(monthly_close=monthly_close).delete()
+
+
+@transaction.atomic
+def close_month(year: int, month: int, receipts: Iterable, subcontracts: Iterable,
+                transactions: List[Dict], stats: Dict, profit_loss: Dict,
+                closed_by: str = '') -> MonthlyClose:
+    """
+    月次締めを実行し、渡された集計結果をスナップショットとして保存
+
+    receipts: 入金管理の対象案件、subcontracts: 出金管理の対象外注、
+    transactions: 経理ダッシュボードの通帳明細（表示順）、stats: 同統計、profit_loss: 当月の損益
+
+    Raises:
+        ValueError: 既に締め済み、または月末日をまだ過ぎていない
+    """
+    month_end = date(year, month, calendar.monthrange(year, month)[1])
+    if month_end >= timezone.localdate():
+        raise ValueError(f'{year}年{month}月はまだ終わっていないため締められません（{month_end:%m/%d}の翌日以降に締めてください）。')
+
+    monthly_close, created = MonthlyClose.objects.select_for_update().get_or_create(year=year, month=month)
+    if not created and monthly_close.is_closed:
+        raise ValueError(f'{year}年{month}月は既に締め済みです。')
+
+    _clear_snapshots(monthly_close)
+
+    monthly_close.status = 'closed'
+    monthly_close.receipt_total = stats['total_receipt']
+    monthly_close.receipt_received = stats['receipt_received']
+    monthly_close.receipt_pending = stats['receipt_pending']
+    monthly_close.payment_total = stats['total_payment']
+    monthly_close.payment_paid = stats['payment_paid']
+    monthly_close.payment_pending = stats['payment_pending']
+    monthly_close.closed_by = closed_by
+    monthly_close.closed_at = timezone.now()
+    monthly_close.save()
+
+    ReceiptSnapshot.objects.bulk_create([_receipt_snapshot(monthly_close, p) for p in receipts])
+    PaymentSnapshot.objects.bulk_create([_payment_snapshot(monthly_close, s) for s in subcontracts])
+    LedgerSnapshot.objects.bulk_create([
+        _ledger_snapshot(monthly_close, position, row) for position, row in enumerate(transactions)
+    ])
+    ProfitLossSnapshot.objects.create(
+        monthly_close=monthly_close,
+        **{field: profit_loss.get(field) or 0 for field in ProfitLossSnapshot.PL_FIELDS}
+    )
+    return monthly_close
+
+
+@transaction.atomic
+def reopen_month(year: int, month: int, reopened_by: str = '') -> MonthlyClose:
+    """締めを解除してスナップショットを破棄（以降は元データから再計算して表示）"""
+    monthly_close = MonthlyClose.objects.select_for_update().filter(
+        year=year, month=month, status='closed'
+    ).first()
+    if monthly_close is None:
+        raise ValueError(f'{year}年{month}月は締められていません。')
+
+    _clear_snapshots(monthly_close)
+    monthly_close.status = 'reopened'
+    monthly_close.reopened_by = reopened_by
+    monthly_close.reopened_at = timezone.now()
+    monthly_close.save()
+    return monthly_close
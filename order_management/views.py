@@ -16,6 +16,7 @@ try:
 except ImportError:
     InternalWorker = None
 from .forms import ProjectForm
+from .views_invoice import invoice_pdf_response
 
 
 def dashboard(request):
@@ -1213,6 +1214,9 @@ def get_client_invoice_preview_api(request):
                 'project_count': len(projects)
             }
 
+            if data.get('format') == 'pdf':
+                return invoice_pdf_response(preview_data, f"{preview_invoice_number}.pdf")
+
             return JsonResponse({
                 'success': True,
                 'preview_data': preview_data
@@ -1365,6 +1369,9 @@ def get_invoice_preview_api(request, project_id):
                 'due_date': (today.date() + timedelta(days=30)).strftime('%Y年%m月%d日')
             }
 
+            if request.GET.get('format') == 'pdf':
+                return invoice_pdf_response(preview_data, f"{preview_invoice_number}.pdf")
+
             return JsonResponse({
                 'success': True,
                 'preview_data': preview_data
@@ -1,9 +1,17 @@
-from django.shortcuts import render
+from django.shortcuts import render, redirect
+from django.contrib import messages
+from django.views.decorators.http import require_POST
 from django.views.generic import TemplateView
 from django.db.models import Q, Sum, Count, Case, When, DecimalField
+from django.urls import reverse
 from django.utils import timezone
 from datetime import datetime, timedelta
-from .models import Project, FixedCost, VariableCost
+from .models import Project, FixedCost, VariableCost, MonthlyClose, ProfitLossSnapshot
+from .utils.month_close import (
+    close_month, fiscal_year_of, get_closed_profit_loss, get_monthly_close, reopen_month,
+)
+from .views_payment import PaymentDashboardView
+from .views_receipt import ReceiptDashboardView
 from subcontract_management.models import Subcontract, Contractor, InternalWorker
 import calendar
 from decimal import Decimal
@@ -25,6 +33,43 @@ class AccountingDashboardView(TemplateView):
         start_date = datetime(year, month, 1).date()
         end_date = datetime(year, month, calendar.monthrange(year, month)[1]).date()
 
+        # 締め済みの月はスナップショットから表示
+        monthly_close = get_monthly_close(year, month)
+        if monthly_close:
+            month_data = self.get_closed_month_data(monthly_close)
+        else:
+            month_data = self.get_month_data(start_date, end_date)
+
+        # ビュータイプの選択肢
+        view_type_choices = [
+            ('summary', 'サマリー表示'),
+            ('ledger', '通帳表示'),
+        ]
+
+        # === 年間業績データ ===
+        annual_performance = self.get_annual_performance(year)
+
+        context.update({
+            'year': year,
+            'month': month,
+            'month_name': calendar.month_name[month],
+            'view_type': view_type,
+            'view_type_choices': view_type_choices,
+            'receipt_projects': month_data['receipt_projects'],
+            'payment_subcontracts': month_data['payment_subcontracts'],
+            'transactions': month_data['transactions'],
+            'stats': month_data['stats'],
+            'start_date': start_date,
+            'end_date': end_date,
+            'annual_performance': annual_performance,
+            'monthly_close': monthly_close,
+            'last_close': MonthlyClose.objects.filter(year=year, month=month).first(),
+        })
+
+        return context
+
+    def get_month_data(self, start_date, end_date):
+        """対象月の入金・出金・通帳明細・統計を元データから算出"""
         # === 入金データ（入金ベース） ===
         receipt_projects = Project.objects.filter(
             Q(payment_due_date__range=[start_date, end_date]) |
@@ -70,6 +115,7 @@ class AccountingDashboardView(TemplateView):
             if amount > 0:
                 transactions.append({
                     'date': project.payment_due_date or project.contract_date or start_date,
+                    'site_name': project.site_name,
                     'description': f'入金: {project.site_name}',
                     'client': project.contractor_name,
                     'type': 'receipt',
@@ -85,6 +131,7 @@ class AccountingDashboardView(TemplateView):
                 payee = subcontract.contractor.name if subcontract.contractor else subcontract.internal_worker.name
                 transactions.append({
                     'date': subcontract.payment_date or start_date,
+                    'site_name': subcontract.site_name,
                     'description': f'出金: {subcontract.site_name}',
                     'client': payee,
                     'type': 'payment',
@@ -122,31 +169,22 @@ class AccountingDashboardView(TemplateView):
             'projected_cashflow': receipt_total - payment_total,  # 予想キャッシュフロー
         }
 
-        # ビュータイプの選択肢
-        view_type_choices = [
-            ('summary', 'サマリー表示'),
-            ('ledger', '通帳表示'),
-        ]
-
-        # === 年間業績データ ===
-        annual_performance = self.get_annual_performance(year)
-
-        context.update({
-            'year': year,
-            'month': month,
-            'month_name': calendar.month_name[month],
-            'view_type': view_type,
-            'view_type_choices': view_type_choices,
+        return {
             'receipt_projects': receipt_projects,
             'payment_subcontracts': payment_subcontracts,
             'transactions': transactions,
             'stats': stats,
-            'start_date': start_date,
-            'end_date': end_date,
-            'annual_performance': annual_performance,
-        })
+        }
 
-        return context
+    def get_closed_month_data(self, monthly_close):
+        """締め済みの月の入金・出金・通帳明細・統計をスナップショットから取得"""
+        ledger_rows = list(monthly_close.ledger_rows.all())
+        return {
+            'receipt_projects': [row.as_project() for row in ledger_rows if row.transaction_type == 'receipt'],
+            'payment_subcontracts': [row.as_subcontract() for row in ledger_rows if row.transaction_type == 'payment'],
+            'transactions': [row.as_transaction() for row in ledger_rows],
+            'stats': monthly_close.get_stats(),
+        }
 
     def get_annual_performance(self, year):
         """年間業績データを計算"""
@@ -181,7 +219,8 @@ class AccountingDashboardView(TemplateView):
                 'fixed_costs': Decimal('0'),       # 固定費
                 'operating_profit': Decimal('0'),  # 営業利益
                 'is_actual': False,                # 実績かどうか
-                'is_current': False                # 今月かどうか
+                'is_current': False,               # 今月かどうか
+                'is_closed': False                 # 月次締め済みかどうか
             }
 
         # 実績データと今月フラグの設定
@@ -192,6 +231,17 @@ class AccountingDashboardView(TemplateView):
             if data['year'] == current_year and data['month'] == current_month:
                 data['is_current'] = True
 
+        # 締め済みの月は損益スナップショットの値を使い、元データからは再計算しない
+        closed_profit_loss = get_closed_profit_loss(year)
+        closed_indexes = set()
+        for i, data in monthly_data.items():
+            snapshot = closed_profit_loss.get((data['year'], data['month']))
+            if snapshot:
+                for field in ProfitLossSnapshot.PL_FIELDS:
+                    data[field] = getattr(snapshot, field)
+                data['is_closed'] = True
+                closed_indexes.add(i)
+
         # === 売上高・売上原価の計算 ===
         # 受注済みプロジェクトから売上を計算
         revenue_projects = Project.objects.filter(
@@ -206,7 +256,7 @@ class AccountingDashboardView(TemplateView):
                 continue
 
             month_index = self.get_fiscal_month_index(revenue_date, year)
-            if month_index is not None:
+            if month_index is not None and month_index not in closed_indexes:
                 # 売上高
                 revenue = project.billing_amount or Decimal('0')
                 monthly_data[month_index]['revenue'] += revenue
@@ -229,11 +279,13 @@ class AccountingDashboardView(TemplateView):
 
         for cost in variable_costs:
             month_index = self.get_fiscal_month_index(cost.incurred_date, year)
-            if month_index is not None:
+            if month_index is not None and month_index not in closed_indexes:
                 monthly_data[month_index]['sales_expense'] += cost.amount
 
         # === 固定費の計算 ===
         for i, data in monthly_data.items():
+            if i in closed_indexes:
+                continue
             target_year = data['year']
             target_month = data['month']
 
@@ -248,6 +300,8 @@ class AccountingDashboardView(TemplateView):
 
         # === 損益計算 ===
         for i, data in monthly_data.items():
+            if i in closed_indexes:
+                continue
             data['gross_profit'] = data['revenue'] - data['cost_of_sales']
             data['operating_profit'] = data['gross_profit'] - data['sales_expense'] - data['fixed_costs']
 
@@ -301,4 +355,53 @@ class AccountingDashboardView(TemplateView):
             if date.year == fiscal_year + 1:
                 return date.month + 8
 
-        return None
\ No newline at end of file
+        return None
+
+
+@require_POST
+def monthly_close_action(request):
+    """
+    月次締め／締め解除
+
+    締め: 入金管理・出金管理・経理ダッシュボード・損益の当月分をスナップショットに保存
+    締め解除: スナップショットを破棄し、元データからの再計算に戻す
+    """
+    try:
+        year = int(request.POST.get('year'))
+        month = int(request.POST.get('month'))
+        datetime(year, month, 1)
+    except (TypeError, ValueError):
+        messages.error(request, '対象月が正しくありません。')
+        return redirect('order_management:accounting_dashboard')
+
+    action = request.POST.get('action', 'close')
+    username = request.user.username if request.user.is_authenticated else 'system'
+
+    try:
+        if action == 'reopen':
+            reopen_month(year, month, reopened_by=username)
+            messages.success(request, f'{year}年{month}月の締めを解除しました。')
+        else:
+            start_date = datetime(year, month, 1).date()
+            end_date = datetime(year, month, calendar.monthrange(year, month)[1]).date()
+            accounting = AccountingDashboardView()
+            month_data = accounting.get_month_data(start_date, end_date)
+            fiscal_year = fiscal_year_of(year, month)
+            profit_loss = accounting.get_annual_performance(fiscal_year)['monthly_data'][
+                accounting.get_fiscal_month_index(start_date, fiscal_year)
+            ]
+
+            close_month(
+                year, month,
+                receipts=ReceiptDashboardView.get_month_queryset(start_date, end_date),
+                subcontracts=PaymentDashboardView.get_month_queryset(start_date, end_date),
+                transactions=month_data['transactions'],
+                stats=month_data['stats'],
+                profit_loss=profit_loss,
+                closed_by=username,
+            )
+            messages.success(request, f'{year}年{month}月を締めました。以降はこの時点の内容で表示されます。')
+    except ValueError as e:
+        messages.error(request, str(e))
+
+    return redirect(f"{reverse('order_management:accounting_dashboard')}?year={year}&month={month}")
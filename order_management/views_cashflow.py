@@ -0,0 +1,110 @@
+"""資金繰り予測関連のビュー"""
+import json
+from datetime import datetime
+
+from django.http import JsonResponse
+from django.views.generic import TemplateView
+from django.utils import timezone
+
+from .utils.cashflow import CashflowForecast
+
+
+def _parse_int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_adjustments(items):
+    """
+    JSONボディの臨時の入出金 [{"date", "amount"}, ...] を取り出す
+
+    Raises:
+        ValueError: リストでない、または要素がオブジェクトでない
+    """
+    if items is None:
+        return []
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValueError('adjustments は {"date", "amount"} のリストで指定してください')
+
+    adjustments = []
+    for item in items:
+        adjustment_date = _parse_date(item.get('date'))
+        if adjustment_date:
+            adjustments.append({'date': adjustment_date, 'amount': _parse_int(item.get('amount'))})
+    return adjustments
+
+
+def _forecast_params(data, adjustments=None):
+    """GETパラメータ／JSONボディから予測条件を取り出す（臨時の入出金は JSON ボディのみ）"""
+    return {
+        'start_date': _parse_date(data.get('start_date')) or timezone.localdate(),
+        'months': _parse_int(data.get('months'), 3),
+        'opening_balance': _parse_int(data.get('opening_balance')),
+        'receipt_delay_days': _parse_int(data.get('receipt_delay_days')),
+        'payment_delay_days': _parse_int(data.get('payment_delay_days')),
+        'adjustments': adjustments or [],
+    }
+
+
+def _run_forecast(params):
+    forecast = CashflowForecast(params['start_date'], params['months'])
+    return forecast.compute(
+        opening_balance=params['opening_balance'],
+        receipt_delay_days=params['receipt_delay_days'],
+        payment_delay_days=params['payment_delay_days'],
+        adjustments=params['adjustments'],
+    )
+
+
+class CashflowForecastView(TemplateView):
+    template_name = 'order_management/cashflow_forecast.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        params = _forecast_params(self.request.GET)
+        result = _run_forecast(params)
+
+        context.update({
+            'params': params,
+            'summary': result['summary'],
+            'forecast_json': json.dumps(result),
+            'month_options': [1, 3, 6, 12],
+        })
+        return context
+
+
+def cashflow_forecast_api(request):
+    """
+    資金繰り予測API（what-if 再計算用）
+
+    GET: start_date, months, opening_balance, receipt_delay_days, payment_delay_days
+    POST: 上記に加えて adjustments=[{"date": "2025-10-31", "amount": -500000}, ...]
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body or '{}')
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+        try:
+            adjustments = _parse_adjustments(data.get('adjustments'))
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    elif request.method == 'GET':
+        data = request.GET
+        adjustments = None
+    else:
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    result = _run_forecast(_forecast_params(data, adjustments))
+    return JsonResponse({'success': True, **result})
@@ -0,0 +1,119 @@
+"""請求書PDF関連のビュー"""
+import json
+import calendar
+from datetime import datetime
+
+from django.http import JsonResponse, FileResponse, HttpResponseNotModified
+from django.shortcuts import get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+
+from .models import Invoice
+from .utils.invoice_pdf import (
+    InvoicePDFCache, build_invoice_payload, normalize_payload, payload_digest,
+    render_invoice_pdf, submit_invoice_batch,
+)
+
+
+def invoice_pdf_response(preview_data, filename):
+    """プレビューデータからPDFレスポンスを作成（ディスクキャッシュ経由）"""
+    digest, path = InvoicePDFCache().get_or_render(normalize_payload(preview_data))
+    response = FileResponse(open(path, 'rb'), content_type='application/pdf', filename=filename)
+    response['ETag'] = f'"{digest}"'
+    return response
+
+
+def invoice_pdf(request, invoice_id):
+    """請求書PDFダウンロード"""
+    invoice = get_object_or_404(Invoice.objects.prefetch_related('items'), pk=invoice_id)
+    payload = build_invoice_payload(invoice)
+    digest = payload_digest(payload)
+
+    # 内容が変わらなければハッシュも変わらないため、ETag で再送を省略
+    if request.headers.get('If-None-Match') == f'"{digest}"':
+        return HttpResponseNotModified()
+
+    cache = InvoicePDFCache()
+    path = cache.path_for(digest)
+    if not path.exists():
+        path = cache.store(digest, render_invoice_pdf(payload))
+
+    response = FileResponse(
+        open(path, 'rb'),
+        content_type='application/pdf',
+        as_attachment=request.GET.get('download') == '1',
+        filename=f'{invoice.invoice_number}.pdf',
+    )
+    response['ETag'] = f'"{digest}"'
+    response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    return response
+
+
+@csrf_exempt
+def invoice_pdf_batch_api(request):
+    """
+    請求書PDFの一括生成API
+
+    POST: {"invoice_ids": [...]} または {"year": 2025, "month": 9} を受け取り、
+          未生成分をプロセスプールに投入して即座に 202 を返す。
+    GET:  ?invoice_ids=1,2,3 で生成状況を返す（生成に失敗した請求書は error に理由が入る）。
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body or '{}')
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+        invoices = Invoice.objects.prefetch_related('items')
+        try:
+            if data.get('invoice_ids'):
+                invoice_ids = data['invoice_ids']
+                if not isinstance(invoice_ids, list) or not all(
+                    isinstance(i, int) and not isinstance(i, bool) for i in invoice_ids
+                ):
+                    raise ValueError('invoice_ids は整数のリストで指定してください')
+                invoices = invoices.filter(id__in=invoice_ids)
+            elif data.get('year') and data.get('month'):
+                year, month = int(data['year']), int(data['month'])
+                if not 1 <= month <= 12:
+                    raise ValueError('month は 1〜12 で指定してください')
+                start_date = datetime(year, month, 1).date()
+                end_date = datetime(year, month, calendar.monthrange(year, month)[1]).date()
+                invoices = invoices.filter(issue_date__range=[start_date, end_date])
+            else:
+                return JsonResponse({'success': False, 'error': 'invoice_ids または year/month を指定してください'}, status=400)
+        except (ValueError, TypeError) as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+        results = submit_invoice_batch(invoices.exclude(status='cancelled'))
+        return JsonResponse({
+            'success': True,
+            'invoice_count': len(results),
+            'ready_count': sum(1 for r in results if r['ready']),
+            'failed_count': sum(1 for r in results if r['error']),
+            'invoices': results,
+        }, status=202)
+
+    if request.method == 'GET':
+        ids = [int(i) for i in request.GET.get('invoice_ids', '').split(',') if i.strip().isdigit()]
+        cache = InvoicePDFCache()
+        results = []
+        for invoice in Invoice.objects.filter(id__in=ids).prefetch_related('items'):
+            digest = payload_digest(build_invoice_payload(invoice))
+            ready = cache.exists(digest)
+            results.append({
+                'invoice_id': invoice.id,
+                'invoice_number': invoice.invoice_number,
+                'digest': digest,
+                'ready': ready,
+                'error': None if ready else cache.error(digest),
+            })
+        return JsonResponse({
+            'success': True,
+            'invoice_count': len(results),
+            'ready_count': sum(1 for r in results if r['ready']),
+            'failed_count': sum(1 for r in results if r['error']),
+            'invoices': results,
+        })
+
+    return JsonResponse({'error': 'Invalid request method'}, status=405)
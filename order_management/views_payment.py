@@ -1,4 +1,5 @@
-from django.shortcuts import render
+from django.shortcuts import render, redirect
+from django.contrib import messages
 from django.views.generic import TemplateView
 from django.db.models import Q, Sum, Count, Case, When, DecimalField
 from django.utils import timezone
@@ -6,6 +7,8 @@ from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from .models import Project
 from subcontract_management.models import Subcontract, Contractor, InternalWorker
+from .utils.bank_transfer import ZenginTransferBatch
+from .utils.month_close import get_monthly_close
 import calendar
 
 
@@ -116,11 +119,15 @@ class PaymentDashboardView(TemplateView):
             start_date = datetime(year, month, 1).date()
             end_date = datetime(year, month, calendar.monthrange(year, month)[1]).date()
 
-        # 出金ベース：Subcontractから支払い対象を取得
-        base_query = Subcontract.objects.filter(
-            Q(payment_date__range=[start_date, end_date]) |
-            Q(billed_amount__gt=0)  # テスト用：請求額があるものを表示
-        ).select_related('project', 'contractor', 'internal_worker')
+        # 締め済みの月（月別表示）はスナップショットから表示
+        # スナップショットは発注先情報を contractor_xxx として平坦に保持しているため、参照名の接頭辞を切り替える
+        monthly_close = get_monthly_close(year, month) if date_filter_type == 'month' else None
+        if monthly_close:
+            base_query = monthly_close.payments.all()
+            contractor_prefix, worker_prefix = 'contractor_', 'internal_worker_'
+        else:
+            base_query = self.get_month_queryset(start_date, end_date)
+            contractor_prefix, worker_prefix = 'contractor__', 'internal_worker__'
 
         # 支払い状況による絞り込み
         if status_filter != 'all':
@@ -158,29 +165,35 @@ class PaymentDashboardView(TemplateView):
 
         # 支払いサイクルフィルター
         if payment_cycle_filter != 'all':
-            base_query = base_query.filter(contractor__payment_cycle=payment_cycle_filter)
+            base_query = base_query.filter(**{f'{contractor_prefix}payment_cycle': payment_cycle_filter})
 
         # 作業者タイプフィルター
         if worker_type_filter != 'all':
             base_query = base_query.filter(worker_type=worker_type_filter)
 
         # 銀行情報有無フィルター
+        bank_name = f'{contractor_prefix}bank_name'
+        account_number = f'{contractor_prefix}account_number'
         if has_bank_info == 'yes':
-            base_query = base_query.filter(
-                contractor__bank_name__isnull=False,
-                contractor__account_number__isnull=False
-            ).exclude(
-                Q(contractor__bank_name='') | Q(contractor__account_number='')
+            base_query = base_query.filter(**{
+                f'{bank_name}__isnull': False,
+                f'{account_number}__isnull': False,
+            }).exclude(
+                Q(**{bank_name: ''}) | Q(**{account_number: ''})
             )
         elif has_bank_info == 'no':
             base_query = base_query.filter(
-                Q(contractor__bank_name__isnull=True) |
-                Q(contractor__account_number__isnull=True) |
-                Q(contractor__bank_name='') |
-                Q(contractor__account_number='')
+                Q(**{f'{bank_name}__isnull': True}) |
+                Q(**{f'{account_number}__isnull': True}) |
+                Q(**{bank_name: ''}) |
+                Q(**{account_number: ''})
             )
 
-        payment_subcontracts = base_query.order_by('contractor__name', 'internal_worker__name', 'payment_date')
+        payment_subcontracts = base_query.order_by(f'{contractor_prefix}name', f'{worker_prefix}name', 'payment_date')
+        if monthly_close:
+            rows = list(payment_subcontracts)
+            projects = Project.objects.in_bulk({row.project_id for row in rows})
+            payment_subcontracts = [row.as_subcontract(projects.get(row.project_id)) for row in rows]
 
         # 出金先別の集計データ
         payee_summary = {}
@@ -326,7 +339,7 @@ class PaymentDashboardView(TemplateView):
         # 統計情報（出金ベース）
         stats = {
             'total_payees': len(payee_summary),
-            'total_subcontracts': payment_subcontracts.count(),
+            'total_subcontracts': len(payment_subcontracts),
             'total_outflow': monthly_outflow_stats['total_outflow'],
             'scheduled_amount': monthly_outflow_stats['scheduled_amount'],
             'executed_amount': monthly_outflow_stats['executed_amount'],
@@ -411,6 +424,36 @@ class PaymentDashboardView(TemplateView):
             'date_filter_type_choices': date_filter_type_choices,
             'date_start': date_start,
             'date_end': date_end,
+            'monthly_close': monthly_close,
         })
 
-        return context
\ No newline at end of file
+        return context
+
+    @staticmethod
+    def get_month_queryset(start_date, end_date):
+        """出金ベース：Subcontractから支払い対象を取得"""
+        return Subcontract.objects.filter(
+            Q(payment_date__range=[start_date, end_date]) |
+            Q(billed_amount__gt=0)  # テスト用：請求額があるものを表示
+        ).select_related('project', 'contractor', 'internal_worker')
+
+
+def zengin_transfer_file(request):
+    """
+    総合振込ファイル（全銀協フォーマット）ダウンロード
+
+    支払日（pay_date=YYYY-MM-DD、省略時は今日）までの未払い外注費を
+    振込先口座ごとにまとめてストリーミング出力する。
+    """
+    pay_date_param = request.GET.get('pay_date', '')
+    try:
+        pay_date = datetime.strptime(pay_date_param, '%Y-%m-%d').date() if pay_date_param else timezone.now().date()
+    except ValueError:
+        messages.error(request, '支払日の形式が正しくありません。')
+        return redirect('order_management:payment_dashboard')
+
+    try:
+        return ZenginTransferBatch(pay_date).streaming_response()
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('order_management:payment_dashboard')
@@ -1,9 +1,17 @@
-from django.shortcuts import render
+from django.shortcuts import render, redirect
+from django.contrib import messages
+from django.views.decorators.http import require_POST
 from django.views.generic import TemplateView
 from django.db.models import Q, Sum, Count, Case, When, DecimalField
 from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
 from datetime import datetime, timedelta
-from .models import Project
+from .models import Project, BankStatementLine
+from .forms import BankStatementImportForm
+from .utils.bank_statement import (
+    import_bank_statement, confirm_suggested_receipt, reject_suggested_receipt,
+)
+from .utils.month_close import get_monthly_close
 import calendar
 
 
@@ -23,33 +31,30 @@ class ReceiptDashboardView(TemplateView):
         start_date = datetime(year, month, 1).date()
         end_date = datetime(year, month, calendar.monthrange(year, month)[1]).date()
 
-        # 入金ベース：今月入金予定の案件のみ
-        base_query = Project.objects.filter(
-            payment_due_date__gte=start_date,
-            payment_due_date__lte=end_date,
-            estimate_amount__gt=0
-        ).exclude(
-            contractor_name__isnull=True
-        ).exclude(
-            contractor_name=''
-        )
+        # 締め済みの月はスナップショットから表示（フィールド名は案件と共通）
+        monthly_close = get_monthly_close(year, month)
+        if monthly_close:
+            base_query = monthly_close.receipts.all()
+        else:
+            base_query = self.get_month_queryset(start_date, end_date)
 
         # 入金状況による絞り込み
         if status_filter == 'received':
-            # 入金済み（工事完了済み案件と仮定）
-            base_query = base_query.filter(work_end_completed=True)
+            # 入金済み（入金明細で消込済みの案件）
+            base_query = base_query.filter(payment_status='executed')
         elif status_filter == 'pending':
-            # 入金待ち（未完了案件）
-            base_query = base_query.filter(work_end_completed=False)
+            # 入金待ち（未消込案件）
+            base_query = base_query.exclude(payment_status='executed')
         elif status_filter == 'overdue':
             # 遅延（入金予定日を過ぎている案件）
             today = timezone.now().date()
             base_query = base_query.filter(
-                payment_due_date__lt=today,
-                work_end_completed=False
-            )
+                payment_due_date__lt=today
+            ).exclude(payment_status='executed')
 
         receipt_projects = base_query.order_by('contractor_name', 'payment_due_date')
+        if monthly_close:
+            receipt_projects = [row.as_project() for row in receipt_projects]
 
         # 発注元別の集計データ
         client_summary = {}
@@ -84,8 +89,8 @@ class ReceiptDashboardView(TemplateView):
 
             # 入金状況別の集計
             today = timezone.now().date()
-            if project.work_end_completed:
-                # 工事完了済み = 入金済みと仮定
+            if project.payment_status == 'executed':
+                # 入金明細で消込済み = 入金済み
                 client_summary[client_name]['received_amount'] += amount
                 monthly_receipt_stats['received_amount'] += amount
             elif project.payment_due_date and project.payment_due_date < today:
@@ -102,7 +107,7 @@ class ReceiptDashboardView(TemplateView):
         # 統計情報（入金ベース）
         stats = {
             'total_clients': len(client_summary),
-            'total_projects': receipt_projects.count(),
+            'total_projects': len(receipt_projects),
             'total_receipt': monthly_receipt_stats['total_receipt'],
             'pending_amount': monthly_receipt_stats['pending_amount'],
             'received_amount': monthly_receipt_stats['received_amount'],
@@ -128,6 +133,76 @@ class ReceiptDashboardView(TemplateView):
             'stats': stats,
             'start_date': start_date,
             'end_date': end_date,
+            'statement_form': BankStatementImportForm(),
+            'review_lines': BankStatementLine.objects.filter(
+                match_status='needs_review'
+            ).select_related('suggested_project')[:50],
+            'monthly_close': monthly_close,
         })
 
-        return context
\ No newline at end of file
+        return context
+
+    @staticmethod
+    def get_month_queryset(start_date, end_date):
+        """入金ベース：対象月に入金予定の案件のみ"""
+        return Project.objects.filter(
+            payment_due_date__gte=start_date,
+            payment_due_date__lte=end_date,
+            estimate_amount__gt=0
+        ).exclude(
+            contractor_name__isnull=True
+        ).exclude(
+            contractor_name=''
+        )
+
+
+@require_POST
+def bank_statement_import(request):
+    """入出金明細を取り込んで入金消込を実行"""
+    form = BankStatementImportForm(request.POST, request.FILES)
+    redirect_url = request.POST.get('next', '')
+    if not url_has_allowed_host_and_scheme(redirect_url, allowed_hosts={request.get_host()}):
+        redirect_url = 'order_management:receipt_dashboard'
+
+    if not form.is_valid():
+        messages.error(request, '明細ファイルを選択してください。')
+        return redirect(redirect_url)
+
+    try:
+        statement, result = import_bank_statement(
+            form.cleaned_data['statement_file'],
+            file_format=form.cleaned_data['file_format'],
+            imported_by=request.user.username if request.user.is_authenticated else 'system',
+            window_days=form.cleaned_data['window_days'],
+        )
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect(redirect_url)
+
+    duplicates = f"・取込済み {statement.duplicate_count}件を除外" if statement.duplicate_count else ''
+    messages.success(
+        request,
+        f"{statement.line_count}件の入金明細を取り込みました{duplicates}"
+        f"（消込 {result['matched']}件 / 要確認 {result['needs_review']}件 / "
+        f"候補複数 {result['ambiguous']}件 / 未消込 {result['unmatched']}件）"
+    )
+    return redirect(redirect_url)
+
+
+@require_POST
+def bank_statement_review(request, line_id):
+    """要確認の入金明細を候補の案件で消込む（action=confirm）か候補を取り消す（action=reject）"""
+    redirect_url = request.POST.get('next', '')
+    if not url_has_allowed_host_and_scheme(redirect_url, allowed_hosts={request.get_host()}):
+        redirect_url = 'order_management:receipt_dashboard'
+
+    try:
+        if request.POST.get('action') == 'confirm':
+            line = confirm_suggested_receipt(line_id)
+            messages.success(request, f"入金 ¥{line.amount:,} を消込みました。")
+        else:
+            reject_suggested_receipt(line_id)
+            messages.info(request, '消込候補を取り消しました。')
+    except ValueError as e:
+        messages.error(request, str(e))
+    return redirect(redirect_url)
@@ -256,15 +256,39 @@ class SurveyReportAdmin(admin.ModelAdmin):
 
 @admin.register(SurveyPhoto)
 class SurveyPhotoAdmin(admin.ModelAdmin):
-    list_display = ["survey_report", "location", "description", "created_at"]
-    list_filter = ["location", "created_at", "is_before"]
+    list_display = [
+        "survey_report",
+        "location",
+        "description",
+        "processing_status",
+        "created_at",
+    ]
+    list_filter = ["location", "processing_status", "created_at", "is_before"]
     search_fields = ["survey_report__survey__project__title", "description"]
-    readonly_fields = ["created_at"]
+    readonly_fields = [
+        "processing_status",
+        "renditions",
+        "processing_error",
+        "processed_at",
+        "created_at",
+    ]
 
     fieldsets = (
         ("基本情報", {"fields": ("survey_report", "photo", "location", "is_before")}),
         ("詳細", {"fields": ("description", "upload_order")}),
         ("位置情報", {"fields": ("latitude", "longitude"), "classes": ("collapse",)}),
+        (
+            "縮小版",
+            {
+                "fields": (
+                    "processing_status",
+                    "renditions",
+                    "processing_error",
+                    "processed_at",
+                ),
+                "classes": ("collapse",),
+            },
+        ),
         ("システム情報", {"fields": ("created_at",), "classes": ("collapse",)}),
     )
 
@@ -0,0 +1,242 @@
+"""
+住所エリアの正規化インデックス
+
+案件の住所・職人の対応エリアから都道府県・市区町村・区のトークンを保存時に1度だけ抽出し、
+正規化キーで一意な AreaToken と多対多で紐づける。
+エリアの一致判定はトークンIDの集合の共通部分、職人のエリア検索は紐づけテーブルの索引で行う。
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+from django.apps import apps as global_apps
+from django.db.models import Q
+
+
+# 旧字体・異体字 → 新字体（住所表記で揺れやすいもの）
+ITAIJI_TABLE = str.maketrans(
+    {
+        "澤": "沢",
+        "邊": "辺",
+        "邉": "辺",
+        "嶋": "島",
+        "嶌": "島",
+        "﨑": "崎",
+        "嵜": "崎",
+        "濱": "浜",
+        "櫻": "桜",
+        "龍": "竜",
+        "舘": "館",
+        "德": "徳",
+        "廣": "広",
+        "國": "国",
+        "會": "会",
+        "藏": "蔵",
+        "齋": "斎",
+        "齊": "斉",
+        "驛": "駅",
+        "鐵": "鉄",
+        "ヶ": "が",
+        "ヵ": "か",
+    }
+)
+
+# 漢字に挟まれた「ケ」「け」は「ヶ」の表記揺れ（霞ケ関・霞ヶ関・霞が関）
+SMALL_KE_PATTERN = re.compile(r"(?<=[一-鿿])[ケけ](?=[一-鿿])")
+
+# 市名の途中にも「市」を含む市（最初の「市」で切ると「四日市」になる）
+CITY_NAMES_WITH_SHI = ("四日市市", "廿日市市", "野々市市")
+
+# 市名の途中に「郡」を含む市（郡として読むと「山市」が残る）
+CITY_NAMES_WITH_GUN = ("大和郡山市",)
+
+# 都道府県 → (郡) → 市町村 → 区 の順に先頭から読む（いずれも省略可）
+# 郡の後は町・村だけを読み、「余市郡余市町」を「余市」で切らない
+# 郡がなければ市は町・村より優先して探し、「大町市」「東村山市」を途中の町・村で切らない
+# （「郡山市」のように郡で始まる市もここで読む）
+ADDRESS_PATTERN = re.compile(
+    r"(?P<prefecture>北海道|東京都|京都府|大阪府|[^\d\s都道府県]{2,4}県)?"
+    rf"(?:(?!{'|'.join(CITY_NAMES_WITH_GUN)})(?P<county>[^\d\s県区郡]{{1,5}}?郡))?"
+    r"(?P<city>(?(county)[^\d\s県区郡]{1,7}?[町村]"
+    rf"|(?:{'|'.join(CITY_NAMES_WITH_SHI)}"
+    r"|[^\d\s県区]{1,7}?市|[^\d\s県区]{1,7}?[町村])))?"
+    r"(?P<ward>[^\d\s県区郡]{1,5}?区)?"
+)
+
+AREA_SEPARATOR_PATTERN = re.compile(r"[,、，/／\n]")
+
+
+def normalize_area_name(text):
+    """
+    エリア名を照合用のキーに正規化
+
+    全角・半角（NFKC）、旧字体、ヶ/ケ/が の揺れを吸収し、カタカナはひらがなに揃える。
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    text = re.sub(r"\s+", "", text).translate(ITAIJI_TABLE)
+    text = SMALL_KE_PATTERN.sub("が", text)
+    return "".join(
+        chr(ord(char) - 0x60) if "ァ" <= char <= "ヶ" else char for char in text
+    )
+
+
+@lru_cache(maxsize=4096)
+def parse_area_tokens(address):
+    """
+    住所から (正規化キー, 表示名, レベル) のタプルを抽出
+
+    政令指定都市の区は市名と結合して「横浜市中区」のように1トークンにする
+    （東京23区は区のみ）。
+    """
+    text = re.sub(r"\s+", "", unicodedata.normalize("NFKC", address or ""))
+    match = ADDRESS_PATTERN.match(text)
+    prefecture, city, ward = match.group("prefecture", "city", "ward")
+
+    names = []
+    if prefecture:
+        names.append((prefecture, "prefecture"))
+    if city:
+        names.append((city, "city"))
+    if ward:
+        names.append((f"{city or ''}{ward}", "ward"))
+
+    return tuple((normalize_area_name(name), name, level) for name, level in names)
+
+
+@lru_cache(maxsize=1024)
+def parse_coverage_areas(coverage_areas):
+    """
+    カンマ区切りの対応エリアからトークンを抽出
+
+    住所として読めない項目（「都内」など）はそのまま「その他」のトークンにする。
+    """
+    tokens = {}
+    for area in AREA_SEPARATOR_PATTERN.split(coverage_areas or ""):
+        area = area.strip()
+        if not area:
+            continue
+        parsed = parse_area_tokens(area) or (
+            (normalize_area_name(area), area, "other"),
+        )
+        for token in parsed:
+            tokens.setdefault(token[0], token)
+    return tuple(tokens.values())
+
+
+def get_or_create_token_ids(tokens, token_model=None):
+    """トークンを AreaToken に登録し、IDのリストを返す（既存はまとめて取得）"""
+    if token_model is None:
+        token_model = global_apps.get_model("projects", "AreaToken")
+    if not tokens:
+        return []
+
+    keys = [key for key, _, _ in tokens]
+    existing = dict(
+        token_model.objects.filter(key__in=keys).values_list("key", "id")
+    )
+    missing = [
+        token_model(key=key, name=name, level=level)
+        for key, name, level in tokens
+        if key not in existing
+    ]
+    if missing:
+        token_model.objects.bulk_create(missing, ignore_conflicts=True)
+        existing = dict(
+            token_model.objects.filter(key__in=keys).values_list("key", "id")
+        )
+    return [existing[key] for key in keys]
+
+
+def sync_project_areas(project):
+    """案件の住所からエリアトークンを作り直す"""
+    token_ids = get_or_create_token_ids(parse_area_tokens(project.address))
+    project.area_tokens.set(token_ids)
+    project._area_token_ids = frozenset(token_ids)
+    project._area_source = project.address
+
+
+def sync_craftsman_areas(craftsman):
+    """職人の対応エリアからエリアトークンを作り直す"""
+    token_ids = get_or_create_token_ids(parse_coverage_areas(craftsman.coverage_areas))
+    craftsman.area_tokens.set(token_ids)
+    craftsman._area_token_ids = frozenset(token_ids)
+    craftsman._area_source = craftsman.coverage_areas
+
+
+def load_area_token_ids(instances):
+    """
+    案件または職人のリストにエリアトークンIDの集合を1クエリでまとめて読み込む
+
+    読み込んだ集合は各インスタンスに保持され、area_token_ids() から参照される。
+    """
+    instances = [
+        instance for instance in instances if not hasattr(instance, "_area_token_ids")
+    ]
+    if not instances:
+        return
+
+    through = type(instances[0]).area_tokens.through
+    owner_field = type(instances[0])._meta.model_name + "_id"
+    token_ids = {instance.pk: set() for instance in instances}
+    for owner_id, token_id in through.objects.filter(
+        **{f"{owner_field}__in": list(token_ids)}
+    ).values_list(owner_field, "areatoken_id"):
+        token_ids[owner_id].add(token_id)
+
+    for instance in instances:
+        instance._area_token_ids = frozenset(token_ids[instance.pk])
+
+
+def area_token_ids(instance):
+    """案件・職人に紐づくエリアトークンIDの集合"""
+    if not hasattr(instance, "_area_token_ids"):
+        load_area_token_ids([instance])
+    return instance._area_token_ids
+
+
+def area_match_score(project_token_ids, craftsman_token_ids):
+    """案件のエリアトークンのうち職人の対応エリアに含まれる割合 (0-100、情報がなければ50)"""
+    if not project_token_ids or not craftsman_token_ids:
+        return 50  # 中立スコア
+    matches = len(project_token_ids & craftsman_token_ids)
+    return matches / len(project_token_ids) * 100
+
+
+def area_search_filter(area):
+    """
+    エリア検索語を職人の絞り込み条件に変換
+
+    住所として読める項目は最も細かいトークン（「東京都渋谷区」なら渋谷区）の完全一致、
+    それ以外（「渋谷」など）は前方一致で探す。
+    """
+    condition = Q()
+    for entry in AREA_SEPARATOR_PATTERN.split(area or ""):
+        tokens = parse_area_tokens(entry.strip())
+        if tokens:
+            condition |= Q(area_tokens__key=tokens[-1][0])
+        elif entry.strip():
+            condition |= Q(area_tokens__key__startswith=normalize_area_name(entry))
+    return condition
+
+
+def rebuild_area_index(apps=global_apps):
+    """全案件・全職人のエリアトークンを作り直す（マイグレーションからも利用）"""
+    Project = apps.get_model("projects", "Project")
+    Craftsman = apps.get_model("projects", "Craftsman")
+    AreaToken = apps.get_model("projects", "AreaToken")
+
+    counts = {}
+    for model, field, parser in (
+        (Project, "address", parse_area_tokens),
+        (Craftsman, "coverage_areas", parse_coverage_areas),
+    ):
+        through = model.area_tokens.through
+        owner_field = model._meta.model_name + "_id"
+        rows = []
+        for pk, text in model.objects.values_list("pk", field):
+            for token_id in get_or_create_token_ids(parser(text), AreaToken):
+                rows.append(through(**{owner_field: pk, "areatoken_id": token_id}))
+        through.objects.all().delete()
+        through.objects.bulk_create(rows, batch_size=1000)
+        counts[model._meta.model_name] = len(rows)
+    return counts
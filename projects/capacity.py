@@ -0,0 +1,227 @@
+"""
+チーム稼働状況ヒートマップ
+
+職人（CraftsmanSchedule・Assignment）と調査員（projects.Survey・surveys.Survey）の
+期間内の行をそれぞれ1クエリで読み込み、リソース×日の稼働率行列を作る。
+行列はキャッシュし、スケジュール・アサイン・調査が変わったらバージョンを進めて無効化する。
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .craftsman_matching import ACTIVE_ASSIGNMENT_STATUSES, sweep_assignment_occupancy
+from .models import (
+    Assignment,
+    Craftsman,
+    CraftsmanSchedule,
+    Survey,
+    SurveyAvailability,
+    Surveyor,
+)
+
+
+CACHE_VERSION_KEY = "capacity_heatmap:version"
+CACHE_TIMEOUT = 60 * 60
+
+# セルの値は稼働率（%、100超は過剰割当）。休みの日は OFF
+OFF = -1
+
+# surveys アプリの調査員は1日の件数上限を持たないため、所要時間の合計をこの分数で割る
+FIELD_SURVEY_DAY_MINUTES = 480
+
+INACTIVE_SURVEY_STATUSES = ["cancelled", "rescheduled"]
+
+
+def invalidate_capacity_cache(**kwargs):
+    """キャッシュ済みのヒートマップをすべて無効化（シグナル受信にも使う）"""
+    try:
+        cache.incr(CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(CACHE_VERSION_KEY, 2, None)
+
+
+def connect_signals():
+    """稼働状況に影響するモデルの保存・削除でキャッシュを無効化"""
+    from surveys.models import Survey as FieldSurvey, Surveyor as FieldSurveyor
+
+    for model in (
+        Craftsman,
+        CraftsmanSchedule,
+        Assignment,
+        Surveyor,
+        Survey,
+        SurveyAvailability,
+        FieldSurveyor,
+        FieldSurvey,
+    ):
+        for signal_name, signal in (
+            ("post_save", post_save),
+            ("post_delete", post_delete),
+        ):
+            signal.connect(
+                invalidate_capacity_cache,
+                sender=model,
+                dispatch_uid=f"capacity_heatmap:{model._meta.label_lower}:{signal_name}",
+            )
+
+
+class CapacityHeatmap:
+    """
+    リソース×日の稼働率行列
+
+    - 職人: 確定・作業中アサインの区間を差分配列で日次件数に展開（1件 = 100%）。
+      割当済みのスケジュールは100%、休みは OFF
+    - 調査員（案件側）: 日ごとの調査件数 ÷ 1日最大件数。稼働不可の日は OFF
+    - 調査員（現地調査側）: 日ごとの予定所要時間 ÷ 8時間
+    """
+
+    def __init__(self, start_date=None, days=56):
+        self.start_date = start_date or timezone.now().date()
+        self.days = days
+        self.end_date = self.start_date + timedelta(days=days - 1)
+
+    @property
+    def cache_key(self):
+        version = cache.get_or_set(CACHE_VERSION_KEY, 1, None)
+        return f"capacity_heatmap:{version}:{self.start_date.isoformat()}:{self.days}"
+
+    def get_grid(self):
+        """キャッシュ済みの行列（なければ作成してキャッシュ）"""
+        key = self.cache_key
+        grid = cache.get(key)
+        if grid is None:
+            grid = self.build()
+            cache.set(key, grid, CACHE_TIMEOUT)
+        return grid
+
+    def build(self):
+        """
+        行列を作成
+
+        Returns:
+            {"start_date": 期間初日, "days": 日数,
+             "resources": [[種別, ID, 名前], ...], "rows": [[セル値, ...], ...]}
+        """
+        resources = []
+        rows = []
+        for build_rows in (
+            self._craftsman_rows,
+            self._surveyor_rows,
+            self._field_surveyor_rows,
+        ):
+            for resource, row in build_rows():
+                resources.append(resource)
+                rows.append(row)
+
+        return {
+            "start_date": self.start_date.isoformat(),
+            "days": self.days,
+            "resources": resources,
+            "rows": rows,
+        }
+
+    def _day(self, date):
+        return (date - self.start_date).days
+
+    def _craftsman_rows(self):
+        craftsmen = Craftsman.objects.filter(is_active=True).order_by("name")
+        occupancy = sweep_assignment_occupancy(
+            Assignment.objects.filter(
+                status__in=ACTIVE_ASSIGNMENT_STATUSES,
+                craftsman__is_active=True,
+                scheduled_start_date__lte=self.end_date,
+                scheduled_end_date__gte=self.start_date,
+            ).values_list("craftsman_id", "scheduled_start_date", "scheduled_end_date"),
+            self.start_date,
+            self.end_date,
+        )
+
+        assigned = defaultdict(set)
+        off = defaultdict(set)
+        for craftsman_id, date, is_available, assigned_project_id in (
+            CraftsmanSchedule.objects.filter(
+                craftsman__is_active=True, date__range=[self.start_date, self.end_date]
+            ).values_list("craftsman_id", "date", "is_available", "assigned_project_id")
+        ):
+            if assigned_project_id:
+                assigned[craftsman_id].add(self._day(date))
+            elif not is_available:
+                off[craftsman_id].add(self._day(date))
+
+        empty = [0] * self.days
+        for craftsman_id, name in craftsmen.values_list("id", "name"):
+            counts = occupancy.get(craftsman_id, empty)
+            row = []
+            for day in range(self.days):
+                if counts[day]:
+                    row.append(counts[day] * 100)
+                elif day in assigned[craftsman_id]:
+                    row.append(100)
+                elif day in off[craftsman_id]:
+                    row.append(OFF)
+                else:
+                    row.append(0)
+            yield ["craftsman", craftsman_id, name], row
+
+    def _surveyor_rows(self):
+        counts = defaultdict(lambda: [0] * self.days)
+        for surveyor_id, scheduled_at in (
+            Survey.objects.filter(
+                surveyor__is_active=True,
+                scheduled_date__date__range=[self.start_date, self.end_date],
+            )
+            .exclude(status__in=INACTIVE_SURVEY_STATUSES)
+            .values_list("surveyor_id", "scheduled_date")
+        ):
+            day = self._day(timezone.localdate(scheduled_at))
+            if 0 <= day < self.days:
+                counts[surveyor_id][day] += 1
+
+        off = defaultdict(set)
+        for surveyor_id, date in SurveyAvailability.objects.filter(
+            surveyor__is_active=True,
+            is_available=False,
+            date__range=[self.start_date, self.end_date],
+        ).values_list("surveyor_id", "date"):
+            off[surveyor_id].add(self._day(date))
+
+        for surveyor_id, name, daily_capacity in (
+            Surveyor.objects.filter(is_active=True)
+            .order_by("name")
+            .values_list("id", "name", "daily_capacity")
+        ):
+            capacity = max(daily_capacity, 1)
+            row = [
+                count * 100 // capacity
+                if count or day not in off[surveyor_id]
+                else OFF
+                for day, count in enumerate(counts[surveyor_id])
+            ]
+            yield ["surveyor", surveyor_id, name], row
+
+    def _field_surveyor_rows(self):
+        from surveys.models import Survey as FieldSurvey, Surveyor as FieldSurveyor
+
+        minutes = defaultdict(lambda: [0] * self.days)
+        for surveyor_id, date, duration in (
+            FieldSurvey.objects.filter(
+                surveyor__is_active=True,
+                scheduled_date__range=[self.start_date, self.end_date],
+            )
+            .exclude(status="cancelled")
+            .values_list("surveyor_id", "scheduled_date", "estimated_duration")
+        ):
+            minutes[surveyor_id][self._day(date)] += duration or 0
+
+        for surveyor_id, name in (
+            FieldSurveyor.objects.filter(is_active=True)
+            .order_by("name")
+            .values_list("id", "name")
+        ):
+            row = [
+                total * 100 // FIELD_SURVEY_DAY_MINUTES for total in minutes[surveyor_id]
+            ]
+            yield ["field_surveyor", surveyor_id, name], row
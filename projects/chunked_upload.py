@@ -0,0 +1,368 @@
+"""
+写真の分割・再開可能アップロード
+
+電波の弱い現場からでも途中から送り直せるよう、写真を分割して送る。
+
+1. 開始: ファイル名・サイズ・SHA-256 を送ると upload_id が返る
+2. 分割送信: 受信済みの位置（offset）を添えて続きのバイト列を送る。
+   接続が切れたら状態を問い合わせ、返ってきた offset から送り直す
+3. 完了: 既存の写真アップロード API に upload_id を送ると、チェックサムを確かめたうえで
+   組み立て済みのファイルを通常のアップロードと同じ経路で SurveyPhoto に保存する
+
+受信中のデータは CHUNKED_UPLOAD_DIR の <upload_id>.part に追記するだけで、メモリには溜めない。
+保存時は FileSystemStorage が一時ファイルとして扱い、コピーせずに移動する。
+最後の受信から CHUNKED_UPLOAD_EXPIRY 秒を過ぎたアップロードは次の開始時に削除する。
+開始できるのはログイン済みのユーザーだけで、ユーザーごとの受信中のアップロードは
+CHUNKED_UPLOAD_MAX_SESSIONS 件、全体で宣言されたサイズの合計は CHUNKED_UPLOAD_MAX_BYTES までとする。
+"""
+import fcntl
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.http import JsonResponse
+
+from . import photo_pipeline
+
+
+# 1回に受け付ける分割のサイズの上限と、クライアントに勧める分割のサイズ
+MAX_CHUNK_BYTES = 8 * 1024 * 1024
+DEFAULT_CHUNK_BYTES = 1024 * 1024
+
+DEFAULT_EXPIRY = 24 * 60 * 60
+
+DEFAULT_MAX_SESSIONS = 10
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+READ_BLOCK_BYTES = 64 * 1024
+
+UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ChunkedUploadError(Exception):
+    """分割アップロードを続けられない（status は応答の HTTP ステータス）"""
+
+    status = 400
+
+
+class LoginRequiredError(ChunkedUploadError):
+    """ログインしていない"""
+
+    status = 401
+
+
+class TooManyUploadsError(ChunkedUploadError):
+    """ユーザーの受信中のアップロードが上限に達している"""
+
+    status = 429
+
+
+class UploadStorageFullError(ChunkedUploadError):
+    """受信中のアップロードのサイズの合計が上限に達している"""
+
+    status = 503
+
+
+class UploadNotFoundError(ChunkedUploadError):
+    """upload_id が見つからない（期限切れを含む）"""
+
+    status = 404
+
+
+class OffsetMismatchError(ChunkedUploadError):
+    """送られた offset が受信済みの位置と合わない"""
+
+    status = 409
+
+    def __init__(self, message, offset):
+        super().__init__(message)
+        self.offset = offset
+
+
+class ChecksumMismatchError(ChunkedUploadError):
+    """組み立てたファイルの SHA-256 が開始時の値と合わない"""
+
+    status = 422
+
+
+class AssembledUpload(File):
+    """組み立て済みのファイル（ストレージには一時ファイルとして移動させる）"""
+
+    def __init__(self, file, name, path, content_hash):
+        super().__init__(file, name)
+        self.path = path
+        self.content_hash = content_hash
+
+    def temporary_file_path(self):
+        return str(self.path)
+
+
+def upload_root():
+    return Path(
+        getattr(settings, "CHUNKED_UPLOAD_DIR", None)
+        or Path(tempfile.gettempdir()) / "survey_photo_uploads"
+    )
+
+
+def _paths(upload_id):
+    if not UPLOAD_ID_RE.match(upload_id or ""):
+        raise UploadNotFoundError("アップロードが見つかりません")
+    root = upload_root()
+    return root / f"{upload_id}.json", root / f"{upload_id}.part"
+
+
+def _load(upload_id, user):
+    meta_path, part_path = _paths(upload_id)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        raise UploadNotFoundError("アップロードが見つかりません（期限切れの可能性があります）")
+    if meta["user_id"] != _user_id(user):
+        raise UploadNotFoundError("アップロードが見つかりません")
+    return meta, part_path
+
+
+def _user_id(user):
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def _setting(name, default):
+    return getattr(settings, name, None) or default
+
+
+def _check_capacity(root, user_id, size):
+    """受信中のアップロードの件数・サイズの合計が上限を超えないか（期限切れは削除済み）"""
+    sessions = 0
+    reserved = 0
+    for meta_path in root.glob("*.json"):
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            continue
+        reserved += meta.get("size", 0)
+        if meta.get("user_id") == user_id:
+            sessions += 1
+    if sessions >= _setting("CHUNKED_UPLOAD_MAX_SESSIONS", DEFAULT_MAX_SESSIONS):
+        raise TooManyUploadsError(
+            "受信中のアップロードが多すぎます。完了するか中止してから開始してください"
+        )
+    if reserved + size > _setting("CHUNKED_UPLOAD_MAX_BYTES", DEFAULT_MAX_BYTES):
+        raise UploadStorageFullError(
+            "アップロードが混み合っています。しばらくしてから再送してください"
+        )
+
+
+def _offset(part_path):
+    try:
+        return part_path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def start(filename, size, sha256, user=None):
+    """
+    分割アップロードを開始する
+
+    Raises:
+        LoginRequiredError: ログインしていない
+        ChunkedUploadError: サイズ・チェックサムの形式が正しくない
+        TooManyUploadsError: ユーザーの受信中のアップロードが CHUNKED_UPLOAD_MAX_SESSIONS 件ある
+        UploadStorageFullError: 受信中のサイズの合計が CHUNKED_UPLOAD_MAX_BYTES を超える
+        photo_pipeline.PhotoTooLargeError: サイズが PHOTO_MAX_UPLOAD_BYTES を超える
+
+    Returns:
+        {"upload_id", "offset", "size", "chunk_size"}
+    """
+    user_id = _user_id(user)
+    if user_id is None:
+        raise LoginRequiredError("ログインしてください")
+    sha256 = (sha256 or "").lower()
+    if not SHA256_RE.match(sha256):
+        raise ChunkedUploadError("sha256 の形式が正しくありません")
+    if size <= 0:
+        raise ChunkedUploadError("size が正しくありません")
+    photo_pipeline.check_upload_size(size)
+
+    root = upload_root()
+    root.mkdir(parents=True, exist_ok=True)
+    purge_expired()
+
+    upload_id = uuid.uuid4().hex
+    meta = {
+        "filename": os.path.basename(filename or "") or "photo.jpg",
+        "size": size,
+        "sha256": sha256,
+        "user_id": user_id,
+        "created_at": time.time(),
+    }
+    meta_path, part_path = _paths(upload_id)
+    # 上限の確認から登録までを同時の開始と直列にする
+    with open(root / ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        _check_capacity(root, user_id, size)
+        part_path.touch()
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    return {
+        "upload_id": upload_id,
+        "offset": 0,
+        "size": size,
+        "chunk_size": DEFAULT_CHUNK_BYTES,
+    }
+
+
+def status(upload_id, user=None):
+    """受信済みの位置 {"upload_id", "offset", "size"}"""
+    meta, part_path = _load(upload_id, user)
+    return {"upload_id": upload_id, "offset": _offset(part_path), "size": meta["size"]}
+
+
+def append(upload_id, offset, stream, length, user=None):
+    """
+    受信済みの位置 offset から length バイトを stream から読んで追記する
+
+    同じアップロードへの同時の追記はファイルロックで直列にする。
+
+    Raises:
+        OffsetMismatchError: offset が受信済みの位置と合わない（e.offset が正しい位置）
+        ChunkedUploadError: 分割が大きすぎる、または宣言したサイズを超える
+
+    Returns:
+        追記後の受信済みの位置
+    """
+    meta, part_path = _load(upload_id, user)
+    if length <= 0 or length > MAX_CHUNK_BYTES:
+        raise ChunkedUploadError(
+            f"分割のサイズは 1〜{MAX_CHUNK_BYTES // (1024 * 1024)}MB にしてください"
+        )
+    with open(part_path, "ab") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            current = os.fstat(f.fileno()).st_size
+            if offset != current:
+                raise OffsetMismatchError("offset が受信済みの位置と合いません", current)
+            if current + length > meta["size"]:
+                raise ChunkedUploadError("宣言したサイズを超えています")
+            remaining = length
+            while remaining:
+                block = stream.read(min(READ_BLOCK_BYTES, remaining))
+                if not block:
+                    break
+                f.write(block)
+                remaining -= len(block)
+            f.flush()
+            os.utime(_paths(upload_id)[0])
+            # 途中で切れた場合も受信できた分は残し、次はその位置から送ってもらう
+            return os.fstat(f.fileno()).st_size
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def finalize(upload_id, user=None):
+    """
+    受信し終えたファイルのチェックサムを確かめ、保存に渡せるファイルを返す
+
+    チェックサムが合わなければアップロードを破棄する（最初から送り直してもらう）。
+    返したファイルは呼び出し側で閉じ、保存し終えたら discard() で後片付けする
+    （received_photo() を使えばどちらも済む）。
+
+    Raises:
+        OffsetMismatchError: まだ全部を受信していない
+        ChecksumMismatchError: SHA-256 が開始時の値と合わない
+    """
+    meta, part_path = _load(upload_id, user)
+    received = _offset(part_path)
+    if received != meta["size"]:
+        raise OffsetMismatchError("まだ全部を受信していません", received)
+
+    f = open(part_path, "rb")
+    try:
+        digest = photo_pipeline.file_digest(f)
+    except OSError:
+        f.close()
+        raise
+    if digest != meta["sha256"]:
+        f.close()
+        discard(upload_id)
+        raise ChecksumMismatchError("チェックサムが一致しません。最初から送り直してください")
+    return AssembledUpload(f, meta["filename"], part_path, digest)
+
+
+def photo_from_request(request, field="photo"):
+    """
+    リクエストで送られた写真と upload_id
+
+    通常のファイル送信ならそのファイル、upload_id が送られていれば finalize() したファイルを返す。
+    どちらもなければ (None, None)。
+    """
+    if field in request.FILES:
+        return request.FILES[field], None
+    upload_id = request.POST.get("upload_id")
+    if not upload_id:
+        return None, None
+    return finalize(upload_id, request.user), upload_id
+
+
+@contextmanager
+def received_photo(request, field="photo"):
+    """
+    photo_from_request() の写真を保存する間だけ開いておく
+
+    分割アップロードのファイルは抜けるときに必ず閉じ、保存し終えたか、
+    画像として受け付けられなかった（PhotoRejectedError）ときは一時ファイルを削除する。
+    混み合いで断った（PipelineBusyError）ときは同じ upload_id で再送できるよう残す。
+    """
+    photo_file, upload_id = photo_from_request(request, field)
+    try:
+        yield photo_file
+    except photo_pipeline.PipelineBusyError:
+        raise
+    except photo_pipeline.PhotoRejectedError:
+        if upload_id:
+            discard(upload_id)
+        raise
+    else:
+        if upload_id:
+            discard(upload_id)
+    finally:
+        if upload_id:
+            photo_file.close()
+
+
+def error_response(error):
+    """分割アップロードのエラー応答（offset の不一致なら正しい offset を添える）"""
+    data = {"error": str(error)}
+    if isinstance(error, OffsetMismatchError):
+        data["offset"] = error.offset
+    return JsonResponse(data, status=error.status)
+
+
+def discard(upload_id):
+    """アップロードの一時ファイルを削除"""
+    for path in _paths(upload_id):
+        path.unlink(missing_ok=True)
+
+
+def purge_expired():
+    """期限を過ぎたアップロードを削除し、削除した件数を返す"""
+    expiry = getattr(settings, "CHUNKED_UPLOAD_EXPIRY", None) or DEFAULT_EXPIRY
+    deadline = time.time() - expiry
+    purged = 0
+    for meta_path in upload_root().glob("*.json"):
+        try:
+            if meta_path.stat().st_mtime < deadline:
+                discard(meta_path.stem)
+                purged += 1
+        except FileNotFoundError:
+            pass
+    return purged
@@ -1,9 +1,122 @@
 from datetime import timedelta
+from itertools import accumulate
 from django.db.models import Q, Count, Avg
 from django.utils import timezone
+from .area_index import (
+    area_match_score,
+    area_search_filter,
+    area_token_ids,
+    load_area_token_ids,
+)
+from .geocoding import distances_from, location_of, proximity_score
 from .models import Craftsman, Assignment, CraftsmanSchedule, Project
 
 
+ACTIVE_ASSIGNMENT_STATUSES = ["confirmed", "in_progress"]
+
+
+class AvailabilityIndex:
+    """
+    職人×日の稼働可能ビットセット
+
+    期間内の CraftsmanSchedule と確定済み Assignment を候補職人分まとめて読み込み、
+    職人ごとに「bit i = start_date + i 日目」の整数ビットセットを作る。
+    稼働可能日数はビットマスクの popcount で求める。
+    """
+
+    def __init__(self, craftsmen, start_date, end_date):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.days = max((end_date - start_date).days + 1, 0)
+        self.full_mask = (1 << self.days) - 1
+
+        self.craftsman_ids = [craftsman.id for craftsman in craftsmen]
+        self.active = {craftsman.id: craftsman.is_active for craftsman in craftsmen}
+        # スケジュールで休み・案件割当済みの日
+        self.blocked = dict.fromkeys(self.craftsman_ids, 0)
+        # 確定・作業中のアサインで埋まっている日
+        self.busy = dict.fromkeys(self.craftsman_ids, 0)
+
+        if self.craftsman_ids and self.days:
+            self._load()
+
+    def _load(self):
+        schedules = CraftsmanSchedule.objects.filter(
+            craftsman_id__in=self.craftsman_ids,
+            date__range=[self.start_date, self.end_date],
+        ).values_list("craftsman_id", "date", "is_available", "assigned_project_id")
+
+        for craftsman_id, date, is_available, assigned_project_id in schedules:
+            if not is_available or assigned_project_id:
+                self.blocked[craftsman_id] |= 1 << self.day_index(date)
+
+        assignments = Assignment.objects.filter(
+            craftsman_id__in=self.craftsman_ids,
+            status__in=ACTIVE_ASSIGNMENT_STATUSES,
+            scheduled_start_date__lte=self.end_date,
+            scheduled_end_date__gte=self.start_date,
+        ).values_list("craftsman_id", "scheduled_start_date", "scheduled_end_date")
+
+        for craftsman_id, start_date, end_date in assignments:
+            self.busy[craftsman_id] |= self.range_mask(start_date, end_date)
+
+    def day_index(self, date):
+        """日付をビット位置に変換"""
+        return (date - self.start_date).days
+
+    def range_mask(self, start_date=None, end_date=None):
+        """期間内に丸めた日付範囲のビットマスク"""
+        first = max(self.day_index(start_date or self.start_date), 0)
+        last = min(self.day_index(end_date or self.end_date), self.days - 1)
+        if last < first:
+            return 0
+        return ((1 << (last - first + 1)) - 1) << first
+
+    def available_mask(self, craftsman_id):
+        """稼働可能日のビットマスク"""
+        if not self.active.get(craftsman_id):
+            return 0
+        return self.full_mask & ~(self.blocked[craftsman_id] | self.busy[craftsman_id])
+
+    def available_days(self, craftsman_id, start_date=None, end_date=None):
+        """期間内の稼働可能日数"""
+        return (
+            self.available_mask(craftsman_id) & self.range_mask(start_date, end_date)
+        ).bit_count()
+
+    def is_available(self, craftsman_id, date):
+        """指定日に稼働可能か"""
+        index = self.day_index(date)
+        if not 0 <= index < self.days:
+            return False
+        return bool(self.available_mask(craftsman_id) >> index & 1)
+
+    def window_starts(self, craftsman_id, length):
+        """
+        length 日連続で稼働可能な期間の開始日ビットマスク
+
+        「bit i が立つ = i 日目から covered 日連続で空き」を保ったまま
+        mask &= mask >> step で covered を倍々に伸ばすため、シフト回数は O(log length)。
+        期間外のビットは常に0なので、期間末尾をはみ出す窓は自然に除外される。
+        """
+        mask = self.available_mask(craftsman_id)
+        covered = 1
+        while covered < length and mask:
+            step = min(covered, length - covered)
+            mask &= mask >> step
+            covered += step
+        return mask if length > 0 else 0
+
+    def windows(self, craftsman_id, length):
+        """length 日連続で稼働可能な期間 (開始日, 終了日) を日付順に列挙"""
+        mask = self.window_starts(craftsman_id, length)
+        while mask:
+            lowest = mask & -mask
+            start_date = self.start_date + timedelta(days=lowest.bit_length() - 1)
+            yield start_date, start_date + timedelta(days=length - 1)
+            mask ^= lowest
+
+
 class CraftsmanMatcher:
     """職人マッチングロジック"""
 
@@ -22,15 +135,19 @@ class CraftsmanMatcher:
         優先順位: 空き時間 > 技能マッチ > 地域近接 > コスト安
         """
         # 基本フィルタリング
-        available_craftsmen = self._get_available_craftsmen(
-            project.project_type, start_date, end_date
+        available_craftsmen = list(
+            self._get_available_craftsmen(project.project_type, start_date, end_date)
         )
 
+        # 候補全員の稼働状況・対応エリアをまとめて読み込む
+        availability_index = AvailabilityIndex(available_craftsmen, start_date, end_date)
+        load_area_token_ids(available_craftsmen)
+
         # スコア計算
         scored_craftsmen = []
         for craftsman in available_craftsmen:
             score = self._calculate_match_score(
-                craftsman, project, start_date, end_date
+                craftsman, project, start_date, end_date, availability_index
             )
             scored_craftsmen.append(
                 {
@@ -53,17 +170,19 @@ class CraftsmanMatcher:
         """基本的なフィルタリングで利用可能な職人を取得"""
         return (
             Craftsman.objects.filter(is_active=True, specialties=project_type)
-            .prefetch_related("specialties", "craftsmanschedule_set", "assignment_set")
+            .prefetch_related("specialties")
             .distinct()
         )
 
-    def _calculate_match_score(self, craftsman, project, start_date, end_date):
+    def _calculate_match_score(
+        self, craftsman, project, start_date, end_date, availability_index=None
+    ):
         """マッチングスコアを計算"""
         scores = {}
 
         # 1. 空き時間スコア (40%)
         scores["availability"] = self._calculate_availability_score(
-            craftsman, start_date, end_date
+            craftsman, start_date, end_date, availability_index
         )
 
         # 2. 技能マッチスコア (30%)
@@ -85,21 +204,21 @@ class CraftsmanMatcher:
 
         return scores
 
-    def _calculate_availability_score(self, craftsman, start_date, end_date):
+    def _calculate_availability_score(
+        self, craftsman, start_date, end_date, availability_index=None
+    ):
         """空き時間スコア計算"""
         # 指定期間中の稼働可能日数を計算
         total_days = (end_date - start_date).days + 1
-        available_days = 0
-
-        current_date = start_date
-        while current_date <= end_date:
-            if craftsman.can_work_on(current_date):
-                available_days += 1
-            current_date += timedelta(days=1)
-
-        if total_days == 0:
+        if total_days <= 0:
             return 0
 
+        if availability_index is None:
+            availability_index = AvailabilityIndex([craftsman], start_date, end_date)
+        available_days = availability_index.available_days(
+            craftsman.id, start_date, end_date
+        )
+
         # 空き時間の割合をスコアに変換 (0-100)
         availability_ratio = available_days / total_days
         return availability_ratio * 100
@@ -121,27 +240,21 @@ class CraftsmanMatcher:
         return min(base_score + skill_bonus + rating_bonus, 100)
 
     def _calculate_location_score(self, craftsman, project):
-        """地域近接スコア計算"""
-        # 簡易的な地域マッチング
-        if not craftsman.coverage_areas or not project.address:
-            return 50  # 中立スコア
-
-        project_areas = self._extract_area_keywords(project.address)
-        craftsman_areas = craftsman.coverage_area_list
-
-        # エリアマッチング
-        matches = 0
-        for project_area in project_areas:
-            for craftsman_area in craftsman_areas:
-                if project_area in craftsman_area or craftsman_area in project_area:
-                    matches += 1
-                    break
+        """
+        地域近接スコア計算
 
-        if not project_areas:
-            return 50
+        対応エリアの一致（エリアトークンIDの共通部分）と、拠点からの大円距離による近接度の高い方。
+        """
+        area_score = area_match_score(area_token_ids(project), area_token_ids(craftsman))
+        (distance,) = distances_from(location_of(project), [location_of(craftsman)])
+        return self._combine_location_scores(area_score, distance)
 
-        match_ratio = matches / len(project_areas)
-        return match_ratio * 100
+    def _combine_location_scores(self, area_score, distance):
+        """エリア一致スコアと距離を地域近接スコアにまとめる（距離不明ならエリア一致のみ）"""
+        proximity = proximity_score(distance)
+        if proximity is None:
+            return area_score
+        return max(area_score, proximity)
 
     def _calculate_cost_score(self, craftsman):
         """コストスコア計算（安いほど高スコア）"""
@@ -160,63 +273,49 @@ class CraftsmanMatcher:
             )
             return (1 - normalized_rate) * 100
 
-    def _extract_area_keywords(self, address):
-        """住所からエリアキーワードを抽出"""
-        import re
-
-        # 都道府県・市区町村を抽出
-        patterns = [
-            r"([東京都|大阪府|京都府|北海道|.*県])",
-            r"([^都道府県]*[市区町村])",
-            r"([^市区町村]*区)",
-        ]
-
-        areas = []
-        for pattern in patterns:
-            matches = re.findall(pattern, address)
-            areas.extend(matches)
-
-        return list(set(areas))  # 重複除去
-
     def get_workload_analysis(self, craftsman, days=30):
         """職人の稼働率分析"""
-        from django.utils import timezone
+        return self.get_workload_analysis_bulk([craftsman], days)[craftsman.id]
+
+    def get_workload_analysis_bulk(self, craftsmen=None, days=30):
+        """
+        複数職人の稼働率分析をまとめて計算（craftsmen 省略時は稼働中の全職人）
 
+        期間に重なる確定・作業中のアサインを1クエリで読み込み、
+        職人ごとに区間を日次の占有配列へ掃き出して稼働日数を数える。
+        戻り値は craftsman.id をキーにした辞書。
+        """
         start_date = timezone.now().date()
         end_date = start_date + timedelta(days=days)
-
-        # 期間中のアサイン状況
-        assignments = Assignment.objects.filter(
-            craftsman=craftsman,
-            status__in=["confirmed", "in_progress"],
-            scheduled_start_date__lte=end_date,
-            scheduled_end_date__gte=start_date,
+        if craftsmen is None:
+            craftsmen = Craftsman.objects.filter(is_active=True)
+        craftsmen = list(craftsmen)
+
+        occupancy = sweep_assignment_occupancy(
+            Assignment.objects.filter(
+                craftsman__in=craftsmen,
+                status__in=ACTIVE_ASSIGNMENT_STATUSES,
+                scheduled_start_date__lte=end_date,
+                scheduled_end_date__gte=start_date,
+            ).values_list("craftsman_id", "scheduled_start_date", "scheduled_end_date"),
+            start_date,
+            end_date,
         )
 
-        busy_days = 0
-        current_date = start_date
-
-        while current_date <= end_date:
-            # その日にアサインがあるかチェック
-            day_assignments = assignments.filter(
-                scheduled_start_date__lte=current_date,
-                scheduled_end_date__gte=current_date,
-            )
-
-            if day_assignments.exists():
-                busy_days += 1
-
-            current_date += timedelta(days=1)
-
-        workload_percentage = (busy_days / days) * 100
-
-        return {
-            "total_days": days,
-            "busy_days": busy_days,
-            "available_days": days - busy_days,
-            "workload_percentage": workload_percentage,
-            "status": self._get_workload_status(workload_percentage),
-        }
+        workloads = {}
+        for craftsman in craftsmen:
+            counts = occupancy.get(craftsman.id)
+            busy_days = sum(1 for count in counts if count) if counts else 0
+            workload_percentage = (busy_days / days) * 100
+
+            workloads[craftsman.id] = {
+                "total_days": days,
+                "busy_days": busy_days,
+                "available_days": days - busy_days,
+                "workload_percentage": workload_percentage,
+                "status": self._get_workload_status(workload_percentage),
+            }
+        return workloads
 
     def _get_workload_status(self, percentage):
         """稼働率から状態を判定"""
@@ -230,48 +329,379 @@ class CraftsmanMatcher:
             return {"level": "available", "label": "余裕あり", "color": "success"}
 
     def suggest_alternative_dates(
-        self, craftsman, preferred_start, preferred_end, project_type
+        self,
+        craftsman,
+        preferred_start,
+        preferred_end,
+        project_type=None,
+        search_days=14,
+        limit=None,
+        availability_index=None,
     ):
-        """代替日程を提案"""
-        suggestions = []
+        """
+        代替日程を提案
 
-        # 前後2週間で空いている期間を検索
-        search_start = preferred_start - timedelta(days=14)
-        search_end = preferred_end + timedelta(days=14)
+        希望期間の前後 search_days 日で、同じ日数だけ連続して空いている期間を
+        希望開始日に近い順（同距離なら早い順）にすべて返す。
+        """
+        return [
+            {key: value for key, value in suggestion.items() if key != "craftsman"}
+            for suggestion in self.suggest_alternative_dates_bulk(
+                [craftsman],
+                preferred_start,
+                preferred_end,
+                project_type,
+                search_days,
+                limit,
+                availability_index,
+            )
+        ]
 
-        current_date = search_start
-        while current_date <= search_end:
-            # 必要な日数分連続で空いているかチェック
-            required_days = (preferred_end - preferred_start).days + 1
+    def suggest_alternative_dates_bulk(
+        self,
+        craftsmen,
+        preferred_start,
+        preferred_end,
+        project_type=None,
+        search_days=14,
+        limit=None,
+        availability_index=None,
+    ):
+        """
+        複数職人の代替日程をまとめて提案（日程提案画面用）
 
-            if self._check_consecutive_availability(
-                craftsman, current_date, required_days
-            ):
-                suggestion_end = current_date + timedelta(days=required_days - 1)
+        稼働状況は全員分を一度に読み込み、職人ごとの連続空き期間をビット演算で求める。
+        戻り値は職人をまたいで希望開始日に近い順に並べたリスト。
+        """
+        craftsmen = list(craftsmen)
+        required_days = (preferred_end - preferred_start).days + 1
+        if required_days <= 0 or not craftsmen:
+            return []
+
+        if availability_index is None:
+            availability_index = AvailabilityIndex(
+                craftsmen,
+                preferred_start - timedelta(days=search_days),
+                preferred_end + timedelta(days=search_days),
+            )
 
+        suggestions = []
+        for craftsman in craftsmen:
+            if project_type and project_type not in craftsman.specialties.all():
+                continue
+            for start_date, end_date in availability_index.windows(
+                craftsman.id, required_days
+            ):
                 suggestions.append(
                     {
-                        "start_date": current_date,
-                        "end_date": suggestion_end,
-                        "days_diff": abs((current_date - preferred_start).days),
-                        "is_earlier": current_date < preferred_start,
+                        "craftsman": craftsman,
+                        "start_date": start_date,
+                        "end_date": end_date,
+                        "days_diff": abs((start_date - preferred_start).days),
+                        "is_earlier": start_date < preferred_start,
+                        "is_preferred": start_date == preferred_start,
                     }
                 )
 
-            current_date += timedelta(days=1)
-
         # 希望日に近い順でソート
-        suggestions.sort(key=lambda x: x["days_diff"])
+        suggestions.sort(key=lambda x: (x["days_diff"], x["start_date"]))
+
+        return suggestions[:limit] if limit else suggestions
+
+
+class BatchAssignmentPlanner(CraftsmanMatcher):
+    """
+    複数案件×職人の一括アサイン計画
+
+    案件×職人のスコア行列を構成要素（空き・技能・地域・コスト）ごとの配列から組み立て、
+    割当問題をハンガリアン法で解く。1ラウンドで各職人に割り当てるのは最大1案件とし、
+    割り当てた日を職人ごとのビットセットで塞いでから残りの案件で次のラウンドを解くため、
+    同じ職人が同じ日に2案件を持つことはない（期間が重ならなければ複数案件を受け持てる）。
+    """
+
+    # 実行不可能な組合せのコスト（スコアは0-100なので十分大きい値）
+    INFEASIBLE_COST = 10**6
+
+    def __init__(self, min_availability=1.0):
+        super().__init__()
+        # 案件期間のうち稼働可能でなければならない日の割合
+        self.min_availability = min_availability
+
+    def plan(self, projects, craftsmen=None):
+        """
+        案件群に対する職人の割当案を作成
+
+        Returns:
+            {"assignments": [...], "unassigned": [案件, ...], "total_score": float}
+        """
+        projects = list(projects)
+        if craftsmen is None:
+            craftsmen = Craftsman.objects.filter(is_active=True).prefetch_related(
+                "specialties"
+            )
+        craftsmen = list(craftsmen)
+
+        if not projects or not craftsmen:
+            return {"assignments": [], "unassigned": projects, "total_score": 0}
+
+        start_date = min(project.start_date for project in projects)
+        end_date = max(project.end_date for project in projects)
+        availability_index = AvailabilityIndex(craftsmen, start_date, end_date)
+
+        matrix = self.build_score_matrix(projects, craftsmen, availability_index)
+        plan = self._solve(matrix["total"], matrix["masks"], len(craftsmen))
 
-        return suggestions[:5]  # 上位5つの提案
+        assignments = []
+        for p, c in sorted(plan.items(), key=lambda x: (projects[x[0]].start_date, x[0])):
+            project = projects[p]
+            assignments.append(
+                {
+                    "project": project,
+                    "craftsman": craftsmen[c],
+                    "start_date": project.start_date,
+                    "end_date": project.end_date,
+                    "availability_score": matrix["availability"][p][c],
+                    "skill_score": matrix["skill_match"][p][c],
+                    "location_score": matrix["location"][p][c],
+                    "cost_score": matrix["cost"][p][c],
+                    "total_score": matrix["total"][p][c],
+                }
+            )
+
+        return {
+            "assignments": assignments,
+            "unassigned": [
+                project for p, project in enumerate(projects) if p not in plan
+            ],
+            "total_score": sum(a["total_score"] for a in assignments),
+        }
+
+    def build_score_matrix(self, projects, craftsmen, availability_index):
+        """
+        案件×職人のスコア行列を構成要素ごとに作成
+
+        職人側の値（コスト・技能ボーナス・対応エリア・座標・稼働可能ビットセット）は1度だけ配列にし、
+        工種・エリアが同じ案件は技能・地域の行を共有する（距離は案件ごとに一括計算）。
+        実行不可能な組合せ（工種外・空き不足）の総合スコアは None。
+        """
+        weights = self.weights
+
+        # 職人ごとの列ベクトル
+        cost_row = [self._calculate_cost_score(craftsman) for craftsman in craftsmen]
+        skill_bonus = [
+            (craftsman.skill_level - 1) * 5 + float(craftsman.average_rating) * 4
+            for craftsman in craftsmen
+        ]
+        specialty_ids = [
+            {project_type.id for project_type in craftsman.specialties.all()}
+            for craftsman in craftsmen
+        ]
+        load_area_token_ids(craftsmen)
+        load_area_token_ids(projects)
+        coverage = [area_token_ids(craftsman) for craftsman in craftsmen]
+        craftsman_locations = [location_of(craftsman) for craftsman in craftsmen]
+        available_masks = [
+            availability_index.available_mask(craftsman.id) for craftsman in craftsmen
+        ]
 
-    def _check_consecutive_availability(self, craftsman, start_date, required_days):
-        """連続稼働可能日数をチェック"""
-        for i in range(required_days):
-            check_date = start_date + timedelta(days=i)
-            if not craftsman.can_work_on(check_date):
-                return False
-        return True
+        skill_rows = {}
+        location_rows = {}
+        fixed_rows = {}
+        matrix = {
+            "total": [],
+            "availability": [],
+            "skill_match": [],
+            "location": [],
+            "cost": [],
+            "masks": [],
+        }
+
+        for project in projects:
+            project_type_id = project.project_type_id
+            if project_type_id not in skill_rows:
+                skill_rows[project_type_id] = [
+                    min(50 + (30 if project_type_id in specialties else 0) + bonus, 100)
+                    for specialties, bonus in zip(specialty_ids, skill_bonus)
+                ]
+            skill_row = skill_rows[project_type_id]
+
+            location_key = (area_token_ids(project), location_of(project))
+            if location_key not in location_rows:
+                project_areas, project_location = location_key
+                location_rows[location_key] = [
+                    self._combine_location_scores(
+                        area_match_score(project_areas, areas), distance
+                    )
+                    for areas, distance in zip(
+                        coverage, distances_from(project_location, craftsman_locations)
+                    )
+                ]
+            location_row = location_rows[location_key]
+
+            # 空き以外の加重和は工種×エリア×位置ごとに共有
+            fixed_key = (project_type_id, location_key)
+            if fixed_key not in fixed_rows:
+                fixed_rows[fixed_key] = [
+                    (
+                        skill * weights["skill_match"]
+                        + location * weights["location"]
+                        + cost * weights["cost"]
+                    )
+                    / 100
+                    for skill, location, cost in zip(skill_row, location_row, cost_row)
+                ]
+            fixed_row = fixed_rows[fixed_key]
+
+            project_mask = availability_index.range_mask(
+                project.start_date, project.end_date
+            )
+            total_days = project.duration_days
+            availability_row = [
+                (mask & project_mask).bit_count() / total_days * 100
+                for mask in available_masks
+            ]
+            min_score = self.min_availability * 100
+            total_row = [
+                fixed + availability * weights["availability"] / 100
+                if project_type_id in specialties and availability >= min_score
+                else None
+                for fixed, availability, specialties in zip(
+                    fixed_row, availability_row, specialty_ids
+                )
+            ]
+
+            matrix["total"].append(total_row)
+            matrix["availability"].append(availability_row)
+            matrix["skill_match"].append(skill_row)
+            matrix["location"].append(location_row)
+            matrix["cost"].append(cost_row)
+            matrix["masks"].append(project_mask)
+
+        return matrix
+
+    def _solve(self, totals, masks, craftsman_count):
+        """
+        日毎の稼働上限を守りながら割当問題を繰り返し解く
+
+        Returns:
+            {案件の添字: 職人の添字}
+        """
+        plan = {}
+        occupied = [0] * craftsman_count
+        pending = list(range(len(totals)))
+
+        while pending:
+            costs = []
+            rows = []
+            for p in pending:
+                mask = masks[p]
+                row = [
+                    self.INFEASIBLE_COST
+                    if score is None or occupied[c] & mask
+                    else 100 - score
+                    for c, score in enumerate(totals[p])
+                ]
+                # 割り当て可能な職人が残っていない案件は以降のラウンドから外す
+                if any(cost < self.INFEASIBLE_COST for cost in row):
+                    rows.append(p)
+                    costs.append(row)
+
+            assigned = [
+                (rows[r], c)
+                for r, c in solve_assignment(costs)
+                if costs[r][c] < self.INFEASIBLE_COST
+            ]
+            if not assigned:
+                break
+
+            for p, c in assigned:
+                plan[p] = c
+                occupied[c] |= masks[p]
+            pending = [p for p in rows if p not in plan]
+
+        return plan
+
+
+def solve_assignment(cost):
+    """
+    最小コストの割当問題をハンガリアン法（ポテンシャル付き, O(n²m)）で解く
+
+    cost は n×m の行列。行と列の少ない方の数だけ (行, 列) の組を返す。
+    """
+    if not cost or not cost[0]:
+        return []
+
+    n, m = len(cost), len(cost[0])
+    if n > m:
+        transposed = [list(column) for column in zip(*cost)]
+        return sorted((r, c) for c, r in solve_assignment(transposed))
+
+    inf = float("inf")
+    u = [0] * (n + 1)
+    v = [0] * (m + 1)
+    owner = [0] * (m + 1)  # 列 j に割り当てられた行（1始まり、0は未割当）
+    way = [0] * (m + 1)
+
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = owner[j0]
+            row = cost[i0 - 1]
+            ui0 = u[i0]
+            delta = inf
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    current = row[j - 1] - ui0 - v[j]
+                    if current < minv[j]:
+                        minv[j] = current
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+
+    return sorted((owner[j] - 1, j - 1) for j in range(1, m + 1) if owner[j])
+
+
+def sweep_assignment_occupancy(intervals, start_date, end_date):
+    """
+    (職人ID, 開始日, 終了日) の区間列を職人ごとの日次占有件数配列に変換
+
+    区間の始点に+1、終点の翌日に-1 を置いた差分配列を累積和で戻すため、
+    区間数・日数の和に比例する計算量で済む。
+    """
+    total_days = (end_date - start_date).days + 1
+    diffs = {}
+    for craftsman_id, interval_start, interval_end in intervals:
+        first = max((interval_start - start_date).days, 0)
+        last = min((interval_end - start_date).days, total_days - 1)
+        if last < first:
+            continue
+        diff = diffs.setdefault(craftsman_id, [0] * (total_days + 1))
+        diff[first] += 1
+        diff[last + 1] -= 1
+
+    return {
+        craftsman_id: list(accumulate(diff[:total_days]))
+        for craftsman_id, diff in diffs.items()
+    }
 
 
 # 職人検索用のユーティリティ関数
@@ -289,7 +719,7 @@ def search_craftsmen(filters):
 
     # エリアフィルタ
     if filters.get("area"):
-        queryset = queryset.filter(coverage_areas__icontains=filters["area"])
+        queryset = queryset.filter(area_search_filter(filters["area"])).distinct()
 
     # 時給範囲フィルタ
     if filters.get("max_hourly_rate"):
@@ -299,27 +729,43 @@ def search_craftsmen(filters):
     if filters.get("min_rating"):
         queryset = queryset.filter(average_rating__gte=filters["min_rating"])
 
-    return queryset.select_related().prefetch_related("specialties")
+    return queryset.with_metrics()
 
 
 def get_craftsman_availability_calendar(craftsman, start_date, end_date):
     """職人のカレンダー形式稼働状況を取得"""
+    total_days = (end_date - start_date).days + 1
+    if total_days <= 0:
+        return []
+
+    # 期間内のスケジュールとアサインをそれぞれ1クエリで取得
+    schedules = {
+        schedule.date: schedule
+        for schedule in CraftsmanSchedule.objects.filter(
+            craftsman=craftsman, date__range=[start_date, end_date]
+        )
+    }
+
+    # 同じ日に複数のアサインがある場合は新しいもの（既定の並び順で先頭）を表示する
+    day_assignments = [None] * total_days
+    assignments = Assignment.objects.filter(
+        craftsman=craftsman,
+        status__in=ACTIVE_ASSIGNMENT_STATUSES,
+        scheduled_start_date__lte=end_date,
+        scheduled_end_date__gte=start_date,
+    ).select_related("project")
+    for assignment in assignments:
+        first = max((assignment.scheduled_start_date - start_date).days, 0)
+        last = min((assignment.scheduled_end_date - start_date).days, total_days - 1)
+        for index in range(first, last + 1):
+            if day_assignments[index] is None:
+                day_assignments[index] = assignment
+
     calendar_data = []
-    current_date = start_date
-
-    while current_date <= end_date:
-        # その日のスケジュール情報を取得
-        schedule = CraftsmanSchedule.objects.filter(
-            craftsman=craftsman, date=current_date
-        ).first()
-
-        # アサイン情報を取得
-        assignment = Assignment.objects.filter(
-            craftsman=craftsman,
-            status__in=["confirmed", "in_progress"],
-            scheduled_start_date__lte=current_date,
-            scheduled_end_date__gte=current_date,
-        ).first()
+    for index in range(total_days):
+        current_date = start_date + timedelta(days=index)
+        schedule = schedules.get(current_date)
+        assignment = day_assignments[index]
 
         day_data = {
             "date": current_date,
@@ -335,6 +781,5 @@ def get_craftsman_availability_calendar(craftsman, start_date, end_date):
             day_data["status"] = "unavailable"
 
         calendar_data.append(day_data)
-        current_date += timedelta(days=1)
 
     return calendar_data
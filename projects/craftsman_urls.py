@@ -71,6 +71,17 @@ craftsman_urlpatterns = [
         craftsman_views.schedule_bulk_update,
         name="schedule_bulk_update",
     ),
+    # 稼働状況ヒートマップ
+    path(
+        "craftsman/capacity/",
+        craftsman_views.capacity_heatmap,
+        name="capacity_heatmap",
+    ),
+    path(
+        "api/capacity/heatmap/",
+        craftsman_views.capacity_heatmap_api,
+        name="capacity_heatmap_api",
+    ),
     # 連絡機能
     path(
         "assignments/<int:assignment_id>/contact/<str:method>/",
@@ -83,4 +94,14 @@ craftsman_urlpatterns = [
         craftsman_views.craftsman_workload_api,
         name="craftsman_workload_api",
     ),
+    path(
+        "api/craftsman/alternative-dates/",
+        craftsman_views.craftsman_alternative_dates_api,
+        name="craftsman_alternative_dates_api",
+    ),
+    path(
+        "api/assignments/batch/",
+        craftsman_views.batch_assignment_api,
+        name="batch_assignment_api",
+    ),
 ]
@@ -6,13 +6,13 @@ from django.utils import timezone
 from django.db import transaction
 from django.views.generic import ListView, DetailView
 from django.db.models import Q, Count, Avg
+from collections import defaultdict
 from datetime import datetime, timedelta
 import json
 
 from .models import (
     Craftsman,
     Assignment,
-    CraftsmanSchedule,
     Project,
     CraftsmanRating,
     Surveyor,
@@ -28,10 +28,13 @@ from .craftsman_forms import (
     QuickAssignmentForm,
 )
 from .craftsman_matching import (
+    BatchAssignmentPlanner,
     CraftsmanMatcher,
     search_craftsmen,
     get_craftsman_availability_calendar,
 )
+from .schedule_service import schedule_dates, upsert_craftsman_schedule
+from .capacity import CapacityHeatmap
 
 
 def craftsman_dashboard(request):
@@ -70,8 +73,10 @@ def craftsman_dashboard(request):
     # 稼働率の高い職人
     busy_craftsmen = []
     matcher = CraftsmanMatcher()
-    for craftsman in Craftsman.objects.filter(is_active=True)[:10]:
-        workload = matcher.get_workload_analysis(craftsman, days=7)
+    candidates = list(Craftsman.objects.filter(is_active=True).with_metrics()[:10])
+    workloads = matcher.get_workload_analysis_bulk(candidates, days=7)
+    for craftsman in candidates:
+        workload = workloads[craftsman.id]
         if workload["workload_percentage"] > 70:
             busy_craftsmen.append({"craftsman": craftsman, "workload": workload})
 
@@ -97,11 +102,12 @@ def craftsman_search(request):
 
         # 稼働率情報を追加
         matcher = CraftsmanMatcher()
+        craftsmen = list(craftsmen)
+        workloads = matcher.get_workload_analysis_bulk(craftsmen)
         craftsmen_with_workload = []
         for craftsman in craftsmen:
-            workload = matcher.get_workload_analysis(craftsman)
             craftsmen_with_workload.append(
-                {"craftsman": craftsman, "workload": workload}
+                {"craftsman": craftsman, "workload": workloads[craftsman.id]}
             )
         craftsmen = craftsmen_with_workload
 
@@ -228,6 +234,31 @@ def craftsman_schedule_calendar(request, craftsman_id=None):
     return render(request, "craftsman/schedule_calendar.html", context)
 
 
+def capacity_heatmap(request):
+    """チーム稼働状況ヒートマップ（行列は capacity_heatmap_api から取得）"""
+    return render(request, "craftsman/capacity_heatmap.html")
+
+
+def capacity_heatmap_api(request):
+    """
+    稼働状況ヒートマップAPI
+
+    GET: start_date (任意・既定は今日), days (任意・既定56、最大366)
+    rows[i][j] は resources[i] の start_date + j 日の稼働率（%、休みは -1）
+    """
+    try:
+        start_date = (
+            datetime.strptime(request.GET["start_date"], "%Y-%m-%d").date()
+            if request.GET.get("start_date")
+            else timezone.now().date()
+        )
+        days = min(max(int(request.GET.get("days", 56)), 1), 366)
+    except ValueError:
+        return JsonResponse({"error": "パラメータの形式が正しくありません"}, status=400)
+
+    return JsonResponse(CapacityHeatmap(start_date, days).get_grid())
+
+
 @csrf_exempt
 def quick_assignment(request):
     """クイックアサイン（Ajax）"""
@@ -275,6 +306,265 @@ def craftsman_workload_api(request, craftsman_id):
     return JsonResponse(workload)
 
 
+# 代替日程の検索範囲（希望日程の前後の日数）と提案件数の上限
+MAX_ALTERNATIVE_SEARCH_DAYS = 60
+MAX_ALTERNATIVE_LIMIT = 100
+
+
+def craftsman_alternative_dates_api(request):
+    """
+    代替日程提案API
+
+    GET: start_date, end_date (YYYY-MM-DD), project_type (任意), craftsman_ids (任意・カンマ区切り),
+         search_days (任意・既定14、最大60), limit (任意・最大100)
+    """
+    try:
+        preferred_start = datetime.strptime(request.GET["start_date"], "%Y-%m-%d").date()
+        preferred_end = datetime.strptime(request.GET["end_date"], "%Y-%m-%d").date()
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "start_date と end_date を指定してください"}, status=400)
+    try:
+        search_days = int(request.GET.get("search_days", 14))
+        limit = int(request.GET.get("limit", 0))
+    except ValueError:
+        return JsonResponse({"error": "search_days と limit は整数で指定してください"}, status=400)
+    if (preferred_end - preferred_start).days >= MAX_ALTERNATIVE_SEARCH_DAYS:
+        return JsonResponse(
+            {"error": f"希望日程は{MAX_ALTERNATIVE_SEARCH_DAYS}日未満で指定してください"},
+            status=400,
+        )
+    search_days = min(max(search_days, 0), MAX_ALTERNATIVE_SEARCH_DAYS)
+    limit = min(max(limit, 0), MAX_ALTERNATIVE_LIMIT)
+
+    project_type = None
+    if request.GET.get("project_type"):
+        project_type = get_object_or_404(ProjectType, id=request.GET["project_type"])
+
+    craftsmen = Craftsman.objects.filter(is_active=True).prefetch_related("specialties")
+    if project_type:
+        craftsmen = craftsmen.filter(specialties=project_type)
+    craftsman_ids = [
+        int(i) for i in request.GET.get("craftsman_ids", "").split(",") if i.strip().isdigit()
+    ]
+    if craftsman_ids:
+        craftsmen = craftsmen.filter(id__in=craftsman_ids)
+
+    matcher = CraftsmanMatcher()
+    suggestions = matcher.suggest_alternative_dates_bulk(
+        craftsmen.distinct(),
+        preferred_start,
+        preferred_end,
+        project_type,
+        search_days=search_days,
+        limit=limit or None,
+    )
+
+    return JsonResponse(
+        {
+            "success": True,
+            "suggestions": [
+                {
+                    "craftsman_id": s["craftsman"].id,
+                    "craftsman_name": s["craftsman"].name,
+                    "start_date": s["start_date"].isoformat(),
+                    "end_date": s["end_date"].isoformat(),
+                    "days_diff": s["days_diff"],
+                    "is_earlier": s["is_earlier"],
+                    "is_preferred": s["is_preferred"],
+                }
+                for s in suggestions
+            ],
+        }
+    )
+
+
+# 一括アサイン計画の対象期間の上限（日数）
+MAX_BATCH_ASSIGNMENT_DAYS = 31
+
+# 打診中・確定済みとして扱うアサインの状態（案件・職人の重複打診を防ぐ）
+OPEN_ASSIGNMENT_STATUSES = ["inquiry", "confirmed", "in_progress"]
+
+
+@csrf_exempt
+def batch_assignment_api(request):
+    """
+    一括アサイン計画API
+
+    GET: start_date (任意・既定は明日), days (任意・既定7、1〜31に丸める),
+         min_availability (任意・既定1.0)
+         期間内に開始し、打診中・確定済みのアサインがない案件に職人の割当案を返す
+    POST: {"assignments": [{"project_id", "craftsman_id"}, ...]} の割当案を打診として一括登録
+          （登録時点で案件に打診中・確定済みのアサインがある組、職人の予定が重なる組は skipped で返す）
+    """
+    if request.method == "POST":
+        return _create_batch_assignments(request)
+
+    try:
+        start_date = (
+            datetime.strptime(request.GET["start_date"], "%Y-%m-%d").date()
+            if request.GET.get("start_date")
+            else timezone.now().date() + timedelta(days=1)
+        )
+        days = int(request.GET.get("days", 7))
+        min_availability = float(request.GET.get("min_availability", 1.0))
+    except ValueError:
+        return JsonResponse({"error": "パラメータの形式が正しくありません"}, status=400)
+
+    days = min(max(days, 1), MAX_BATCH_ASSIGNMENT_DAYS)
+    end_date = start_date + timedelta(days=days - 1)
+    projects = (
+        Project.objects.filter(
+            start_date__range=[start_date, end_date],
+            status__in=["draft", "confirmed"],
+        )
+        .exclude(assignment__status__in=OPEN_ASSIGNMENT_STATUSES)
+        .select_related("project_type")
+        .order_by("start_date", "id")
+    )
+
+    planner = BatchAssignmentPlanner(min_availability=min_availability)
+    result = planner.plan(projects)
+
+    return JsonResponse(
+        {
+            "success": True,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "total_score": round(result["total_score"], 1),
+            "assignments": [
+                {
+                    "project_id": a["project"].id,
+                    "project_title": a["project"].title,
+                    "craftsman_id": a["craftsman"].id,
+                    "craftsman_name": a["craftsman"].name,
+                    "start_date": a["start_date"].isoformat(),
+                    "end_date": a["end_date"].isoformat(),
+                    "availability_score": round(a["availability_score"], 1),
+                    "skill_score": round(a["skill_score"], 1),
+                    "location_score": round(a["location_score"], 1),
+                    "cost_score": round(a["cost_score"], 1),
+                    "total_score": round(a["total_score"], 1),
+                }
+                for a in result["assignments"]
+            ],
+            "unassigned": [
+                {"project_id": project.id, "project_title": project.title}
+                for project in result["unassigned"]
+            ],
+        }
+    )
+
+
+def _create_batch_assignments(request):
+    """割当案を打診中のアサインとしてまとめて登録"""
+    try:
+        data = json.loads(request.body)
+        pairs = [
+            (int(item["project_id"]), int(item["craftsman_id"]))
+            for item in data["assignments"]
+        ]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "assignments を指定してください"}, status=400)
+
+    projects = Project.objects.in_bulk({project_id for project_id, _ in pairs})
+    craftsmen = Craftsman.objects.in_bulk({craftsman_id for _, craftsman_id in pairs})
+    assigned_by = Surveyor.objects.first()  # 仮の担当者
+
+    assignments = []
+    for project_id, craftsman_id in pairs:
+        project = projects.get(project_id)
+        craftsman = craftsmen.get(craftsman_id)
+        if project is None or craftsman is None:
+            return JsonResponse(
+                {"error": f"案件 {project_id} または職人 {craftsman_id} が見つかりません"},
+                status=404,
+            )
+        assignment = Assignment(
+            project=project,
+            craftsman=craftsman,
+            assigned_by=assigned_by,
+            scheduled_start_date=project.start_date,
+            scheduled_end_date=project.end_date,
+            estimated_hours=project.duration_days * 8,
+            offered_rate=craftsman.hourly_rate,
+            inquiry_message=f"案件「{project.title}」についてご相談があります。",
+        )
+        # bulk_create では save() を通らないため総額はここで計算
+        assignment.total_amount = assignment.calculate_total_amount()
+        assignments.append(assignment)
+
+    with transaction.atomic():
+        # 計画を作った後に打診・確定された組（再送を含む）は登録しない
+        list(Project.objects.select_for_update().filter(pk__in=projects))
+        accepted, skipped = _filter_open_assignments(assignments)
+        created = Assignment.objects.bulk_create(accepted)
+
+    return JsonResponse(
+        {
+            "success": True,
+            "assignment_ids": [assignment.id for assignment in created],
+            "skipped": skipped,
+            "message": f"{len(created)}件の打診を登録しました"
+            + (f"（{len(skipped)}件は登録済み・予定重複のため除外）" if skipped else ""),
+        }
+    )
+
+
+def _filter_open_assignments(assignments):
+    """
+    打診中・確定済みのアサインと衝突する組を除く
+
+    案件にすでに打診中・確定済みのアサインがある組と、職人の打診中・確定済みのアサインと
+    期間が重なる組（同じ依頼内の組どうしを含む）を除外する。
+
+    Returns:
+        (登録するアサインのリスト, [{"project_id", "craftsman_id", "reason"}, ...])
+    """
+    if not assignments:
+        return [], []
+
+    open_projects = set(
+        Assignment.objects.filter(
+            project__in={a.project_id for a in assignments},
+            status__in=OPEN_ASSIGNMENT_STATUSES,
+        ).values_list("project_id", flat=True)
+    )
+    busy = defaultdict(list)
+    for craftsman_id, start_date, end_date in Assignment.objects.filter(
+        craftsman__in={a.craftsman_id for a in assignments},
+        status__in=OPEN_ASSIGNMENT_STATUSES,
+        scheduled_start_date__lte=max(a.scheduled_end_date for a in assignments),
+        scheduled_end_date__gte=min(a.scheduled_start_date for a in assignments),
+    ).values_list("craftsman_id", "scheduled_start_date", "scheduled_end_date"):
+        busy[craftsman_id].append((start_date, end_date))
+
+    accepted = []
+    skipped = []
+    for assignment in assignments:
+        start_date = assignment.scheduled_start_date
+        end_date = assignment.scheduled_end_date
+        if assignment.project_id in open_projects:
+            reason = "案件には打診中・確定済みのアサインがあります"
+        elif any(
+            start <= end_date and start_date <= end
+            for start, end in busy[assignment.craftsman_id]
+        ):
+            reason = "職人の予定が期間内に埋まっています"
+        else:
+            accepted.append(assignment)
+            open_projects.add(assignment.project_id)
+            busy[assignment.craftsman_id].append((start_date, end_date))
+            continue
+        skipped.append(
+            {
+                "project_id": assignment.project_id,
+                "craftsman_id": assignment.craftsman_id,
+                "reason": reason,
+            }
+        )
+    return accepted, skipped
+
+
 def schedule_bulk_update(request):
     """スケジュール一括更新"""
     if request.method == "POST":
@@ -287,33 +577,17 @@ def schedule_bulk_update(request):
             exclude_weekends = form.cleaned_data["exclude_weekends"]
             notes = form.cleaned_data["notes"]
 
-            created_count = 0
-            current_date = start_date
-
-            with transaction.atomic():
-                while current_date <= end_date:
-                    # 土日除外オプション
-                    if exclude_weekends and current_date.weekday() >= 5:
-                        current_date += timedelta(days=1)
-                        continue
-
-                    schedule, created = CraftsmanSchedule.objects.get_or_create(
-                        craftsman=craftsman,
-                        date=current_date,
-                        defaults={"is_available": is_available, "notes": notes},
-                    )
-
-                    if not created:
-                        schedule.is_available = is_available
-                        if notes:
-                            schedule.notes = notes
-                        schedule.save()
-
-                    created_count += 1
-                    current_date += timedelta(days=1)
+            result = upsert_craftsman_schedule(
+                craftsman,
+                schedule_dates(start_date, end_date, exclude_weekends),
+                is_available,
+                notes=notes,
+            )
 
             messages.success(
-                request, f"{craftsman.name}さんのスケジュールを{created_count}日分更新しました"
+                request,
+                f"{craftsman.name}さんのスケジュールを{result['created'] + result['updated']}日分更新しました"
+                f"（新規 {result['created']}日 / 更新 {result['updated']}日）",
             )
             return redirect("craftsman_schedule_calendar", craftsman_id=craftsman.id)
     else:
@@ -365,6 +639,9 @@ class CraftsmanDetailView(DetailView):
     template_name = "craftsman/craftsman_detail.html"
     context_object_name = "craftsman"
 
+    def get_queryset(self):
+        return Craftsman.objects.with_metrics()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         craftsman = self.object
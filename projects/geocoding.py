@@ -0,0 +1,161 @@
+"""
+オフライン住所ジオコーダ
+
+同梱の市区町村代表点テーブル（data/municipality_centroids.csv）から住所の緯度経度を引く。
+外部APIは使わないため、ネットワークのない環境でも動く。
+住所は area_index と同じトークンに分解し、区 → 市町村 → 都道府県 の順で最も細かい代表点を返す。
+全国版のテーブルを使う場合は settings.MUNICIPALITY_CENTROIDS_FILE で差し替える。
+"""
+import csv
+import math
+from functools import lru_cache
+from pathlib import Path
+
+from django.apps import apps as global_apps
+from django.conf import settings
+
+from .area_index import AREA_SEPARATOR_PATTERN, normalize_area_name, parse_area_tokens
+
+
+DEFAULT_CENTROIDS_FILE = (
+    Path(__file__).resolve().parent / "data" / "municipality_centroids.csv"
+)
+
+EARTH_RADIUS_KM = 6371.0
+
+# この距離で近接スコアが0になる
+PROXIMITY_RANGE_KM = 60.0
+
+
+@lru_cache(maxsize=1)
+def load_centroids():
+    """
+    代表点テーブルを読み込む
+
+    Returns:
+        ({(都道府県キー, 市区町村キー): (緯度, 経度)}, {市区町村キー: (緯度, 経度)})
+        2つ目は都道府県なしの住所用で、同名の市区町村が複数ある名前は含めない。
+    """
+    path = getattr(settings, "MUNICIPALITY_CENTROIDS_FILE", DEFAULT_CENTROIDS_FILE)
+    by_prefecture = {}
+    by_name = {}
+    ambiguous = set()
+
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            prefecture = normalize_area_name(row["prefecture"])
+            municipality = normalize_area_name(row["municipality"])
+            point = (float(row["latitude"]), float(row["longitude"]))
+            by_prefecture[(prefecture, municipality)] = point
+            if municipality:
+                if municipality in by_name:
+                    ambiguous.add(municipality)
+                by_name[municipality] = point
+
+    for municipality in ambiguous:
+        del by_name[municipality]
+    return by_prefecture, by_name
+
+
+@lru_cache(maxsize=4096)
+def geocode(address):
+    """住所の代表点 (緯度, 経度) を返す（見つからなければ None）"""
+    tokens = parse_area_tokens(address)
+    if not tokens:
+        return None
+
+    by_prefecture, by_name = load_centroids()
+    prefecture = next((key for key, _, level in tokens if level == "prefecture"), None)
+    municipalities = [key for key, _, level in reversed(tokens) if level != "prefecture"]
+
+    for municipality in municipalities:
+        if prefecture is not None:
+            point = by_prefecture.get((prefecture, municipality))
+        else:
+            point = by_name.get(municipality)
+        if point:
+            return point
+
+    if prefecture is not None:
+        return by_prefecture.get((prefecture, ""))
+    return None
+
+
+def geocode_coverage(coverage_areas):
+    """対応エリア（カンマ区切り）のうち最初に位置が分かる項目の代表点"""
+    for area in AREA_SEPARATOR_PATTERN.split(coverage_areas or ""):
+        point = geocode(area.strip())
+        if point:
+            return point
+    return None
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """2点間の大円距離 (km)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def distances_from(origin, points):
+    """
+    1点から複数点への大円距離 (km) をまとめて計算
+
+    起点側の三角関数は1度だけ求める。位置が分からない点（None）の距離は None。
+    """
+    if origin is None:
+        return [None] * len(points)
+
+    phi1 = math.radians(origin[0])
+    lam1 = math.radians(origin[1])
+    cos_phi1 = math.cos(phi1)
+    distances = []
+    for point in points:
+        if point is None:
+            distances.append(None)
+            continue
+        phi2 = math.radians(point[0])
+        a = (
+            math.sin((phi2 - phi1) / 2) ** 2
+            + cos_phi1 * math.cos(phi2) * math.sin((math.radians(point[1]) - lam1) / 2) ** 2
+        )
+        distances.append(2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a))))
+    return distances
+
+
+def proximity_score(distance_km):
+    """距離を近接スコア (0-100) に変換（距離不明は None）"""
+    if distance_km is None:
+        return None
+    return max(0.0, 1 - distance_km / PROXIMITY_RANGE_KM) * 100
+
+
+def location_of(instance):
+    """案件・調査員・職人の保存済み座標（未ジオコードは None）"""
+    if instance.latitude is None or instance.longitude is None:
+        return None
+    return (instance.latitude, instance.longitude)
+
+
+def geocode_all(apps=global_apps):
+    """全案件・調査員・職人の座標を代表点テーブルから作り直す（マイグレーションからも利用）"""
+    counts = {}
+    for model_name, field, geocoder in (
+        ("Project", "address", geocode),
+        ("Surveyor", "base_location", geocode),
+        ("Craftsman", "coverage_areas", geocode_coverage),
+    ):
+        model = apps.get_model("projects", model_name)
+        rows = []
+        for instance in model.objects.only("pk", field):
+            point = geocoder(getattr(instance, field))
+            instance.latitude, instance.longitude = point or (None, None)
+            rows.append(instance)
+        model.objects.bulk_update(rows, ["latitude", "longitude"], batch_size=500)
+        counts[model._meta.model_name] = sum(
+            1 for instance in rows if instance.latitude is not None
+        )
+    return counts
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from projects.geocoding import geocode, geocode_all, load_centroids
+
+
+class Command(BaseCommand):
+    help = '案件・調査員・職人の住所から座標を作り直す（同梱の市区町村代表点テーブルを使用）'
+
+    def handle(self, *args, **options):
+        load_centroids.cache_clear()
+        geocode.cache_clear()
+        counts = geocode_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'座標を設定しました（案件 {counts["project"]}件 / 調査員 {counts["surveyor"]}件 / '
+            f'職人 {counts["craftsman"]}件）'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from projects import photo_pipeline
+
+
+class Command(BaseCommand):
+    help = '縮小版が未生成の調査写真を処理する（再起動などで処理待ちのまま残った写真の回収用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true', help='処理に失敗した写真もやり直す')
+
+    def handle(self, *args, **options):
+        statuses = [photo_pipeline.STATUS_PENDING]
+        if options['retry_failed']:
+            statuses.append(photo_pipeline.STATUS_FAILED)
+
+        for model in photo_pipeline.photo_models():
+            photos = model.objects.filter(processing_status__in=statuses).order_by('pk')
+            processed = failed = 0
+            for photo in photos.iterator():
+                if photo_pipeline.process_photo(photo):
+                    processed += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f'{model._meta.label} #{photo.pk}: {photo.processing_error}')
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name}（{model._meta.app_label}）: {processed}件を処理、{failed}件が失敗しました'
+            ))
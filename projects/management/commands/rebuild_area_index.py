@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from projects.area_index import rebuild_area_index
+
+
+class Command(BaseCommand):
+    help = '案件の住所・職人の対応エリアからエリアトークンの索引を作り直す'
+
+    def handle(self, *args, **options):
+        counts = rebuild_area_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'エリアの紐づけを作成しました（案件側 {counts["project"]}件 / 職人側 {counts["craftsman"]}件）'
+        ))
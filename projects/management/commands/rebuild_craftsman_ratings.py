@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from projects.rating_aggregates import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = '職人の評価件数・評価合計・平均評価を評価データから集計し直す'
+
+    def handle(self, *args, **options):
+        rated = rebuild_rating_aggregates()
+        self.stdout.write(self.style.SUCCESS(f'評価のある職人 {rated}名の累計を再集計しました'))
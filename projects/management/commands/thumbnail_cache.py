@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from projects import photo_pipeline
+from projects.thumbnails import THUMBNAIL_SOURCES, get_thumbnail_cache, source_model
+
+
+class Command(BaseCommand):
+    help = 'サムネイルキャッシュの件数とサイズを表示する（--backfill で既存写真のコンテンツハッシュを記録、--clear でキャッシュを削除）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='キャッシュのファイルをすべて削除する')
+        parser.add_argument('--backfill', action='store_true', help='コンテンツハッシュが未記録の写真に記録する')
+
+    def handle(self, *args, **options):
+        cache = get_thumbnail_cache()
+        if options['clear']:
+            cache.clear()
+            self.stdout.write(self.style.SUCCESS(f'サムネイルキャッシュ（{cache.root}）を削除しました'))
+            return
+
+        if options['backfill']:
+            for kind in THUMBNAIL_SOURCES:
+                model = source_model(kind)
+                updated = 0
+                for photo in model.objects.filter(content_hash='').order_by('pk').iterator():
+                    photo_pipeline.assign_content_hash(photo)
+                    if photo.content_hash:
+                        model.objects.filter(pk=photo.pk).update(content_hash=photo.content_hash)
+                        updated += 1
+                self.stdout.write(f'{model._meta.label}: {updated}件のコンテンツハッシュを記録しました')
+
+        stats = cache.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'サムネイルキャッシュ: {stats["files"]}件 '
+            f'{stats["bytes"] / 1024 / 1024:.1f}MB / 上限 {stats["max_bytes"] / 1024 / 1024:.0f}MB（{cache.root}）'
+        ))
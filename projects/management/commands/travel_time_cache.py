@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max, Min
+
+from projects.models import TravelTime
+from projects.travel_times import get_travel_time_cache
+
+
+class Command(BaseCommand):
+    help = '移動時間キャッシュの件数を表示する（--clear で現在の推定方式のキャッシュを削除）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='現在の推定方式のキャッシュを削除する')
+
+    def handle(self, *args, **options):
+        cache = get_travel_time_cache()
+        if options['clear']:
+            cache.clear()
+            self.stdout.write(self.style.SUCCESS(f'移動時間キャッシュ（{cache.estimator.name}）を削除しました'))
+            return
+
+        rows = TravelTime.objects.values('estimator').annotate(
+            count=Count('id'), oldest=Min('last_used_at'), newest=Max('last_used_at')
+        ).order_by('estimator')
+        for row in rows:
+            self.stdout.write(
+                f'{row["estimator"]}: {row["count"]}件（最終利用 {row["oldest"]:%Y-%m-%d} 〜 {row["newest"]:%Y-%m-%d}）'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'現在の推定方式: {cache.estimator.name}（上限 {cache.max_entries}件）'
+        ))
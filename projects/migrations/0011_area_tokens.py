@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:00
+
+from django.db import migrations, models
+
+
+def build_area_index(apps, schema_editor):
+    from projects.area_index import rebuild_area_index
+
+    rebuild_area_index(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0010_projecteditsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AreaToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='正規化キー')),
+                ('name', models.CharField(max_length=100, verbose_name='エリア名')),
+                ('level', models.CharField(choices=[('prefecture', '都道府県'), ('city', '市区町村'), ('ward', '区'), ('other', 'その他')], max_length=20, verbose_name='レベル')),
+            ],
+            options={
+                'verbose_name': 'エリアトークン',
+                'verbose_name_plural': 'エリアトークン',
+            },
+        ),
+        migrations.AddField(
+            model_name='craftsman',
+            name='area_tokens',
+            field=models.ManyToManyField(blank=True, related_name='craftsmen', to='projects.areatoken', verbose_name='対応エリア（索引）'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='area_tokens',
+            field=models.ManyToManyField(blank=True, related_name='projects', to='projects.areatoken', verbose_name='エリア'),
+        ),
+        migrations.RunPython(build_area_index, migrations.RunPython.noop),
+    ]
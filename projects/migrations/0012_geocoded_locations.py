@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:03
+
+from django.db import migrations, models
+
+
+def geocode_existing(apps, schema_editor):
+    from projects.geocoding import geocode_all
+
+    geocode_all(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0011_area_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='craftsman',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='緯度'),
+        ),
+        migrations.AddField(
+            model_name='craftsman',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='経度'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='緯度'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='経度'),
+        ),
+        migrations.AddField(
+            model_name='surveyor',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='緯度'),
+        ),
+        migrations.AddField(
+            model_name='surveyor',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='経度'),
+        ),
+        migrations.RunPython(geocode_existing, migrations.RunPython.noop),
+    ]
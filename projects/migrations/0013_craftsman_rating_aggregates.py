@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:05
+
+from django.db import migrations, models
+
+
+def build_rating_aggregates(apps, schema_editor):
+    from projects.rating_aggregates import rebuild_rating_aggregates
+
+    rebuild_rating_aggregates(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0012_geocoded_locations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='craftsman',
+            name='rating_count',
+            field=models.IntegerField(default=0, verbose_name='評価件数'),
+        ),
+        migrations.AddField(
+            model_name='craftsman',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8, verbose_name='評価合計'),
+        ),
+        migrations.RunPython(build_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0013_craftsman_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TravelTime',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estimator', models.CharField(max_length=30, verbose_name='推定方式')),
+                ('origin', models.CharField(max_length=32, verbose_name='出発地点')),
+                ('destination', models.CharField(max_length=32, verbose_name='到着地点')),
+                ('minutes', models.IntegerField(verbose_name='移動時間（分）')),
+                ('distance_km', models.FloatField(verbose_name='移動距離（km）')),
+                ('last_used_at', models.DateTimeField(db_index=True, verbose_name='最終利用日時')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='登録日時')),
+            ],
+            options={
+                'verbose_name': '移動時間キャッシュ',
+                'verbose_name_plural': '移動時間キャッシュ',
+                'unique_together': {('estimator', 'origin', 'destination')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0015_survey_photo_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='progressphoto',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='コンテンツハッシュ'),
+        ),
+        migrations.AddField(
+            model_name='surveyphoto',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='コンテンツハッシュ'),
+        ),
+    ]
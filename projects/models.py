@@ -1,9 +1,16 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models.functions import Cast, Coalesce, Round
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 import json
 
+from . import photo_pipeline, thumbnails
+
 
 class Customer(models.Model):
     name = models.CharField(max_length=100, verbose_name="顧客名")
@@ -35,6 +42,28 @@ class ProjectType(models.Model):
         return self.name
 
 
+class AreaToken(models.Model):
+    """住所エリアトークン（都道府県・市区町村・区）"""
+
+    LEVEL_CHOICES = [
+        ("prefecture", "都道府県"),
+        ("city", "市区町村"),
+        ("ward", "区"),
+        ("other", "その他"),
+    ]
+
+    key = models.CharField(max_length=100, unique=True, verbose_name="正規化キー")
+    name = models.CharField(max_length=100, verbose_name="エリア名")
+    level = models.CharField(max_length=20, choices=LEVEL_CHOICES, verbose_name="レベル")
+
+    class Meta:
+        verbose_name = "エリアトークン"
+        verbose_name_plural = "エリアトークン"
+
+    def __str__(self):
+        return self.name
+
+
 class Project(models.Model):
     STATUS_CHOICES = [
         ("draft", "下書き"),
@@ -50,6 +79,11 @@ class Project(models.Model):
     )
     title = models.CharField(max_length=200, verbose_name="案件名")
     address = models.TextField(verbose_name="作業場所")
+    area_tokens = models.ManyToManyField(
+        AreaToken, blank=True, related_name="projects", verbose_name="エリア"
+    )
+    latitude = models.FloatField(null=True, blank=True, verbose_name="緯度")
+    longitude = models.FloatField(null=True, blank=True, verbose_name="経度")
     start_date = models.DateField(verbose_name="開始予定日")
     end_date = models.DateField(verbose_name="終了予定日")
     amount = models.DecimalField(max_digits=10, decimal_places=0, verbose_name="金額")
@@ -70,6 +104,24 @@ class Project(models.Model):
     def __str__(self):
         return f"{self.title} - {self.customer.name}"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "address" in update_fields:
+            from .geocoding import geocode
+
+            self.latitude, self.longitude = geocode(self.address) or (None, None)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "latitude", "longitude"}
+
+        super().save(*args, **kwargs)
+
+        # 住所が変わりうる保存ではエリアトークンを作り直す
+        if update_fields is None or "address" in update_fields:
+            from .area_index import sync_project_areas
+
+            if getattr(self, "_area_source", None) != self.address:
+                sync_project_areas(self)
+
     @property
     def formatted_amount(self):
         return f"{self.amount:,}円"
@@ -208,6 +260,8 @@ class Surveyor(models.Model):
     email = models.EmailField(blank=True, verbose_name="メールアドレス")
     is_active = models.BooleanField(default=True, verbose_name="稼働可能")
     base_location = models.CharField(max_length=100, blank=True, verbose_name="拠点")
+    latitude = models.FloatField(null=True, blank=True, verbose_name="緯度")
+    longitude = models.FloatField(null=True, blank=True, verbose_name="経度")
     daily_capacity = models.IntegerField(default=3, verbose_name="1日最大件数")
     work_start_time = models.TimeField(default="09:00", verbose_name="開始時刻")
     work_end_time = models.TimeField(default="17:00", verbose_name="終了時刻")
@@ -220,6 +274,17 @@ class Surveyor(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "base_location" in update_fields:
+            from .geocoding import geocode
+
+            self.latitude, self.longitude = geocode(self.base_location) or (None, None)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "latitude", "longitude"}
+
+        super().save(*args, **kwargs)
+
     @property
     def daily_work_hours(self):
         start = timezone.datetime.combine(
@@ -348,6 +413,26 @@ class SurveyRoute(models.Model):
         return f"{self.surveyor.name} - {self.date}"
 
 
+class TravelTime(models.Model):
+    """地点間の移動時間キャッシュ（travel_times.TravelTimeCache が管理）"""
+
+    estimator = models.CharField(max_length=30, verbose_name="推定方式")
+    origin = models.CharField(max_length=32, verbose_name="出発地点")
+    destination = models.CharField(max_length=32, verbose_name="到着地点")
+    minutes = models.IntegerField(verbose_name="移動時間（分）")
+    distance_km = models.FloatField(verbose_name="移動距離（km）")
+    last_used_at = models.DateTimeField(db_index=True, verbose_name="最終利用日時")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="登録日時")
+
+    class Meta:
+        verbose_name = "移動時間キャッシュ"
+        verbose_name_plural = "移動時間キャッシュ"
+        unique_together = ["estimator", "origin", "destination"]
+
+    def __str__(self):
+        return f"{self.origin} → {self.destination}: {self.minutes}分"
+
+
 class SurveyReport(models.Model):
     """調査記録・報告書"""
 
@@ -497,8 +582,25 @@ class SurveyPhoto(models.Model):
     )
     is_before = models.BooleanField(default=True, verbose_name="施工前写真")
     upload_order = models.IntegerField(default=0, verbose_name="アップロード順序")
+    processing_status = models.CharField(
+        max_length=10,
+        choices=photo_pipeline.STATUS_CHOICES,
+        default=photo_pipeline.STATUS_PENDING,
+        verbose_name="処理状況",
+    )
+    renditions = models.JSONField(default=dict, blank=True, verbose_name="縮小版")
+    processing_error = models.CharField(
+        max_length=200, blank=True, verbose_name="処理エラー"
+    )
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name="処理日時")
+    content_hash = models.CharField(
+        max_length=64, blank=True, editable=False, verbose_name="コンテンツハッシュ"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="撮影日時")
 
+    # 縮小版の元にする ImageField
+    source_field = "photo"
+
     class Meta:
         verbose_name = "調査写真"
         verbose_name_plural = "調査写真"
@@ -511,8 +613,25 @@ class SurveyPhoto(models.Model):
 
     @property
     def thumbnail_url(self):
-        """サムネイルURL（実装時に画像処理ライブラリを使用）"""
-        return self.photo.url
+        """サムネイルURL"""
+        return thumbnails.thumbnail_url(self)
+
+    @property
+    def display_url(self):
+        """表示用URL（長辺1920pxの縮小版、生成前は原本）"""
+        return photo_pipeline.rendition_url(self, "large")
+
+
+@receiver(pre_save, sender=SurveyPhoto)
+def hash_survey_photo(sender, instance, **kwargs):
+    """写真のコンテンツハッシュを記録"""
+    photo_pipeline.assign_content_hash(instance, kwargs.get("update_fields"))
+
+
+@receiver(post_delete, sender=SurveyPhoto)
+def delete_survey_photo_renditions(sender, instance, **kwargs):
+    """削除された写真の縮小版ファイルを削除"""
+    photo_pipeline.delete_renditions(instance)
 
 
 class WorkerNotification(models.Model):
@@ -577,6 +696,60 @@ class SurveyTemplate(models.Model):
         return f"{self.name} ({self.project_type.name})"
 
 
+class CraftsmanQuerySet(models.QuerySet):
+    """職人クエリセット"""
+
+    def with_metrics(self, today=None, horizon_days=30):
+        """
+        一覧表示用の指標を固定回数のクエリでまとめて付与
+
+        - upcoming_assignment_count: 今後7日に開始する確定・作業中のアサイン数（サブクエリ）
+        - specialties: 得意工種（prefetch）
+        - upcoming_blocked_schedules / upcoming_active_assignments:
+          today から horizon_days 日分の休み・割当済みの日とアサイン（prefetch）。
+          next_free_date と can_work_on はこれを使い、インスタンスごとのクエリを発行しない。
+        """
+        today = today or timezone.now().date()
+        horizon = today + timezone.timedelta(days=horizon_days)
+
+        workload = (
+            Assignment.objects.filter(
+                craftsman=models.OuterRef("pk"),
+                status__in=["confirmed", "in_progress"],
+                project__start_date__range=[today, today + timezone.timedelta(days=7)],
+            )
+            .order_by()
+            .values("craftsman")
+            .annotate(count=models.Count("pk"))
+            .values("count")
+        )
+
+        return self.annotate(
+            upcoming_assignment_count=Coalesce(models.Subquery(workload), 0),
+            metrics_start_date=models.Value(today, output_field=models.DateField()),
+            metrics_end_date=models.Value(horizon, output_field=models.DateField()),
+        ).prefetch_related(
+            "specialties",
+            models.Prefetch(
+                "craftsmanschedule_set",
+                queryset=CraftsmanSchedule.objects.filter(
+                    models.Q(is_available=False) | models.Q(assigned_project__isnull=False),
+                    date__range=[today, horizon],
+                ),
+                to_attr="upcoming_blocked_schedules",
+            ),
+            models.Prefetch(
+                "assignment_set",
+                queryset=Assignment.objects.filter(
+                    status__in=["confirmed", "in_progress"],
+                    scheduled_start_date__lte=horizon,
+                    scheduled_end_date__gte=today,
+                ),
+                to_attr="upcoming_active_assignments",
+            ),
+        )
+
+
 class Craftsman(models.Model):
     """職人"""
 
@@ -600,6 +773,11 @@ class Craftsman(models.Model):
         max_digits=6, decimal_places=0, verbose_name="時給（円）"
     )
     coverage_areas = models.TextField(verbose_name="対応エリア", help_text="カンマ区切りで入力")
+    area_tokens = models.ManyToManyField(
+        AreaToken, blank=True, related_name="craftsmen", verbose_name="対応エリア（索引）"
+    )
+    latitude = models.FloatField(null=True, blank=True, verbose_name="緯度")
+    longitude = models.FloatField(null=True, blank=True, verbose_name="経度")
     is_active = models.BooleanField(default=True, verbose_name="稼働可能")
     bio = models.TextField(blank=True, verbose_name="自己紹介・実績")
 
@@ -608,10 +786,17 @@ class Craftsman(models.Model):
     average_rating = models.DecimalField(
         max_digits=3, decimal_places=2, default=0.00, verbose_name="平均評価"
     )
+    # 平均評価の元になる累計（評価の登録・変更・削除時に F() で加減算）
+    rating_count = models.IntegerField(default=0, verbose_name="評価件数")
+    rating_sum = models.DecimalField(
+        max_digits=8, decimal_places=2, default=0, verbose_name="評価合計"
+    )
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="登録日時")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
 
+    objects = CraftsmanQuerySet.as_manager()
+
     class Meta:
         verbose_name = "職人"
         verbose_name_plural = "職人"
@@ -620,6 +805,27 @@ class Craftsman(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_skill_level_display()})"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "coverage_areas" in update_fields:
+            from .geocoding import geocode_coverage
+
+            self.latitude, self.longitude = geocode_coverage(self.coverage_areas) or (
+                None,
+                None,
+            )
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "latitude", "longitude"}
+
+        super().save(*args, **kwargs)
+
+        # 対応エリアが変わりうる保存ではエリアトークンを作り直す
+        if update_fields is None or "coverage_areas" in update_fields:
+            from .area_index import sync_craftsman_areas
+
+            if getattr(self, "_area_source", None) != self.coverage_areas:
+                sync_craftsman_areas(self)
+
     @property
     def coverage_area_list(self):
         """対応エリアをリストで取得"""
@@ -627,38 +833,97 @@ class Craftsman(models.Model):
 
     @property
     def specialty_names(self):
-        """得意工種名をリストで取得"""
-        return list(self.specialties.values_list("name", flat=True))
+        """得意工種名をリストで取得（prefetch 済みならクエリなし）"""
+        return [project_type.name for project_type in self.specialties.all()]
 
     @property
     def current_workload(self):
         """現在の作業負荷を計算"""
         from django.utils import timezone
 
-        today = timezone.now().date()
-        next_week = today + timezone.timedelta(days=7)
+        assigned_days = getattr(self, "upcoming_assignment_count", None)
+        if assigned_days is None:
+            today = timezone.now().date()
+            next_week = today + timezone.timedelta(days=7)
 
-        assigned_days = Assignment.objects.filter(
-            craftsman=self,
-            status__in=["confirmed", "in_progress"],
-            project__start_date__range=[today, next_week],
-        ).count()
+            assigned_days = Assignment.objects.filter(
+                craftsman=self,
+                status__in=["confirmed", "in_progress"],
+                project__start_date__range=[today, next_week],
+            ).count()
 
         return min(assigned_days * 20, 100)  # 最大100%
 
+    def _has_metrics_for(self, date):
+        """with_metrics() で読み込んだ期間に date が含まれるか"""
+        return (
+            hasattr(self, "upcoming_blocked_schedules")
+            and self.metrics_start_date <= date <= self.metrics_end_date
+        )
+
+    @property
+    def next_free_date(self):
+        """
+        今日以降で最初の空き日（休み・割当済み・確定アサインのない日）
+
+        with_metrics() で取得した場合は読み込み済みの期間内で探し、見つからなければ None。
+        """
+        from django.utils import timezone
+
+        if hasattr(self, "upcoming_blocked_schedules"):
+            start_date, end_date = self.metrics_start_date, self.metrics_end_date
+            schedules = self.upcoming_blocked_schedules
+            assignments = self.upcoming_active_assignments
+        else:
+            start_date = timezone.now().date()
+            end_date = start_date + timezone.timedelta(days=30)
+            schedules = CraftsmanSchedule.objects.filter(
+                models.Q(is_available=False) | models.Q(assigned_project__isnull=False),
+                craftsman=self,
+                date__range=[start_date, end_date],
+            )
+            assignments = Assignment.objects.filter(
+                craftsman=self,
+                status__in=["confirmed", "in_progress"],
+                scheduled_start_date__lte=end_date,
+                scheduled_end_date__gte=start_date,
+            )
+
+        if not self.is_active:
+            return None
+
+        blocked = {schedule.date for schedule in schedules}
+        for assignment in assignments:
+            current_date = max(assignment.scheduled_start_date, start_date)
+            while current_date <= min(assignment.scheduled_end_date, end_date):
+                blocked.add(current_date)
+                current_date += timezone.timedelta(days=1)
+
+        current_date = start_date
+        while current_date <= end_date:
+            if current_date not in blocked:
+                return current_date
+            current_date += timezone.timedelta(days=1)
+        return None
+
     def can_work_on(self, date, project_type=None):
         """指定日に作業可能かチェック"""
         if not self.is_active:
             return False
 
-        # スケジュール確認
-        schedule = CraftsmanSchedule.objects.filter(craftsman=self, date=date).first()
+        # スケジュール確認（with_metrics() の読み込み済み期間内ならクエリなし）
+        if self._has_metrics_for(date):
+            schedule = next(
+                (s for s in self.upcoming_blocked_schedules if s.date == date), None
+            )
+        else:
+            schedule = CraftsmanSchedule.objects.filter(craftsman=self, date=date).first()
 
         if schedule and not schedule.is_available:
             return False
 
         # 既にアサインされているかチェック
-        if schedule and schedule.assigned_project:
+        if schedule and schedule.assigned_project_id:
             return False
 
         # 工種が指定されている場合、対応可能かチェック
@@ -800,23 +1065,16 @@ class Assignment(models.Model):
             self.update_craftsman_schedule()
 
     def update_craftsman_schedule(self):
-        """職人のスケジュールを更新"""
-        from django.utils import timezone
-
-        # 予定期間中の日付でスケジュールを作成/更新
-        current_date = self.scheduled_start_date
-        while current_date <= self.scheduled_end_date:
-            schedule, created = CraftsmanSchedule.objects.get_or_create(
-                craftsman=self.craftsman,
-                date=current_date,
-                defaults={"is_available": False, "assigned_project": self.project},
-            )
-            if not created:
-                schedule.is_available = False
-                schedule.assigned_project = self.project
-                schedule.save()
-
-            current_date += timezone.timedelta(days=1)
+        """職人のスケジュールを更新（予定期間をまとめて upsert）"""
+        from .schedule_service import schedule_dates, upsert_craftsman_schedule
+
+        return upsert_craftsman_schedule(
+            self.craftsman,
+            schedule_dates(self.scheduled_start_date, self.scheduled_end_date),
+            is_available=False,
+            assigned_project=self.project,
+            assign=True,
+        )
 
 
 class CraftsmanRating(models.Model):
@@ -858,27 +1116,81 @@ class CraftsmanRating(models.Model):
     def save(self, *args, **kwargs):
         # 総合評価を自動計算
         self.overall_rating = (
-            self.technical_skill
-            + self.punctuality
-            + self.communication
-            + self.work_quality
-        ) / 4.0
+            Decimal(
+                self.technical_skill
+                + self.punctuality
+                + self.communication
+                + self.work_quality
+            )
+            / 4
+        )
 
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = (
+                    CraftsmanRating.objects.filter(pk=self.pk)
+                    .values_list("craftsman_id", "overall_rating")
+                    .first()
+                )
+
+            super().save(*args, **kwargs)
+
+            # 職人の評価累計を差分だけ更新
+            if previous:
+                self.apply_to_craftsman(previous[0], -1, -previous[1])
+            self.apply_to_craftsman(self.craftsman_id, 1, self.overall_rating)
+
+        self.refresh_craftsman_rating()
+
+    def delete(self, *args, **kwargs):
+        # 累計からの差し引きは post_delete（一括削除・カスケード削除を含む）で行う
+        result = super().delete(*args, **kwargs)
+        self.refresh_craftsman_rating()
+        return result
+
+    @staticmethod
+    def apply_to_craftsman(craftsman_id, count_delta, sum_delta):
+        """
+        職人の評価件数・合計に差分を加え、平均評価を累計から導出
 
-        # 職人の平均評価を更新
-        self.update_craftsman_rating()
+        読み出しを挟まない UPDATE 文なので同時に評価が登録されても加算が失われない。
+        平均は加算後の値から求めるため、別の UPDATE 文にしている（DBごとの評価順序に依存しない）。
+        """
+        craftsmen = Craftsman.objects.filter(pk=craftsman_id)
+        craftsmen.update(
+            rating_count=models.F("rating_count") + count_delta,
+            rating_sum=models.F("rating_sum") + sum_delta,
+        )
+        craftsmen.update(
+            average_rating=models.Case(
+                models.When(
+                    rating_count__gt=0,
+                    then=Round(
+                        Cast("rating_sum", models.FloatField())
+                        / models.F("rating_count"),
+                        2,
+                    ),
+                ),
+                default=models.Value(0),
+                output_field=models.DecimalField(max_digits=3, decimal_places=2),
+            )
+        )
 
-    def update_craftsman_rating(self):
-        """職人の平均評価を更新"""
-        from django.db.models import Avg
+    def refresh_craftsman_rating(self):
+        """読み込み済みの職人インスタンスの評価を DB の値に合わせる"""
+        if CraftsmanRating.craftsman.is_cached(self):
+            self.craftsman.refresh_from_db(
+                fields=["rating_count", "rating_sum", "average_rating"]
+            )
 
-        avg_rating = CraftsmanRating.objects.filter(craftsman=self.craftsman).aggregate(
-            Avg("overall_rating")
-        )["overall_rating__avg"]
 
-        self.craftsman.average_rating = avg_rating or 0.00
-        self.craftsman.save()
+@receiver(post_delete, sender=CraftsmanRating)
+def subtract_deleted_rating(sender, instance, **kwargs):
+    """削除された評価を職人の評価累計から差し引く"""
+    CraftsmanRating.apply_to_craftsman(
+        instance.craftsman_id, -1, -instance.overall_rating
+    )
 
 
 # 資材購入モジュール
@@ -1341,8 +1653,14 @@ class ProgressPhoto(models.Model):
     photo_type = models.CharField(
         max_length=20, choices=PHOTO_TYPE_CHOICES, default="during", verbose_name="写真種別"
     )
+    content_hash = models.CharField(
+        max_length=64, blank=True, editable=False, verbose_name="コンテンツハッシュ"
+    )
     taken_at = models.DateTimeField(auto_now_add=True)
 
+    # サムネイルの元にする ImageField
+    source_field = "photo"
+
     class Meta:
         ordering = ["-taken_at"]
         verbose_name = "進捗写真"
@@ -1351,6 +1669,17 @@ class ProgressPhoto(models.Model):
     def __str__(self):
         return f"{self.progress.project.title} - {self.get_photo_type_display()}"
 
+    @property
+    def thumbnail_url(self):
+        """サムネイルURL"""
+        return thumbnails.thumbnail_url(self)
+
+
+@receiver(pre_save, sender=ProgressPhoto)
+def hash_progress_photo(sender, instance, **kwargs):
+    """写真のコンテンツハッシュを記録"""
+    photo_pipeline.assign_content_hash(instance, kwargs.get("update_fields"))
+
 
 class ProjectIssue(models.Model):
     """プロジェクト問題管理"""
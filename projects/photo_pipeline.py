@@ -0,0 +1,486 @@
+"""
+調査写真の取り込みパイプライン
+
+アップロード時は原本をそのまま保存して応答を返し、縮小版の生成はプロセスプールに回す。
+ワーカーは原本を読み込んで EXIF の向きを画素に反映し、長辺 1920 / 640 / 160px の JPEG
+（settings.PHOTO_WEBP が真なら WebP も）を EXIF なしで原本と同じディレクトリに書き出す。
+完了・失敗は親プロセス側のコールバックで写真の processing_status に記録する。
+
+展開時のメモリを抑えるため、JPEG は draft モードで最大の縮小版に足りる 1/2〜1/8 の解像度で
+デコードし、画素数が PHOTO_MAX_PIXELS を超える画像（展開爆弾を含む）はヘッダーの時点で拒否する。
+処理待ちが PHOTO_PIPELINE_MAX_PENDING 件を超えたプロセスは新しいアップロードを 503 で断り、
+リクエストのプロセス内でのデコードは PHOTO_DECODE_CONCURRENCY 件までに制限する。
+
+対象のモデルは source_field（原本の ImageField 名）と
+processing_status / renditions / processing_error / processed_at を持つこと。
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import get_context
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+logger = logging.getLogger(__name__)
+
+# 縮小版の名前と長辺のピクセル数（大きい順）
+RENDITION_SIZES = {"large": 1920, "medium": 640, "small": 160}
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+# 受け付ける画像形式と保存時の拡張子（拡張子はクライアントのファイル名ではなく検出した形式で決める）
+FORMAT_EXTENSIONS = {
+    "JPEG": ".jpg",
+    "MPO": ".jpg",
+    "PNG": ".png",
+    "WEBP": ".webp",
+    "GIF": ".gif",
+    "BMP": ".bmp",
+    "TIFF": ".tif",
+}
+ACCEPTED_FORMATS = set(FORMAT_EXTENSIONS)
+
+# 受け付けるファイルサイズと画素数の上限（48MP のスマートフォン写真まで）
+DEFAULT_MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+DEFAULT_MAX_PIXELS = 50_000_000
+
+# プロセスごとの処理待ちの上限、リクエスト内で同時にデコードする数、デコード待ちの秒数
+DEFAULT_MAX_PENDING = 16
+DEFAULT_DECODE_CONCURRENCY = 2
+DECODE_WAIT_SECONDS = 10
+
+# ワーカーをこの件数ごとに作り直し、断片化したメモリを返す
+DEFAULT_TASKS_PER_CHILD = 50
+
+RETRY_AFTER_SECONDS = 10
+
+STATUS_PENDING = "pending"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+STATUS_CHOICES = [
+    (STATUS_PENDING, "処理待ち"),
+    (STATUS_READY, "処理済み"),
+    (STATUS_FAILED, "処理失敗"),
+]
+
+_executor = None
+_pending = 0
+_pending_lock = threading.Lock()
+_decode_semaphore = None
+_decode_semaphore_lock = threading.Lock()
+
+
+class PhotoRejectedError(Exception):
+    """受け付けられないアップロード（status は応答の HTTP ステータス）"""
+
+    status = 400
+
+
+class InvalidPhotoError(PhotoRejectedError):
+    """画像として読み込めないアップロード"""
+
+
+class PhotoTooLargeError(PhotoRejectedError):
+    """ファイルサイズか画素数が上限を超えるアップロード"""
+
+    status = 413
+
+
+class PipelineBusyError(PhotoRejectedError):
+    """処理待ちが上限に達している"""
+
+    status = 503
+
+
+def _setting(name, default):
+    return getattr(settings, name, None) or default
+
+
+def max_pixels():
+    """展開を許す画素数の上限（settings.PHOTO_MAX_PIXELS）"""
+    return _setting("PHOTO_MAX_PIXELS", DEFAULT_MAX_PIXELS)
+
+
+def check_pixels(size, max_pixels):
+    """画素数が上限を超えていれば PhotoTooLargeError"""
+    width, height = size
+    if width * height > max_pixels:
+        raise PhotoTooLargeError(
+            f"画像の画素数が大きすぎます（{width}×{height}、上限 {max_pixels:,} 画素）"
+        )
+
+
+def check_photo(uploaded):
+    """
+    アップロードされたファイルが対応形式で上限内の画像かをヘッダーだけで確かめる（画素は展開しない）
+
+    Returns:
+        Pillow が検出した画像形式（"JPEG" など）
+
+    Raises:
+        InvalidPhotoError: 画像でない、または対応していない形式
+        PhotoTooLargeError: 画素数が PHOTO_MAX_PIXELS を超える
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            with Image.open(uploaded) as image:
+                image_format = image.format
+                size = image.size
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+        raise PhotoTooLargeError("画像の画素数が大きすぎます") from e
+    except (UnidentifiedImageError, OSError) as e:
+        raise InvalidPhotoError("画像ファイルを読み込めません") from e
+    finally:
+        uploaded.seek(0)
+    if image_format not in ACCEPTED_FORMATS:
+        raise InvalidPhotoError(f"対応していない画像形式です: {image_format}")
+    check_pixels(size, max_pixels())
+    return image_format
+
+
+def check_upload_size(size):
+    """ファイルサイズが PHOTO_MAX_UPLOAD_BYTES を超えていれば PhotoTooLargeError"""
+    max_bytes = _setting("PHOTO_MAX_UPLOAD_BYTES", DEFAULT_MAX_UPLOAD_BYTES)
+    if size > max_bytes:
+        raise PhotoTooLargeError(
+            f"ファイルサイズが大きすぎます（上限 {max_bytes // (1024 * 1024)}MB）"
+        )
+
+
+def admit_upload(uploaded):
+    """
+    アップロードを受け付けてよいか確かめる（保存の前に呼ぶ）
+
+    Returns:
+        検出した画像形式（保存名の拡張子は photo_filename で決める）
+
+    Raises:
+        PhotoTooLargeError: ファイルサイズか画素数が上限を超える
+        PipelineBusyError: このプロセスの処理待ちが PHOTO_PIPELINE_MAX_PENDING 件に達している
+        InvalidPhotoError: 画像でない、または対応していない形式
+    """
+    check_upload_size(uploaded.size)
+    if _pending >= _setting("PHOTO_PIPELINE_MAX_PENDING", DEFAULT_MAX_PENDING):
+        raise PipelineBusyError("写真の処理が混み合っています。しばらくしてから再送してください")
+    return check_photo(uploaded)
+
+
+def photo_filename(stem, image_format):
+    """検出した画像形式の拡張子を付けた保存名"""
+    return f"{stem}{FORMAT_EXTENSIONS[image_format]}"
+
+
+def rejection_response(error):
+    """受け付けられないアップロードへの JSON 応答"""
+    response = JsonResponse({"error": str(error)}, status=error.status)
+    if isinstance(error, PipelineBusyError):
+        response["Retry-After"] = str(RETRY_AFTER_SECONDS)
+    return response
+
+
+@contextmanager
+def decode_slot():
+    """
+    このプロセスで画像をデコードする枠を確保する（同時に PHOTO_DECODE_CONCURRENCY 件まで）
+
+    Raises:
+        PipelineBusyError: DECODE_WAIT_SECONDS 秒待っても枠が空かない
+    """
+    global _decode_semaphore
+    with _decode_semaphore_lock:
+        if _decode_semaphore is None:
+            _decode_semaphore = threading.BoundedSemaphore(
+                _setting("PHOTO_DECODE_CONCURRENCY", DEFAULT_DECODE_CONCURRENCY)
+            )
+    if not _decode_semaphore.acquire(timeout=DECODE_WAIT_SECONDS):
+        raise PipelineBusyError("画像の処理が混み合っています")
+    try:
+        yield
+    finally:
+        _decode_semaphore.release()
+
+
+def draft_size(size, limit):
+    """長辺を limit に収めたときの大きさ（draft モードの要求サイズ）"""
+    width, height = size
+    scale = limit / max(width, height)
+    if scale >= 1:
+        return size
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def file_digest(f):
+    """ファイルの SHA-256（チャンクごとに読み、読み終えたら先頭に戻す）"""
+    digest = hashlib.sha256()
+    f.seek(0)
+    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+        digest.update(chunk)
+    f.seek(0)
+    return digest.hexdigest()
+
+
+def assign_content_hash(photo, update_fields=None):
+    """新しく添付された原本（とハッシュ未記録の原本）のコンテンツハッシュを記録する（pre_save 用）"""
+    if update_fields is not None and "content_hash" not in update_fields:
+        return
+    source = _source(photo)
+    if not source:
+        photo.content_hash = ""
+    elif not source._committed:
+        # 分割アップロードで組み立てたファイルは検証済みのハッシュを持っている
+        photo.content_hash = getattr(source.file, "content_hash", None) or file_digest(
+            source.file
+        )
+    elif not photo.content_hash:
+        try:
+            with source.open("rb") as f:
+                photo.content_hash = file_digest(f)
+        except FileNotFoundError:
+            logger.warning("写真の原本がありません: %s", source.name)
+
+
+def rendition_name(source_name, label, extension):
+    """原本のストレージ上の名前から縮小版の名前を作る"""
+    stem, _ = os.path.splitext(source_name)
+    return f"{stem}_{label}.{extension}"
+
+
+def save_atomic(image, path, image_format, **options):
+    """一時ファイル経由でアトミックに画像を書き込む"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, format=image_format, **options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def render_renditions(root, source_name, webp=False, max_pixels=DEFAULT_MAX_PIXELS):
+    """
+    原本から縮小版を書き出す（ワーカープロセス側の処理、DBアクセスなし）
+
+    Args:
+        root: MEDIA_ROOT
+        source_name: 原本のストレージ上の名前（root からの相対パス）
+        webp: WebP も書き出すか
+        max_pixels: 展開を許す画素数の上限
+
+    Returns:
+        {"renditions": {名前: {"jpeg": 相対パス, "webp": 相対パス}}}
+    """
+    root = Path(root)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        with Image.open(root / source_name) as original:
+            check_pixels(original.size, max_pixels)
+            # JPEG は最大の縮小版に足りる解像度でデコードする（他の形式では何もしない）
+            original.draft(
+                "RGB", draft_size(original.size, max(RENDITION_SIZES.values()))
+            )
+            image = ImageOps.exif_transpose(original)
+            return _write_renditions(root, source_name, image, webp)
+
+
+def _write_renditions(root, source_name, image, webp):
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    renditions = {}
+    # 大きい縮小版から順に縮めていき、小さい版ほど少ない画素から作る
+    for label, size in RENDITION_SIZES.items():
+        if image.width > size or image.height > size:
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        names = {"jpeg": rendition_name(source_name, label, "jpg")}
+        save_atomic(
+            image,
+            root / names["jpeg"],
+            "JPEG",
+            quality=JPEG_QUALITY,
+            optimize=True,
+            progressive=True,
+        )
+        if webp:
+            names["webp"] = rendition_name(source_name, label, "webp")
+            save_atomic(image, root / names["webp"], "WEBP", quality=WEBP_QUALITY)
+        renditions[label] = names
+    return {"renditions": renditions}
+
+
+def get_executor():
+    """写真処理用のプロセスプール（プロセス内で共有）"""
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, "PHOTO_PIPELINE_WORKERS", None) or min(
+            2, os.cpu_count() or 1
+        )
+        _executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context("spawn"),
+            max_tasks_per_child=_setting(
+                "PHOTO_PIPELINE_TASKS_PER_CHILD", DEFAULT_TASKS_PER_CHILD
+            ),
+        )
+    return _executor
+
+
+def _source(photo):
+    return getattr(photo, photo.source_field)
+
+
+def _record_result(model, pk, future):
+    """ワーカーの結果を写真に記録（プロセスプールのコールバック、親プロセスの別スレッドで動く）"""
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+    try:
+        error = future.exception()
+        if error is None:
+            result = future.result()
+            model.objects.filter(pk=pk).update(
+                processing_status=STATUS_READY,
+                renditions=result["renditions"],
+                processing_error="",
+                processed_at=timezone.now(),
+            )
+        else:
+            logger.warning("写真 %s:%s の処理に失敗しました: %s", model._meta.label, pk, error)
+            model.objects.filter(pk=pk).update(
+                processing_status=STATUS_FAILED,
+                processing_error=str(error)[:200],
+                processed_at=timezone.now(),
+            )
+    finally:
+        connection.close()
+
+
+def _submit(fn, *args):
+    """プロセスプールに投入（ワーカーの異常終了で壊れたプールは作り直して1回だけ再投入）"""
+    global _executor
+    executor = get_executor()
+    try:
+        return executor.submit(fn, *args)
+    except BrokenProcessPool:
+        logger.warning("写真処理のプロセスプールが停止していたため作り直します")
+        if _executor is executor:
+            _executor = None
+        return get_executor().submit(fn, *args)
+
+
+def submit_photo(photo):
+    """写真の縮小版生成をプロセスプールに投入（完了を待たない）"""
+    global _pending
+    with _pending_lock:
+        _pending += 1
+    try:
+        future = _submit(
+            render_renditions,
+            str(settings.MEDIA_ROOT),
+            _source(photo).name,
+            getattr(settings, "PHOTO_WEBP", False),
+            max_pixels(),
+        )
+    except Exception:
+        with _pending_lock:
+            _pending -= 1
+        raise
+    model = type(photo)
+    pk = photo.pk
+    future.add_done_callback(lambda f: _record_result(model, pk, f))
+    return future
+
+
+def _submit_or_fail(photo):
+    """
+    縮小版の生成を投入し、投入できなければ写真を処理失敗にする
+
+    アップロード自体は保存済みのため例外は上げない（process_survey_photos --retry-failed で再処理できる）。
+    """
+    try:
+        submit_photo(photo)
+    except Exception as e:
+        logger.exception("写真 %s:%s の処理を投入できませんでした", photo._meta.label, photo.pk)
+        type(photo).objects.filter(pk=photo.pk).update(
+            processing_status=STATUS_FAILED,
+            processing_error=str(e)[:200],
+            processed_at=timezone.now(),
+        )
+
+
+def enqueue_photo(photo):
+    """トランザクションの確定後に縮小版の生成を投入する"""
+    transaction.on_commit(lambda: _submit_or_fail(photo))
+
+
+def process_photo(photo):
+    """写真の縮小版をこのプロセスで生成し、結果を保存する（管理コマンド用）"""
+    try:
+        with decode_slot():
+            result = render_renditions(
+                str(settings.MEDIA_ROOT),
+                _source(photo).name,
+                getattr(settings, "PHOTO_WEBP", False),
+                max_pixels(),
+            )
+    except Exception as e:
+        photo.processing_status = STATUS_FAILED
+        photo.processing_error = str(e)[:200]
+    else:
+        photo.processing_status = STATUS_READY
+        photo.renditions = result["renditions"]
+        photo.processing_error = ""
+    photo.processed_at = timezone.now()
+    photo.save(
+        update_fields=[
+            "processing_status",
+            "renditions",
+            "processing_error",
+            "processed_at",
+        ]
+    )
+    return photo.processing_status == STATUS_READY
+
+
+def rendition_url(photo, label, image_format="jpeg"):
+    """縮小版のURL（未生成なら原本のURL）"""
+    source = _source(photo)
+    if not source:
+        return None
+    name = (photo.renditions or {}).get(label, {}).get(image_format)
+    if photo.processing_status != STATUS_READY or not name:
+        return source.url
+    return source.storage.url(name)
+
+
+def delete_renditions(photo):
+    """縮小版のファイルを削除"""
+    storage = _source(photo).storage
+    for names in (photo.renditions or {}).values():
+        for name in names.values():
+            storage.delete(name)
+
+
+def photo_models():
+    """パイプラインで処理する写真モデル"""
+    return [
+        apps.get_model("projects", "SurveyPhoto"),
+        apps.get_model("surveys", "SurveyPhoto"),
+    ]
@@ -0,0 +1,113 @@
+import json
+import re
+
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import (
+    require_GET,
+    require_http_methods,
+    require_POST,
+)
+
+from . import chunked_upload, photo_pipeline
+from .thumbnails import THUMBNAIL_SIZES, get_thumbnail_cache, source_model
+
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# URL にコンテンツハッシュを含むため、内容が変わることはない
+THUMBNAIL_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@require_GET
+def photo_thumbnail(request, kind, pk, digest, size):
+    """
+    写真のサムネイル（初回アクセスで生成してディスクにキャッシュ）
+
+    キャッシュ済みなら DB に問い合わせずにファイルを返す。
+    未生成なら写真を読み込み、URL のハッシュが写真のコンテンツハッシュと一致するときだけ生成する。
+    """
+    model = source_model(kind)
+    if model is None or size not in THUMBNAIL_SIZES or not DIGEST_RE.match(digest):
+        raise Http404
+
+    etag = f'"{digest}-{size}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        cache = get_thumbnail_cache()
+        f = cache.open(digest, size)
+        if f is None:
+            photo = get_object_or_404(model, pk=pk, content_hash=digest)
+            try:
+                f = open(cache.render(photo, size), "rb")
+            except photo_pipeline.PipelineBusyError as e:
+                return photo_pipeline.rejection_response(e)
+            except (photo_pipeline.PhotoRejectedError, OSError):
+                raise Http404
+        response = FileResponse(f, content_type="image/jpeg")
+        response["ETag"] = etag
+    response["Cache-Control"] = THUMBNAIL_CACHE_CONTROL
+    return response
+
+
+@require_POST
+def photo_upload_start(request):
+    """
+    写真の分割アップロードを開始
+
+    POST（JSON またはフォーム）: filename, size（バイト数）, sha256（16進）。ログインが必要
+    返り値の upload_id で分割を送り、最後に写真アップロード API へ upload_id を送る。
+    """
+    try:
+        if request.content_type == "application/json":
+            data = json.loads(request.body)
+        else:
+            data = request.POST
+        if not isinstance(data, dict):
+            return JsonResponse({"error": "送信データの形式が正しくありません"}, status=400)
+        size = int(data.get("size", 0))
+    except (ValueError, TypeError):
+        return JsonResponse({"error": "size の形式が正しくありません"}, status=400)
+
+    try:
+        result = chunked_upload.start(
+            data.get("filename", ""), size, data.get("sha256"), request.user
+        )
+    except photo_pipeline.PhotoRejectedError as e:
+        return photo_pipeline.rejection_response(e)
+    except chunked_upload.ChunkedUploadError as e:
+        return chunked_upload.error_response(e)
+    return JsonResponse(result, status=201)
+
+
+@require_http_methods(["GET", "PUT", "DELETE"])
+def photo_upload_session(request, upload_id):
+    """
+    分割アップロードの状態・分割の送信・中止
+
+    GET: 受信済みの位置 {"offset", "size"}
+    PUT: 本文に続きのバイト列、Upload-Offset ヘッダー（または offset パラメータ）に送信位置。
+         位置が合わなければ 409 と正しい offset を返す
+    DELETE: 受信済みのデータを破棄
+    """
+    try:
+        if request.method == "GET":
+            return JsonResponse(chunked_upload.status(upload_id, request.user))
+
+        if request.method == "DELETE":
+            chunked_upload.status(upload_id, request.user)
+            chunked_upload.discard(upload_id)
+            return JsonResponse({"success": True})
+
+        try:
+            offset = int(
+                request.headers.get("Upload-Offset", request.GET.get("offset", ""))
+            )
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return JsonResponse({"error": "offset を指定してください"}, status=400)
+        offset = chunked_upload.append(upload_id, offset, request, length, request.user)
+        return JsonResponse({"upload_id": upload_id, "offset": offset})
+    except chunked_upload.ChunkedUploadError as e:
+        return chunked_upload.error_response(e)
@@ -0,0 +1,47 @@
+"""
+職人評価の累計（評価件数・評価合計）の再構築
+
+通常は CraftsmanRating の登録・変更・削除で差分更新されるため、
+既存データの取り込み時や累計がずれた疑いがある場合にだけ使う。
+"""
+from decimal import Decimal
+
+from django.apps import apps as global_apps
+from django.db.models import Count, Sum
+
+
+def rebuild_rating_aggregates(apps=global_apps):
+    """
+    全職人の評価件数・合計・平均を評価テーブルから集計し直す
+
+    評価が1件もない職人は平均評価を変更しない（手入力・取り込み済みの値を残す）。
+    """
+    Craftsman = apps.get_model("projects", "Craftsman")
+    CraftsmanRating = apps.get_model("projects", "CraftsmanRating")
+
+    totals = {
+        row["craftsman_id"]: row
+        for row in CraftsmanRating.objects.values("craftsman_id").annotate(
+            count=Count("id"), total=Sum("overall_rating")
+        )
+    }
+
+    craftsmen = list(
+        Craftsman.objects.only("pk", "rating_count", "rating_sum", "average_rating")
+    )
+    for craftsman in craftsmen:
+        row = totals.get(craftsman.pk)
+        if row:
+            craftsman.rating_count = row["count"]
+            craftsman.rating_sum = row["total"]
+            craftsman.average_rating = (
+                Decimal(row["total"]) / row["count"]
+            ).quantize(Decimal("0.01"))
+        else:
+            craftsman.rating_count = 0
+            craftsman.rating_sum = 0
+
+    Craftsman.objects.bulk_update(
+        craftsmen, ["rating_count", "rating_sum", "average_rating"], batch_size=500
+    )
+    return len(totals)
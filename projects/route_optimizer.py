@@ -0,0 +1,236 @@
+"""
+調査ルート最適化
+
+調査員の1日の訪問順を、拠点と各現場の移動時間行列の上で最近傍法により作り、
+2-opt（区間の反転）と Or-opt（1〜3件の区間の移動）で改善する。
+移動時間行列は travel_times の移動時間キャッシュから引く（既定は代表点間の大円距離からの概算で、
+外部の地図サービスは使わない）。
+
+順序の評価値は 総移動時間 + 優先度の重み × 開始までの待ち時間 + 終業時刻超過のペナルティ。
+優先度の高い調査ほど早い時間に回り、所要時間を含めて勤務時間内に収まる順が選ばれる。
+"""
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .geocoding import location_of
+from .models import Survey, SurveyRoute
+from .travel_times import get_travel_time_cache
+
+
+# 始業から調査開始までの1分あたりのコスト（移動1分 = 1）
+PRIORITY_WEIGHTS = {"urgent": 1.0, "high": 0.5, "normal": 0.1, "low": 0.0}
+
+# 終業時刻を1分超えるごとのコスト
+OVERTIME_PENALTY = 100
+
+OR_OPT_SEGMENT_LENGTHS = (1, 2, 3)
+
+
+class RouteOptimizer:
+    """
+    拠点（添字0）から調査地点（添字1〜n）を回って拠点に戻る順序の最適化
+
+    Args:
+        travel: (n+1)×(n+1) の移動時間行列（分）
+        durations: 各地点の作業時間（分、添字0は拠点で未使用）
+        weights: 各地点の優先度の重み（添字0は未使用）
+        day_start: 始業時刻（0時からの分）
+        day_end: 終業時刻（0時からの分、None なら制限なし）
+    """
+
+    def __init__(self, travel, durations, weights, day_start=0, day_end=None):
+        self.travel = travel
+        self.durations = durations
+        self.weights = weights
+        self.day_start = day_start
+        self.day_end = day_end
+
+    def evaluate(self, order):
+        """訪問順の評価値（小さいほど良い）"""
+        travel = self.travel
+        time = self.day_start
+        previous = 0
+        total_travel = 0
+        waiting_cost = 0
+        for stop in order:
+            time += travel[previous][stop]
+            total_travel += travel[previous][stop]
+            waiting_cost += self.weights[stop] * (time - self.day_start)
+            time += self.durations[stop]
+            previous = stop
+        total_travel += travel[previous][0]
+
+        overtime = 0
+        if self.day_end is not None:
+            overtime = max(0, time - self.day_end)
+        return total_travel + waiting_cost + overtime * OVERTIME_PENALTY
+
+    def schedule(self, order):
+        """
+        訪問順どおりに回ったときの予定
+
+        Returns:
+            ([(地点, 開始時刻, 直前からの移動時間), ...], 最後の終了時刻, 拠点へ戻るまでの総移動時間)
+        """
+        stops = []
+        time = self.day_start
+        previous = 0
+        total_travel = 0
+        for stop in order:
+            leg = self.travel[previous][stop]
+            time += leg
+            total_travel += leg
+            stops.append((stop, time, leg))
+            time += self.durations[stop]
+            previous = stop
+        if order:
+            total_travel += self.travel[previous][0]
+        return stops, time, total_travel
+
+    def nearest_neighbour(self):
+        """最近傍法による初期解（同じ移動時間なら優先度の高い地点から）"""
+        remaining = set(range(1, len(self.travel)))
+        order = []
+        current = 0
+        while remaining:
+            current = min(
+                remaining,
+                key=lambda stop: (self.travel[current][stop], -self.weights[stop], stop),
+            )
+            order.append(current)
+            remaining.remove(current)
+        return order
+
+    def solve(self, initial=None):
+        """
+        最近傍法の初期解（と指定された初期順序）を 2-opt / Or-opt で改善できなくなるまで改善し、
+        最も良い順序を返す
+        """
+        starts = [self.nearest_neighbour()]
+        if initial:
+            starts.append(list(initial))
+        return min(
+            (self._improve(order) for order in starts), key=lambda pair: pair[1]
+        )[0]
+
+    def _improve(self, order):
+        best = self.evaluate(order)
+        improved = True
+        while improved:
+            improved = False
+            for candidate in self._neighbours(order):
+                cost = self.evaluate(candidate)
+                if cost < best - 1e-9:
+                    order, best = candidate, cost
+                    improved = True
+                    break
+        return order, best
+
+    @staticmethod
+    def _neighbours(order):
+        n = len(order)
+        # 2-opt: 区間 [i, j] を反転
+        for i in range(n - 1):
+            for j in range(i + 1, n):
+                yield order[:i] + order[i : j + 1][::-1] + order[j + 1 :]
+
+        # Or-opt: 長さ1〜3の区間を別の位置へ移動
+        for length in OR_OPT_SEGMENT_LENGTHS:
+            for i in range(n - length + 1):
+                segment = order[i : i + length]
+                rest = order[:i] + order[i + length :]
+                for k in range(len(rest) + 1):
+                    if k != i:
+                        yield rest[:k] + segment + rest[k:]
+
+
+def _minutes_of_day(value):
+    return value.hour * 60 + value.minute
+
+
+def plan_survey_route(surveyor, surveys, target_date):
+    """
+    調査員の1日の調査を最適な訪問順に並べる
+
+    Args:
+        surveyor: 調査員（拠点の座標を起点・終点にする）
+        surveys: 対象日の調査（project を select_related 済み、並びは現在の予定順）
+        target_date: 対象日
+
+    Returns:
+        {"surveys": 訪問順の調査（planned_start, planned_end, travel_minutes 属性付き）,
+         "total_travel_time": 総移動時間（分）, "current_travel_time": 現在の予定順の総移動時間（分）,
+         "total_distance": 総移動距離 (km), "finish_time": 最後の調査の終了予定,
+         "overtime": 終業時刻の超過（分）}
+    """
+    surveys = list(surveys)
+    depot = location_of(surveyor)
+    points = [depot] + [location_of(survey.project) for survey in surveys]
+    travel, distances = get_travel_time_cache().matrix(points)
+    if depot is None:
+        # 拠点が不明なら最初の現場から回り始め、最後の現場で終わる
+        for i in range(len(points)):
+            travel[0][i] = travel[i][0] = 0
+
+    day_start = _minutes_of_day(surveyor.work_start_time)
+    day_end = _minutes_of_day(surveyor.work_end_time)
+    optimizer = RouteOptimizer(
+        travel,
+        [0] + [survey.estimated_duration for survey in surveys],
+        [0] + [PRIORITY_WEIGHTS.get(survey.priority, 0) for survey in surveys],
+        day_start,
+        day_end,
+    )
+    current_order = list(range(1, len(points)))
+    order = optimizer.solve(initial=current_order)
+    stops, finish, total_travel = optimizer.schedule(order)
+    _, _, current_travel = optimizer.schedule(current_order)
+
+    midnight = timezone.make_aware(datetime.combine(target_date, datetime.min.time()))
+    ordered = []
+    total_distance = 0.0
+    previous = 0
+    for stop, start, leg in stops:
+        survey = surveys[stop - 1]
+        survey.planned_start = midnight + timedelta(minutes=start)
+        survey.planned_end = survey.planned_start + timedelta(
+            minutes=survey.estimated_duration
+        )
+        survey.travel_minutes = leg
+        ordered.append(survey)
+        total_distance += distances[previous][stop] or 0
+        previous = stop
+    if depot is not None and stops:
+        total_distance += distances[previous][0] or 0
+
+    return {
+        "surveys": ordered,
+        "total_travel_time": total_travel,
+        "current_travel_time": current_travel,
+        "total_distance": round(total_distance, 1),
+        "finish_time": midnight + timedelta(minutes=finish) if stops else None,
+        "overtime": max(0, finish - day_end) if stops else 0,
+    }
+
+
+def save_survey_route(surveyor, target_date, plan):
+    """最適化結果を SurveyRoute に保存し、各調査の予定日時を訪問順の開始予定に合わせる"""
+    surveys = plan["surveys"]
+    with transaction.atomic():
+        route, _ = SurveyRoute.objects.update_or_create(
+            date=target_date,
+            surveyor=surveyor,
+            defaults={
+                "optimized_order": [survey.id for survey in surveys],
+                "total_travel_time": plan["total_travel_time"],
+            },
+        )
+        route.surveys.set(surveys)
+        now = timezone.now()
+        for survey in surveys:
+            survey.scheduled_date = survey.planned_start
+            survey.updated_at = now
+        Survey.objects.bulk_update(surveys, ["scheduled_date", "updated_at"])
+    return route
@@ -0,0 +1,73 @@
+"""
+職人スケジュールの一括書き込み
+
+対象日の集合を先に求め、(職人, 日付) の一意制約に対する
+bulk_create(update_conflicts=True) で1バッチの upsert として反映する。
+"""
+from datetime import timedelta
+
+from django.db import transaction
+
+from .capacity import invalidate_capacity_cache
+from .models import CraftsmanSchedule
+
+
+def schedule_dates(start_date, end_date, exclude_weekends=False):
+    """期間内の対象日リスト（土日除外可）"""
+    dates = []
+    current_date = start_date
+    while current_date <= end_date:
+        if not (exclude_weekends and current_date.weekday() >= 5):
+            dates.append(current_date)
+        current_date += timedelta(days=1)
+    return dates
+
+
+def upsert_craftsman_schedule(
+    craftsman, dates, is_available, notes="", assigned_project=None, assign=False
+):
+    """
+    職人スケジュールを日付単位でまとめて作成・更新
+
+    Args:
+        notes: 空でなければ既存の備考も上書きする
+        assign: True のとき assigned_project（None なら割当解除）も反映する
+
+    Returns:
+        {"created": 新規作成した日数, "updated": 更新した日数}
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return {"created": 0, "updated": 0}
+
+    update_fields = ["is_available"]
+    if notes:
+        update_fields.append("notes")
+    if assign:
+        update_fields.append("assigned_project")
+
+    schedules = [
+        CraftsmanSchedule(
+            craftsman=craftsman,
+            date=date,
+            is_available=is_available,
+            notes=notes,
+            assigned_project=assigned_project if assign else None,
+        )
+        for date in dates
+    ]
+
+    with transaction.atomic():
+        existing = CraftsmanSchedule.objects.filter(
+            craftsman=craftsman, date__in=dates
+        ).count()
+        CraftsmanSchedule.objects.bulk_create(
+            schedules,
+            update_conflicts=True,
+            unique_fields=["craftsman", "date"],
+            update_fields=update_fields,
+        )
+
+    # bulk_create は保存シグナルを送らないため稼働状況キャッシュを明示的に無効化
+    invalidate_capacity_cache()
+    return {"created": len(dates) - existing, "updated": existing}
@@ -0,0 +1,458 @@
+"""
+週間の調査割当プランナー
+
+未割当の現地調査を、調査員 × 日ごとのルートに時間枠付きで挿入していく
+（時間枠付き配送計画問題の挿入法ヒューリスティック）。
+
+- ルートは調査員の勤務時間（SurveyAvailability があればその時間）を時間枠とし、
+  稼働不可の日はルートを作らない。1日の件数は daily_capacity まで
+- 割当済みの調査は予定時刻に固定した訪問先としてルートに含める
+- 優先度の高い調査から順に、挿入コスト（移動時間の増分 + 優先度に応じた日送りのコスト）の
+  最良と次点の差（regret）が大きいものを先に、最も安い位置へ挿入する
+- 固定の訪問先がないルートは最後に route_optimizer で訪問順を改善する
+
+移動時間は travel_times の移動時間キャッシュから、重複を除いた地点の行列として1度に読み込む。
+"""
+import math
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .capacity import invalidate_capacity_cache
+from .geocoding import location_of
+from .models import Survey, SurveyAvailability, Surveyor, SurveyRoute
+from .route_optimizer import PRIORITY_WEIGHTS, RouteOptimizer
+from .schedule_service import schedule_dates
+from .travel_times import UNKNOWN_TRAVEL_MINUTES, get_travel_time_cache
+
+
+# 優先度の高い順に挿入する
+PRIORITY_ORDER = ["urgent", "high", "normal", "low"]
+
+# 計画期間の初日から1日遅らせるごとのコスト（移動1分 = 1）
+PRIORITY_DAY_COSTS = {"urgent": 240, "high": 60, "normal": 5, "low": 0}
+
+# 1件の調査ごとに割当先として検討する拠点の近い調査員の数
+CANDIDATE_SURVEYORS = 6
+
+PLANNED_SURVEY_STATUSES = ["scheduled", "in_progress"]
+
+NO_SITE = -1  # 位置が分からない現場
+
+
+class _Stop:
+    __slots__ = ("survey", "point", "duration", "earliest", "latest", "fixed")
+
+    def __init__(self, survey, point, earliest=None, latest=math.inf, fixed=False):
+        self.survey = survey
+        self.point = point
+        self.duration = survey.estimated_duration
+        self.earliest = earliest
+        self.latest = latest
+        self.fixed = fixed
+
+
+class _Route:
+    __slots__ = (
+        "surveyor",
+        "day",
+        "date",
+        "start",
+        "end",
+        "capacity",
+        "depot",
+        "stops",
+        "starts",
+        "travel",
+    )
+
+    def __init__(self, surveyor, day, date, start, end, capacity, depot):
+        self.surveyor = surveyor
+        self.day = day
+        self.date = date
+        self.start = start
+        self.end = end
+        self.capacity = capacity
+        self.depot = depot
+        self.stops = []
+        self.starts = []
+        self.travel = 0
+
+    @property
+    def has_new_stops(self):
+        return any(not stop.fixed for stop in self.stops)
+
+
+def _minutes_of_day(value):
+    return value.hour * 60 + value.minute
+
+
+class WeeklySurveyPlanner:
+    """
+    未割当の調査（projects.Survey）を期間内の調査員 × 日に割り当て、開始時刻を決める
+
+    Args:
+        start_date: 計画期間の初日
+        days: 計画日数
+        exclude_weekends: True なら土日にはルートを作らない
+    """
+
+    def __init__(self, start_date, days=7, exclude_weekends=False):
+        self.start_date = start_date
+        self.end_date = start_date + timedelta(days=days - 1)
+        self.dates = schedule_dates(start_date, self.end_date, exclude_weekends)
+
+    def plan(self, surveys=None, surveyors=None):
+        """
+        割当計画を作成（保存はしない）
+
+        Args:
+            surveys: 割り当てる調査（省略時は未割当・予定ステータスの全件）。
+                予定日が期間内にある調査はその日に、期間より前または未定の調査は期間内のどの日にも入れる
+            surveyors: 割当先の調査員（省略時は稼働中の全員）
+
+        Returns:
+            {"assignments": [{"survey", "surveyor", "start", "travel_minutes"}, ...],
+             "unassigned": [割り当てられなかった調査], "routes": [_Route, ...],
+             "total_travel_time": 新規割当のあるルートの総移動時間（分）}
+        """
+        if surveyors is None:
+            surveyors = Surveyor.objects.filter(is_active=True).order_by("id")
+        surveyors = list(surveyors)
+        if surveys is None:
+            surveys = Survey.objects.filter(
+                surveyor__isnull=True, status="scheduled"
+            ).select_related("project")
+        surveys = [
+            survey
+            for survey in surveys
+            if survey.scheduled_date is None
+            or timezone.localdate(survey.scheduled_date) <= self.end_date
+        ]
+
+        fixed_surveys = list(
+            Survey.objects.filter(
+                surveyor__in=surveyors,
+                status__in=PLANNED_SURVEY_STATUSES,
+                scheduled_date__date__range=[self.start_date, self.end_date],
+            )
+            .select_related("project")
+            .order_by("scheduled_date")
+        )
+
+        self._load_travel_matrix(surveyors, surveys + fixed_surveys)
+        self.routes = self._build_routes(surveyors, fixed_surveys)
+
+        pending = {}
+        for survey in surveys:
+            stop = _Stop(survey, self._site(survey))
+            pending[survey.id] = (stop, self._candidate_routes(stop, surveyors))
+
+        unassigned = []
+        for priority in PRIORITY_ORDER:
+            tier = {
+                survey_id: item
+                for survey_id, item in pending.items()
+                if item[0].survey.priority == priority
+            }
+            unassigned += self._insert_by_regret(tier)
+        unassigned += [
+            item[0].survey
+            for item in pending.values()
+            if item[0].survey.priority not in PRIORITY_ORDER
+        ]
+
+        for route in self.routes.values():
+            if route.has_new_stops:
+                self._improve(route)
+
+        assignments = []
+        total_travel = 0
+        for route in self.routes.values():
+            if not route.has_new_stops:
+                continue
+            total_travel += route.travel
+            previous = route.depot
+            for stop, start in zip(route.stops, route.starts):
+                if not stop.fixed:
+                    assignments.append(
+                        {
+                            "survey": stop.survey,
+                            "surveyor": route.surveyor,
+                            "start": self._datetime(route.date, start),
+                            "travel_minutes": self._travel(previous, stop.point),
+                        }
+                    )
+                previous = stop.point
+        assignments.sort(key=lambda a: (a["start"], a["surveyor"].id))
+
+        return {
+            "assignments": assignments,
+            "unassigned": unassigned,
+            "routes": [r for r in self.routes.values() if r.has_new_stops],
+            "total_travel_time": total_travel,
+        }
+
+    # 準備
+
+    def _load_travel_matrix(self, surveyors, surveys):
+        points = {}
+        for point in [location_of(s) for s in surveyors] + [
+            location_of(s.project) for s in surveys
+        ]:
+            if point is not None:
+                points.setdefault(point, len(points))
+        self._point_index = points
+        self._matrix, _ = get_travel_time_cache().matrix(list(points))
+
+    def _site(self, survey):
+        point = location_of(survey.project)
+        return NO_SITE if point is None else self._point_index[point]
+
+    def _travel(self, a, b):
+        if a is None or b is None:
+            return 0  # 拠点が不明な調査員は最初の現場から回る
+        if a == NO_SITE or b == NO_SITE:
+            return UNKNOWN_TRAVEL_MINUTES
+        return self._matrix[a][b]
+
+    def _build_routes(self, surveyors, fixed_surveys):
+        availability = {
+            (a.surveyor_id, a.date): a
+            for a in SurveyAvailability.objects.filter(
+                surveyor__in=surveyors, date__range=[self.start_date, self.end_date]
+            )
+        }
+        fixed_by_route = {}
+        for survey in fixed_surveys:
+            local = timezone.localtime(survey.scheduled_date)
+            minute = _minutes_of_day(local)
+            fixed_by_route.setdefault((survey.surveyor_id, local.date()), []).append(
+                _Stop(survey, self._site(survey), minute, minute, fixed=True)
+            )
+
+        routes = {}
+        for surveyor in surveyors:
+            point = location_of(surveyor)
+            depot = None if point is None else self._point_index[point]
+            for day, date in enumerate(self.dates):
+                available = availability.get((surveyor.id, date))
+                if available is not None and not available.is_available:
+                    continue
+                hours = (
+                    (available.start_time, available.end_time)
+                    if available
+                    else (surveyor.work_start_time, surveyor.work_end_time)
+                )
+                start, end = map(_minutes_of_day, hours)
+                fixed = fixed_by_route.get((surveyor.id, date), [])
+                route = _Route(
+                    surveyor, day, date, start, end, surveyor.daily_capacity, depot
+                )
+                result = self._simulate(route, fixed)
+                if result is None:
+                    # 既存の予定だけで時間枠に収まらない日は新規に入れない
+                    route.capacity = len(fixed)
+                    result = (0, [stop.earliest for stop in fixed])
+                route.stops = fixed
+                route.travel, route.starts = result
+                routes[(surveyor.id, date)] = route
+        return routes
+
+    def _candidate_routes(self, stop, surveyors):
+        scheduled = stop.survey.scheduled_date
+        if scheduled is not None and timezone.localdate(scheduled) >= self.start_date:
+            dates = [timezone.localdate(scheduled)]
+        else:
+            dates = self.dates
+
+        nearest = surveyors
+        if stop.point != NO_SITE and len(surveyors) > CANDIDATE_SURVEYORS:
+            nearest = sorted(
+                surveyors,
+                key=lambda s: self._travel(
+                    self._point_index.get(location_of(s), NO_SITE), stop.point
+                ),
+            )[:CANDIDATE_SURVEYORS]
+
+        return [
+            self.routes[(surveyor.id, date)]
+            for surveyor in nearest
+            for date in dates
+            if (surveyor.id, date) in self.routes
+        ]
+
+    # 挿入
+
+    def _simulate(self, route, stops):
+        """訪問順どおりに回れるなら (総移動時間, 各開始時刻)、時間枠に収まらなければ None"""
+        time = route.start
+        previous = route.depot
+        travel = 0
+        starts = []
+        for stop in stops:
+            leg = self._travel(previous, stop.point)
+            time += leg
+            travel += leg
+            if stop.earliest is not None and time < stop.earliest:
+                time = stop.earliest
+            if time > stop.latest:
+                return None
+            starts.append(time)
+            time += stop.duration
+            previous = stop.point
+        if stops:
+            if time > route.end:
+                return None
+            travel += self._travel(previous, route.depot)
+        return travel, starts
+
+    def _best_insertion(self, stop, route):
+        if len(route.stops) >= route.capacity:
+            return None
+        day_cost = PRIORITY_DAY_COSTS.get(stop.survey.priority, 0) * route.day
+        best = None
+        for position in range(len(route.stops) + 1):
+            stops = route.stops[:position] + [stop] + route.stops[position:]
+            result = self._simulate(route, stops)
+            if result is None:
+                continue
+            cost = result[0] - route.travel + day_cost
+            if best is None or cost < best[0]:
+                best = (cost, stops, result)
+        return best
+
+    def _insert_by_regret(self, pending):
+        options = {}
+        for survey_id, (stop, routes) in pending.items():
+            options[survey_id] = {
+                id(route): (route, insertion)
+                for route in routes
+                if (insertion := self._best_insertion(stop, route)) is not None
+            }
+
+        unassigned = []
+        while pending:
+            chosen_id = None
+            chosen_key = None
+            for survey_id in pending:
+                costs = sorted(item[1][0] for item in options[survey_id].values())
+                if not costs:
+                    chosen_id = survey_id
+                    break
+                regret = costs[1] - costs[0] if len(costs) > 1 else math.inf
+                key = (regret, -costs[0], -survey_id)
+                if chosen_key is None or key > chosen_key:
+                    chosen_id, chosen_key = survey_id, key
+
+            stop, _ = pending.pop(chosen_id)
+            choices = options.pop(chosen_id)
+            if not choices:
+                unassigned.append(stop.survey)
+                continue
+
+            route, (_, stops, (travel, starts)) = min(
+                choices.values(), key=lambda item: item[1][0]
+            )
+            route.stops, route.travel, route.starts = stops, travel, starts
+
+            for survey_id, (other, routes) in pending.items():
+                if id(route) in options[survey_id]:
+                    insertion = self._best_insertion(other, route)
+                    if insertion is None:
+                        del options[survey_id][id(route)]
+                    else:
+                        options[survey_id][id(route)] = (route, insertion)
+        return unassigned
+
+    def _improve(self, route):
+        """固定の訪問先がないルートの訪問順を 2-opt / Or-opt で改善"""
+        if len(route.stops) < 3 or any(stop.fixed for stop in route.stops):
+            return
+        points = [route.depot] + [stop.point for stop in route.stops]
+        travel = [[self._travel(a, b) for b in points] for a in points]
+        optimizer = RouteOptimizer(
+            travel,
+            [0] + [stop.duration for stop in route.stops],
+            [0] + [PRIORITY_WEIGHTS.get(s.survey.priority, 0) for s in route.stops],
+            route.start,
+            route.end,
+        )
+        order = optimizer.solve(initial=list(range(1, len(points))))
+        stops = [route.stops[i - 1] for i in order]
+        result = self._simulate(route, stops)
+        if result is not None and result[0] <= route.travel:
+            route.stops = stops
+            route.travel, route.starts = result
+
+    def _datetime(self, date, minute):
+        return timezone.make_aware(
+            datetime.combine(date, datetime.min.time()) + timedelta(minutes=minute)
+        )
+
+
+def apply_survey_plan(plan):
+    """
+    割当計画を保存
+
+    調査の担当者・予定日時を bulk_update でまとめて更新し、
+    新規割当のあるルートは SurveyRoute に訪問順と総移動時間を upsert する。
+    """
+    assignments = plan["assignments"]
+    if not assignments:
+        return 0
+
+    now = timezone.now()
+    surveys = []
+    for assignment in assignments:
+        survey = assignment["survey"]
+        survey.surveyor = assignment["surveyor"]
+        survey.scheduled_date = assignment["start"]
+        survey.updated_at = now
+        surveys.append(survey)
+
+    with transaction.atomic():
+        Survey.objects.bulk_update(
+            surveys, ["surveyor", "scheduled_date", "updated_at"], batch_size=500
+        )
+        SurveyRoute.objects.bulk_create(
+            [
+                SurveyRoute(
+                    date=route.date,
+                    surveyor=route.surveyor,
+                    optimized_order=[stop.survey.id for stop in route.stops],
+                    total_travel_time=route.travel,
+                )
+                for route in plan["routes"]
+            ],
+            update_conflicts=True,
+            unique_fields=["date", "surveyor"],
+            update_fields=["optimized_order", "total_travel_time"],
+        )
+
+        route_ids = {
+            (surveyor_id, date): pk
+            for pk, surveyor_id, date in SurveyRoute.objects.filter(
+                surveyor__in={route.surveyor for route in plan["routes"]},
+                date__in={route.date for route in plan["routes"]},
+            ).values_list("pk", "surveyor_id", "date")
+        }
+        through = SurveyRoute.surveys.through
+        ids = [route_ids[(r.surveyor.id, r.date)] for r in plan["routes"]]
+        through.objects.filter(surveyroute_id__in=ids).delete()
+        through.objects.bulk_create(
+            [
+                through(
+                    surveyroute_id=route_ids[(route.surveyor.id, route.date)],
+                    survey_id=stop.survey.id,
+                )
+                for route in plan["routes"]
+                for stop in route.stops
+            ],
+            batch_size=500,
+        )
+
+    # bulk_update は保存シグナルを送らないため稼働状況キャッシュを明示的に無効化
+    invalidate_capacity_cache()
+    return len(surveys)
@@ -7,11 +7,8 @@ from django.db import transaction
 from django.views.generic import ListView, DetailView
 from django.views.decorators.http import require_http_methods
 import json
-import os
-from PIL import Image
-from io import BytesIO
-from django.core.files.base import ContentFile
 
+from . import chunked_upload, photo_pipeline
 from .models import Survey, SurveyReport, SurveyPhoto, Surveyor, WorkerNotification
 from .survey_record_forms import (
     SurveyRecordForm,
@@ -122,45 +119,40 @@ def photo_upload_ajax(request, report_id):
     report = get_object_or_404(SurveyReport, id=report_id)
 
     try:
-        photo_file = request.FILES.get("photo")
         location = request.POST.get("location", "overview")
         description = request.POST.get("description", "")
 
-        if not photo_file:
-            return JsonResponse({"error": "写真ファイルが必要です"}, status=400)
-
-        # 画像の圧縮
-        image = Image.open(photo_file)
-
-        # サイズ制限（最大1920px）
-        max_size = 1920
-        if image.width > max_size or image.height > max_size:
-            image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-
-        # JPEGで保存
-        output = BytesIO()
-        if image.mode in ("RGBA", "LA", "P"):
-            image = image.convert("RGB")
-        image.save(output, format="JPEG", quality=85, optimize=True)
-        output.seek(0)
-
-        # ファイル名を生成
-        timestamp = timezone.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"survey_{report.id}_{location}_{timestamp}.jpg"
-
-        # SurveyPhotoオブジェクトを作成
-        survey_photo = SurveyPhoto.objects.create(
-            survey_report=report, location=location, description=description
-        )
-
-        # 圧縮した画像を保存
-        survey_photo.photo.save(filename, ContentFile(output.getvalue()), save=True)
+        try:
+            with chunked_upload.received_photo(request) as photo_file:
+                if not photo_file:
+                    return JsonResponse({"error": "写真ファイルが必要です"}, status=400)
+
+                image_format = photo_pipeline.admit_upload(photo_file)
+
+                # 原本をそのまま保存し、縮小版はプロセスプールで生成する
+                timestamp = timezone.now().strftime("%Y%m%d_%H%M%S")
+                photo_file.name = photo_pipeline.photo_filename(
+                    f"survey_{report.id}_{location}_{timestamp}", image_format
+                )
+                survey_photo = SurveyPhoto.objects.create(
+                    survey_report=report,
+                    photo=photo_file,
+                    location=location,
+                    description=description,
+                )
+        except chunked_upload.ChunkedUploadError as e:
+            return chunked_upload.error_response(e)
+        except photo_pipeline.PhotoRejectedError as e:
+            return photo_pipeline.rejection_response(e)
+        photo_pipeline.enqueue_photo(survey_photo)
 
         return JsonResponse(
             {
                 "success": True,
                 "photo_id": survey_photo.id,
                 "photo_url": survey_photo.photo.url,
+                "thumbnail_url": survey_photo.thumbnail_url,
+                "processing_status": survey_photo.processing_status,
                 "description": survey_photo.description,
                 "location": survey_photo.get_location_display(),
             }
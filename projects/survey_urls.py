@@ -13,6 +13,11 @@ survey_urlpatterns = [
     ),
     # 調査カレンダー
     path("surveys/calendar/", survey_views.survey_calendar, name="survey_calendar"),
+    path(
+        "api/surveys/calendar/",
+        survey_views.survey_calendar_feed,
+        name="survey_calendar_feed",
+    ),
     # 調査アサイン
     path(
         "projects/<int:project_id>/assign-survey/",
@@ -1,13 +1,20 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.http import JsonResponse
 from django.contrib import messages
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Max
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date, quote_etag
 from datetime import datetime, timedelta, date
 from .models import Survey, Surveyor, Project, SurveyRoute
 from .forms import SurveyForm, SurveyAssignForm, SurveyCompletionForm
+from .geocoding import distances_from, geocode, location_of, proximity_score
+from .route_optimizer import plan_survey_route, save_survey_route
+from .survey_planner import WeeklySurveyPlanner, apply_survey_plan
+import hashlib
 import json
 
 
@@ -55,50 +62,102 @@ class SurveyDetailView(DetailView):
 
 
 def survey_calendar(request):
-    """調査員別カレンダービュー"""
-    # 日付範囲の設定
+    """調査員別カレンダービュー（予定は survey_calendar_feed から表示範囲分だけ取得）"""
+    context = {
+        "surveyors": Surveyor.objects.filter(is_active=True),
+        "today": timezone.now().date().isoformat(),
+    }
+    return render(request, "projects/survey_calendar.html", context)
+
+
+def _parse_calendar_bound(value, default_date):
+    """カレンダーの範囲指定（日付または日時）を aware な日時に変換"""
+    bound = parse_datetime(value) if value else None
+    if bound is None:
+        bound = datetime.combine(
+            (parse_date(value) if value else None) or default_date,
+            datetime.min.time(),
+        )
+    if timezone.is_naive(bound):
+        bound = timezone.make_aware(bound)
+    return bound
+
+
+def survey_calendar_feed(request):
+    """
+    調査カレンダーのイベントAPI
+
+    GET: start, end（日付または ISO 日時、end は含まない。既定は前7日〜30日後）、surveyor（任意）
+    範囲内の調査の最終更新日時と件数から ETag / Last-Modified を付け、
+    変更がなければ 304 を返す。
+    """
     today = timezone.now().date()
-    start_date = today - timedelta(days=7)
-    end_date = today + timedelta(days=30)
+    try:
+        start = _parse_calendar_bound(
+            request.GET.get("start"), today - timedelta(days=7)
+        )
+        end = _parse_calendar_bound(request.GET.get("end"), today + timedelta(days=31))
+        surveyor_id = (
+            int(request.GET["surveyor"]) if request.GET.get("surveyor") else None
+        )
+    except ValueError:
+        return JsonResponse(
+            {"error": "start / end / surveyor の形式が正しくありません"}, status=400
+        )
 
-    # 調査データの取得
     surveys = Survey.objects.filter(
-        scheduled_date__date__range=[start_date, end_date]
-    ).select_related("project", "surveyor", "project__customer")
-
-    surveyors = Surveyor.objects.filter(is_active=True)
+        surveyor__is_active=True, scheduled_date__gte=start, scheduled_date__lt=end
+    )
+    if surveyor_id is not None:
+        surveys = surveys.filter(surveyor_id=surveyor_id)
+
+    summary = surveys.aggregate(last_modified=Max("updated_at"), count=Count("id"))
+    last_modified = summary["last_modified"]
+    version = last_modified.timestamp() if last_modified else 0
+    etag = quote_etag(
+        hashlib.md5(
+            f"{request.GET.urlencode()}:{summary['count']}:{version}".encode()
+        ).hexdigest()
+    )
+    last_modified_ts = int(version) or None
 
-    # カレンダー用データの構築
-    calendar_data = {}
-    for surveyor in surveyors:
-        calendar_data[surveyor.id] = {"name": surveyor.name, "surveys": []}
-
-    for survey in surveys:
-        if survey.surveyor and survey.surveyor.id in calendar_data:
-            calendar_data[survey.surveyor.id]["surveys"].append(
-                {
-                    "id": survey.id,
-                    "title": survey.project.title,
-                    "customer": survey.project.customer.name,
-                    "start": survey.scheduled_date.isoformat(),
-                    "duration": survey.estimated_duration,
-                    "status": survey.status,
-                    "priority": survey.priority,
-                    "address": survey.project.address[:50] + "..."
-                    if len(survey.project.address) > 50
-                    else survey.project.address,
-                }
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified_ts
+    )
+    if response is None:
+        events = [
+            {
+                "id": row["id"],
+                "title": row["project__title"],
+                "customer": row["project__customer__name"],
+                "start": timezone.localtime(row["scheduled_date"]).isoformat(),
+                "duration": row["estimated_duration"],
+                "status": row["status"],
+                "priority": row["priority"],
+                "address": row["project__address"],
+                "surveyor_id": row["surveyor_id"],
+                "surveyor": row["surveyor__name"],
+            }
+            for row in surveys.order_by("scheduled_date").values(
+                "id",
+                "project__title",
+                "project__customer__name",
+                "scheduled_date",
+                "estimated_duration",
+                "status",
+                "priority",
+                "project__address",
+                "surveyor_id",
+                "surveyor__name",
             )
+        ]
+        response = JsonResponse(events, safe=False)
 
-    context = {
-        "calendar_data": calendar_data,
-        "surveyors": surveyors,
-        "today": today.isoformat(),
-        "start_date": start_date.isoformat(),
-        "end_date": end_date.isoformat(),
-    }
-
-    return render(request, "projects/survey_calendar.html", context)
+    response["ETag"] = etag
+    if last_modified_ts:
+        response["Last-Modified"] = http_date(last_modified_ts)
+    response["Cache-Control"] = "private, max-age=0, must-revalidate"
+    return response
 
 
 def survey_assign(request, project_id):
@@ -137,10 +196,16 @@ def get_recommended_surveyors(project, scheduled_date=None):
     if not scheduled_date:
         scheduled_date = timezone.now().date()
 
-    surveyors = Surveyor.objects.filter(is_active=True)
+    surveyors = list(Surveyor.objects.filter(is_active=True))
     recommended = []
 
-    for surveyor in surveyors:
+    # 案件から各調査員の拠点までの距離をまとめて計算
+    project_location = location_of(project) or geocode(project.address)
+    distances = distances_from(
+        project_location, [location_of(surveyor) for surveyor in surveyors]
+    )
+
+    for surveyor, distance in zip(surveyors, distances):
         score = 0
         reasons = []
 
@@ -156,8 +221,13 @@ def get_recommended_surveyors(project, scheduled_date=None):
             score -= 20
             reasons.append(f"満員 ({daily_count}/{surveyor.daily_capacity}件)")
 
-        # 地域の近さ（簡易版）
-        if surveyor.base_location and project.address:
+        # 地域の近さ（拠点からの大円距離、座標がなければ住所の文字列一致）
+        if distance is not None:
+            proximity = proximity_score(distance)
+            score += round(15 * proximity / 100)
+            if proximity > 0:
+                reasons.append(f"拠点から約{distance:.0f}km")
+        elif surveyor.base_location and project.address:
             if surveyor.base_location in project.address:
                 score += 15
                 reasons.append("地域が近い")
@@ -168,6 +238,7 @@ def get_recommended_surveyors(project, scheduled_date=None):
                 "score": score,
                 "reasons": reasons,
                 "daily_count": daily_count,
+                "distance_km": distance,
             }
         )
 
@@ -238,23 +309,41 @@ def survey_route_optimization(request):
     surveyor_id = request.GET.get("surveyor")
     if surveyor_id:
         surveyor = get_object_or_404(Surveyor, id=surveyor_id)
-        surveys = Survey.objects.filter(
-            surveyor=surveyor,
-            scheduled_date__date=target_date,
-            status__in=["scheduled", "in_progress"],
-        ).select_related("project")
+        surveys = (
+            Survey.objects.filter(
+                surveyor=surveyor,
+                scheduled_date__date=target_date,
+                status__in=["scheduled", "in_progress"],
+            )
+            .select_related("project", "project__customer")
+            .order_by("scheduled_date")
+        )
 
-        # 簡易的なルート最適化（実際にはより高度なアルゴリズムを使用）
-        optimized_surveys = optimize_route(list(surveys))
+        plan = plan_survey_route(surveyor, surveys, target_date)
+
+        if request.method == "POST":
+            save_survey_route(surveyor, target_date, plan)
+            messages.success(
+                request,
+                f"{surveyor.name}さんのルートを保存し、{len(plan['surveys'])}件の予定時刻を更新しました。",
+            )
+            return redirect(
+                f"{reverse('survey_routes')}?date={target_date.isoformat()}&surveyor={surveyor.id}"
+            )
 
         context = {
             "surveyor": surveyor,
+            "surveyors": Surveyor.objects.filter(is_active=True),
             "date": target_date,
-            "surveys": optimized_surveys,
-            "total_surveys": len(optimized_surveys),
+            "total_surveys": len(plan["surveys"]),
+            "total_duration": sum(s.estimated_duration for s in plan["surveys"]),
+            "saved_route": SurveyRoute.objects.filter(
+                surveyor=surveyor, date=target_date
+            ).first(),
+            **plan,
         }
 
-        return render(request, "projects/survey_route_detail.html", context)
+        return render(request, "projects/survey_routes.html", context)
 
     # 全調査員の概要
     surveyors = Surveyor.objects.filter(is_active=True)
@@ -282,33 +371,47 @@ def survey_route_optimization(request):
     return render(request, "projects/survey_routes.html", context)
 
 
-def optimize_route(surveys):
-    """簡易的なルート最適化"""
-    if not surveys:
-        return []
+def auto_assign_surveys(request):
+    """
+    未割当の調査を週間プランナーで自動アサイン
 
-    # 実際にはより高度なアルゴリズム（TSP、遺伝的アルゴリズムなど）を使用
-    # ここでは住所の文字列ソートによる簡易実装
-    return sorted(surveys, key=lambda s: s.project.address)
+    GET: 計画のプレビュー（start_date は既定で明日、days は既定7、exclude_weekends）
+    POST: 同じ条件で計画し直して保存
+    """
+    params = request.POST if request.method == "POST" else request.GET
+    try:
+        start_date = (
+            datetime.strptime(params["start_date"], "%Y-%m-%d").date()
+            if params.get("start_date")
+            else timezone.now().date() + timedelta(days=1)
+        )
+        days = min(max(int(params.get("days", 7)), 1), 31)
+    except ValueError:
+        messages.error(request, "計画期間の指定が正しくありません。")
+        return redirect("survey_list")
+    exclude_weekends = bool(params.get("exclude_weekends"))
 
+    planner = WeeklySurveyPlanner(start_date, days, exclude_weekends)
+    plan = planner.plan()
 
-def auto_assign_surveys(request):
-    """未アサインの調査を自動アサイン"""
-    unassigned_surveys = Survey.objects.filter(
-        surveyor__isnull=True, status="scheduled"
-    ).select_related("project")
-
-    assigned_count = 0
-    for survey in unassigned_surveys:
-        recommended = get_recommended_surveyors(survey.project, survey.scheduled_date)
-        if recommended and recommended[0]["score"] > 0:
-            best_surveyor = recommended[0]["surveyor"]
-            survey.surveyor = best_surveyor
-            survey.save()
-            assigned_count += 1
+    if request.method == "POST":
+        assigned_count = apply_survey_plan(plan)
+        messages.success(request, f"{assigned_count}件の調査を自動アサインしました。")
+        if plan["unassigned"]:
+            messages.warning(
+                request,
+                f"{len(plan['unassigned'])}件は期間内の空き枠がなく割り当てられませんでした。",
+            )
+        return redirect("survey_list")
 
-    messages.success(request, f"{assigned_count}件の調査を自動アサインしました。")
-    return redirect("survey_list")
+    context = {
+        "start_date": start_date,
+        "end_date": planner.end_date,
+        "days": days,
+        "exclude_weekends": exclude_weekends,
+        **plan,
+    }
+    return render(request, "projects/survey_auto_assign.html", context)
 
 
 def survey_dashboard(request):
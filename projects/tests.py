@@ -1,3 +1,1310 @@
-from django.test import TestCase
+import hashlib
+import io
+import itertools
+import math
+import os
+import shutil
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import Avg, Count
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from order_management.models import Project as OrderProject
+from surveys import models as surveys_models
+
+from . import capacity, chunked_upload, photo_pipeline, thumbnails
+from .area_index import parse_area_tokens
+from .geocoding import distances_from, geocode, haversine_km, proximity_score
+from .craftsman_matching import (
+    AvailabilityIndex,
+    BatchAssignmentPlanner,
+    CraftsmanMatcher,
+    solve_assignment,
+)
+from .models import (
+    Assignment,
+    Craftsman,
+    CraftsmanRating,
+    CraftsmanSchedule,
+    Customer,
+    Project,
+    ProjectType,
+    Survey,
+    SurveyAvailability,
+    SurveyReport,
+    Surveyor,
+    SurveyRoute,
+    TravelTime,
+)
+from .rating_aggregates import rebuild_rating_aggregates
+from .route_optimizer import RouteOptimizer
+from .schedule_service import schedule_dates, upsert_craftsman_schedule
+from .survey_planner import WeeklySurveyPlanner, apply_survey_plan
+from .travel_times import HaversineEstimator, TravelTimeCache, TravelTimeServiceError
+
+
+def create_craftsman(project_type=None, **kwargs):
+    values = {
+        "name": "職人 一郎",
+        "phone": "090-0000-0000",
+        "hourly_rate": 3000,
+        "coverage_areas": "東京都新宿区",
+    }
+    values.update(kwargs)
+    craftsman = Craftsman.objects.create(**values)
+    if project_type is not None:
+        craftsman.specialties.add(project_type)
+    return craftsman
+
+
+def create_site_project(project_type=None, **kwargs):
+    values = {
+        "customer": Customer.objects.get_or_create(name="顧客", phone="03-0000-0000")[0],
+        "project_type": project_type
+        or ProjectType.objects.get_or_create(name="クロス")[0],
+        "title": "クロス張替",
+        "address": "東京都新宿区西新宿1-1-1",
+        "start_date": date(2026, 11, 2),
+        "end_date": date(2026, 11, 4),
+        "amount": 100000,
+        "status": "confirmed",
+    }
+    values.update(kwargs)
+    return Project.objects.create(**values)
+
+
+def create_assignment(project, craftsman, status="confirmed", **kwargs):
+    values = {
+        "assigned_by": Surveyor.objects.get_or_create(name="担当", phone="03-1111-1111")[
+            0
+        ],
+        "status": status,
+        "scheduled_start_date": project.start_date,
+        "scheduled_end_date": project.end_date,
+        "estimated_hours": 8,
+        "offered_rate": 3000,
+        "inquiry_message": "ご対応可能でしょうか",
+    }
+    values.update(kwargs)
+    return Assignment.objects.create(project=project, craftsman=craftsman, **values)
+
+
+def create_survey():
+    project = OrderProject.objects.create(
+        site_name="テスト現場",
+        site_address="東京都新宿区西新宿1-1-1",
+        contractor_name="元請株式会社",
+        contractor_address="東京都千代田区丸の内1-1-1",
+        project_manager="担当者",
+        work_type="cross",
+    )
+    return surveys_models.Survey.objects.create(
+        project=project,
+        surveyor=surveys_models.Surveyor.objects.create(employee_id="S001", name="調査 太郎"),
+        scheduled_date=date(2026, 11, 2),
+        scheduled_start_time=time(10, 0),
+    )
+
+
+def create_survey_photo():
+    return surveys_models.SurveyPhoto.objects.create(
+        survey=create_survey(),
+        photo_type="room_overview",
+        image="survey_photos/test.jpg",
+        content_hash="0" * 64,
+    )
+
+
+class CraftsmanAlternativeDatesApiTests(TestCase):
+    url = reverse("craftsman_alternative_dates_api")
+
+    def get(self, **params):
+        query = {"start_date": "2026-11-02", "end_date": "2026-11-04", **params}
+        return self.client.get(self.url, query)
+
+    def test_rejects_non_numeric_parameters(self):
+        self.assertEqual(self.get(search_days="abc").status_code, 400)
+        self.assertEqual(self.get(limit="1.5").status_code, 400)
+
+    def test_rejects_long_preferred_range(self):
+        response = self.get(end_date="2027-11-04")
+        self.assertEqual(response.status_code, 400)
+
+    def test_clamps_search_days_and_limit(self):
+        with mock.patch.object(
+            CraftsmanMatcher, "suggest_alternative_dates_bulk", return_value=[]
+        ) as suggest:
+            response = self.get(search_days="100000", limit="5000")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(suggest.call_args.kwargs["search_days"], 60)
+        self.assertEqual(suggest.call_args.kwargs["limit"], 100)
+
+
+class ParseAreaTokensTests(TestCase):
+    def city(self, address):
+        tokens = parse_area_tokens(address)
+        return [name for _, name, level in tokens if level == "city"]
+
+    def test_city_names_containing_shi_are_not_cut_short(self):
+        self.assertEqual(self.city("三重県四日市市諏訪町1-5"), ["四日市市"])
+        self.assertEqual(self.city("広島県廿日市市下平良1丁目"), ["廿日市市"])
+        self.assertEqual(self.city("石川県野々市市本町"), ["野々市市"])
+
+    def test_city_is_preferred_over_town_or_village_in_its_name(self):
+        self.assertEqual(self.city("長野県大町市大町"), ["大町市"])
+        self.assertEqual(self.city("新潟県十日町市本町"), ["十日町市"])
+        self.assertEqual(self.city("東京都東村山市本町"), ["東村山市"])
+
+    def test_town_after_county_is_not_read_as_city(self):
+        self.assertEqual(self.city("北海道余市郡余市町黒川町"), ["余市町"])
+        self.assertEqual(self.city("北海道虻田郡倶知安町"), ["倶知安町"])
+
+    def test_city_names_containing_gun(self):
+        self.assertEqual(self.city("福島県郡山市朝日1丁目"), ["郡山市"])
+        self.assertEqual(self.city("奈良県大和郡山市北郡山町"), ["大和郡山市"])
+
+    def test_town_village_and_ward(self):
+        self.assertEqual(self.city("埼玉県入間郡三芳町藤久保"), ["三芳町"])
+        self.assertEqual(self.city("千葉県市川市市川1丁目"), ["市川市"])
+        self.assertEqual(
+            [name for _, name, _ in parse_area_tokens("神奈川県横浜市中区")],
+            ["神奈川県", "横浜市", "横浜市中区"],
+        )
+
+
+class GeocodingTests(TestCase):
+    tokyo = (35.6895, 139.6917)
+    osaka = (34.6863, 135.5200)
+
+    def test_geocode_returns_finest_known_centroid(self):
+        self.assertEqual(geocode("東京都新宿区西新宿1-1-1"), (35.6938, 139.7034))
+        self.assertEqual(geocode("新宿区西新宿1-1-1"), (35.6938, 139.7034))
+        # 市区町村が表にない場合は都道府県の代表点
+        self.assertEqual(geocode("東京都架空村1"), self.tokyo)
+
+    def test_geocode_unknown_address_returns_none(self):
+        self.assertIsNone(geocode("架空村1"))
+        self.assertIsNone(geocode("住所不明"))
+
+    def test_haversine_distance_between_fixed_points(self):
+        # 赤道上の経度1度は約111.19km
+        self.assertAlmostEqual(haversine_km(0, 0, 0, 1), 111.19, places=2)
+        self.assertAlmostEqual(haversine_km(*self.tokyo, *self.osaka), 395.14, places=2)
+        self.assertEqual(haversine_km(*self.tokyo, *self.tokyo), 0)
+
+    def test_distances_from_matches_haversine(self):
+        distances = distances_from(self.tokyo, [self.osaka, None, self.tokyo])
+
+        self.assertAlmostEqual(distances[0], haversine_km(*self.tokyo, *self.osaka))
+        self.assertIsNone(distances[1])
+        self.assertAlmostEqual(distances[2], 0)
+        self.assertEqual(distances_from(None, [self.osaka]), [None])
+
+    def test_proximity_score(self):
+        self.assertEqual(proximity_score(0), 100)
+        self.assertEqual(proximity_score(30), 50)
+        self.assertEqual(proximity_score(395), 0)
+        self.assertIsNone(proximity_score(None))
+
+
+class UpsertCraftsmanScheduleTests(TestCase):
+    def setUp(self):
+        self.craftsman = create_craftsman()
+
+    def schedules(self):
+        return {
+            s.date: s
+            for s in CraftsmanSchedule.objects.filter(craftsman=self.craftsman)
+        }
+
+    def test_schedule_dates_excludes_weekends(self):
+        # 2026-11-06 は金曜、11-07・08 は土日
+        days = schedule_dates(
+            date(2026, 11, 6), date(2026, 11, 9), exclude_weekends=True
+        )
+
+        self.assertEqual(days, [date(2026, 11, 6), date(2026, 11, 9)])
+        self.assertEqual(len(schedule_dates(date(2026, 11, 6), date(2026, 11, 9))), 4)
+
+    def test_splits_created_and_updated_days(self):
+        project = create_site_project()
+        CraftsmanSchedule.objects.create(
+            craftsman=self.craftsman,
+            date=date(2026, 11, 3),
+            is_available=True,
+            notes="午前のみ",
+            assigned_project=project,
+        )
+
+        result = upsert_craftsman_schedule(
+            self.craftsman,
+            [date(2026, 11, 2), date(2026, 11, 3), date(2026, 11, 3)],
+            is_available=False,
+        )
+
+        self.assertEqual(result, {"created": 1, "updated": 1})
+        schedules = self.schedules()
+        self.assertFalse(schedules[date(2026, 11, 2)].is_available)
+        updated = schedules[date(2026, 11, 3)]
+        self.assertFalse(updated.is_available)
+        # notes が空・assign=False のときは既存の備考と割当を残す
+        self.assertEqual(updated.notes, "午前のみ")
+        self.assertEqual(updated.assigned_project, project)
+
+    def test_overwrites_notes_and_assignment_when_given(self):
+        project = create_site_project()
+        upsert_craftsman_schedule(
+            self.craftsman,
+            [date(2026, 11, 2)],
+            True,
+            assigned_project=project,
+            assign=True,
+        )
+
+        result = upsert_craftsman_schedule(
+            self.craftsman, [date(2026, 11, 2)], False, notes="通院", assign=True
+        )
+
+        self.assertEqual(result, {"created": 0, "updated": 1})
+        schedule = self.schedules()[date(2026, 11, 2)]
+        self.assertEqual(schedule.notes, "通院")
+        self.assertIsNone(schedule.assigned_project)
+
+    def test_empty_dates_write_nothing(self):
+        with self.assertNumQueries(0):
+            result = upsert_craftsman_schedule(self.craftsman, [], False)
+        self.assertEqual(result, {"created": 0, "updated": 0})
+
+
+class CraftsmanRatingAggregateTests(TestCase):
+    def setUp(self):
+        self.craftsmen = [
+            create_craftsman(name="職人A"),
+            create_craftsman(name="職人B"),
+        ]
+
+    def rate(self, craftsman, *scores):
+        project = create_site_project()
+        assignment = create_assignment(project, craftsman, status="completed")
+        return CraftsmanRating.objects.create(
+            assignment=assignment,
+            craftsman=craftsman,
+            surveyor=assignment.assigned_by,
+            technical_skill=scores[0],
+            punctuality=scores[1],
+            communication=scores[2],
+            work_quality=scores[3],
+        )
+
+    def assertMatchesFreshAggregate(self):
+        for craftsman in Craftsman.objects.all():
+            with self.subTest(craftsman=craftsman.name):
+                fresh = CraftsmanRating.objects.filter(craftsman=craftsman).aggregate(
+                    count=Count("id"), average=Avg("overall_rating")
+                )
+                self.assertEqual(craftsman.rating_count, fresh["count"])
+                if fresh["count"]:
+                    self.assertEqual(
+                        craftsman.average_rating,
+                        Decimal(str(fresh["average"])).quantize(Decimal("0.01")),
+                    )
+                else:
+                    self.assertEqual(craftsman.average_rating, 0)
+
+    def test_create_update_and_delete_keep_aggregates(self):
+        a, b = self.craftsmen
+        first = self.rate(a, 5, 5, 5, 5)
+        second = self.rate(a, 3, 4, 4, 4)
+        self.rate(b, 2, 2, 2, 2)
+        self.assertMatchesFreshAggregate()
+        self.assertEqual(a.rating_count, 2)  # 読み込み済みのインスタンスも更新
+
+        second.work_quality = 1
+        second.save()
+        self.assertMatchesFreshAggregate()
+
+        # 職人の付け替えは元の職人から引いて新しい職人に足す
+        second.craftsman = b
+        second.save()
+        self.assertMatchesFreshAggregate()
+
+        first.delete()
+        self.assertMatchesFreshAggregate()
+
+        # 一括削除も post_delete で差し引く
+        CraftsmanRating.objects.filter(craftsman=b).delete()
+        self.assertMatchesFreshAggregate()
+        self.assertEqual(Craftsman.objects.get(pk=b.pk).rating_sum, Decimal("0"))
+
+    def test_rebuild_matches_running_aggregates(self):
+        self.rate(self.craftsmen[0], 5, 4, 3, 2)
+        self.rate(self.craftsmen[0], 4, 4, 4, 5)
+        fields = ["rating_count", "rating_sum", "average_rating"]
+        before = list(Craftsman.objects.values_list(*fields))
+        Craftsman.objects.update(rating_count=0, rating_sum=0)
+
+        self.assertEqual(rebuild_rating_aggregates(), 1)
+        self.assertEqual(list(Craftsman.objects.values_list(*fields)), before)
+
+
+class CraftsmanWithMetricsTests(TestCase):
+    today = date(2026, 11, 2)
+
+    def setUp(self):
+        self.craftsman = create_craftsman(name="職人A")
+        self.idle = create_craftsman(name="職人B")
+        for status, start in [
+            ("confirmed", date(2026, 11, 5)),
+            ("in_progress", date(2026, 11, 2)),
+            ("inquiry", date(2026, 11, 3)),
+            ("completed", date(2026, 11, 4)),
+            ("confirmed", date(2026, 11, 12)),  # 7日より先
+        ]:
+            project = create_site_project(start_date=start, end_date=start)
+            create_assignment(project, self.craftsman, status=status)
+        CraftsmanSchedule.objects.create(
+            craftsman=self.craftsman, date=date(2026, 11, 3), is_available=False
+        )
+
+    def test_annotated_counts_match_per_craftsman_queries(self):
+        craftsmen = {c.pk: c for c in Craftsman.objects.with_metrics(today=self.today)}
+
+        for craftsman in craftsmen.values():
+            with self.subTest(craftsman=craftsman.name):
+                expected = Assignment.objects.filter(
+                    craftsman=craftsman,
+                    status__in=["confirmed", "in_progress"],
+                    project__start_date__range=[self.today, self.today + timedelta(7)],
+                ).count()
+                self.assertEqual(craftsman.upcoming_assignment_count, expected)
+        self.assertEqual(craftsmen[self.craftsman.pk].upcoming_assignment_count, 2)
+        self.assertEqual(craftsmen[self.craftsman.pk].current_workload, 40)
+        self.assertEqual(craftsmen[self.idle.pk].upcoming_assignment_count, 0)
+
+    def test_prefetched_schedule_answers_without_queries(self):
+        craftsman = Craftsman.objects.with_metrics(today=self.today).get(
+            pk=self.craftsman.pk
+        )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                sorted(a.status for a in craftsman.upcoming_active_assignments),
+                ["confirmed", "confirmed", "in_progress"],
+            )
+            # 11/2 作業中、11/3 休み、11/4 は完了済みのため空き
+            self.assertEqual(craftsman.next_free_date, date(2026, 11, 4))
+            self.assertFalse(craftsman.can_work_on(date(2026, 11, 3)))
+            self.assertTrue(craftsman.can_work_on(date(2026, 11, 4)))
+
+    def test_query_count_does_not_grow_with_craftsmen(self):
+        for i in range(5):
+            create_craftsman(name=f"職人{i}")
+
+        with self.assertNumQueries(4):
+            list(Craftsman.objects.with_metrics(today=self.today))
+
+
+class CapacityHeatmapCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.heatmap = capacity.CapacityHeatmap(date(2026, 11, 2), days=5)
+
+    def row(self, grid, kind, pk):
+        return grid["rows"][grid["resources"].index([kind, pk, mock.ANY])]
+
+    def version(self):
+        return cache.get(capacity.CACHE_VERSION_KEY)
+
+    def test_cached_grid_is_reused_until_a_change(self):
+        craftsman = create_craftsman()
+        grid = self.heatmap.get_grid()
+        version = self.version()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.heatmap.get_grid(), grid)
+        self.assertEqual(self.row(grid, "craftsman", craftsman.pk), [0] * 5)
+
+        create_assignment(create_site_project(), craftsman)
+
+        self.assertGreater(self.version(), version)
+        self.assertEqual(
+            self.row(self.heatmap.get_grid(), "craftsman", craftsman.pk),
+            [100, 100, 100, 0, 0],
+        )
+
+    def test_survey_save_and_delete_recompute_grid(self):
+        surveyor = Surveyor.objects.create(name="調査員", phone="03-0000-0000")
+        self.heatmap.get_grid()
+        version = self.version()
+
+        survey = Survey.objects.create(
+            project=create_site_project(),
+            surveyor=surveyor,
+            scheduled_date=timezone.make_aware(datetime(2026, 11, 3, 10)),
+        )
+
+        self.assertGreater(self.version(), version)
+        grid = self.heatmap.get_grid()
+        self.assertEqual(self.row(grid, "surveyor", surveyor.pk), [0, 33, 0, 0, 0])
+
+        version = self.version()
+        survey.delete()
+
+        self.assertGreater(self.version(), version)
+        grid = self.heatmap.get_grid()
+        self.assertEqual(self.row(grid, "surveyor", surveyor.pk), [0] * 5)
+
+    def test_field_survey_save_recomputes_grid(self):
+        self.heatmap.get_grid()
+        version = self.version()
+
+        survey = create_survey()
+
+        self.assertGreater(self.version(), version)
+        grid = self.heatmap.get_grid()
+        # 120分 ÷ 480分
+        self.assertEqual(
+            self.row(grid, "field_surveyor", survey.surveyor_id), [25, 0, 0, 0, 0]
+        )
+
+
+class RouteOptimizerTests(TestCase):
+    def optimizer(self, points, **kwargs):
+        travel = [[round(math.dist(a, b) * 10) for b in points] for a in points]
+        return RouteOptimizer(travel, [0] * len(points), [0] * len(points), **kwargs)
+
+    def brute_force(self, optimizer):
+        return min(
+            optimizer.evaluate(list(order))
+            for order in itertools.permutations(range(1, len(optimizer.travel)))
+        )
+
+    def test_improves_nearest_neighbour_tour_to_optimum(self):
+        # 拠点(0,0)の近くから順に拾うと、最後に遠い (0,5) から戻ることになる
+        optimizer = self.optimizer([(0, 0), (1, 0), (-2, 0), (3, 0), (-4, 1), (0, 5)])
+        optimum = self.brute_force(optimizer)
+
+        self.assertGreater(optimizer.evaluate(optimizer.nearest_neighbour()), optimum)
+        self.assertEqual(optimizer.evaluate(optimizer.solve()), optimum)
+
+    def test_initial_order_is_never_made_worse(self):
+        optimizer = self.optimizer([(0, 0), (2, 1), (-1, 0), (3, 3), (-2, 3), (0, 4)])
+        initial = [1, 3, 5, 4, 2]
+
+        order = optimizer.solve(initial=initial)
+
+        self.assertEqual(sorted(order), [1, 2, 3, 4, 5])
+        self.assertLessEqual(optimizer.evaluate(order), optimizer.evaluate(initial))
+
+    def test_day_end_rules_out_cheaper_order(self):
+        # 1→2 の順は移動が短い（100分）が、最後の調査が拠点近くの遠回りで終わる
+        travel = [
+            [0, 40, 30],
+            [60, 0, 55],
+            [5, 20, 0],
+        ]
+        durations = [0, 60, 60]
+        unbounded = RouteOptimizer(travel, durations, [0, 0, 0])
+        bounded = RouteOptimizer(travel, durations, [0, 0, 0], day_end=180)
+
+        self.assertEqual(unbounded.solve(), [1, 2])
+        self.assertEqual(bounded.solve(), [2, 1])
+        stops, finish, total_travel = bounded.schedule([2, 1])
+        self.assertEqual(stops, [(2, 30, 30), (1, 110, 20)])
+        self.assertEqual((finish, total_travel), (170, 110))
+        self.assertEqual(bounded.schedule([1, 2])[1], 215)
+
+    def test_urgent_survey_is_visited_first(self):
+        # 移動だけなら 1→2 の順だが、2 が至急なら先に回る
+        travel = [
+            [0, 10, 30],
+            [10, 0, 25],
+            [20, 40, 0],
+        ]
+        durations = [0, 60, 60]
+
+        self.assertEqual(RouteOptimizer(travel, durations, [0, 0, 0]).solve(), [1, 2])
+        self.assertEqual(RouteOptimizer(travel, durations, [0, 0, 1.0]).solve(), [2, 1])
+
+
+class WeeklySurveyPlannerTests(TestCase):
+    monday = date(2026, 11, 2)
+    tuesday = date(2026, 11, 3)
+
+    def setUp(self):
+        # A は 11/2 10:00 に固定の調査があり、11/3 は午後だけ。B は 11/2 が休みで1日1件
+        self.a = Surveyor.objects.create(
+            name="調査員A", phone="03-0000-0001", base_location="東京都新宿区", daily_capacity=2
+        )
+        self.b = Surveyor.objects.create(
+            name="調査員B", phone="03-0000-0002", base_location="東京都新宿区", daily_capacity=1
+        )
+        SurveyAvailability.objects.create(
+            surveyor=self.a, date=self.tuesday, start_time=time(13), end_time=time(17)
+        )
+        SurveyAvailability.objects.create(
+            surveyor=self.b,
+            date=self.monday,
+            start_time=time(9),
+            end_time=time(17),
+            is_available=False,
+        )
+        self.pinned = self.create_survey(
+            "東京都新宿区西新宿2-8-1",
+            surveyor=self.a,
+            scheduled_date=self.at(self.monday, 10),
+        )
+        self.surveys = {
+            priority: self.create_survey("東京都渋谷区道玄坂1-1", priority=priority)
+            for priority in ["low", "normal", "high", "urgent"]
+        }
+
+    def at(self, day, hour, minute=0):
+        return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+    def create_survey(self, address, **kwargs):
+        project = create_site_project(address=address)
+        return Survey.objects.create(project=project, **kwargs)
+
+    def plan(self):
+        return WeeklySurveyPlanner(self.monday, days=2).plan(
+            surveys=Survey.objects.filter(surveyor__isnull=True).select_related(
+                "project"
+            ),
+            surveyors=Surveyor.objects.order_by("id"),
+        )
+
+    def test_plan_respects_time_windows_capacity_and_pinned_surveys(self):
+        plan = self.plan()
+
+        placed = {a["survey"].priority: a for a in plan["assignments"]}
+        # 11/2 の空きは A の1枠だけなので至急が入り、低優先は溢れる
+        self.assertEqual(placed["urgent"]["surveyor"], self.a)
+        self.assertEqual(timezone.localdate(placed["urgent"]["start"]), self.monday)
+        self.assertGreaterEqual(placed["urgent"]["start"], self.at(self.monday, 12))
+        self.assertEqual(plan["unassigned"], [self.surveys["low"]])
+        self.assertNotIn(self.pinned, [a["survey"] for a in plan["assignments"]])
+
+        by_route = {}
+        for assignment in plan["assignments"]:
+            start = timezone.localtime(assignment["start"])
+            key = (assignment["surveyor"], start.date())
+            by_route.setdefault(key, []).append(start)
+        # B の 11/2 は休み、A の 11/3 は 13:00-17:00 に2時間の調査が1件しか入らない
+        self.assertEqual(
+            {key: len(starts) for key, starts in by_route.items()},
+            {
+                (self.a, self.monday): 1,
+                (self.a, self.tuesday): 1,
+                (self.b, self.tuesday): 1,
+            },
+        )
+        (afternoon,) = by_route[(self.a, self.tuesday)]
+        self.assertGreaterEqual(afternoon, self.at(self.tuesday, 13))
+        self.assertLessEqual(
+            afternoon + timedelta(minutes=120), self.at(self.tuesday, 17)
+        )
+
+    def test_apply_updates_surveys_and_rewrites_routes(self):
+        stale = SurveyRoute.objects.create(date=self.monday, surveyor=self.a)
+        stale.surveys.add(self.surveys["low"])
+        plan = self.plan()
+
+        self.assertEqual(apply_survey_plan(plan), 3)
+
+        for assignment in plan["assignments"]:
+            survey = Survey.objects.get(pk=assignment["survey"].pk)
+            self.assertEqual(survey.surveyor, assignment["surveyor"])
+            self.assertEqual(survey.scheduled_date, assignment["start"])
+        self.assertIsNone(Survey.objects.get(pk=self.surveys["low"].pk).surveyor)
+
+        route = SurveyRoute.objects.get(date=self.monday, surveyor=self.a)
+        self.assertEqual(route.pk, stale.pk)
+        expected = [self.pinned.pk, self.surveys["urgent"].pk]
+        self.assertEqual(route.optimized_order, expected)
+        self.assertEqual(sorted(route.surveys.values_list("pk", flat=True)), expected)
+        self.assertEqual(SurveyRoute.objects.count(), 3)
+
+    def test_apply_empty_plan_writes_nothing(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(apply_survey_plan({"assignments": [], "routes": []}), 0)
+
+
+class SurveyCalendarFeedTests(TestCase):
+    url = reverse("survey_calendar_feed")
+    params = {"start": "2026-11-02", "end": "2026-11-09"}
+
+    def setUp(self):
+        self.surveyor = Surveyor.objects.create(name="調査員", phone="03-0000-0000")
+        self.survey = Survey.objects.create(
+            project=create_site_project(),
+            surveyor=self.surveyor,
+            scheduled_date=timezone.make_aware(datetime(2026, 11, 3, 10)),
+        )
+
+    def get(self, headers=None, **params):
+        return self.client.get(self.url, {**self.params, **params}, headers=headers)
+
+    def test_invalid_surveyor_returns_400(self):
+        self.assertEqual(self.get(surveyor="abc").status_code, 400)
+        self.assertEqual(self.get(start="2026-13-01").status_code, 400)
+
+    def test_filters_by_surveyor(self):
+        other = Surveyor.objects.create(name="別の調査員", phone="03-0000-0001")
+
+        self.assertEqual(len(self.get(surveyor=str(self.surveyor.pk)).json()), 1)
+        self.assertEqual(self.get(surveyor=str(other.pk)).json(), [])
+
+    def test_unchanged_feed_returns_304_until_a_survey_is_updated(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual([e["id"] for e in first.json()], [self.survey.pk])
+
+        repeated = self.get(headers={"If-None-Match": first["ETag"]})
+        self.assertEqual(repeated.status_code, 304)
+        self.assertEqual(repeated["ETag"], first["ETag"])
+
+        self.survey.estimated_duration = 90
+        self.survey.save()
+
+        updated = self.get(headers={"If-None-Match": first["ETag"]})
+        self.assertEqual(updated.status_code, 200)
+        self.assertNotEqual(updated["ETag"], first["ETag"])
+        self.assertEqual(updated.json()[0]["duration"], 90)
+
+
+class UnavailableEstimator:
+    name = "unavailable"
+
+    def estimate(self, origins, destinations):
+        raise TravelTimeServiceError("connection refused")
+
+
+class TravelTimeCacheTests(TestCase):
+    points = [(35.6812, 139.7671), (35.6586, 139.7454)]
+
+    def test_fallback_estimates_are_not_cached(self):
+        cache = TravelTimeCache(UnavailableEstimator())
+        with self.assertLogs("projects.travel_times", "WARNING"):
+            travel, _ = cache.matrix(self.points)
+
+        self.assertGreater(travel[0][1], 0)
+        self.assertEqual(cache.stats()["memory_entries"], 0)
+        self.assertFalse(TravelTime.objects.exists())
+
+        with self.assertLogs("projects.travel_times", "WARNING"):
+            cache.matrix(self.points)
+        self.assertEqual(cache.stats()["misses"], 4)
+
+    def test_estimates_are_cached(self):
+        cache = TravelTimeCache(HaversineEstimator())
+        cache.matrix(self.points)
+        cache.matrix(self.points)
+
+        stats = cache.stats()
+        self.assertEqual(stats["memory_entries"], 2)
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(stats["memory_hits"], 2)
+        self.assertEqual(TravelTime.objects.count(), 2)
+
+
+class PhotoPipelineSubmitTests(TestCase):
+    def test_broken_pool_is_recreated(self):
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool
+        fresh = mock.Mock()
+        with mock.patch.object(photo_pipeline, "_executor", broken), mock.patch.object(
+            photo_pipeline, "ProcessPoolExecutor", return_value=fresh
+        ), self.assertLogs("projects.photo_pipeline", "WARNING"):
+            future = photo_pipeline._submit(max, 1, 2)
+            self.assertIs(photo_pipeline._executor, fresh)
+
+        self.assertIs(future, fresh.submit.return_value)
+        fresh.submit.assert_called_once_with(max, 1, 2)
+
+    def test_failed_submit_marks_photo_failed(self):
+        photo = create_survey_photo()
+        with mock.patch.object(
+            photo_pipeline, "submit_photo", side_effect=OSError("no workers")
+        ), self.assertLogs("projects.photo_pipeline", "ERROR"):
+            with self.captureOnCommitCallbacks(execute=True):
+                photo_pipeline.enqueue_photo(photo)
+
+        photo.refresh_from_db()
+        self.assertEqual(photo.processing_status, photo_pipeline.STATUS_FAILED)
+        self.assertEqual(photo.processing_error, "no workers")
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "white").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def create_survey_report():
+    return SurveyReport.objects.create(
+        survey=Survey.objects.create(project=create_site_project()),
+        actual_area=20,
+        access_notes="駐車場あり",
+        surveyor_notes="特記なし",
+    )
+
+
+class PhotoAdmissionTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        settings_override = override_settings(MEDIA_ROOT=self.tmp)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.report = create_survey_report()
+
+    def upload(self):
+        with mock.patch.object(photo_pipeline, "enqueue_photo"):
+            return self.client.post(
+                reverse("photo_upload_ajax", args=[self.report.pk]),
+                {"photo": SimpleUploadedFile("wall.png", png_bytes())},
+            )
+
+    def assertRejected(self, response, status):
+        self.assertEqual(response.status_code, status)
+        self.assertFalse(self.report.photos.exists())
+
+    def test_accepts_small_image(self):
+        self.assertEqual(self.upload().status_code, 200)
+
+    @override_settings(PHOTO_MAX_PIXELS=63)
+    def test_rejects_pixel_count_over_limit(self):
+        self.assertRejected(self.upload(), 413)
+
+    @override_settings(PHOTO_MAX_UPLOAD_BYTES=10)
+    def test_rejects_file_over_size_limit(self):
+        self.assertRejected(self.upload(), 413)
+
+    def test_rejects_decompression_bomb_from_header(self):
+        # 8×8 の画像でも Pillow の上限を下げれば展開爆弾として扱われる
+        for limit in (40, 10):
+            with self.subTest(limit=limit), mock.patch.object(
+                Image, "MAX_IMAGE_PIXELS", limit
+            ):
+                self.assertRejected(self.upload(), 413)
+
+    @override_settings(PHOTO_PIPELINE_MAX_PENDING=2)
+    def test_full_queue_returns_503_with_retry_after(self):
+        with mock.patch.object(photo_pipeline, "_pending", 2):
+            response = self.upload()
+
+        self.assertRejected(response, 503)
+        self.assertEqual(
+            response["Retry-After"], str(photo_pipeline.RETRY_AFTER_SECONDS)
+        )
+
+    @override_settings(PHOTO_DECODE_CONCURRENCY=1)
+    def test_decode_slot_times_out_when_taken(self):
+        with mock.patch.multiple(
+            photo_pipeline, _decode_semaphore=None, DECODE_WAIT_SECONDS=0.01
+        ):
+            with photo_pipeline.decode_slot():
+                with self.assertRaises(photo_pipeline.PipelineBusyError):
+                    with photo_pipeline.decode_slot():
+                        pass
+            # 解放後は再び確保できる
+            with photo_pipeline.decode_slot():
+                pass
+
+
+class PhotoThumbnailTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.tmp, THUMBNAIL_CACHE_DIR=os.path.join(self.tmp, "thumbs")
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        thumbnails.get_thumbnail_cache.cache_clear()
+        self.addCleanup(thumbnails.get_thumbnail_cache.cache_clear)
+        self.photo = surveys_models.SurveyPhoto.objects.create(
+            survey=create_survey(),
+            photo_type="room_overview",
+            image=SimpleUploadedFile("wall.png", png_bytes()),
+        )
+        self.url = thumbnails.thumbnail_url(self.photo, 160)
+
+    def test_url_with_other_digest_is_404(self):
+        url = self.url.replace(self.photo.content_hash, "f" * 64)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        url = self.url.replace("/160", "/161")
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_generated_on_first_access_then_served_without_queries(self):
+        cache = thumbnails.get_thumbnail_cache()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertTrue(cache.path_for(self.photo.content_hash, 160).exists())
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+            with Image.open(io.BytesIO(b"".join(response.streaming_content))) as image:
+                self.assertEqual(image.format, "JPEG")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_immutable_cache_headers_and_conditional_get(self):
+        response = self.client.get(self.url)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["ETag"], f'"{self.photo.content_hash}-160"')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                self.url, headers={"If-None-Match": response["ETag"]}
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertIn("immutable", response["Cache-Control"])
+
+    def test_least_recently_used_is_evicted_over_max_bytes(self):
+        cache = thumbnails.ThumbnailCache(os.path.join(self.tmp, "lru"))
+        digest = self.photo.content_hash
+        paths = {size: cache.render(self.photo, size) for size in (160, 320)}
+        # 160 が 320 より古いが、最後に読まれたのは 160
+        now = datetime.now().timestamp()
+        os.utime(paths[160], (now - 3 * 3600,) * 2)
+        os.utime(paths[320], (now - 2 * 3600,) * 2)
+        cache.open(digest, 160).close()
+
+        cache.max_bytes = sum(p.stat().st_size for p in paths.values()) * 5 // 4
+        paths[640] = cache.render(self.photo, 640)
+
+        self.assertEqual(cache.evictions, 1)
+        self.assertFalse(paths[320].exists())
+        self.assertTrue(paths[160].exists())
+        self.assertTrue(paths[640].exists())
+        self.assertLessEqual(cache.stats()["bytes"], cache.max_bytes)
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        settings_override = override_settings(
+            CHUNKED_UPLOAD_DIR=os.path.join(self.tmp, "uploads"),
+            MEDIA_ROOT=os.path.join(self.tmp, "media"),
+            CHUNKED_UPLOAD_MAX_SESSIONS=2,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user("surveyor", password="pass")
+        self.client.force_login(self.user)
+
+    def start(self, content, **overrides):
+        data = {
+            "filename": "wall.png",
+            "size": len(content),
+            "sha256": hashlib.sha256(content).hexdigest(),
+            **overrides,
+        }
+        return self.client.post(
+            reverse("photo_upload_start"), data, content_type="application/json"
+        )
+
+    def put(self, upload_id, offset, chunk):
+        return self.client.generic(
+            "PUT",
+            reverse("photo_upload_session", args=[upload_id]),
+            chunk,
+            content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def upload(self, content):
+        upload_id = self.start(content).json()["upload_id"]
+        half = len(content) // 2
+        self.put(upload_id, 0, content[:half])
+        self.put(upload_id, half, content[half:])
+        return upload_id
+
+    def upload_step_photo(self, upload_id):
+        survey = create_survey()
+        step = surveys_models.SurveyWorkflowStep.objects.create(
+            step_type="room_setup", step_number=1, title="部屋", description="部屋"
+        )
+        with mock.patch.object(photo_pipeline, "enqueue_photo"):
+            return self.client.post(
+                reverse("surveys:upload_step_photo", args=[survey.pk, step.pk]),
+                {"upload_id": upload_id},
+            )
+
+    def test_start_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.start(b"data").status_code, 401)
+
+    def test_start_rejects_non_object_json(self):
+        response = self.client.post(
+            reverse("photo_upload_start"), [1], content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_start_limits_open_sessions_per_user(self):
+        self.assertEqual(self.start(b"a").status_code, 201)
+        self.assertEqual(self.start(b"b").status_code, 201)
+        self.assertEqual(self.start(b"c").status_code, 429)
+
+    @override_settings(CHUNKED_UPLOAD_MAX_BYTES=10)
+    def test_start_limits_total_bytes(self):
+        self.assertEqual(self.start(b"0123456789").status_code, 201)
+        self.assertEqual(self.start(b"x").status_code, 503)
+
+    def test_resume_from_received_offset(self):
+        content = png_bytes()
+        upload_id = self.start(content).json()["upload_id"]
+
+        self.assertEqual(self.put(upload_id, 0, content[:10]).json()["offset"], 10)
+        response = self.put(upload_id, 0, content[10:])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["offset"], 10)
+
+        status = self.client.get(reverse("photo_upload_session", args=[upload_id]))
+        self.assertEqual(status.json()["offset"], 10)
+        response = self.put(upload_id, 10, content[10:])
+        self.assertEqual(response.json()["offset"], len(content))
+
+    def test_finished_upload_is_saved_and_cleaned_up(self):
+        content = png_bytes()
+        upload_id = self.upload(content)
+
+        response = self.upload_step_photo(upload_id)
+
+        self.assertEqual(response.status_code, 200)
+        photo = surveys_models.SurveyPhoto.objects.get(pk=response.json()["photo_id"])
+        self.assertEqual(photo.content_hash, hashlib.sha256(content).hexdigest())
+        with photo.image.open("rb") as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual(os.listdir(chunked_upload.upload_root()), [".lock"])
+
+    def test_invalid_image_is_discarded_and_closed(self):
+        upload_id = self.upload(b"not an image")
+        opened = []
+        finalize = chunked_upload.finalize
+
+        def spy(*args):
+            opened.append(finalize(*args))
+            return opened[-1]
+
+        with mock.patch.object(chunked_upload, "finalize", spy):
+            response = self.upload_step_photo(upload_id)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(opened[0].closed)
+        self.assertFalse(surveys_models.SurveyPhoto.objects.exists())
+        self.assertEqual(os.listdir(chunked_upload.upload_root()), [".lock"])
+
+    def test_saved_name_uses_detected_format(self):
+        content = png_bytes()
+        upload_id = self.start(content, filename="wall.html").json()["upload_id"]
+        self.put(upload_id, 0, content)
+
+        response = self.upload_step_photo(upload_id)
+
+        photo = surveys_models.SurveyPhoto.objects.get(pk=response.json()["photo_id"])
+        self.assertRegex(photo.image.name, r"/wall[^/]*\.png$")
+
+    def test_report_photo_extension_ignores_client_filename(self):
+        report = create_survey_report()
+        with mock.patch.object(photo_pipeline, "enqueue_photo"):
+            response = self.client.post(
+                reverse("photo_upload_ajax", args=[report.pk]),
+                {"photo": SimpleUploadedFile("photo.jpg.html", png_bytes())},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["photo_url"].endswith(".png"))
+
+    def test_checksum_mismatch_discards_upload(self):
+        content = png_bytes()
+        upload_id = self.start(content, sha256="0" * 64).json()["upload_id"]
+        self.put(upload_id, 0, content)
+
+        response = self.upload_step_photo(upload_id)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(os.listdir(chunked_upload.upload_root()), [".lock"])
+
+
+class AvailabilityIndexTests(TestCase):
+    start = date(2026, 11, 2)  # 月曜日
+    end = date(2026, 11, 15)
+
+    def setUp(self):
+        self.project_type = ProjectType.objects.create(name="クロス")
+        self.craftsman = create_craftsman(self.project_type)
+        days = schedule_dates(self.start, self.end)
+        weekends = [day for day in days if day.weekday() >= 5]
+        upsert_craftsman_schedule(self.craftsman, weekends, is_available=False)
+        upsert_craftsman_schedule(self.craftsman, [date(2026, 11, 4)], is_available=True)
+        # 11/10〜11/11 は確定済みの案件で埋まっている
+        project = create_site_project(
+            self.project_type, start_date=date(2026, 11, 10), end_date=date(2026, 11, 11)
+        )
+        create_assignment(project, self.craftsman)
+
+    def per_row_available_days(self, craftsman, start, end):
+        craftsman = Craftsman.objects.get(pk=craftsman.pk)
+        return [day for day in schedule_dates(start, end) if craftsman.can_work_on(day)]
+
+    def test_matches_per_row_query(self):
+        inactive = create_craftsman(self.project_type, name="休業中", is_active=False)
+        index = AvailabilityIndex([self.craftsman, inactive], self.start, self.end)
+
+        for craftsman in (self.craftsman, inactive):
+            for start, end in (
+                (self.start, self.end),
+                (date(2026, 11, 6), date(2026, 11, 9)),
+                (date(2026, 11, 7), date(2026, 11, 8)),
+            ):
+                with self.subTest(craftsman=craftsman.name, start=start, end=end):
+                    expected = self.per_row_available_days(craftsman, start, end)
+                    self.assertEqual(
+                        index.available_days(craftsman.id, start, end), len(expected)
+                    )
+                    self.assertEqual(
+                        [
+                            day
+                            for day in schedule_dates(start, end)
+                            if index.is_available(craftsman.id, day)
+                        ],
+                        expected,
+                    )
+
+    def test_weekend_only_range_has_no_availability(self):
+        index = AvailabilityIndex([self.craftsman], self.start, self.end)
+        self.assertEqual(
+            index.available_days(self.craftsman.id, date(2026, 11, 7), date(2026, 11, 8)),
+            0,
+        )
+        self.assertFalse(index.is_available(self.craftsman.id, date(2026, 11, 16)))
+
+    def test_in_progress_assignment_without_schedule_blocks_days(self):
+        project = create_site_project(
+            self.project_type, start_date=date(2026, 11, 2), end_date=date(2026, 11, 3)
+        )
+        create_assignment(project, self.craftsman, status="in_progress")
+        index = AvailabilityIndex([self.craftsman], self.start, self.end)
+
+        self.assertFalse(index.is_available(self.craftsman.id, date(2026, 11, 2)))
+        self.assertEqual(index.available_days(self.craftsman.id), 6)
+
+    def test_consecutive_windows(self):
+        index = AvailabilityIndex([self.craftsman], self.start, self.end)
+        self.assertEqual(
+            list(index.windows(self.craftsman.id, 3)),
+            [
+                (date(2026, 11, 2), date(2026, 11, 4)),
+                (date(2026, 11, 3), date(2026, 11, 5)),
+                (date(2026, 11, 4), date(2026, 11, 6)),
+            ],
+        )
+
+
+class SuggestAlternativeDatesTests(TestCase):
+    preferred_start = date(2026, 11, 9)
+    preferred_end = date(2026, 11, 10)
+
+    def setUp(self):
+        self.project_type = ProjectType.objects.create(name="クロス")
+        self.craftsmen = [
+            create_craftsman(self.project_type, name="職人A"),
+            create_craftsman(self.project_type, name="職人B"),
+        ]
+        # A は希望期間が確定済み、B は週末と 11/6 が休み
+        project = create_site_project(
+            self.project_type, start_date=date(2026, 11, 9), end_date=date(2026, 11, 11)
+        )
+        create_assignment(project, self.craftsmen[0])
+        days = schedule_dates(date(2026, 11, 2), date(2026, 11, 17))
+        upsert_craftsman_schedule(
+            self.craftsmen[1],
+            [day for day in days if day.weekday() >= 5] + [date(2026, 11, 6)],
+            is_available=False,
+        )
+        self.matcher = CraftsmanMatcher()
+
+    def reference(self, craftsman, search_days):
+        """稼働可否を1日ずつ確かめて連続2日の空きを探す"""
+        craftsman = Craftsman.objects.get(pk=craftsman.pk)
+        first = self.preferred_start - timedelta(days=search_days)
+        last = self.preferred_end + timedelta(days=search_days)
+        starts = [
+            day
+            for day in schedule_dates(first, last - timedelta(days=1))
+            if craftsman.can_work_on(day) and craftsman.can_work_on(day + timedelta(1))
+        ]
+        return sorted(
+            starts, key=lambda day: (abs((day - self.preferred_start).days), day)
+        )
+
+    def test_bulk_matches_per_craftsman_results(self):
+        bulk = self.matcher.suggest_alternative_dates_bulk(
+            self.craftsmen, self.preferred_start, self.preferred_end, search_days=7
+        )
+
+        for craftsman in self.craftsmen:
+            with self.subTest(craftsman=craftsman.name):
+                single = self.matcher.suggest_alternative_dates(
+                    craftsman, self.preferred_start, self.preferred_end, search_days=7
+                )
+                self.assertEqual(
+                    [s for s in bulk if s["craftsman"] == craftsman],
+                    [{**s, "craftsman": craftsman} for s in single],
+                )
+                self.assertEqual(
+                    [s["start_date"] for s in single], self.reference(craftsman, 7)
+                )
+        self.assertEqual(
+            [(s["days_diff"], s["start_date"]) for s in bulk],
+            sorted((s["days_diff"], s["start_date"]) for s in bulk),
+        )
+
+    def test_filters_by_project_type_and_limit(self):
+        other_type = ProjectType.objects.create(name="塗装")
+        self.craftsmen[1].specialties.set([other_type])
+
+        suggestions = self.matcher.suggest_alternative_dates_bulk(
+            self.craftsmen,
+            self.preferred_start,
+            self.preferred_end,
+            project_type=self.project_type,
+            search_days=7,
+            limit=2,
+        )
+
+        self.assertEqual(len(suggestions), 2)
+        self.assertTrue(all(s["craftsman"] == self.craftsmen[0] for s in suggestions))
+        self.assertEqual(suggestions[0]["start_date"], date(2026, 11, 7))
+
+
+class SolveAssignmentTests(TestCase):
+    def test_finds_minimum_cost_instead_of_greedy_choice(self):
+        # 行0 に最安の列0 を与えると行1 が高コストの列1 しか残らない
+        self.assertEqual(solve_assignment([[1, 2], [2, 100]]), [(0, 1), (1, 0)])
+
+    def test_rectangular_matrix_assigns_fewer_side(self):
+        self.assertEqual(solve_assignment([[5, 1, 9]]), [(0, 1)])
+        self.assertEqual(solve_assignment([[5], [1], [9]]), [(1, 0)])
+        self.assertEqual(solve_assignment([]), [])
+
+
+class BatchAssignmentPlannerTests(TestCase):
+    def setUp(self):
+        self.cross = ProjectType.objects.create(name="クロス")
+        self.paint = ProjectType.objects.create(name="塗装")
+
+    def plan(self, projects, craftsmen):
+        craftsmen = Craftsman.objects.filter(
+            pk__in=[c.pk for c in craftsmen]
+        ).prefetch_related("specialties")
+        return BatchAssignmentPlanner().plan(projects, craftsmen)
+
+    def test_optimal_plan_assigns_every_project(self):
+        expert = create_craftsman(self.cross, name="職人A", skill_level=5)
+        expert.specialties.add(self.paint)
+        junior = create_craftsman(self.cross, name="職人B", skill_level=1)
+        cross_project = create_site_project(self.cross)
+        paint_project = create_site_project(self.paint, title="外壁塗装")
+
+        result = self.plan([cross_project, paint_project], [expert, junior])
+
+        # A はクロスでも高得点だが、塗装を受けられるのは A だけ
+        self.assertEqual(
+            {a["project"].pk: a["craftsman"].pk for a in result["assignments"]},
+            {cross_project.pk: junior.pk, paint_project.pk: expert.pk},
+        )
+        self.assertEqual(result["unassigned"], [])
+
+    def test_craftsman_is_not_double_booked(self):
+        craftsman = create_craftsman(self.cross)
+        first = create_site_project(self.cross)
+        overlapping = create_site_project(
+            self.cross, start_date=date(2026, 11, 3), end_date=date(2026, 11, 5)
+        )
+        later = create_site_project(
+            self.cross, start_date=date(2026, 11, 5), end_date=date(2026, 11, 6)
+        )
+
+        result = self.plan([first, overlapping], [craftsman])
+        self.assertEqual(len(result["assignments"]), 1)
+        self.assertEqual(len(result["unassigned"]), 1)
+
+        result = self.plan([first, later], [craftsman])
+        self.assertEqual([a["project"] for a in result["assignments"]], [first, later])
+        self.assertEqual(result["unassigned"], [])
+
+
+class BatchAssignmentApiTests(TestCase):
+    url = reverse("batch_assignment_api")
+
+    def setUp(self):
+        self.project_type = ProjectType.objects.create(name="クロス")
+        self.craftsman = create_craftsman(self.project_type)
+        self.project = create_site_project(self.project_type)
+        Surveyor.objects.create(name="担当", phone="03-1111-1111")
+
+    def post(self, pairs):
+        return self.client.post(
+            self.url,
+            {
+                "assignments": [
+                    {"project_id": project.pk, "craftsman_id": craftsman.pk}
+                    for project, craftsman in pairs
+                ]
+            },
+            content_type="application/json",
+        )
+
+    def test_days_are_clamped(self):
+        for days, end_date in [("0", "2026-11-02"), ("1000", "2026-12-02")]:
+            with self.subTest(days=days):
+                response = self.client.get(
+                    self.url, {"start_date": "2026-11-02", "days": days}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["end_date"], end_date)
+
+    def test_replayed_post_does_not_duplicate_offers(self):
+        first = self.post([(self.project, self.craftsman)])
+        self.assertEqual(len(first.json()["assignment_ids"]), 1)
+
+        response = self.post([(self.project, self.craftsman)])
+
+        self.assertEqual(response.json()["assignment_ids"], [])
+        self.assertEqual(len(response.json()["skipped"]), 1)
+        self.assertEqual(Assignment.objects.filter(project=self.project).count(), 1)
+
+    def test_skips_craftsman_with_overlapping_assignment(self):
+        other = create_site_project(
+            self.project_type, start_date=date(2026, 11, 4), end_date=date(2026, 11, 5)
+        )
+        free = create_site_project(
+            self.project_type, start_date=date(2026, 11, 9), end_date=date(2026, 11, 10)
+        )
+        create_assignment(other, self.craftsman, status="inquiry")
+
+        response = self.post([(self.project, self.craftsman), (free, self.craftsman)])
+
+        self.assertEqual(len(response.json()["assignment_ids"]), 1)
+        self.assertEqual(
+            [s["project_id"] for s in response.json()["skipped"]], [self.project.pk]
+        )
+        self.assertFalse(Assignment.objects.filter(project=self.project).exists())
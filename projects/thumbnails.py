@@ -0,0 +1,226 @@
+"""
+写真サムネイルのオンデマンド生成とディスクキャッシュ
+
+サムネイルの URL は 写真の種類 / ID / 原本のコンテンツハッシュ / 長辺のピクセル数 からなり、
+内容が変わらない限り同じ URL になるため、長期間の immutable キャッシュで配信できる。
+初回のアクセスで生成したファイルを コンテンツハッシュ + 大きさ をキーにディスクへ保存し、
+2回目以降は DB に問い合わせずにファイルを返す。
+
+キャッシュの合計サイズが THUMBNAIL_CACHE_MAX_BYTES を超えたら、
+最終アクセス（ファイルの更新日時で記録）の古い順に上限の9割まで削る。
+"""
+import os
+import shutil
+import threading
+import time
+import warnings
+from functools import lru_cache
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from . import photo_pipeline
+
+
+# 生成を許す長辺のピクセル数（任意の大きさでキャッシュを埋められないよう固定）
+THUMBNAIL_SIZES = (160, 320, 640, 1280)
+DEFAULT_THUMBNAIL_SIZE = 320
+
+THUMBNAIL_QUALITY = 80
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# 最終アクセスの記録（更新日時の書き換え）はこの秒数より古いときだけ行う
+TOUCH_INTERVAL = 3600
+
+# URL 上の種類 → 写真モデル
+THUMBNAIL_SOURCES = {
+    "survey-record": "projects.SurveyPhoto",
+    "survey": "surveys.SurveyPhoto",
+    "progress": "projects.ProgressPhoto",
+}
+
+
+def source_model(kind):
+    """URL 上の種類に対応する写真モデル（未知の種類なら None）"""
+    label = THUMBNAIL_SOURCES.get(kind)
+    return apps.get_model(label) if label else None
+
+
+def thumbnail_url(photo, size=DEFAULT_THUMBNAIL_SIZE):
+    """
+    写真のサムネイル URL
+
+    コンテンツハッシュが未記録の写真（thumbnail_cache --backfill の前の既存写真）は、
+    縮小版があればその URL、なければ原本の URL を返す。
+    """
+    source = getattr(photo, photo.source_field)
+    if not source:
+        return None
+    if not photo.content_hash:
+        if hasattr(photo, "renditions"):
+            return photo_pipeline.rendition_url(photo, "medium")
+        return source.url
+    kind = next(
+        kind
+        for kind, label in THUMBNAIL_SOURCES.items()
+        if label == photo._meta.label
+    )
+    return reverse(
+        "photo_thumbnail",
+        kwargs={
+            "kind": kind,
+            "pk": photo.pk,
+            "digest": photo.content_hash,
+            "size": size,
+        },
+    )
+
+
+class ThumbnailCache:
+    """コンテンツハッシュをキーにしたサムネイルのディスクキャッシュ（LRU、合計サイズに上限）"""
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = Path(root or Path(settings.MEDIA_ROOT) / "thumbnails")
+        self.max_bytes = max_bytes or DEFAULT_MAX_BYTES
+        self._usage = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path_for(self, digest, size):
+        return self.root / digest[:2] / f"{digest}_{size}.jpg"
+
+    def open(self, digest, size):
+        """キャッシュ済みならファイルを開いて返す（なければ None）"""
+        path = self.path_for(digest, size)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        now = time.time()
+        try:
+            if now - os.fstat(f.fileno()).st_mtime > TOUCH_INTERVAL:
+                os.utime(path, (now, now))
+        except OSError:
+            pass
+        return f
+
+    def render(self, photo, size):
+        """
+        写真のサムネイルを生成してキャッシュに保存し、そのパスを返す
+
+        処理済みの縮小版（長辺1920px）があれば原本の代わりにそれを縮める。
+
+        Raises:
+            photo_pipeline.PipelineBusyError: デコードの枠が空かない
+            photo_pipeline.PhotoTooLargeError: 原本の画素数が上限を超える
+        """
+        source = getattr(photo, photo.source_field)
+        name = source.name
+        if hasattr(photo, "renditions") and photo.processing_status == (
+            photo_pipeline.STATUS_READY
+        ):
+            large = (photo.renditions or {}).get("large", {}).get("jpeg")
+            if large and size <= photo_pipeline.RENDITION_SIZES["large"]:
+                name = large
+
+        path = self.path_for(photo.content_hash, size)
+        with photo_pipeline.decode_slot():
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", Image.DecompressionBombWarning)
+                with source.storage.open(name, "rb") as f, Image.open(f) as original:
+                    photo_pipeline.check_pixels(
+                        original.size, photo_pipeline.max_pixels()
+                    )
+                    original.draft(
+                        "RGB", photo_pipeline.draft_size(original.size, size)
+                    )
+                    image = ImageOps.exif_transpose(original)
+                    if image.mode != "RGB":
+                        image = image.convert("RGB")
+                    image.thumbnail((size, size), Image.Resampling.LANCZOS)
+                    photo_pipeline.save_atomic(
+                        image,
+                        path,
+                        "JPEG",
+                        quality=THUMBNAIL_QUALITY,
+                        optimize=True,
+                        progressive=True,
+                    )
+        self._add(path.stat().st_size)
+        return path
+
+    def _files(self):
+        for directory in self.root.glob("??"):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith(".jpg"):
+                        yield entry
+
+    def _add(self, size):
+        with self._lock:
+            if self._usage is None:
+                self._usage = sum(entry.stat().st_size for entry in self._files())
+            else:
+                self._usage += size
+            if self._usage > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # 他のプロセスの書き込み分もあるため、数え直してから古い順に削る
+        entries = sorted(
+            (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+            for entry in self._files()
+        )
+        usage = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 9 // 10
+        for _, size, path in entries:
+            if usage <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            usage -= size
+            self.evictions += 1
+        self._usage = usage
+
+    def stats(self):
+        """キャッシュの件数・合計サイズとヒット率（ヒット率はこのプロセスでの累計）"""
+        files = 0
+        total = 0
+        for entry in self._files():
+            files += 1
+            total += entry.stat().st_size
+        lookups = self.hits + self.misses
+        return {
+            "files": files,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def clear(self):
+        """キャッシュのファイルをすべて削除"""
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self._usage = 0
+
+
+@lru_cache(maxsize=1)
+def get_thumbnail_cache():
+    """設定に従った共有のサムネイルキャッシュ"""
+    return ThumbnailCache(
+        getattr(settings, "THUMBNAIL_CACHE_DIR", None),
+        getattr(settings, "THUMBNAIL_CACHE_MAX_BYTES", None),
+    )
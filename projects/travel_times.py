@@ -0,0 +1,351 @@
+"""
+地点間の移動時間キャッシュ
+
+ジオコード済みの地点の組ごとに推定した移動時間・距離を TravelTime テーブルに保存し、
+プロセス内の LRU を前段に置いて再計算を避ける。
+1日分の訪問先の行列は1回の問い合わせでまとめて読み込み、足りない組だけを推定する。
+
+推定方式は settings.TRAVEL_TIME_ESTIMATOR（クラスのドット区切りパス）で差し替えられる。
+既定は大円距離 × 迂回係数 ÷ 平均速度の HaversineEstimator。
+ローカルの OSRM サーバーを立てた場合は OSRMEstimator と settings.TRAVEL_TIME_SERVICE_URL を設定する。
+"""
+import json
+import logging
+import math
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .geocoding import distances_from
+from .models import TravelTime
+
+
+logger = logging.getLogger(__name__)
+
+# 道路の迂回を見込んだ直線距離の倍率と平均移動速度
+DETOUR_FACTOR = 1.3
+AVERAGE_SPEED_KMH = 25.0
+
+# 位置が分からない地点との移動時間（分）
+UNKNOWN_TRAVEL_MINUTES = 30
+
+DEFAULT_ESTIMATOR = "projects.travel_times.HaversineEstimator"
+DEFAULT_MEMORY_SIZE = 10000
+DEFAULT_MAX_ENTRIES = 100000
+
+# テーブルの最終利用日時はこの間隔より古いときだけ更新する
+TOUCH_INTERVAL = timedelta(hours=1)
+
+
+class TravelTimeServiceError(Exception):
+    """移動時間サービスに問い合わせできない"""
+
+
+def point_key(point):
+    """座標 (緯度, 経度) をキャッシュのキーにする（約1m単位に丸める）"""
+    return f"{point[0]:.5f},{point[1]:.5f}"
+
+
+class HaversineEstimator:
+    """大円距離 × 迂回係数 ÷ 平均速度 による推定"""
+
+    name = "haversine"
+
+    def estimate(self, origins, destinations):
+        """
+        出発地点 × 到着地点 の (移動時間（分）, 移動距離 (km)) の行列
+
+        Args:
+            origins, destinations: 座標 (緯度, 経度) のリスト
+        """
+        return [
+            [
+                (
+                    math.ceil(distance * DETOUR_FACTOR / AVERAGE_SPEED_KMH * 60),
+                    distance * DETOUR_FACTOR,
+                )
+                for distance in distances_from(origin, destinations)
+            ]
+            for origin in origins
+        ]
+
+
+class OSRMEstimator:
+    """ローカルの OSRM サーバーの table API による推定"""
+
+    name = "osrm"
+
+    def __init__(self, base_url=None, profile="driving", timeout=5):
+        self.base_url = (
+            base_url or getattr(settings, "TRAVEL_TIME_SERVICE_URL", "http://localhost:5000")
+        ).rstrip("/")
+        self.profile = profile
+        self.timeout = timeout
+
+    def estimate(self, origins, destinations):
+        points = list(dict.fromkeys(list(origins) + list(destinations)))
+        index = {point: i for i, point in enumerate(points)}
+        coordinates = ";".join(f"{lng:.6f},{lat:.6f}" for lat, lng in points)
+        url = (
+            f"{self.base_url}/table/v1/{self.profile}/{coordinates}"
+            f"?sources={';'.join(str(index[p]) for p in origins)}"
+            f"&destinations={';'.join(str(index[p]) for p in destinations)}"
+            "&annotations=duration,distance"
+        )
+        try:
+            with urlopen(url, timeout=self.timeout) as response:
+                data = json.load(response)
+        except (URLError, OSError, ValueError) as e:
+            raise TravelTimeServiceError(str(e)) from e
+        if data.get("code") != "Ok":
+            raise TravelTimeServiceError(data.get("message", data.get("code")))
+
+        return [
+            [
+                (
+                    math.ceil(seconds / 60) if seconds is not None else UNKNOWN_TRAVEL_MINUTES,
+                    meters / 1000 if meters is not None else 0.0,
+                )
+                for seconds, meters in zip(duration_row, distance_row)
+            ]
+            for duration_row, distance_row in zip(data["durations"], data["distances"])
+        ]
+
+
+class TravelTimeCache:
+    """
+    推定方式ごとの移動時間キャッシュ
+
+    プロセス内の LRU（memory_size 件）→ TravelTime テーブル → 推定 の順に引く。
+    テーブルは max_entries 件を超えたら最終利用日時の古い順に1割削る。
+    """
+
+    def __init__(self, estimator=None, memory_size=None, max_entries=None):
+        self.estimator = estimator or HaversineEstimator()
+        self.memory_size = memory_size or DEFAULT_MEMORY_SIZE
+        self.max_entries = max_entries or DEFAULT_MAX_ENTRIES
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.memory_hits = 0
+        self.table_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """ヒット率などの集計（このプロセスでの累計）"""
+        lookups = self.memory_hits + self.table_hits + self.misses
+        return {
+            "estimator": self.estimator.name,
+            "lookups": lookups,
+            "memory_hits": self.memory_hits,
+            "table_hits": self.table_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.table_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "evictions": self.evictions,
+        }
+
+    def get(self, origin, destination):
+        """2地点間の (移動時間（分）, 移動距離 (km))"""
+        travel, distances = self.matrix([origin, destination])
+        return travel[0][1], distances[0][1]
+
+    def matrix(self, points):
+        """
+        地点リストの移動時間行列（分）と距離行列 (km)
+
+        位置が分からない地点（None）との移動時間は UNKNOWN_TRAVEL_MINUTES、距離は None。
+        同じ地点どうしは0。
+        """
+        keys = [point_key(point) if point is not None else None for point in points]
+        pairs = {
+            (origin, destination)
+            for origin in keys
+            for destination in keys
+            if origin is not None and destination is not None and origin != destination
+        }
+        values = self.prefetch(pairs, dict(zip(keys, points)))
+
+        travel = []
+        distances = []
+        for origin in keys:
+            travel_row = []
+            distance_row = []
+            for destination in keys:
+                if origin is None or destination is None:
+                    travel_row.append(UNKNOWN_TRAVEL_MINUTES)
+                    distance_row.append(None)
+                elif origin == destination:
+                    travel_row.append(0)
+                    distance_row.append(0.0)
+                else:
+                    minutes, distance = values[(origin, destination)]
+                    travel_row.append(minutes)
+                    distance_row.append(distance)
+            travel.append(travel_row)
+            distances.append(distance_row)
+        return travel, distances
+
+    def prefetch(self, pairs, points_by_key):
+        """
+        地点キーの組の値をまとめて読み込む
+
+        Args:
+            pairs: (出発キー, 到着キー) の集合
+            points_by_key: キー → 座標
+
+        Returns:
+            {(出発キー, 到着キー): (移動時間（分）, 移動距離 (km))}
+        """
+        values = {}
+        with self._lock:
+            for pair in pairs:
+                value = self._memory.get(pair)
+                if value is not None:
+                    self._memory.move_to_end(pair)
+                    values[pair] = value
+            self.memory_hits += len(values)
+
+        missing = pairs - values.keys()
+        if missing:
+            found = self._load(missing)
+            with self._lock:
+                self.table_hits += len(found)
+            values.update(found)
+            missing -= found.keys()
+
+        # 代用の推定値はテーブルと同じくプロセス内の LRU にも残さない
+        fallback = set()
+        if missing:
+            with self._lock:
+                self.misses += len(missing)
+            estimated, cached = self._estimate(missing, points_by_key)
+            values.update(estimated)
+            if not cached:
+                fallback = missing
+
+        with self._lock:
+            for pair in pairs - fallback - self._memory.keys():
+                self._memory[pair] = values[pair]
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+        return values
+
+    def _load(self, pairs):
+        origins = {origin for origin, _ in pairs}
+        destinations = {destination for _, destination in pairs}
+        found = {}
+        stale = []
+        touch_before = timezone.now() - TOUCH_INTERVAL
+        for pk, origin, destination, minutes, distance, last_used_at in (
+            TravelTime.objects.filter(
+                estimator=self.estimator.name,
+                origin__in=origins,
+                destination__in=destinations,
+            ).values_list(
+                "pk", "origin", "destination", "minutes", "distance_km", "last_used_at"
+            )
+        ):
+            if (origin, destination) in pairs:
+                found[(origin, destination)] = (minutes, distance)
+                if last_used_at < touch_before:
+                    stale.append(pk)
+        if stale:
+            TravelTime.objects.filter(pk__in=stale).update(last_used_at=timezone.now())
+        return found
+
+    def _estimate(self, pairs, points_by_key):
+        """
+        足りない組を推定してテーブルに保存する
+
+        Returns:
+            ({(出発キー, 到着キー): 値}, 保存したか)
+            サービスに接続できず既定の推定で代用したときは保存せず False
+        """
+        origins = sorted({origin for origin, _ in pairs})
+        destinations = sorted({destination for _, destination in pairs})
+        try:
+            rows = self.estimator.estimate(
+                [points_by_key[key] for key in origins],
+                [points_by_key[key] for key in destinations],
+            )
+        except TravelTimeServiceError as e:
+            # サービスが使えないときは既定の推定で代用し、キャッシュには残さない
+            logger.warning("移動時間サービスに接続できません: %s", e)
+            fallback = HaversineEstimator()
+            rows = fallback.estimate(
+                [points_by_key[key] for key in origins],
+                [points_by_key[key] for key in destinations],
+            )
+            values = {
+                (origin, destination): rows[i][j]
+                for i, origin in enumerate(origins)
+                for j, destination in enumerate(destinations)
+                if (origin, destination) in pairs
+            }
+            return values, False
+
+        now = timezone.now()
+        values = {}
+        entries = []
+        for i, origin in enumerate(origins):
+            for j, destination in enumerate(destinations):
+                if (origin, destination) not in pairs:
+                    continue
+                minutes, distance = rows[i][j]
+                values[(origin, destination)] = (minutes, distance)
+                entries.append(
+                    TravelTime(
+                        estimator=self.estimator.name,
+                        origin=origin,
+                        destination=destination,
+                        minutes=minutes,
+                        distance_km=distance,
+                        last_used_at=now,
+                    )
+                )
+        TravelTime.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+        self._evict()
+        return values, True
+
+    def _evict(self):
+        queryset = TravelTime.objects.filter(estimator=self.estimator.name)
+        overflow = queryset.count() - self.max_entries
+        if overflow <= 0:
+            return
+        count = overflow + self.max_entries // 10
+        oldest = list(
+            queryset.order_by("last_used_at").values_list("pk", flat=True)[:count]
+        )
+        TravelTime.objects.filter(pk__in=oldest).delete()
+        with self._lock:
+            self.evictions += len(oldest)
+
+    def clear(self):
+        """プロセス内の LRU とテーブルを空にする"""
+        with self._lock:
+            self._memory.clear()
+        TravelTime.objects.filter(estimator=self.estimator.name).delete()
+
+
+@lru_cache(maxsize=1)
+def get_travel_time_cache():
+    """設定に従った推定方式の共有キャッシュ"""
+    estimator_class = import_string(
+        getattr(settings, "TRAVEL_TIME_ESTIMATOR", DEFAULT_ESTIMATOR)
+    )
+    return TravelTimeCache(
+        estimator_class(),
+        memory_size=getattr(settings, "TRAVEL_TIME_MEMORY_SIZE", DEFAULT_MEMORY_SIZE),
+        max_entries=getattr(settings, "TRAVEL_TIME_MAX_ENTRIES", DEFAULT_MAX_ENTRIES),
+    )
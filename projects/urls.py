@@ -1,5 +1,5 @@
 from django.urls import path, include
-from . import views, api_views
+from . import views, api_views, photo_views
 from .survey_urls import survey_urlpatterns
 from .survey_record_urls import survey_record_urlpatterns
 from .craftsman_urls import craftsman_urlpatterns
@@ -66,6 +66,21 @@ urlpatterns = (
             api_views.add_survey_step,
             name="api_add_survey_step",
         ),
+        path(
+            "photos/thumbnails/<slug:kind>/<int:pk>/<slug:digest>/<int:size>.jpg",
+            photo_views.photo_thumbnail,
+            name="photo_thumbnail",
+        ),
+        path(
+            "photos/uploads/",
+            photo_views.photo_upload_start,
+            name="photo_upload_start",
+        ),
+        path(
+            "photos/uploads/<slug:upload_id>/",
+            photo_views.photo_upload_session,
+            name="photo_upload_session",
+        ),
     ]
     + survey_urlpatterns
     + survey_record_urlpatterns
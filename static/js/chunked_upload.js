@@ -0,0 +1,119 @@
+/**
+ * 写真の分割・再開可能アップロード
+ *
+ * uploadPhotoResumable(url, file, formData) は写真を 1MB ずつ /photos/uploads/ に送り、
+ * 最後に url（既存の写真アップロード API）へ upload_id を送って保存する。
+ * 通信が切れたら待ってから再送し、ページを開き直しても受信済みの位置から続ける。
+ * 戻り値は url の JSON 応答（通常の multipart 送信と同じ形）。
+ */
+(function () {
+    const UPLOADS_URL = '/photos/uploads/';
+    const DEFAULT_CHUNK_SIZE = 1024 * 1024;
+    const MAX_RETRIES = 8;
+
+    function csrfToken() {
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : '';
+    }
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    async function sha256Hex(file) {
+        const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+        return Array.from(new Uint8Array(digest))
+            .map(b => b.toString(16).padStart(2, '0'))
+            .join('');
+    }
+
+    // 通信エラーと 5xx は間隔を延ばしながら再送する
+    async function fetchWithRetry(url, options) {
+        for (let attempt = 0; ; attempt++) {
+            try {
+                const response = await fetch(url, options);
+                if (response.status < 500 || attempt >= MAX_RETRIES) {
+                    return response;
+                }
+            } catch (error) {
+                if (attempt >= MAX_RETRIES) {
+                    throw error;
+                }
+            }
+            await sleep(Math.min(30000, 1000 * 2 ** attempt));
+        }
+    }
+
+    async function startOrResume(file, key) {
+        const saved = localStorage.getItem(key);
+        if (saved) {
+            const response = await fetchWithRetry(`${UPLOADS_URL}${saved}/`, {method: 'GET'});
+            if (response.ok) {
+                return response.json();
+            }
+            localStorage.removeItem(key);
+        }
+
+        const response = await fetchWithRetry(UPLOADS_URL, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken()},
+            body: JSON.stringify({filename: file.name, size: file.size, sha256: await sha256Hex(file)})
+        });
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error);
+        }
+        localStorage.setItem(key, data.upload_id);
+        return data;
+    }
+
+    async function sendChunks(file, session) {
+        const chunkSize = session.chunk_size || DEFAULT_CHUNK_SIZE;
+        let offset = session.offset;
+        while (offset < file.size) {
+            const response = await fetchWithRetry(`${UPLOADS_URL}${session.upload_id}/`, {
+                method: 'PUT',
+                headers: {
+                    'Content-Type': 'application/octet-stream',
+                    'Upload-Offset': String(offset),
+                    'X-CSRFToken': csrfToken()
+                },
+                body: file.slice(offset, offset + chunkSize)
+            });
+            const data = await response.json();
+            if (!response.ok && response.status !== 409) {
+                throw new Error(data.error);
+            }
+            // 409 のときはサーバーが受信済みの位置から送り直す
+            offset = data.offset;
+        }
+    }
+
+    window.uploadPhotoResumable = async function (url, file, formData) {
+        if (!(window.crypto && crypto.subtle && window.localStorage)) {
+            const response = await fetch(url, {
+                method: 'POST',
+                headers: {'X-CSRFToken': csrfToken()},
+                body: formData
+            });
+            return response.json();
+        }
+
+        const key = `photoUpload:${url}:${file.name}:${file.size}:${file.lastModified}`;
+        const session = await startOrResume(file, key);
+        await sendChunks(file, session);
+
+        formData.delete('photo');
+        formData.append('upload_id', session.upload_id);
+        const response = await fetchWithRetry(url, {
+            method: 'POST',
+            headers: {'X-CSRFToken': csrfToken()},
+            body: formData
+        });
+        const data = await response.json();
+        if (response.ok || response.status === 404 || response.status === 422) {
+            localStorage.removeItem(key);
+        }
+        return data;
+    };
+})();
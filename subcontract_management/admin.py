@@ -108,6 +108,24 @@ class ContractorAdmin(admin.ModelAdmin):
                 'hourly_rate',
                 'is_active'
             )
+        }),
+        ('振込先口座', {
+            'fields': (
+                'bank_name',
+                'bank_code',
+                'branch_name',
+                'branch_code',
+                'account_type',
+                'account_number',
+                'account_holder'
+            )
+        }),
+        ('支払条件', {
+            'fields': (
+                'payment_cycle',
+                'payment_day',
+                'closing_day'
+            )
         })
     )
 
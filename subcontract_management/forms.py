@@ -8,13 +8,15 @@ class ContractorForm(forms.ModelForm):
         fields = [
             'name', 'contractor_type', 'address', 'contact_person',
             'phone', 'email', 'specialties', 'hourly_rate', 'is_active',
-            'bank_name', 'branch_name', 'account_type', 'account_number',
-            'account_holder', 'payment_day', 'payment_cycle'
+            'bank_name', 'bank_code', 'branch_name', 'branch_code',
+            'account_type', 'account_number',
+            'account_holder', 'closing_day', 'payment_day', 'payment_cycle'
         ]
         widgets = {
             'address': forms.Textarea(attrs={'rows': 2}),
             'specialties': forms.Textarea(attrs={'rows': 3}),
             'hourly_rate': forms.NumberInput(attrs={'step': '1'}),
+            'closing_day': forms.NumberInput(attrs={'min': '1', 'max': '31'}),
             'payment_day': forms.NumberInput(attrs={'min': '1', 'max': '31'}),
         }
 
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subcontract_management', '0008_contractor_account_holder_contractor_account_number_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contractor',
+            name='closing_day',
+            field=models.IntegerField(blank=True, help_text='月末締めの場合は31、20日締めの場合は20', null=True, verbose_name='締め日'),
+        ),
+    ]
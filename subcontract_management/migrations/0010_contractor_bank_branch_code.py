@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:43
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subcontract_management', '0009_contractor_closing_day'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contractor',
+            name='bank_code',
+            field=models.CharField(blank=True, help_text='全銀協の金融機関コード（4桁）。未入力の場合は主要銀行のみ銀行名から補完', max_length=4, validators=[django.core.validators.RegexValidator('^\\d{4}$', '銀行コードは4桁の数字で入力してください')], verbose_name='銀行コード'),
+        ),
+        migrations.AddField(
+            model_name='contractor',
+            name='branch_code',
+            field=models.CharField(blank=True, max_length=3, validators=[django.core.validators.RegexValidator('^\\d{3}$', '支店コードは3桁の数字で入力してください')], verbose_name='支店コード'),
+        ),
+    ]
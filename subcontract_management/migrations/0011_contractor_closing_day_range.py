@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:47
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subcontract_management', '0010_contractor_bank_branch_code'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contractor',
+            name='closing_day',
+            field=models.IntegerField(blank=True, help_text='月末締めの場合は31、20日締めの場合は20', null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(31)], verbose_name='締め日'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
 from django.utils import timezone
 from decimal import Decimal
 from order_management.models import Project
@@ -96,7 +97,18 @@ class Contractor(models.Model):
 
     # 銀行口座情報
     bank_name = models.CharField(max_length=100, blank=True, verbose_name='銀行名')
+    bank_code = models.CharField(
+        max_length=4, blank=True,
+        validators=[RegexValidator(r'^\d{4}$', '銀行コードは4桁の数字で入力してください')],
+        verbose_name='銀行コード',
+        help_text='全銀協の金融機関コード（4桁）。未入力の場合は主要銀行のみ銀行名から補完'
+    )
     branch_name = models.CharField(max_length=100, blank=True, verbose_name='支店名')
+    branch_code = models.CharField(
+        max_length=3, blank=True,
+        validators=[RegexValidator(r'^\d{3}$', '支店コードは3桁の数字で入力してください')],
+        verbose_name='支店コード'
+    )
     account_type = models.CharField(
         max_length=10,
         choices=[
@@ -129,6 +141,12 @@ class Contractor(models.Model):
         blank=True,
         verbose_name='支払サイクル'
     )
+    closing_day = models.IntegerField(
+        null=True, blank=True,
+        validators=[MinValueValidator(1), MaxValueValidator(31)],
+        verbose_name='締め日',
+        help_text='月末締めの場合は31、20日締めの場合は20'
+    )
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='登録日時')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
@@ -1,3 +1,33 @@
+from django.core.exceptions import ValidationError
 from django.test import TestCase
 
-# Create your tests here.
+from .forms import ContractorForm
+from .models import Contractor
+
+
+class ContractorClosingDayTests(TestCase):
+    def make_contractor(self, closing_day):
+        return Contractor(name='山田内装', address='東京都豊島区', closing_day=closing_day)
+
+    def test_accepts_days_of_month(self):
+        for day in (None, 1, 20, 31):
+            self.make_contractor(day).full_clean()
+
+    def test_rejects_out_of_range_days(self):
+        for day in (0, 32, -5):
+            with self.assertRaises(ValidationError) as raised:
+                self.make_contractor(day).full_clean()
+            self.assertIn('closing_day', raised.exception.message_dict)
+
+    def test_form_edits_closing_day(self):
+        data = {
+            'name': '山田内装', 'contractor_type': 'company', 'address': '東京都豊島区',
+            'payment_cycle': 'monthly', 'closing_day': '20', 'payment_day': '25',
+        }
+        form = ContractorForm(data)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().closing_day, 20)
+
+        form = ContractorForm({**data, 'closing_day': '32'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('closing_day', form.errors)
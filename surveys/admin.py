@@ -20,6 +20,8 @@ class SurveyDamageInline(admin.TabularInline):
 class SurveyPhotoInline(admin.TabularInline):
     model = SurveyPhoto
     extra = 1
+    exclude = ['renditions', 'processing_error', 'processed_at']
+    readonly_fields = ['processing_status']
 
 
 @admin.register(Survey)
@@ -78,10 +80,10 @@ class SurveyDamageAdmin(admin.ModelAdmin):
 
 @admin.register(SurveyPhoto)
 class SurveyPhotoAdmin(admin.ModelAdmin):
-    list_display = ['survey', 'photo_type', 'caption', 'uploaded_at']
-    list_filter = ['photo_type', 'uploaded_at']
+    list_display = ['survey', 'photo_type', 'caption', 'processing_status', 'uploaded_at']
+    list_filter = ['photo_type', 'processing_status', 'uploaded_at']
     search_fields = ['survey__project__name', 'caption']
-    readonly_fields = ['uploaded_at']
+    readonly_fields = ['processing_status', 'renditions', 'processing_error', 'processed_at', 'uploaded_at']
 
 
 @admin.register(Surveyor)
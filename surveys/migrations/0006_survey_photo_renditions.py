@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('surveys', '0005_survey_approval_notes_survey_approved_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='surveyphoto',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='処理日時'),
+        ),
+        migrations.AddField(
+            model_name='surveyphoto',
+            name='processing_error',
+            field=models.CharField(blank=True, max_length=200, verbose_name='処理エラー'),
+        ),
+        migrations.AddField(
+            model_name='surveyphoto',
+            name='processing_status',
+            field=models.CharField(choices=[('pending', '処理待ち'), ('ready', '処理済み'), ('failed', '処理失敗')], default='pending', max_length=10, verbose_name='処理状況'),
+        ),
+        migrations.AddField(
+            model_name='surveyphoto',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, verbose_name='縮小版'),
+        ),
+    ]
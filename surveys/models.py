@@ -1,8 +1,11 @@
 from django.db import models
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.urls import reverse
 from order_management.models import Project
 from django.utils import timezone
+from projects import photo_pipeline, thumbnails
 
 
 class Surveyor(models.Model):
@@ -312,8 +315,19 @@ class SurveyPhoto(models.Model):
     photo_type = models.CharField(max_length=30, choices=PHOTO_TYPES, verbose_name='写真種別')
     image = models.ImageField(upload_to='survey_photos/%Y/%m/%d/', verbose_name='写真')
     caption = models.CharField(max_length=200, blank=True, verbose_name='キャプション')
+    processing_status = models.CharField(
+        max_length=10, choices=photo_pipeline.STATUS_CHOICES,
+        default=photo_pipeline.STATUS_PENDING, verbose_name='処理状況'
+    )
+    renditions = models.JSONField(default=dict, blank=True, verbose_name='縮小版')
+    processing_error = models.CharField(max_length=200, blank=True, verbose_name='処理エラー')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='処理日時')
+    content_hash = models.CharField(max_length=64, blank=True, editable=False, verbose_name='コンテンツハッシュ')
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name='アップロード日時')
 
+    # 縮小版の元にする ImageField
+    source_field = 'image'
+
     class Meta:
         verbose_name = '調査写真'
         verbose_name_plural = '調査写真'
@@ -321,6 +335,28 @@ class SurveyPhoto(models.Model):
     def __str__(self):
         return f"{self.survey} - {self.get_photo_type_display()}"
 
+    @property
+    def thumbnail_url(self):
+        """サムネイルURL"""
+        return thumbnails.thumbnail_url(self)
+
+    @property
+    def display_url(self):
+        """表示用URL（長辺1920pxの縮小版、生成前は原本）"""
+        return photo_pipeline.rendition_url(self, 'large')
+
+
+@receiver(pre_save, sender=SurveyPhoto)
+def hash_survey_photo(sender, instance, **kwargs):
+    """写真のコンテンツハッシュを記録"""
+    photo_pipeline.assign_content_hash(instance, kwargs.get('update_fields'))
+
+
+@receiver(post_delete, sender=SurveyPhoto)
+def delete_survey_photo_renditions(sender, instance, **kwargs):
+    """削除された写真の縮小版ファイルを削除"""
+    photo_pipeline.delete_renditions(instance)
+
 
 class SurveyWorkflowStep(models.Model):
     """調査ワークフローステップ定義"""
@@ -0,0 +1,261 @@
+"""
+調査員の空き枠インデックス
+
+期間内の調査を1クエリで読み込み、調査員 × 日ごとの予定区間（開始順）のタイムラインを作る。
+空き枠の検索はタイムラインの隙間を日付・時刻順にたどるだけで、調査を走査し直さない。
+
+調査の作成・移動・キャンセルはシグナルからインデックスに差分で反映する。
+インデックスはプロセスごとに持つため、キャッシュのバージョンキーを進めて
+他のプロセスには作り直しを促す。
+"""
+import logging
+import threading
+from bisect import insort
+from datetime import time, timedelta
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from projects.geocoding import geocode, haversine_km
+
+from .models import Survey, Surveyor
+
+
+logger = logging.getLogger(__name__)
+
+DAY_START = time(9, 0)
+DAY_END = time(18, 0)
+
+# インデックスに載せる日数（今日から）
+WINDOW_DAYS = 60
+
+# 前後の調査との間に空ける移動時間（分）
+MOVE_BUFFER_MINUTES = 30
+
+INACTIVE_STATUSES = ['cancelled']
+
+VERSION_KEY = 'survey_slot_index:version'
+
+ROW_FIELDS = (
+    'id', 'surveyor_id', 'scheduled_date', 'scheduled_start_time',
+    'estimated_duration', 'project__site_address',
+)
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _time(minutes):
+    return time(minutes // 60, minutes % 60)
+
+
+class SlotIndex:
+    """調査員 × 日の予定区間タイムライン"""
+
+    def __init__(self, start_date, days=WINDOW_DAYS, day_start=DAY_START, day_end=DAY_END):
+        self.start_date = start_date
+        self.end_date = start_date + timedelta(days=days - 1)
+        self.day_start = _minutes(day_start)
+        self.day_end = _minutes(day_end)
+        self.surveyors = {}
+        self.timelines = {}  # (調査員ID, 日付) → [(開始分, 終了分, 調査ID), ...]
+        self.entries = {}  # 調査ID → (調査員ID, 日付, 開始分, 終了分, 現場の座標)
+        self._lock = threading.Lock()
+
+    def build(self):
+        """期間内の調査を読み込む"""
+        self.surveyors = dict(
+            Surveyor.objects.filter(is_active=True).order_by('id').values_list('id', 'name')
+        )
+        rows = Survey.objects.filter(
+            scheduled_date__range=[self.start_date, self.end_date],
+            surveyor__is_active=True,
+        ).exclude(status__in=INACTIVE_STATUSES).values_list(*ROW_FIELDS)
+        with self._lock:
+            for row in rows:
+                self._add(*row)
+        return self
+
+    def _add(self, survey_id, surveyor_id, date, start_time, duration, address):
+        if surveyor_id not in self.surveyors or not self.start_date <= date <= self.end_date:
+            return
+        start = _minutes(start_time)
+        end = start + (duration or 0)
+        insort(self.timelines.setdefault((surveyor_id, date), []), (start, end, survey_id))
+        self.entries[survey_id] = (surveyor_id, date, start, end, geocode(address or ''))
+
+    def _remove(self, survey_id):
+        entry = self.entries.pop(survey_id, None)
+        if entry is not None:
+            surveyor_id, date, start, end, _ = entry
+            self.timelines[(surveyor_id, date)].remove((start, end, survey_id))
+
+    def update(self, survey):
+        """
+        作成・移動・キャンセルされた調査を反映
+
+        日時が文字列のまま保存されることもあるため、インスタンスの値ではなく保存された行を読み直す。
+        """
+        row = Survey.objects.filter(pk=survey.pk).exclude(
+            status__in=INACTIVE_STATUSES
+        ).values_list(*ROW_FIELDS).first()
+        with self._lock:
+            self._remove(survey.pk)
+            if row is not None:
+                self._add(*row)
+
+    def remove(self, survey_id):
+        """削除された調査を取り除く"""
+        with self._lock:
+            self._remove(survey_id)
+
+    def free_slots(self, duration, date_from=None, time_from=None, surveyor_ids=None,
+                   near=None, radius_km=None):
+        """
+        空き枠を日付・開始時刻の早い順に返すジェネレータ
+
+        調査員ごと・日ごとに、所要時間が収まる最初の隙間を1件ずつ返す。
+
+        Args:
+            duration: 所要時間（分）
+            date_from, time_from: この日時以降の枠だけを探す
+            surveyor_ids: 対象の調査員（省略時は稼働中の全員）
+            near: 現場の座標 (緯度, 経度)。radius_km と合わせて指定すると、
+                前後どちらかの予定の現場が半径内にある枠だけを返す
+        """
+        date = max(date_from or self.start_date, self.start_date)
+        surveyor_ids = [s for s in (surveyor_ids or self.surveyors) if s in self.surveyors]
+
+        while date <= self.end_date:
+            earliest = self.day_start
+            if time_from is not None and date == date_from:
+                earliest = max(earliest, _minutes(time_from))
+
+            slots = []
+            with self._lock:
+                for surveyor_id in surveyor_ids:
+                    slot = self._first_fit(
+                        self.timelines.get((surveyor_id, date), ()),
+                        duration, earliest, near, radius_km,
+                    )
+                    if slot is not None:
+                        slots.append((slot[0], slot[1] if slot[1] is not None else float('inf'),
+                                      surveyor_id, slot))
+
+            for start, _, surveyor_id, (_, distance) in sorted(slots):
+                yield {
+                    'surveyor_id': surveyor_id,
+                    'surveyor': self.surveyors[surveyor_id],
+                    'date': date,
+                    'start': _time(start),
+                    'end': _time(start + duration),
+                    'distance_km': round(distance, 1) if distance is not None else None,
+                }
+            date += timedelta(days=1)
+
+    def earliest_fit(self, duration, **kwargs):
+        """最も早い空き枠（なければ None）"""
+        return next(self.free_slots(duration, **kwargs), None)
+
+    def _first_fit(self, timeline, duration, earliest, near, radius_km):
+        """タイムラインで所要時間が収まる最初の隙間の (開始分, 前後の現場までの距離)"""
+        cursor = self.day_start
+        previous = None
+        for start, end, survey_id in list(timeline) + [(self.day_end, self.day_end, None)]:
+            slot_start = max(cursor, earliest)
+            slot_end = start - (MOVE_BUFFER_MINUTES if survey_id is not None else 0)
+            if slot_end - slot_start >= duration:
+                distance = self._neighbour_distance(near, previous, survey_id)
+                if radius_km is None or (distance is not None and distance <= radius_km):
+                    return slot_start, distance
+            cursor = max(cursor, end + MOVE_BUFFER_MINUTES)
+            previous = survey_id
+        return None
+
+    def _neighbour_distance(self, near, *survey_ids):
+        if near is None:
+            return None
+        distances = [
+            haversine_km(near[0], near[1], *self.entries[survey_id][4])
+            for survey_id in survey_ids
+            if survey_id is not None and self.entries[survey_id][4] is not None
+        ]
+        return min(distances) if distances else None
+
+
+_index = None
+_index_version = None
+_registry_lock = threading.Lock()
+
+
+def get_slot_index():
+    """今日から WINDOW_DAYS 日分のインデックス（日付が変わるか他のプロセスで更新があれば作り直す）"""
+    global _index, _index_version
+    version = cache.get_or_set(VERSION_KEY, 1, None)
+    with _registry_lock:
+        if (
+            _index is None
+            or _index.start_date != timezone.localdate()
+            or _index_version != version
+        ):
+            _index = SlotIndex(timezone.localdate()).build()
+            _index_version = version
+        return _index
+
+
+def _bump_version():
+    """変更をバージョンキーに記録（このプロセスのインデックスが最新なら最新のまま扱う）"""
+    global _index_version
+    with _registry_lock:
+        previous = cache.get(VERSION_KEY)
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            version = 2
+            cache.set(VERSION_KEY, version, None)
+        if previous is not None and _index_version == previous and version == previous + 1:
+            _index_version = version
+
+
+def _discard_index():
+    """差分を反映できなかったインデックスを捨てる（次の検索で作り直す）"""
+    global _index
+    logger.exception('空き枠インデックスを更新できませんでした')
+    with _registry_lock:
+        _index = None
+
+
+def survey_saved(sender, instance, **kwargs):
+    # 調査の保存はインデックスの不具合で失敗させない
+    try:
+        if _index is not None:
+            _index.update(instance)
+    except Exception:
+        _discard_index()
+    _bump_version()
+
+
+def survey_deleted(sender, instance, **kwargs):
+    try:
+        if _index is not None:
+            _index.remove(instance.pk)
+    except Exception:
+        _discard_index()
+    _bump_version()
+
+
+def surveyor_changed(sender, instance, **kwargs):
+    global _index
+    with _registry_lock:
+        _index = None
+    _bump_version()
+
+
+def connect_signals():
+    """調査・調査員の保存・削除をインデックスに反映"""
+    post_save.connect(survey_saved, sender=Survey, dispatch_uid='survey_slot_index:survey_saved')
+    post_delete.connect(survey_deleted, sender=Survey, dispatch_uid='survey_slot_index:survey_deleted')
+    post_save.connect(surveyor_changed, sender=Surveyor, dispatch_uid='survey_slot_index:surveyor_saved')
+    post_delete.connect(surveyor_changed, sender=Surveyor, dispatch_uid='survey_slot_index:surveyor_deleted')
@@ -0,0 +1,276 @@
+"""
+調査データ（部屋・壁面・損傷）の一括保存
+
+保存APIに送られたデータを、調査の既存の部屋・壁面・損傷（3クエリで読み込む）と突き合わせ、
+追加・変更・削除をそれぞれ bulk_create / bulk_update / delete でまとめて1トランザクションで反映する。
+部屋や壁面の数によらずクエリ数は一定で、途中でエラーになれば何も保存しない。
+
+送信データ:
+    {
+        "rooms": [{"id", "name", "walls": [{"id", "direction", "length", "height",
+                   "opening_area", "foundation_type", "foundation_condition"}]}],
+        "damages": [{"id", "type", "has_dents", "dent_count", "description"}],
+        "deleted": {"rooms": [id, ...], "walls": [id, ...], "damages": [id, ...]},
+        "notes": "..."
+    }
+
+id を添えた項目はその行を、id のない項目は部屋名・壁面方向・損傷種別が同じ行を更新し、
+該当する行がなければ追加する。既存の行を更新するときは送られた項目だけを書き換えるため、
+前回の保存で返った id を使えば変わった項目だけを送ればよい。
+削除は deleted で指定した行だけに行う（送られなかった行は削除しない）。
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .models import SurveyDamage, SurveyRoom, SurveyWall
+
+
+WALL_DEFAULTS = {
+    'length': Decimal('0'),
+    'height': Decimal('0'),
+    'opening_area': Decimal('0'),
+    'foundation_type': 'gypsum_board',
+    'foundation_condition': 'good',
+}
+
+DAMAGE_DEFAULTS = {
+    'has_dents': False,
+    'dent_count': 0,
+    'description': '',
+}
+
+WALL_UPDATE_FIELDS = ['room', 'direction', *WALL_DEFAULTS]
+DAMAGE_UPDATE_FIELDS = ['damage_type', *DAMAGE_DEFAULTS]
+
+
+class SurveyDataError(ValueError):
+    """送信データの形式が正しくない"""
+
+
+def _decimal(value, name):
+    try:
+        return Decimal(str(value or 0)).quantize(Decimal('0.1'))
+    except InvalidOperation:
+        raise SurveyDataError(f'{name} の値が正しくありません: {value}')
+
+
+def _integer(value, name):
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        raise SurveyDataError(f'{name} の値が正しくありません: {value}')
+
+
+def _choice(model, field, value):
+    choices = dict(model._meta.get_field(field).choices)
+    if value not in choices:
+        raise SurveyDataError(f'{field} の値が正しくありません: {value}')
+    return value
+
+
+def _id(item):
+    value = item.get('id')
+    return _integer(value, 'id') if value not in (None, '') else None
+
+
+def _wall_values(item):
+    parsers = {
+        'length': lambda v: _decimal(v, 'length'),
+        'height': lambda v: _decimal(v, 'height'),
+        'opening_area': lambda v: _decimal(v, 'opening_area'),
+        'foundation_type': lambda v: _choice(SurveyWall, 'foundation_type', v),
+        'foundation_condition': lambda v: _choice(SurveyWall, 'foundation_condition', v),
+    }
+    return {field: parse(item[field]) for field, parse in parsers.items() if field in item}
+
+
+def _damage_values(item):
+    parsers = {
+        'has_dents': bool,
+        'dent_count': lambda v: _integer(v, 'dent_count'),
+        'description': lambda v: str(v or ''),
+    }
+    return {field: parse(item[field]) for field, parse in parsers.items() if field in item}
+
+
+def _assign(obj, values):
+    """値を書き換え、変わった項目があれば True"""
+    changed = False
+    for field, value in values.items():
+        if getattr(obj, field) != value:
+            setattr(obj, field, value)
+            changed = True
+    return changed
+
+
+class _Changes:
+    """追加・変更する行（同じ行が2回送られても1回だけ書き込む）"""
+
+    def __init__(self):
+        self.created = []
+        self.updated = {}
+
+    def add(self, obj):
+        self.created.append(obj)
+
+    def touch(self, obj, changed):
+        if changed and obj.pk is not None:
+            self.updated[obj.pk] = obj
+
+
+def apply_survey_data(survey, data):
+    """
+    送信データを調査に反映する
+
+    Raises:
+        SurveyDataError: 送信データの形式が正しくない、または他の調査の id を指定した
+
+    Returns:
+        {"rooms": [{"id", "name", "walls": [{"id", "direction"}]}],
+         "damages": [{"id", "type"}], "created", "updated", "deleted"}
+        （rooms・damages は送られた順）
+    """
+    if not isinstance(data, dict):
+        raise SurveyDataError('送信データの形式が正しくありません')
+    deleted = data.get('deleted') or {}
+    try:
+        deleted_ids = {
+            key: {_integer(pk, 'id') for pk in deleted.get(key) or []}
+            for key in ('rooms', 'walls', 'damages')
+        }
+    except AttributeError:
+        raise SurveyDataError('deleted の形式が正しくありません')
+
+    rooms = {room.pk: room for room in SurveyRoom.objects.filter(survey=survey).order_by('id')}
+    walls = {wall.pk: wall for wall in SurveyWall.objects.filter(room__survey=survey).order_by('id')}
+    damages = {damage.pk: damage for damage in SurveyDamage.objects.filter(survey=survey).order_by('id')}
+    for wall in walls.values():
+        wall.room = rooms[wall.room_id]
+
+    # 削除する部屋の壁面も一緒に削除される
+    deleted_ids['walls'] |= {pk for pk, wall in walls.items() if wall.room_id in deleted_ids['rooms']}
+    for key, existing in (('rooms', rooms), ('walls', walls), ('damages', damages)):
+        deleted_ids[key] &= existing.keys()
+        for pk in deleted_ids[key]:
+            del existing[pk]
+
+    rooms_by_name = {}
+    for room in rooms.values():
+        rooms_by_name.setdefault(room.room_name, room)
+    walls_by_room = {}
+    for wall in walls.values():
+        walls_by_room.setdefault(wall.room_id, {}).setdefault(wall.direction, wall)
+
+    room_changes, wall_changes, damage_changes = _Changes(), _Changes(), _Changes()
+    room_results = []
+
+    for item in data.get('rooms') or []:
+        pk = _id(item)
+        name = str(item.get('name') or '').strip()
+        if pk is not None:
+            if pk not in rooms:
+                raise SurveyDataError(f'部屋が見つかりません: {pk}')
+            room = rooms[pk]
+            if room.room_name != name:
+                room.room_name = name
+                room_changes.touch(room, True)
+                rooms_by_name.setdefault(name, room)
+        elif name in rooms_by_name:
+            room = rooms_by_name[name]
+        else:
+            room = SurveyRoom(survey=survey, room_name=name)
+            room_changes.add(room)
+            rooms_by_name[name] = room
+        room_walls = walls_by_room.setdefault(room.pk if room.pk is not None else room.room_name, {})
+
+        wall_results = []
+        for wall_item in item.get('walls') or []:
+            wall_pk = _id(wall_item)
+            values = _wall_values(wall_item)
+            if wall_pk is not None:
+                if wall_pk not in walls:
+                    raise SurveyDataError(f'壁面が見つかりません: {wall_pk}')
+                wall = walls[wall_pk]
+                if 'direction' in wall_item:
+                    values['direction'] = _choice(SurveyWall, 'direction', wall_item['direction'])
+                changed = _assign(wall, values)
+                if wall.room is not room:
+                    wall.room = room
+                    changed = True
+                wall_changes.touch(wall, changed)
+                room_walls.setdefault(wall.direction, wall)
+            else:
+                direction = _choice(SurveyWall, 'direction', wall_item.get('direction'))
+                wall = room_walls.get(direction)
+                if wall is not None:
+                    wall_changes.touch(wall, _assign(wall, values))
+                else:
+                    wall = SurveyWall(room=room, direction=direction, **{**WALL_DEFAULTS, **values})
+                    wall_changes.add(wall)
+                    room_walls[direction] = wall
+            wall_results.append(wall)
+        room_results.append((room, wall_results))
+
+    damages_by_type = {}
+    for damage in damages.values():
+        damages_by_type.setdefault(damage.damage_type, damage)
+    damage_results = []
+    for item in data.get('damages') or []:
+        pk = _id(item)
+        values = _damage_values(item)
+        if pk is not None:
+            if pk not in damages:
+                raise SurveyDataError(f'損傷が見つかりません: {pk}')
+            damage = damages[pk]
+            if 'type' in item:
+                values['damage_type'] = _choice(SurveyDamage, 'damage_type', item['type'])
+            damage_changes.touch(damage, _assign(damage, values))
+        else:
+            damage_type = _choice(SurveyDamage, 'damage_type', item.get('type'))
+            damage = damages_by_type.get(damage_type)
+            if damage is not None:
+                damage_changes.touch(damage, _assign(damage, values))
+            else:
+                damage = SurveyDamage(survey=survey, damage_type=damage_type, **{**DAMAGE_DEFAULTS, **values})
+                damage_changes.add(damage)
+                damages_by_type[damage_type] = damage
+        damage_results.append(damage)
+
+    with transaction.atomic():
+        if deleted_ids['damages']:
+            SurveyDamage.objects.filter(survey=survey, pk__in=deleted_ids['damages']).delete()
+        if deleted_ids['walls']:
+            SurveyWall.objects.filter(room__survey=survey, pk__in=deleted_ids['walls']).delete()
+        if deleted_ids['rooms']:
+            SurveyRoom.objects.filter(survey=survey, pk__in=deleted_ids['rooms']).delete()
+
+        SurveyRoom.objects.bulk_create(room_changes.created)
+        SurveyRoom.objects.bulk_update(room_changes.updated.values(), ['room_name'])
+        # 追加した部屋の id が決まってから壁面に部屋の id を入れる
+        for wall in [*wall_changes.created, *wall_changes.updated.values()]:
+            wall.room_id = wall.room.pk
+        SurveyWall.objects.bulk_create(wall_changes.created)
+        SurveyWall.objects.bulk_update(wall_changes.updated.values(), WALL_UPDATE_FIELDS)
+        SurveyDamage.objects.bulk_create(damage_changes.created)
+        SurveyDamage.objects.bulk_update(damage_changes.updated.values(), DAMAGE_UPDATE_FIELDS)
+
+        if 'notes' in data and survey.notes != (data['notes'] or ''):
+            survey.notes = data['notes'] or ''
+            survey.save(update_fields=['notes', 'updated_at'])
+
+    changes = (room_changes, wall_changes, damage_changes)
+    return {
+        'rooms': [
+            {
+                'id': room.pk,
+                'name': room.room_name,
+                'walls': [{'id': wall.pk, 'direction': wall.direction} for wall in room_walls],
+            }
+            for room, room_walls in room_results
+        ],
+        'damages': [{'id': damage.pk, 'type': damage.damage_type} for damage in damage_results],
+        'created': sum(len(c.created) for c in changes),
+        'updated': sum(len(c.updated) for c in changes),
+        'deleted': sum(len(ids) for ids in deleted_ids.values()),
+    }
@@ -1,3 +1,194 @@
+from datetime import date, time
+from decimal import Decimal
+from unittest import mock
+
 from django.test import TestCase
+from django.urls import reverse
+
+from order_management.models import Project
+
+from . import slot_index
+from .models import Survey, SurveyDamage, SurveyRoom, SurveyWall, Surveyor
+from .slot_index import SlotIndex
+
+
+def create_project(**kwargs):
+    values = {
+        'site_name': 'テスト現場',
+        'site_address': '東京都新宿区西新宿1-1-1',
+        'contractor_name': '元請株式会社',
+        'contractor_address': '東京都千代田区丸の内1-1-1',
+        'project_manager': '担当者',
+        'work_type': 'cross',
+    }
+    values.update(kwargs)
+    return Project.objects.create(**values)
+
+
+def create_surveyor(employee_id='S001', name='調査 太郎'):
+    return Surveyor.objects.create(employee_id=employee_id, name=name)
+
+
+class SlotIndexTests(TestCase):
+    day = date(2026, 11, 2)
+
+    def setUp(self):
+        self.project = create_project()
+        self.surveyor = create_surveyor()
+
+    def create_survey(self, **kwargs):
+        values = {
+            'project': self.project,
+            'surveyor': self.surveyor,
+            'scheduled_date': self.day,
+            'scheduled_start_time': time(10, 0),
+            'estimated_duration': 60,
+        }
+        values.update(kwargs)
+        return Survey.objects.create(**values)
+
+    def test_free_slot_skips_scheduled_survey_and_move_buffer(self):
+        self.create_survey()
+        index = SlotIndex(self.day, days=1).build()
+
+        slots = list(index.free_slots(90))
+
+        self.assertEqual(slots[0]['start'], time(11, 30))
+        self.assertEqual(slots[0]['end'], time(13, 0))
+
+    def test_saved_survey_with_string_values_is_indexed(self):
+        index = SlotIndex(self.day, days=1).build()
+        with mock.patch.object(slot_index, '_index', index):
+            survey = self.create_survey(
+                scheduled_date=self.day.isoformat(), scheduled_start_time='09:00'
+            )
+
+        self.assertEqual(index.entries[survey.pk][1:4], (self.day, 540, 600))
+
+    def test_cancelled_survey_is_removed(self):
+        survey = self.create_survey()
+        index = SlotIndex(self.day, days=1).build()
+        with mock.patch.object(slot_index, '_index', index):
+            survey.status = 'cancelled'
+            survey.save()
+
+        self.assertNotIn(survey.pk, index.entries)
+        self.assertEqual(index.earliest_fit(60)['start'], time(9, 0))
+
+    def test_failed_update_does_not_break_save(self):
+        index = SlotIndex(self.day, days=1).build()
+        with mock.patch.object(slot_index, '_index', index), \
+                mock.patch.object(index, 'update', side_effect=TypeError), \
+                self.assertLogs('surveys.slot_index', 'ERROR'):
+            self.create_survey()
+            self.assertIsNone(slot_index._index)
+
+
+class FreeSlotSearchApiTests(TestCase):
+    url = reverse('surveys:free_slot_search_api')
+
+    def setUp(self):
+        create_surveyor()
+
+    def get(self, **params):
+        return self.client.get(self.url, {'date': '2026-11-02', 'time': '09:00', **params})
+
+    def test_rejects_non_positive_duration(self):
+        self.assertEqual(self.get(duration='0').status_code, 400)
+        self.assertEqual(self.get(duration='-30').status_code, 400)
+
+    def test_rejects_limit_out_of_range(self):
+        self.assertEqual(self.get(limit='0').status_code, 400)
+        self.assertEqual(self.get(limit='51').status_code, 400)
+
+    def test_returns_at_most_limit_slots(self):
+        response = self.get(limit='1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['slots']), 1)
+
+
+class SurveySaveApiTests(TestCase):
+    def setUp(self):
+        self.survey = Survey.objects.create(
+            project=create_project(),
+            surveyor=create_surveyor(),
+            scheduled_date=date(2026, 11, 2),
+            scheduled_start_time=time(10, 0),
+        )
+        self.url = reverse('surveys:survey_save_api', args=[self.survey.pk])
+
+    def save(self, data):
+        return self.client.post(self.url, data, content_type='application/json')
+
+    def test_creates_rooms_walls_and_damages(self):
+        response = self.save({
+            'rooms': [{'name': 'リビング', 'walls': [
+                {'direction': 'north', 'length': '3.6', 'height': '2.4'},
+                {'direction': 'south', 'length': '3.6', 'height': '2.4'},
+            ]}],
+            'damages': [{'type': 'nail_holes', 'has_dents': True, 'dent_count': 3}],
+            'notes': '特記なし',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 4)
+        room = SurveyRoom.objects.get(survey=self.survey)
+        self.assertEqual(room.walls.count(), 2)
+        self.assertEqual(room.walls.get(direction='north').length, Decimal('3.6'))
+        self.assertEqual(SurveyDamage.objects.get(survey=self.survey).dent_count, 3)
+        self.survey.refresh_from_db()
+        self.assertEqual(self.survey.notes, '特記なし')
+
+    def test_updates_only_sent_fields_and_deletes_listed_rows(self):
+        result = self.save({
+            'rooms': [{'name': '寝室', 'walls': [
+                {'direction': 'east', 'length': '2.7', 'height': '2.4'},
+                {'direction': 'west', 'length': '2.7', 'height': '2.4'},
+            ]}],
+        }).json()
+        room = result['rooms'][0]
+        east, west = room['walls']
+
+        response = self.save({
+            'rooms': [{'id': room['id'], 'name': '寝室', 'walls': [{'id': east['id'], 'length': '3.0'}]}],
+            'deleted': {'walls': [west['id']]},
+        })
+
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual(response.json()['deleted'], 1)
+        wall = SurveyWall.objects.get(pk=east['id'])
+        self.assertEqual((wall.length, wall.height), (Decimal('3.0'), Decimal('2.4')))
+        self.assertFalse(SurveyWall.objects.filter(pk=west['id']).exists())
+
+    def test_query_count_does_not_grow_with_rooms(self):
+        rooms = [
+            {'name': f'部屋{i}', 'walls': [{'direction': 'north'}, {'direction': 'south'}]}
+            for i in range(10)
+        ]
+        with self.assertNumQueries(8):
+            self.save({'rooms': rooms})
+
+    def test_invalid_data_returns_400_and_saves_nothing(self):
+        response = self.save({
+            'rooms': [{'name': 'リビング', 'walls': [{'direction': 'up'}]}],
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(SurveyRoom.objects.exists())
+
+        self.assertEqual(self.save([1]).status_code, 400)
+
+    def test_rejects_ids_of_other_surveys(self):
+        other = Survey.objects.create(
+            project=create_project(site_name='別現場'),
+            surveyor=self.survey.surveyor,
+            scheduled_date=date(2026, 11, 3),
+            scheduled_start_time=time(10, 0),
+        )
+        room = SurveyRoom.objects.create(survey=other, room_name='他の部屋')
+
+        response = self.save({'rooms': [{'id': room.pk, 'name': '書き換え'}]})
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 400)
+        room.refresh_from_db()
+        self.assertEqual(room.room_name, '他の部屋')
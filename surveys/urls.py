@@ -44,6 +44,7 @@ urlpatterns = [
     path('<int:pk>/api/save/', views.survey_save_api, name='survey_save_api'),
     path('<int:pk>/api/complete/', views.survey_complete_api, name='survey_complete_api'),
     path('<int:pk>/approve/', views.survey_approve_api, name='survey_approve'),
+    path('api/free-slots/', views.free_slot_search_api, name='free_slot_search_api'),
 
     # 案件に紐づく調査一覧
     path('project/<int:project_id>/', ProjectSurveyListView.as_view(), name='project_surveys'),
@@ -9,9 +9,12 @@ from django.contrib import messages
 from django.contrib.auth.models import User
 from django.db.models import Q, Count
 import json
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 
-from .models import Survey, SurveyRoom, SurveyWall, SurveyDamage, SurveyPhoto, Surveyor
+from .models import Survey, SurveyPhoto, Surveyor
+from .slot_index import get_slot_index
+from .survey_data import SurveyDataError, apply_survey_data
+from projects.geocoding import geocode
 from order_management.models import Project
 from .views_ext import SurveyRecordDetailView, ProjectSurveyListView, ProjectSurveyCreateView
 
@@ -331,62 +334,78 @@ def survey_start_api(request, pk):
 
 @csrf_exempt
 def survey_save_api(request, pk):
-    """調査データ保存API"""
+    """
+    調査データ保存API
+
+    部屋・壁面・損傷の追加・変更・削除をまとめて1トランザクションで保存し、
+    それぞれの id を返す（次回の保存では id を添えて変わった項目だけを送れる）。
+    送信データの形式は survey_data を参照。
+    """
     if request.method == 'POST':
         survey = get_object_or_404(Survey, pk=pk)
 
         try:
             data = json.loads(request.body)
+            result = apply_survey_data(survey, data)
+            return JsonResponse({'success': True, 'message': 'データを保存しました', **result})
 
-            # 部屋データの保存
-            if 'rooms' in data:
-                for room_data in data['rooms']:
-                    room, created = SurveyRoom.objects.get_or_create(
-                        survey=survey,
-                        room_name=room_data['name']
-                    )
-
-                    # 壁面データの保存
-                    if 'walls' in room_data:
-                        for wall_data in room_data['walls']:
-                            SurveyWall.objects.update_or_create(
-                                room=room,
-                                direction=wall_data['direction'],
-                                defaults={
-                                    'length': wall_data.get('length', 0),
-                                    'height': wall_data.get('height', 0),
-                                    'opening_area': wall_data.get('opening_area', 0),
-                                    'foundation_type': wall_data.get('foundation_type', 'gypsum_board'),
-                                    'foundation_condition': wall_data.get('foundation_condition', 'good'),
-                                }
-                            )
-
-            # 損傷データの保存
-            if 'damages' in data:
-                for damage_data in data['damages']:
-                    SurveyDamage.objects.update_or_create(
-                        survey=survey,
-                        damage_type=damage_data['type'],
-                        defaults={
-                            'has_dents': damage_data.get('has_dents', False),
-                            'dent_count': damage_data.get('dent_count', 0),
-                            'description': damage_data.get('description', ''),
-                        }
-                    )
-
-            # 備考の保存
-            if 'notes' in data:
-                survey.notes = data['notes']
-                survey.save()
-
-            return JsonResponse({'success': True, 'message': 'データを保存しました'})
-
+        except (json.JSONDecodeError, SurveyDataError) as e:
+            return JsonResponse({'success': False, 'message': f'エラー: {str(e)}'}, status=400)
         except Exception as e:
             return JsonResponse({'success': False, 'message': f'エラー: {str(e)}'})
 
     return JsonResponse({'success': False, 'message': 'Invalid request method'})
 
 
+def free_slot_search_api(request):
+    """
+    空き枠検索API
+
+    GET: duration（分、既定120）, date / time（この日時以降、既定は今日）, surveyor（任意）,
+         near（現場住所、任意）, radius_km（任意、near と合わせて指定）, limit（1〜50、既定5）
+    """
+    try:
+        duration = int(request.GET.get('duration', 120))
+        date_from = (
+            date.fromisoformat(request.GET['date']) if request.GET.get('date') else timezone.localdate()
+        )
+        if request.GET.get('time'):
+            time_from = datetime.strptime(request.GET['time'], '%H:%M').time()
+        elif date_from == timezone.localdate():
+            time_from = timezone.localtime().time()
+        else:
+            time_from = None
+        radius_km = float(request.GET['radius_km']) if request.GET.get('radius_km') else None
+        limit = int(request.GET.get('limit', 5))
+        surveyor_ids = [int(request.GET['surveyor'])] if request.GET.get('surveyor') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'パラメータの形式が正しくありません'}, status=400)
+    if duration <= 0:
+        return JsonResponse({'success': False, 'message': '所要時間は1分以上を指定してください'}, status=400)
+    if not 1 <= limit <= 50:
+        return JsonResponse({'success': False, 'message': '件数は1〜50で指定してください'}, status=400)
+
+    near = geocode(request.GET['near']) if request.GET.get('near') else None
+    if radius_km is not None and near is None:
+        return JsonResponse({'success': False, 'message': '現場住所の位置が分かりません'}, status=400)
+
+    slots = []
+    for slot in get_slot_index().free_slots(
+        duration, date_from=date_from, time_from=time_from, surveyor_ids=surveyor_ids,
+        near=near, radius_km=radius_km,
+    ):
+        slots.append({
+            **slot,
+            'date': slot['date'].isoformat(),
+            'start': slot['start'].strftime('%H:%M'),
+            'end': slot['end'].strftime('%H:%M'),
+        })
+        if len(slots) >= limit:
+            break
+
+    return JsonResponse({'success': True, 'slots': slots})
+
+
 @csrf_exempt
 def survey_complete_api(request, pk):
     """調査完了API"""
@@ -7,9 +7,11 @@ from django.contrib import messages
 from django.utils import timezone
 from datetime import date
 import json
+import os
 
 from .models import Survey, SurveyWorkflowStep, SurveyStepProgress, SurveyRoom, SurveyWall, SurveyPhoto, Surveyor
 from order_management.models import Project
+from projects import chunked_upload, photo_pipeline
 
 
 class DemoSurveyListView(TemplateView):
@@ -258,10 +260,6 @@ def upload_step_photo(request, survey_id, step_id):
     survey = get_object_or_404(Survey, id=survey_id)
     step = get_object_or_404(SurveyWorkflowStep, id=step_id)
 
-    if 'photo' not in request.FILES:
-        return JsonResponse({'error': 'No photo uploaded'}, status=400)
-
-    photo_file = request.FILES['photo']
     caption = request.POST.get('caption', '')
 
     # 写真の種別を決定
@@ -271,17 +269,36 @@ def upload_step_photo(request, survey_id, step_id):
     elif step.step_type == 'damage_assessment':
         photo_type = 'damage_detail'
 
-    photo = SurveyPhoto.objects.create(
-        survey=survey,
-        photo_type=photo_type,
-        image=photo_file,
-        caption=caption
-    )
+    # 通常のファイル送信か、分割アップロードの upload_id（チェックサムを確かめて組み立てる）
+    try:
+        with chunked_upload.received_photo(request) as photo_file:
+            if photo_file is None:
+                return JsonResponse({'error': 'No photo uploaded'}, status=400)
+
+            image_format = photo_pipeline.admit_upload(photo_file)
+
+            # 原本をそのまま保存し、縮小版はプロセスプールで生成する（拡張子は検出した形式から）
+            photo_file.name = photo_pipeline.photo_filename(
+                os.path.splitext(os.path.basename(photo_file.name))[0] or 'photo', image_format
+            )
+            photo = SurveyPhoto.objects.create(
+                survey=survey,
+                photo_type=photo_type,
+                image=photo_file,
+                caption=caption
+            )
+    except chunked_upload.ChunkedUploadError as e:
+        return chunked_upload.error_response(e)
+    except photo_pipeline.PhotoRejectedError as e:
+        return photo_pipeline.rejection_response(e)
+    photo_pipeline.enqueue_photo(photo)
 
     return JsonResponse({
         'success': True,
         'photo_id': photo.id,
-        'photo_url': photo.image.url if photo.image else None
+        'photo_url': photo.image.url if photo.image else None,
+        'thumbnail_url': photo.thumbnail_url,
+        'processing_status': photo.processing_status,
     })
 
 